@@ -46,7 +46,8 @@ class FashnTryonAdapter:
         garment_photo_type: str = "flat-lay",
         mode: str = "quality",
         num_samples: int = 1,
-        progress_callback=None
+        progress_callback=None,
+        person_image_bytes: Optional[bytes] = None
     ) -> Tuple[List[Image.Image], Dict]:
         """
         バーチャル試着
@@ -59,6 +60,7 @@ class FashnTryonAdapter:
             mode: 処理モード（performance/balanced/quality）
             num_samples: 生成枚数（1-4）
             progress_callback: 進捗コールバック
+            person_image_bytes: エンコード済みの参考人物PNG（指定時は再エンコードしない）
         
         Returns:
             (生成画像リスト, メタデータ)
@@ -72,7 +74,11 @@ class FashnTryonAdapter:
             progress_callback("画像をエンコード中...", 10)
         
         # 画像をBase64エンコード
-        person_data_url = self.encode_image_to_base64(person_image)
+        if person_image_bytes is not None:
+            b64 = base64.b64encode(person_image_bytes).decode('ascii')
+            person_data_url = f"data:image/png;base64,{b64}"
+        else:
+            person_data_url = self.encode_image_to_base64(person_image)
         garment_data_url = self.encode_image_to_base64(garment_image)
         
         # 進捗報告
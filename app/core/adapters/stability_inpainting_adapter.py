@@ -3,24 +3,35 @@
 import base64
 from io import BytesIO
 from typing import Tuple, Optional
-from PIL import Image
+from PIL import Image, ImageFilter
 import requests
 import numpy as np
 
 
+# プロバイダに送るタイルの目標画素数（この程度が最も品質と速度のバランスが良い）
+OPTIMAL_PIXELS = 1024 * 1024
+
+# タイルの拡大は最大2倍まで（小さすぎる領域を無理に拡大しない）
+MAX_UPSCALE = 2.0
+
+
 class StabilityInpaintingAdapter:
     """Stability AI Inpainting アダプター
     
     参考人物画像の服の部分だけを変更します
     """
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, crop_margin: float = 0.15, feather_radius: int = 12):
         """
         Args:
             api_key: Stability AI APIキー
+            crop_margin: マスク外接矩形の周囲に含める余白（矩形サイズに対する比率）
+            feather_radius: 貼り戻し時の境界ぼかし半径（px）
         """
         self.api_key = api_key
         self.api_host = "https://api.stability.ai"
+        self.crop_margin = crop_margin
+        self.feather_radius = feather_radius
     
     def virtual_tryon(
         self,
@@ -119,6 +130,9 @@ class StabilityInpaintingAdapter:
         """
         Stability AI Inpainting APIを呼び出し
         
+        マスクの外接矩形（+余白）だけを切り出し、プロバイダの最適サイズに
+        拡大縮小して送信します。結果は元のサイズに戻し、境界をぼかして貼り戻します。
+        
         Args:
             image: ベース画像
             mask: マスク画像
@@ -127,6 +141,124 @@ class StabilityInpaintingAdapter:
         Returns:
             (生成画像, メタデータ)
         """
+        image = image.convert('RGB')
+        mask = mask.convert('L')
+        if mask.size != image.size:
+            mask = mask.resize(image.size, Image.Resampling.NEAREST)
+        
+        crop_box = self._compute_crop_box(mask)
+        if crop_box is None:
+            print("[Stability Inpainting] マスクが空のため、元の画像を返します")
+            return image.copy(), {
+                "provider": "stability_inpainting",
+                "method": "inpaint",
+                "prompt": prompt,
+                "skipped": True
+            }
+        
+        tile = image.crop(crop_box)
+        tile_mask = mask.crop(crop_box)
+        upload_size = self._optimal_tile_size(tile.size)
+        
+        print(
+            f"[Stability Inpainting] 送信領域: {crop_box} "
+            f"({tile.width}x{tile.height} → {upload_size[0]}x{upload_size[1]}, "
+            f"全体 {image.width}x{image.height})"
+        )
+        
+        if upload_size != tile.size:
+            upload_tile = tile.resize(upload_size, Image.Resampling.LANCZOS)
+            upload_mask = tile_mask.resize(upload_size, Image.Resampling.NEAREST)
+        else:
+            upload_tile, upload_mask = tile, tile_mask
+        
+        result_tile = self._post_inpaint(upload_tile, upload_mask, prompt)
+        
+        if result_tile.size != tile.size:
+            result_tile = result_tile.resize(tile.size, Image.Resampling.LANCZOS)
+        
+        result_image = self._paste_feathered(image, result_tile.convert('RGB'), tile_mask, crop_box)
+        
+        metadata = {
+            "provider": "stability_inpainting",
+            "method": "inpaint",
+            "prompt": prompt,
+            "crop_box": list(crop_box),
+            "upload_size": list(upload_size)
+        }
+        
+        return result_image, metadata
+    
+    def _compute_crop_box(self, mask: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """
+        マスクの外接矩形に余白を加えた切り出し範囲を計算
+        
+        Returns:
+            (left, top, right, bottom) またはNone（マスクが空の場合）
+        """
+        bbox = mask.point(lambda v: 255 if v > 0 else 0).getbbox()
+        if bbox is None:
+            return None
+        
+        left, top, right, bottom = bbox
+        # grow_maskとぼかしが切り出し範囲に収まるよう、最低限の余白を確保
+        min_margin = self.feather_radius * 2 + 8
+        margin_x = max(min_margin, int((right - left) * self.crop_margin))
+        margin_y = max(min_margin, int((bottom - top) * self.crop_margin))
+        
+        return (
+            max(0, left - margin_x),
+            max(0, top - margin_y),
+            min(mask.width, right + margin_x),
+            min(mask.height, bottom + margin_y)
+        )
+    
+    @staticmethod
+    def _optimal_tile_size(size: Tuple[int, int]) -> Tuple[int, int]:
+        """タイルを目標画素数に近づけたサイズ（64の倍数）"""
+        width, height = size
+        scale = min(MAX_UPSCALE, (OPTIMAL_PIXELS / (width * height)) ** 0.5)
+        
+        new_width = max(64, int(round(width * scale / 64)) * 64)
+        new_height = max(64, int(round(height * scale / 64)) * 64)
+        return new_width, new_height
+    
+    def _paste_feathered(
+        self,
+        image: Image.Image,
+        result_tile: Image.Image,
+        tile_mask: Image.Image,
+        crop_box: Tuple[int, int, int, int]
+    ) -> Image.Image:
+        """生成結果をマスクに沿ってぼかしながら元画像に貼り戻す"""
+        # grow_maskと同程度に広げてからぼかす
+        alpha = tile_mask.filter(ImageFilter.MaxFilter(11))
+        alpha = alpha.filter(ImageFilter.GaussianBlur(self.feather_radius / 2))
+        
+        original_tile = image.crop(crop_box)
+        blended = Image.composite(result_tile, original_tile, alpha)
+        
+        result_image = image.copy()
+        result_image.paste(blended, crop_box[:2])
+        return result_image
+    
+    def _post_inpaint(
+        self,
+        image: Image.Image,
+        mask: Image.Image,
+        prompt: str
+    ) -> Image.Image:
+        """
+        Inpainting APIにリクエストを送信
+        
+        Args:
+            image: 送信する画像
+            mask: 送信するマスク
+            prompt: プロンプト
+        
+        Returns:
+            生成画像
+        """
         url = f"{self.api_host}/v2beta/stable-image/edit/inpaint"
         
         # 画像をPNGバイト列に変換
@@ -176,13 +308,7 @@ class StabilityInpaintingAdapter:
         
         print(f"[Stability Inpainting] 画像生成成功")
         
-        metadata = {
-            "provider": "stability_inpainting",
-            "method": "inpaint",
-            "prompt": prompt
-        }
-        
-        return result_image, metadata
+        return result_image
 
 
 # テスト用
@@ -0,0 +1,133 @@
+"""Content-addressed blob store for history images"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Union
+
+from PIL import Image
+
+
+def content_hash(data: bytes) -> str:
+    """バイト列の内容ハッシュ"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class BlobStore:
+    """内容ハッシュをキーにしたファイルストア
+
+    画像ファイルを `<root>/<ハッシュ先頭2文字>/<次の2文字>/<ハッシュ>` に保存します。
+    同じ内容は同じパスになるため、重複した画像は自動的に1つにまとまります。
+    書き込みは一時ファイル経由で置き換えるため、途中で落ちても壊れたファイルは残りません。
+    """
+
+    def __init__(self, root_dir: Union[str, Path]):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+        """
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, blob_hash: str) -> Path:
+        """ハッシュに対応するファイルパス"""
+        return self.root_dir / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+    def put(self, data: bytes) -> str:
+        """
+        データを保存（同じ内容が既にあれば何もしない）
+
+        Args:
+            data: 保存するバイト列
+
+        Returns:
+            内容ハッシュ
+        """
+        blob_hash = content_hash(data)
+        path = self.path_for(blob_hash)
+        if path.exists():
+            return blob_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return blob_hash
+
+    def exists(self, blob_hash: str) -> bool:
+        """保存済みか"""
+        return self.path_for(blob_hash).exists()
+
+    @contextmanager
+    def open(self, blob_hash: str) -> Iterator[Union[mmap.mmap, BytesIO]]:
+        """
+        メモリマップで読み込み用に開く
+
+        Args:
+            blob_hash: 内容ハッシュ
+
+        Yields:
+            ファイルライクな読み取り専用オブジェクト
+        """
+        with open(self.path_for(blob_hash), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # 空ファイルはメモリマップできない
+                yield BytesIO(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def read(self, blob_hash: str) -> bytes:
+        """内容をバイト列で取得"""
+        with self.open(blob_hash) as mapped:
+            return mapped.read()
+
+    def open_image(self, blob_hash: str, formats: Optional[Sequence[str]] = None) -> Image.Image:
+        """
+        画像として読み込み
+
+        ファイル全体をPythonのバイト列にコピーせず、メモリマップから直接デコードします。
+
+        Args:
+            blob_hash: 内容ハッシュ
+            formats: 試す画像形式（Noneの場合はPILが対応するすべて）
+
+        Returns:
+            読み込み済みの画像
+        """
+        with self.open(blob_hash) as mapped:
+            try:
+                img = Image.open(mapped, formats=formats)
+            except ValueError:
+                # 形式の判定でファイル末尾を超えてシークする形式があり、メモリマップでは失敗する
+                img = Image.open(BytesIO(mapped[:]), formats=formats)
+            img.load()
+        return img
+
+    def delete(self, blob_hash: str) -> bool:
+        """
+        削除
+
+        Returns:
+            削除したか（存在しなかった場合はFalse）
+        """
+        try:
+            self.path_for(blob_hash).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def size(self, blob_hash: str) -> int:
+        """ファイルサイズ"""
+        return self.path_for(blob_hash).stat().st_size
@@ -0,0 +1,375 @@
+"""Read-only archive tier for old generation history"""
+
+import json
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+from core.history.image_codecs import DEFAULT_THUMBNAIL_SIZE, STORED_FORMATS
+
+
+# 生成パラメータ（JSON）の圧縮レベル
+PARAMETERS_COMPRESS_LEVEL = 9
+
+
+class HistoryArchive:
+    """古い履歴のアーカイブ（1つのSQLiteファイル）
+
+    アーカイブした履歴は、メタデータと画像ファイルをまとめて1つのファイルに
+    移します。生成パラメータはzlibで圧縮し、画像は保存時の圧縮形式のまま
+    BLOBで持ちます。書き込むのは append（メンテナンス処理）だけで、検索は
+    読み取り専用の接続で行います。履歴IDは元のデータベースのものをそのまま使います。
+    """
+
+    def __init__(self, archive_path: Union[str, Path]):
+        """
+        Args:
+            archive_path: アーカイブファイルのパス（まだなくてもよい）
+        """
+        self.archive_path = Path(archive_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # 読み取り用の接続はUIスレッドとサムネイルのスレッドで共有する
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self) -> bool:
+        """アーカイブファイルがあるか"""
+        return self.archive_path.exists()
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        """読み取り専用の接続（ファイルがなければNone）"""
+        if self._conn is None and self.exists:
+            self._conn = sqlite3.connect(
+                f"{self.archive_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        """読み取りクエリを実行（アーカイブがなければ空）"""
+        with self._lock:
+            conn = self._reader()
+            if conn is None:
+                return []
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        """テーブルとインデックスを作成"""
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS archived_history (
+                id INTEGER PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                generation_mode TEXT NOT NULL,
+                num_images INTEGER NOT NULL,
+                parameters BLOB NOT NULL,
+                is_favorite INTEGER DEFAULT 0,
+                tags TEXT,
+                notes TEXT,
+                archived_at TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_archived_created_at
+            ON archived_history(created_at DESC, id DESC);
+
+            CREATE TABLE IF NOT EXISTS archived_images (
+                history_id INTEGER NOT NULL,
+                image_index INTEGER NOT NULL,
+                image_hash TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                codec TEXT,
+                angle INTEGER,
+                thumbnails TEXT NOT NULL,
+                PRIMARY KEY (history_id, image_index)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS archived_tags (
+                tag TEXT NOT NULL,
+                history_id INTEGER NOT NULL,
+                PRIMARY KEY (tag, history_id)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS archive_blobs (
+                blob_hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+        """)
+
+    def append(self, entries: List[Dict]):
+        """
+        履歴をアーカイブに追加（1トランザクション）
+
+        同じIDの履歴は置き換えるため、途中で中断した移動をやり直しても重複しません。
+
+        Args:
+            entries: 履歴のリスト。各要素は history（generation_historyの行の辞書）,
+                tags, images（history_imagesの行の辞書に thumbnails={サイズ: ハッシュ} を加えたもの）,
+                blobs（{ハッシュ: バイト列}）を持つ辞書
+        """
+        if not entries:
+            return
+
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.archive_path, isolation_level=None)
+        try:
+            self._create_schema(conn)
+            archived_at = datetime.now().isoformat()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry in entries:
+                    history = entry["history"]
+                    history_id = history["id"]
+                    conn.execute("""
+                        INSERT OR REPLACE INTO archived_history
+                        (id, created_at, generation_mode, num_images, parameters,
+                         is_favorite, tags, notes, archived_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        history_id,
+                        history["created_at"],
+                        history["generation_mode"],
+                        history["num_images"],
+                        zlib.compress(history["parameters"].encode("utf-8"), PARAMETERS_COMPRESS_LEVEL),
+                        history["is_favorite"],
+                        history["tags"],
+                        history["notes"],
+                        archived_at,
+                    ))
+
+                    conn.execute("DELETE FROM archived_images WHERE history_id = ?", (history_id,))
+                    conn.executemany("""
+                        INSERT INTO archived_images
+                        (history_id, image_index, image_hash, width, height, codec, angle, thumbnails)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, [(
+                        history_id,
+                        image["image_index"],
+                        image["image_hash"],
+                        image["width"],
+                        image["height"],
+                        image["codec"],
+                        image["angle"],
+                        json.dumps(image["thumbnails"]),
+                    ) for image in entry["images"]])
+
+                    conn.execute("DELETE FROM archived_tags WHERE history_id = ?", (history_id,))
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO archived_tags (tag, history_id) VALUES (?, ?)",
+                        [(tag, history_id) for tag in entry["tags"] if tag]
+                    )
+
+                    # 同じ内容の画像は1つだけ持つ
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO archive_blobs (blob_hash, data) VALUES (?, ?)",
+                        list(entry["blobs"].items())
+                    )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def get_history_page(
+        self,
+        limit: int = 100,
+        before: Optional[Tuple[str, int]] = None,
+        generation_mode: Union[str, Iterable[str], None] = None,
+        tag: Optional[str] = None,
+        search: Optional[str] = None,
+        date_from: Union[datetime, str, None] = None,
+        date_to: Union[datetime, str, None] = None,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE
+    ) -> List[Dict]:
+        """
+        アーカイブした履歴を新しい順に1ページ分取得（HistoryManager.get_history_pageと同じ形式）
+
+        生成パラメータは圧縮しているため、searchはメモだけを部分一致で検索します。
+
+        Returns:
+            履歴のリスト（archived=True）
+        """
+        query = "SELECT h.* FROM archived_history AS h WHERE 1=1"
+        params = []
+
+        if before is not None:
+            query += " AND (h.created_at, h.id) < (?, ?)"
+            params.extend(before)
+
+        if generation_mode:
+            modes = [generation_mode] if isinstance(generation_mode, str) else list(generation_mode)
+            query += f" AND h.generation_mode IN ({', '.join('?' * len(modes))})"
+            params.extend(modes)
+
+        if tag:
+            query += " AND h.id IN (SELECT history_id FROM archived_tags WHERE tag = ?)"
+            params.append(tag)
+
+        if date_from is not None:
+            query += " AND h.created_at >= ?"
+            params.append(date_from.isoformat() if isinstance(date_from, datetime) else date_from)
+
+        if date_to is not None:
+            query += " AND h.created_at < ?"
+            params.append(date_to.isoformat() if isinstance(date_to, datetime) else date_to)
+
+        for term in (search or "").split():
+            query += " AND h.notes LIKE ? ESCAPE '\\'"
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", term) + "%")
+
+        query += " ORDER BY h.created_at DESC, h.id DESC LIMIT ?"
+        params.append(limit)
+
+        return self._rows_to_histories(self._query(query, params), thumbnail_size)
+
+    def get_history(self, history_id: int, thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE) -> Optional[Dict]:
+        """アーカイブした履歴を1件取得（ない場合はNone）"""
+        rows = self._query("SELECT * FROM archived_history WHERE id = ?", (history_id,))
+        histories = self._rows_to_histories(rows, thumbnail_size)
+        return histories[0] if histories else None
+
+    def _rows_to_histories(self, rows: List[sqlite3.Row], thumbnail_size: int) -> List[Dict]:
+        """archived_historyの行を履歴の辞書に変換（先頭画像のサムネイルハッシュを含む）"""
+        if not rows:
+            return []
+
+        ids = [row["id"] for row in rows]
+        first_images = {
+            image["history_id"]: image
+            for image in self._query(
+                f"SELECT history_id, image_hash, thumbnails FROM archived_images "
+                f"WHERE image_index = 0 AND history_id IN ({', '.join('?' * len(ids))})",
+                ids
+            )
+        }
+
+        histories = []
+        for row in rows:
+            image = first_images.get(row["id"])
+            histories.append({
+                "id": row["id"],
+                "created_at": row["created_at"],
+                "generation_mode": row["generation_mode"],
+                "num_images": row["num_images"],
+                "parameters": json.loads(zlib.decompress(row["parameters"]).decode("utf-8")),
+                "is_favorite": bool(row["is_favorite"]),
+                "tags": json.loads(row["tags"]) if row["tags"] else [],
+                "notes": row["notes"],
+                "thumbnail_hash": self._thumbnail_hash(image, thumbnail_size) if image else None,
+                "archived": True,
+            })
+        return histories
+
+    @staticmethod
+    def _thumbnail_hash(image: sqlite3.Row, thumbnail_size: Optional[int]) -> str:
+        """指定サイズのサムネイル（なければ標準サイズ、それもなければ画像本体）のハッシュ"""
+        thumbnails = json.loads(image["thumbnails"])
+        for size in (thumbnail_size, DEFAULT_THUMBNAIL_SIZE):
+            if size and str(size) in thumbnails:
+                return thumbnails[str(size)]
+        return image["image_hash"]
+
+    def get_history_images(self, history_id: int, thumbnail_size: Optional[int] = None) -> List[Image.Image]:
+        """
+        アーカイブした履歴の画像を取得
+
+        Args:
+            history_id: 履歴ID
+            thumbnail_size: 指定した場合はそのサイズのサムネイルを取得
+
+        Returns:
+            画像のリスト（アーカイブにない場合は空）
+        """
+        rows = self._query(
+            "SELECT image_hash, thumbnails FROM archived_images WHERE history_id = ? ORDER BY image_index",
+            (history_id,)
+        )
+        images = []
+        for row in rows:
+            blob_hash = self._thumbnail_hash(row, thumbnail_size) if thumbnail_size else row["image_hash"]
+            try:
+                images.append(self.open_image(blob_hash))
+            except FileNotFoundError:
+                print(f"[History] アーカイブに画像がありません: {blob_hash}")
+        return images
+
+    def open_image(self, blob_hash: str) -> Image.Image:
+        """
+        アーカイブ内の画像を読み込み
+
+        Raises:
+            FileNotFoundError: アーカイブにない場合
+        """
+        img = Image.open(BytesIO(self.read_blob(blob_hash)), formats=STORED_FORMATS)
+        img.load()
+        return img
+
+    def read_blob(self, blob_hash: str) -> bytes:
+        """
+        アーカイブ内の画像ファイルの内容（保存時の圧縮形式のまま）
+
+        Raises:
+            FileNotFoundError: アーカイブにない場合
+        """
+        rows = self._query("SELECT data FROM archive_blobs WHERE blob_hash = ?", (blob_hash,))
+        if not rows:
+            raise FileNotFoundError(blob_hash)
+        return rows[0]["data"]
+
+    def export_chunk(self, after_id: int, limit: int) -> Tuple[List[Dict], List[sqlite3.Row]]:
+        """
+        アーカイブした履歴とその画像をIDの順に1チャンク分読む（一括書き出し用）
+
+        Args:
+            after_id: このIDより後の履歴から読む
+            limit: 読む履歴の数
+
+        Returns:
+            (履歴の行の辞書（parametersは展開したJSON文字列）のリスト, 画像の行のリスト)
+        """
+        with self._lock:
+            conn = self._reader()
+            if conn is None:
+                return [], []
+            # 履歴と画像を同じスナップショットから読む
+            conn.execute("BEGIN")
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM archived_history WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, limit)
+                ).fetchall()
+                image_rows = conn.execute("""
+                    SELECT history_id, image_hash, codec, width, height, angle FROM archived_images
+                    WHERE history_id BETWEEN ? AND ?
+                    ORDER BY history_id, image_index
+                """, (rows[0]["id"], rows[-1]["id"])).fetchall() if rows else []
+            finally:
+                conn.execute("COMMIT")
+
+        histories = [
+            {**dict(row), "parameters": zlib.decompress(row["parameters"]).decode("utf-8")}
+            for row in rows
+        ]
+        return histories, image_rows
+
+    def count(self) -> int:
+        """アーカイブした履歴の数"""
+        rows = self._query("SELECT COUNT(*) AS count FROM archived_history")
+        return rows[0]["count"] if rows else 0
+
+    def close(self):
+        """読み取り用の接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
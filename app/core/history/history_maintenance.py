@@ -0,0 +1,123 @@
+"""Scheduled retention, archiving and compaction for generation history"""
+
+import threading
+from typing import Callable, Dict, Optional
+
+
+# 起動してから最初のメンテナンスまでの時間（秒、起動直後の処理と重ならないように）
+DEFAULT_INITIAL_DELAY = 60.0
+
+# メンテナンスの間隔（秒）
+DEFAULT_INTERVAL = 6 * 60 * 60.0
+
+# 1回のメンテナンスで解放する最大ページ数（書き込みを長く止めないように）
+VACUUM_PAGES_PER_RUN = 4096
+
+
+class HistoryMaintenance:
+    """履歴の定期メンテナンス
+
+    バックグラウンドのスレッドで、次の処理を定期的に行います。
+
+    1. 保存期間（full_image_days）を過ぎた画像をサムネイルのみにする
+    2. アーカイブ期間（archive_days）を過ぎた履歴をアーカイブに移す
+    3. 空いた領域をインクリメンタルVACUUMで少しずつ解放する
+
+    お気に入りの履歴は期間に関係なく、そのまま残します。
+    また、開始直後に旧形式の画像の移行と類似画像検索の索引の作成を行います
+    （以前のバージョンのデータベースの変換を、UIスレッドで行わないように）。
+    """
+
+    def __init__(
+        self,
+        history_manager,
+        full_image_days: Optional[int] = None,
+        archive_days: Optional[int] = None,
+        interval: float = DEFAULT_INTERVAL,
+        initial_delay: float = DEFAULT_INITIAL_DELAY,
+        vacuum_pages: Optional[int] = VACUUM_PAGES_PER_RUN,
+        on_migrated: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Args:
+            history_manager: 対象のHistoryManager
+            full_image_days: フルサイズ画像を残す日数（Noneの場合は削除しない）
+            archive_days: この日数を過ぎた履歴をアーカイブに移す（Noneの場合は移さない）
+            interval: メンテナンスの間隔（秒）
+            initial_delay: 開始から最初のメンテナンスまでの時間（秒）
+            vacuum_pages: 1回に解放する最大ページ数（Noneの場合はすべて）
+            on_migrated: 旧形式の画像を移行した後に呼ばれる関数（引数は移した画像数、
+                このスレッドから呼ばれる）
+        """
+        self.history_manager = history_manager
+        self.full_image_days = full_image_days
+        self.archive_days = archive_days
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.vacuum_pages = vacuum_pages
+        self.on_migrated = on_migrated
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """定期実行を開始"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="history-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        定期実行を停止（実行中のメンテナンスは終わるまで待つ）
+
+        Args:
+            timeout: 最大待ち時間（秒、Noneの場合は無制限）
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        メンテナンスを1回実行
+
+        Returns:
+            {"pruned": サムネイルのみにした画像数, "archived": アーカイブした履歴数,
+             "freed_pages": 解放したページ数}
+        """
+        result = {"pruned": 0, "archived": 0, "freed_pages": 0}
+
+        if self.full_image_days is not None:
+            result["pruned"] = self.history_manager.prune_full_images(self.full_image_days)
+
+        if self.archive_days is not None:
+            result["archived"] = self.history_manager.archive_histories(self.archive_days)
+
+        result["freed_pages"] = self.history_manager.compact(self.vacuum_pages)
+        return result
+
+    def _run(self):
+        """メンテナンススレッド"""
+        if self.history_manager.legacy_images_pending:
+            try:
+                migrated = self.history_manager.migrate_legacy_images()
+                if self.on_migrated and not self.history_manager.legacy_images_pending:
+                    self.on_migrated(migrated)
+            except Exception as e:
+                print(f"[History] 旧形式の画像の移行エラー: {e}")
+        
+        try:
+            self.history_manager.build_similarity_index()
+        except Exception as e:
+            print(f"[History] 類似画像検索の索引の作成エラー: {e}")
+        
+        if self._stop.wait(self.initial_delay):
+            return
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[History] メンテナンスエラー: {e}")
+            if self._stop.wait(self.interval):
+                return
@@ -1,25 +1,117 @@
 """Generation history management"""
 
 import json
+import re
 import sqlite3
-from datetime import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, Union
 from PIL import Image
 import base64
 from io import BytesIO
 
+from core.history.blob_store import BlobStore, content_hash
+from core.history.history_archive import HistoryArchive
+from core.history.image_codecs import (
+    DEFAULT_CODEC,
+    DEFAULT_THUMBNAIL_SIZE,
+    STORED_FORMATS,
+    THUMBNAIL_CODEC,
+    THUMBNAIL_SIZES,
+    encode,
+    resolve_codec,
+    thumbnail_pyramid,
+)
+from core.history.similarity import (
+    DUPLICATE_MAX_DISTANCE,
+    SIMILAR_MAX_DISTANCE,
+    SimilarityIndex,
+    from_db_hashes,
+    phash,
+    to_db_hash,
+)
+
+
+# 他のプロセスが書き込み中の場合に待つ最大時間（秒）
+BUSY_TIMEOUT = 10.0
+
+# 旧形式（BLOB列）からの移行で1回に処理する行数
+MIGRATION_BATCH_SIZE = 32
+
+# タグ・全文検索の一致件数がこれ以下なら、一致したIDから履歴を引く
+INDEX_DRIVEN_MAX_MATCHES = 2000
+
+# アーカイブに1トランザクションで移す履歴の数（画像を読み込むためメモリ量に効く）
+ARCHIVE_BATCH_SIZE = 16
+
+# PRAGMA auto_vacuum の値（INCREMENTAL）
+INCREMENTAL_VACUUM = 2
+
+
+
+def _history_columns(thumbnail_size: int) -> str:
+    """
+    履歴の取得列（各履歴の先頭画像の、指定サイズのサムネイルハッシュを含む）
+    
+    サムネイルの段階がない古い画像は標準サムネイルを返します。
+    """
+    return f"""
+        h.*, (
+            SELECT COALESCE(
+                (SELECT t.thumbnail_hash FROM history_thumbnails AS t
+                 WHERE t.image_id = i.id AND t.size = {int(thumbnail_size)}),
+                i.thumbnail_hash
+            )
+            FROM history_images AS i
+            WHERE i.history_id = h.id
+            ORDER BY i.image_index
+            LIMIT 1
+        ) AS thumbnail_hash
+    """
+
+
+def _prompt_text(parameters: Dict) -> str:
+    """全文検索用に、生成パラメータ内の文字列をつなげる"""
+    texts = []
+    
+    def collect(value):
+        if isinstance(value, str):
+            texts.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                collect(item)
+    
+    collect(parameters)
+    return "\n".join(texts)
+
 
 class HistoryManager:
     """生成履歴管理
     
-    生成された画像とそのパラメータをデータベースに保存・管理します
+    生成された画像とそのパラメータをデータベースに保存・管理します。
+    画像本体は内容ハッシュをキーにしたBlobStoreに置き、データベースには
+    ハッシュ・サイズ・寸法・形式だけを保存します。
     """
     
-    def __init__(self, db_path: str = None):
+    def __init__(
+        self,
+        db_path: str = None,
+        blob_dir: str = None,
+        image_codec: str = DEFAULT_CODEC,
+        archive_path: str = None
+    ):
         """
         Args:
             db_path: データベースファイルのパス（Noneの場合はデフォルト）
+            blob_dir: 画像の保存先（Noneの場合はデータベースと同じ場所の「<名前>_blobs」）
+            image_codec: フルサイズ画像の保存形式（png/webp_lossless/webp/jpeg）
+            archive_path: 古い履歴のアーカイブ（Noneの場合はデータベースと同じ場所の「<名前>_archive.db」）
         """
         if db_path is None:
             # デフォルトパス: ユーザーのAppDataフォルダ
@@ -27,17 +119,133 @@ class HistoryManager:
             app_data.mkdir(parents=True, exist_ok=True)
             db_path = str(app_data / "history.db")
         
+        if blob_dir is None:
+            db_file = Path(db_path)
+            blob_dir = str(db_file.with_name(db_file.stem + "_blobs"))
+        
+        if archive_path is None:
+            db_file = Path(db_path)
+            archive_path = str(db_file.with_name(db_file.stem + "_archive.db"))
+        
         self.db_path = db_path
-        self.conn = None
+        self.blob_store = BlobStore(blob_dir)
+        self.archive = HistoryArchive(archive_path)
+        self.image_codec = resolve_codec(image_codec)
+        # 接続はスレッドごとに作る（読み取りは書き込み中でも待たない）
+        self._local = threading.local()
+        self._connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        self._closed = False
+        # 書き込みトランザクションを直列化（HistoryWriterのスレッドとUIスレッドで共有）
+        self._lock = threading.RLock()
+        # エンコード済みでまだDBに記録されていないBlob（ハッシュ → 件数）
+        self._reserved_blobs: Counter = Counter()
+        self._reserve_lock = threading.Lock()
+        # 類似画像検索の索引（HistoryMaintenanceのスレッドか、初めて検索した時に作成）
+        self._similarity_index: Optional[SimilarityIndex] = None
+        self._index_build_lock = threading.Lock()
+        # 旧形式の画像の移行待ちか（移行はHistoryMaintenanceのスレッドで行う）
+        self._legacy_images_pending = False
+        self._migration_lock = threading.Lock()
         self._initialize_database()
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """このスレッド用の接続（初回に作成）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._closed:
+                raise sqlite3.ProgrammingError("HistoryManagerは閉じられています")
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+    
+    def _connect(self) -> sqlite3.Connection:
+        """接続を作成して登録"""
+        # トランザクションは_writeで明示的に開始する（読み取りは自動コミット）
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        # 新しいデータベースは空き領域を少しずつ解放できる形式で作る（WALより先に設定する）
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WALでは書き込み中も読み取りができ、NORMALでもDBが壊れることはない
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        
+        with self._lock:
+            # 終了したスレッドの接続を閉じる
+            alive = []
+            for thread, other in self._connections:
+                if thread.is_alive():
+                    alive.append((thread, other))
+                else:
+                    other.close()
+            alive.append((threading.current_thread(), conn))
+            self._connections = alive
+        
+        return conn
+    
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Cursor]:
+        """
+        書き込みトランザクション
+        
+        プロセス内の書き込みはロックで1つずつにし、BEGIN IMMEDIATEで最初に
+        書き込みロックを取ります（読み取りから書き込みへの昇格で競合しない）。
+        他のプロセスが書き込み中の場合はBUSY_TIMEOUT秒まで待ちます。
+        
+        Yields:
+            このスレッドの接続のカーソル
+        """
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn.cursor()
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
     def _initialize_database(self):
         """データベースを初期化"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        with self._write() as cursor:
+            self._create_schema(cursor)
         
-        cursor = self.conn.cursor()
+        if self._needs_search_index:
+            self._rebuild_search_index()
         
+        legacy = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'history_images_legacy'"
+        ).fetchone()
+        if legacy:
+            # 移行が終わる前に保存した画像が、旧形式の画像のIDと重ならないようにする
+            with self._write() as cursor:
+                self._reserve_legacy_image_ids(cursor)
+            self._legacy_images_pending = True
+    
+    def _reserve_legacy_image_ids(self, cursor: sqlite3.Cursor):
+        """history_imagesの採番を旧形式の画像の最大IDより後から始める"""
+        legacy_max = cursor.execute(
+            "SELECT MAX(id) FROM history_images_legacy"
+        ).fetchone()[0] or 0
+        row = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'history_images'"
+        ).fetchone()
+        if row is None:
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('history_images', ?)", (legacy_max,)
+            )
+        elif row["seq"] < legacy_max:
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = ? WHERE name = 'history_images'", (legacy_max,)
+            )
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """テーブルとインデックスを作成"""
         # 履歴テーブル
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS generation_history (
@@ -52,31 +260,448 @@ class HistoryManager:
             )
         """)
         
-        # 画像テーブル
+        # 旧形式（画像をBLOBで保持）のテーブルは移行用に退避
+        columns = [row["name"] for row in cursor.execute("PRAGMA table_info(history_images)")]
+        if "image_data" in columns:
+            cursor.execute("ALTER TABLE history_images RENAME TO history_images_legacy")
+        
+        # 画像テーブル（画像本体はBlobStore）
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS history_images (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 history_id INTEGER NOT NULL,
                 image_index INTEGER NOT NULL,
-                image_data BLOB NOT NULL,
-                thumbnail_data BLOB,
+                image_hash TEXT NOT NULL,
+                image_size INTEGER NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                codec TEXT NOT NULL DEFAULT 'png',
+                thumbnail_hash TEXT,
                 angle INTEGER,
+                phash INTEGER,
                 FOREIGN KEY (history_id) REFERENCES generation_history(id)
             )
         """)
         
+        # pHash列がない以前のバージョンのテーブルに追加（値は索引の作成時に計算）
+        columns = [row["name"] for row in cursor.execute("PRAGMA table_info(history_images)")]
+        if "phash" not in columns:
+            cursor.execute("ALTER TABLE history_images ADD COLUMN phash INTEGER")
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_images_history
+            ON history_images(history_id, image_index)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_images_hash
+            ON history_images(image_hash)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_images_thumbnail_hash
+            ON history_images(thumbnail_hash)
+        """)
+        
+        # サイズ別のサムネイル（UIが描画するサイズをそのまま読めるように保存時に作成）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS history_thumbnails (
+                image_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                thumbnail_hash TEXT NOT NULL,
+                PRIMARY KEY (image_id, size),
+                FOREIGN KEY (image_id) REFERENCES history_images(id)
+            ) WITHOUT ROWID
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_thumbnails_hash
+            ON history_thumbnails(thumbnail_hash)
+        """)
+        
         # インデックス
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_created_at 
             ON generation_history(created_at DESC)
         """)
         
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_mode_created_at
+            ON generation_history(generation_mode, created_at DESC)
+        """)
+        
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_favorite 
             ON generation_history(is_favorite DESC, created_at DESC)
         """)
         
-        self.conn.commit()
+        existing_tables = {
+            row["name"] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        
+        # タグテーブル（tags列のJSONを正規化したもの、検索はこちらを使う）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS history_tags (
+                history_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (history_id, tag),
+                FOREIGN KEY (history_id) REFERENCES generation_history(id)
+            ) WITHOUT ROWID
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tags_tag
+            ON history_tags(tag, history_id)
+        """)
+        
+        # メモとプロンプトの全文検索（rowidは履歴ID）
+        self.fts_enabled = self._create_fts_table(cursor)
+        
+        self._needs_search_index = "history_tags" not in existing_tables or (
+            self.fts_enabled and "history_fts" not in existing_tables
+        )
+    
+    def _create_fts_table(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        全文検索テーブルを作成
+        
+        日本語は単語の区切りがないため、部分一致で検索できるtrigramトークナイザを使います。
+        
+        Returns:
+            全文検索が使えるか（FTS5がないSQLiteではFalse、検索はLIKEで行う）
+        """
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                    USING fts5(notes, prompt, tokenize='{tokenizer}')
+                """)
+                self.fts_tokenizer = tokenizer
+                return True
+            except sqlite3.OperationalError:
+                continue
+        
+        print("[History] FTS5が使えないため、検索はLIKEで行います")
+        self.fts_tokenizer = None
+        return False
+    
+    def _rebuild_search_index(self):
+        """既存の履歴からタグテーブルと全文検索を作り直す"""
+        last_id = 0
+        while True:
+            with self._write() as cursor:
+                rows = cursor.execute("""
+                    SELECT id, parameters, tags, notes FROM generation_history
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, MIGRATION_BATCH_SIZE * 32)).fetchall()
+                
+                for row in rows:
+                    self._index_history(
+                        cursor,
+                        row["id"],
+                        json.loads(row["parameters"]),
+                        json.loads(row["tags"]) if row["tags"] else [],
+                        row["notes"] or "",
+                    )
+            
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+    
+    def _index_history(
+        self,
+        cursor: sqlite3.Cursor,
+        history_id: int,
+        parameters: Optional[Dict] = None,
+        tags: Optional[List[str]] = None,
+        notes: Optional[str] = None
+    ):
+        """
+        タグテーブルと全文検索を更新（Noneの項目は変更しない）
+        
+        Args:
+            cursor: 書き込み中のトランザクションのカーソル
+            history_id: 履歴ID
+            parameters: 生成パラメータ
+            tags: タグのリスト
+            notes: メモ
+        """
+        if tags is not None:
+            cursor.execute("DELETE FROM history_tags WHERE history_id = ?", (history_id,))
+            cursor.executemany(
+                "INSERT OR IGNORE INTO history_tags (history_id, tag) VALUES (?, ?)",
+                [(history_id, tag) for tag in tags if tag]
+            )
+        
+        if not self.fts_enabled or (parameters is None and notes is None):
+            return
+        
+        row = cursor.execute(
+            "SELECT notes, prompt FROM history_fts WHERE rowid = ?", (history_id,)
+        ).fetchone()
+        if notes is None:
+            notes = row["notes"] if row else ""
+        prompt = _prompt_text(parameters) if parameters is not None else (row["prompt"] if row else "")
+        
+        cursor.execute("DELETE FROM history_fts WHERE rowid = ?", (history_id,))
+        cursor.execute(
+            "INSERT INTO history_fts (rowid, notes, prompt) VALUES (?, ?, ?)",
+            (history_id, notes or "", prompt)
+        )
+    
+    @property
+    def legacy_images_pending(self) -> bool:
+        """旧形式の画像の移行待ちか（移行が終わるまで、それらの履歴の画像は表示されない）"""
+        return self._legacy_images_pending
+    
+    def migrate_legacy_images(self) -> int:
+        """
+        旧形式のBLOBをBlobStoreに移す（移行済みの場合は何もしない）
+        
+        画像のデコードとファイルへの書き出しを伴い時間がかかるため、UIスレッドでは
+        なくHistoryMaintenanceのスレッドから呼び出します。全行を一度に読み込まず、
+        IDの順に少しずつ移すため、移行中も履歴の保存は止まりません。
+        途中で中断しても、次回起動時に続きから再開します。
+        
+        Returns:
+            移した画像数
+        """
+        with self._migration_lock:
+            if not self._legacy_images_pending:
+                return 0
+            migrated = self._migrate_legacy_images()
+            if not self._closed:
+                self._legacy_images_pending = False
+            return migrated
+    
+    def _migrate_legacy_images(self) -> int:
+        """旧形式のBLOBをIDの順にバッチでBlobStoreに移し、旧テーブルを削除"""
+        conn = self.conn
+        total = conn.execute("SELECT COUNT(*) AS count FROM history_images_legacy").fetchone()["count"]
+        # 移行前に保存された画像（旧形式の最大IDより後）は再開位置に含めない
+        row = conn.execute("""
+            SELECT MAX(id) AS last_id FROM history_images
+            WHERE id <= (SELECT MAX(id) FROM history_images_legacy)
+        """).fetchone()
+        last_id = row["last_id"] or 0
+        
+        print(f"[History] 画像をBlobStoreに移行中: {total}件")
+        
+        migrated = 0
+        while not self._closed:
+            # 1バッチを1トランザクションで移す
+            with self._write() as cursor:
+                rows = cursor.execute("""
+                    SELECT id, history_id, image_index, image_data, thumbnail_data, angle
+                    FROM history_images_legacy
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, MIGRATION_BATCH_SIZE)).fetchall()
+                
+                for legacy_row in rows:
+                    # 移行待ちの間に削除された履歴の画像は移さない
+                    if cursor.execute(
+                        "SELECT 1 FROM generation_history WHERE id = ?", (legacy_row["history_id"],)
+                    ).fetchone() is None:
+                        continue
+                    
+                    image_data = legacy_row["image_data"]
+                    with Image.open(BytesIO(image_data)) as img:
+                        width, height = img.size
+                        codec = (img.format or "png").lower()
+                    
+                    thumbnail_hash = None
+                    if legacy_row["thumbnail_data"]:
+                        thumbnail_hash = self.blob_store.put(legacy_row["thumbnail_data"])
+                    
+                    cursor.execute("""
+                        INSERT INTO history_images
+                        (id, history_id, image_index, image_hash, image_size, width, height,
+                         codec, thumbnail_hash, angle)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        legacy_row["id"],
+                        legacy_row["history_id"],
+                        legacy_row["image_index"],
+                        self.blob_store.put(image_data),
+                        len(image_data),
+                        width,
+                        height,
+                        codec,
+                        thumbnail_hash,
+                        legacy_row["angle"],
+                    ))
+                    migrated += 1
+            
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            print(f"[History] 移行: {migrated}/{total}")
+        
+        if self._closed:
+            return migrated
+        
+        with self._write() as cursor:
+            cursor.execute("DROP TABLE history_images_legacy")
+        
+        # BLOBが占めていた領域はcompact（HistoryMaintenance）で解放する
+        print(f"[History] 移行完了: {migrated}件")
+        return migrated
+    
+    def encode_image(self, img: Image.Image) -> Dict:
+        """
+        画像とサムネイルをエンコードしてBlobStoreに保存
+        
+        フルサイズ画像は image_codec の形式で、サムネイルは THUMBNAIL_SIZES の
+        各サイズで保存します。データベースには触れないため、複数のスレッドから
+        並列に呼び出せます。
+        
+        Args:
+            img: 保存する画像
+        
+        Returns:
+            DBに記録する情報（save_encodedに渡す）
+        """
+        # フルサイズ画像
+        return self._store_image(img, encode(img, self.image_codec), self.image_codec)
+    
+    def encode_image_data(self, data: bytes) -> Dict:
+        """
+        エンコード済みの画像ファイルを、再エンコードせずにBlobStoreに保存
+        
+        画像はそのままの内容で保存し（内容ハッシュが変わらない）、サムネイルと
+        pHashだけを作ります。encode_imageと同じく、複数のスレッドから並列に呼び出せます。
+        
+        Args:
+            data: PNG/WebP/JPEGのファイルの内容
+        
+        Returns:
+            DBに記録する情報（save_encodedに渡す）
+        """
+        with Image.open(BytesIO(data), formats=STORED_FORMATS) as img:
+            img.load()
+            codec = img.format.lower()
+            return self._store_image(img, data, codec)
+    
+    def find_stored_image(self, image_hash: str) -> Optional[Dict]:
+        """
+        保存済みの画像の情報を取得（同じ内容の画像をデコードせずに記録するため）
+        
+        見つかった画像はsave_encodedで記録されるまで削除されないよう予約します。
+        
+        Args:
+            image_hash: 画像の内容ハッシュ
+        
+        Returns:
+            encode_imageと同じ形式の情報（保存されていない場合はNone）
+        """
+        row = self.conn.execute(
+            "SELECT * FROM history_images WHERE image_hash = ? LIMIT 1", (image_hash,)
+        ).fetchone()
+        if row is None or row["thumbnail_hash"] is None:
+            return None
+        
+        thumbnails = {
+            t["size"]: t["thumbnail_hash"]
+            for t in self.conn.execute(
+                "SELECT size, thumbnail_hash FROM history_thumbnails WHERE image_id = ?", (row["id"],)
+            )
+        }
+        stored = {
+            "image_hash": row["image_hash"],
+            "image_size": row["image_size"],
+            "width": row["width"],
+            "height": row["height"],
+            "codec": row["codec"],
+            "thumbnails": thumbnails,
+            "thumbnail_hash": row["thumbnail_hash"],
+            "phash": int(from_db_hashes([row["phash"]])[0]) if row["phash"] is not None else None,
+        }
+        
+        self.reserve_encoded([stored])
+        # 予約する前に削除された場合
+        if not self.blob_store.exists(row["image_hash"]):
+            self.release_encoded([stored])
+            return None
+        return stored
+    
+    def reserve_encoded(self, stored_images: Iterable[Dict]):
+        """
+        encode_imageの結果を、save_encodedで記録されるまで削除されないよう予約
+        
+        encode_image / encode_image_data / find_stored_image は予約済みの結果を返します。
+        同じ結果を複数の履歴で記録する場合は、2回目以降の分をこれで予約します。
+        
+        Args:
+            stored_images: encode_image などの戻り値
+        """
+        with self._reserve_lock:
+            for stored in stored_images:
+                self._reserved_blobs.update(self._stored_hashes(stored))
+    
+    def release_encoded(self, stored_images: Iterable[Dict]):
+        """
+        記録しなかったencode_imageの結果の予約を解除
+        
+        Args:
+            stored_images: encode_image / encode_image_data / find_stored_image の戻り値
+        """
+        with self._reserve_lock:
+            for stored in stored_images:
+                self._reserved_blobs.subtract(self._stored_hashes(stored))
+            self._reserved_blobs += Counter()  # 0以下になった予約を取り除く
+    
+    def _store_image(self, img: Image.Image, img_data: bytes, codec: str) -> Dict:
+        """エンコードしたフルサイズ画像と、サムネイルをBlobStoreに保存"""
+        # サムネイル（大きいサイズから順に縮小）
+        pyramid = thumbnail_pyramid(img, THUMBNAIL_SIZES)
+        thumbnail_data = {size: encode(thumb, THUMBNAIL_CODEC) for size, thumb in pyramid.items()}
+        
+        stored = {
+            "image_hash": content_hash(img_data),
+            "image_size": len(img_data),
+            "width": img.width,
+            "height": img.height,
+            "codec": codec,
+            "thumbnails": {size: content_hash(data) for size, data in thumbnail_data.items()},
+            # 類似画像検索用（縮小済みの最大サムネイルから計算）
+            "phash": phash(pyramid[max(pyramid)]),
+        }
+        stored["thumbnail_hash"] = stored["thumbnails"][DEFAULT_THUMBNAIL_SIZE]
+        
+        # DBに記録されるまでの間に、履歴削除でファイルが消されないよう予約
+        self.reserve_encoded([stored])
+        self.blob_store.put(img_data)
+        for data in thumbnail_data.values():
+            self.blob_store.put(data)
+        
+        return stored
+    
+    @staticmethod
+    def _stored_hashes(stored: Dict) -> List[str]:
+        """encode_imageの戻り値に含まれるBlobのハッシュ"""
+        return [stored["image_hash"], stored["thumbnail_hash"], *stored.get("thumbnails", {}).values()]
+    
+    def _release_blobs(self, blob_hashes: Iterable[str]):
+        """どの画像からも参照されなくなったBlobを削除"""
+        cursor = self.conn.cursor()
+        for blob_hash in set(h for h in blob_hashes if h):
+            with self._reserve_lock:
+                if self._reserved_blobs[blob_hash] > 0:
+                    continue
+                row = cursor.execute("""
+                    SELECT 1 FROM history_images
+                    WHERE image_hash = ? OR thumbnail_hash = ?
+                    UNION ALL
+                    SELECT 1 FROM history_thumbnails
+                    WHERE thumbnail_hash = ?
+                    LIMIT 1
+                """, (blob_hash, blob_hash, blob_hash)).fetchone()
+                if row is None:
+                    self.blob_store.delete(blob_hash)
     
     def save_generation(
         self,
@@ -101,56 +726,107 @@ class HistoryManager:
         Returns:
             履歴ID
         """
-        cursor = self.conn.cursor()
+        # 各画像を保存（画像本体はBlobStore、同じ画像は1つにまとまる）
+        stored_images = [self.encode_image(img) for img in images]
         
-        # パラメータをJSON化
-        params_json = json.dumps(parameters, ensure_ascii=False)
-        tags_json = json.dumps(tags or [], ensure_ascii=False)
+        history_id, = self.save_encoded([{
+            "stored_images": stored_images,
+            "parameters": parameters,
+            "generation_mode": generation_mode,
+            "angles": angles,
+            "tags": tags,
+            "notes": notes,
+        }])
         
-        # 履歴レコードを作成
-        cursor.execute("""
-            INSERT INTO generation_history 
-            (created_at, generation_mode, num_images, parameters, tags, notes)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.now().isoformat(),
-            generation_mode,
-            len(images),
-            params_json,
-            tags_json,
-            notes
-        ))
-        
-        history_id = cursor.lastrowid
-        
-        # 各画像を保存
-        for i, img in enumerate(images):
-            # フルサイズ画像
-            img_buffer = BytesIO()
-            img.save(img_buffer, format='PNG')
-            img_data = img_buffer.getvalue()
-            
-            # サムネイル
-            thumb = img.copy()
-            thumb.thumbnail((200, 200), Image.Resampling.LANCZOS)
-            thumb_buffer = BytesIO()
-            thumb.save(thumb_buffer, format='PNG')
-            thumb_data = thumb_buffer.getvalue()
-            
-            # 角度情報
-            angle = angles[i] if angles and i < len(angles) else None
-            
-            cursor.execute("""
-                INSERT INTO history_images 
-                (history_id, image_index, image_data, thumbnail_data, angle)
-                VALUES (?, ?, ?, ?, ?)
-            """, (history_id, i, img_data, thumb_data, angle))
+        return history_id
+    
+    def save_encoded(self, entries: List[Dict]) -> List[int]:
+        """
+        エンコード済みの生成結果をまとめて1トランザクションで保存
+        
+        Args:
+            entries: 生成結果のリスト。各要素は stored_images（encode_imageの戻り値のリスト）,
+                parameters, generation_mode, angles, tags, notes, created_at・is_favorite（省略可）を持つ辞書
         
-        self.conn.commit()
+        Returns:
+            履歴IDのリスト（entriesと同じ順）
+        """
+        history_ids = []
+        indexed = []  # (画像ID, 履歴ID, pHash)
         
-        print(f"[History] 履歴保存完了: ID={history_id}, 画像数={len(images)}")
+        with self._lock:
+            try:
+                with self._write() as cursor:
+                    for entry in entries:
+                        stored_images = entry["stored_images"]
+                        angles = entry.get("angles")
+                        
+                        # 履歴レコードを作成
+                        cursor.execute("""
+                            INSERT INTO generation_history 
+                            (created_at, generation_mode, num_images, parameters, is_favorite, tags, notes)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """, (
+                            entry.get("created_at") or datetime.now().isoformat(),
+                            entry.get("generation_mode", "variety"),
+                            len(stored_images),
+                            json.dumps(entry.get("parameters", {}), ensure_ascii=False),
+                            1 if entry.get("is_favorite") else 0,
+                            json.dumps(entry.get("tags") or [], ensure_ascii=False),
+                            entry.get("notes", "")
+                        ))
+                        
+                        history_id = cursor.lastrowid
+                        self._index_history(
+                            cursor, history_id,
+                            parameters=entry.get("parameters", {}),
+                            tags=entry.get("tags") or [],
+                            notes=entry.get("notes", ""),
+                        )
+                        
+                        for i, stored in enumerate(stored_images):
+                            # 角度情報
+                            angle = angles[i] if angles and i < len(angles) else None
+                            
+                            image_phash = stored.get("phash")
+                            cursor.execute("""
+                                INSERT INTO history_images 
+                                (history_id, image_index, image_hash, image_size, width, height,
+                                 codec, thumbnail_hash, angle, phash)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            """, (
+                                history_id, i, stored["image_hash"], stored["image_size"],
+                                stored["width"], stored["height"], stored["codec"],
+                                stored["thumbnail_hash"], angle,
+                                to_db_hash(image_phash) if image_phash is not None else None
+                            ))
+                            image_id = cursor.lastrowid
+                            
+                            cursor.executemany("""
+                                INSERT INTO history_thumbnails (image_id, size, thumbnail_hash)
+                                VALUES (?, ?, ?)
+                            """, [
+                                (image_id, size, thumbnail_hash)
+                                for size, thumbnail_hash in stored.get("thumbnails", {}).items()
+                            ])
+                            
+                            if image_phash is not None:
+                                indexed.append((image_id, history_id, image_phash))
+                        
+                        history_ids.append(history_id)
+                
+                # コミットした画像を類似画像検索の索引に追加（作成済みの場合）
+                if self._similarity_index is not None and indexed:
+                    self._similarity_index.add(*zip(*indexed))
+            finally:
+                self.release_encoded(
+                    stored for entry in entries for stored in entry["stored_images"]
+                )
         
-        return history_id
+        for history_id, entry in zip(history_ids, entries):
+            print(f"[History] 履歴保存完了: ID={history_id}, 画像数={len(entry['stored_images'])}")
+        
+        return history_ids
     
     def get_history_list(
         self,
@@ -169,103 +845,412 @@ class HistoryManager:
         Returns:
             履歴のリスト
         """
-        cursor = self.conn.cursor()
+        return self.get_history_page(limit=limit, favorites_only=favorites_only, tag=tag_filter)
+    
+    def get_history(self, history_id: int, thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE) -> Optional[Dict]:
+        """
+        履歴を1件取得
+        
+        Args:
+            history_id: 履歴ID
+            thumbnail_size: thumbnail_hashとして返すサムネイルのサイズ
+        
+        Returns:
+            履歴（get_history_pageの項目と同じ形式、アーカイブも探し、存在しない場合はNone）
+        """
+        row = self.conn.execute(
+            f"SELECT {_history_columns(thumbnail_size)} FROM generation_history AS h WHERE h.id = ?",
+            (history_id,)
+        ).fetchone()
+        if row is None:
+            return self.archive.get_history(history_id, thumbnail_size)
+        return self._row_to_history(row)
+    
+    def get_history_page(
+        self,
+        limit: int = 100,
+        before: Optional[Tuple[str, int]] = None,
+        favorites_only: bool = False,
+        generation_mode: Union[str, Iterable[str], None] = None,
+        tag: Optional[str] = None,
+        search: Optional[str] = None,
+        date_from: Union[datetime, str, None] = None,
+        date_to: Union[datetime, str, None] = None,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE,
+        include_archive: bool = False
+    ) -> List[Dict]:
+        """
+        履歴を新しい順に1ページ分取得（キーセットページング）
         
-        query = "SELECT * FROM generation_history WHERE 1=1"
+        OFFSETを使わず前ページの最後の行から続きを読むため、何ページ目でも
+        同じ速さで取得できます。絞り込みはすべてSQL側で行い、各履歴の
+        先頭画像のサムネイルハッシュも同じクエリで取得します。
+        
+        Args:
+            limit: 取得件数
+            before: 前ページ最後の履歴の (created_at, id)。Noneの場合は先頭から
+            favorites_only: お気に入りのみ
+            generation_mode: 生成モード（複数指定可）でフィルタ
+            tag: タグでフィルタ
+            search: メモ・プロンプトの全文検索（空白区切りのAND検索）
+            date_from: この日時以降
+            date_to: この日時より前
+            thumbnail_size: thumbnail_hashとして返すサムネイルのサイズ（THUMBNAIL_SIZESのいずれか）
+            include_archive: アーカイブした履歴も日時順に混ぜて返す（archived=Trueが付く）
+        
+        Returns:
+            履歴のリスト（thumbnail_hash を含む）
+        """
+        query = f"SELECT {_history_columns(thumbnail_size)} FROM generation_history AS h WHERE 1=1"
         params = []
         
+        if before is not None:
+            # 行値の比較にするとインデックスの範囲検索になる
+            query += " AND (h.created_at, h.id) < (?, ?)"
+            params.extend(before)
+        
         if favorites_only:
-            query += " AND is_favorite = 1"
+            query += " AND h.is_favorite = 1"
         
-        if tag_filter:
-            query += " AND tags LIKE ?"
-            params.append(f'%"{tag_filter}"%')
+        if generation_mode:
+            modes = [generation_mode] if isinstance(generation_mode, str) else list(generation_mode)
+            query += f" AND h.generation_mode IN ({', '.join('?' * len(modes))})"
+            params.extend(modes)
         
-        query += " ORDER BY created_at DESC LIMIT ?"
+        if tag:
+            query += self._id_filter("SELECT history_id FROM history_tags WHERE tag = ?", tag)
+            params.append(tag)
+        
+        if date_from is not None:
+            query += " AND h.created_at >= ?"
+            params.append(date_from.isoformat() if isinstance(date_from, datetime) else date_from)
+        
+        if date_to is not None:
+            query += " AND h.created_at < ?"
+            params.append(date_to.isoformat() if isinstance(date_to, datetime) else date_to)
+        
+        for term in (search or "").split():
+            if self.fts_enabled and (self.fts_tokenizer != "trigram" or len(term) >= 3):
+                phrase = '"' + term.replace('"', '""') + '"'
+                query += self._id_filter("SELECT rowid FROM history_fts WHERE history_fts MATCH ?", phrase)
+                params.append(phrase)
+            else:
+                # trigramは3文字未満を索引できないため、短い語は部分一致で探す
+                query += " AND (h.notes LIKE ? ESCAPE '\\' OR h.parameters LIKE ? ESCAPE '\\')"
+                pattern = "%" + re.sub(r"([%_\\])", r"\\\1", term) + "%"
+                params.extend([pattern, pattern])
+        
+        query += " ORDER BY h.created_at DESC, h.id DESC LIMIT ?"
         params.append(limit)
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        histories = [self._row_to_history(row) for row in self.conn.execute(query, params).fetchall()]
         
-        history_list = []
-        for row in rows:
-            history_list.append({
-                "id": row["id"],
-                "created_at": row["created_at"],
-                "generation_mode": row["generation_mode"],
-                "num_images": row["num_images"],
-                "parameters": json.loads(row["parameters"]),
-                "is_favorite": bool(row["is_favorite"]),
-                "tags": json.loads(row["tags"]) if row["tags"] else [],
-                "notes": row["notes"]
-            })
+        # アーカイブにはお気に入りがないため、お気に入りのみの場合は読まない
+        if include_archive and not favorites_only and self.archive.exists:
+            archived = self.archive.get_history_page(
+                limit=limit, before=before, generation_mode=generation_mode, tag=tag,
+                search=search, date_from=date_from, date_to=date_to, thumbnail_size=thumbnail_size,
+            )
+            if archived:
+                # 移動が途中で中断した履歴は両方にあるため、こちらを優先する
+                ids = {history["id"] for history in histories}
+                histories += [history for history in archived if history["id"] not in ids]
+                histories.sort(key=lambda history: (history["created_at"], history["id"]), reverse=True)
+                histories = histories[:limit]
+        
+        return histories
+    
+    def _id_filter(self, id_query: str, param) -> str:
+        """
+        IDの集合による絞り込み条件を、一致件数に応じた実行計画で作る
+        
+        一致が少なければ一致したIDから履歴を引きます。多ければ新しい順に履歴を
+        たどって集合に含まれるかを調べます（「+」でh.idのインデックスを使わせない）。
+        一致が多いほど1ページ分がすぐ見つかるため、一致件数に関係なく速く返ります。
+        
+        Args:
+            id_query: IDを返すSELECT文（パラメータは1つ）
+            param: id_queryのパラメータ
+        
+        Returns:
+            WHERE句に追加する条件
+        """
+        count = self.conn.execute(f"SELECT COUNT(*) FROM ({id_query})", (param,)).fetchone()[0]
+        if count <= INDEX_DRIVEN_MAX_MATCHES:
+            return f" AND h.id IN ({id_query})"
+        return f" AND +h.id IN ({id_query})"
+    
+    @staticmethod
+    def _row_to_history(row: sqlite3.Row) -> Dict:
+        """generation_historyの行を辞書に変換"""
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "generation_mode": row["generation_mode"],
+            "num_images": row["num_images"],
+            "parameters": json.loads(row["parameters"]),
+            "is_favorite": bool(row["is_favorite"]),
+            "tags": json.loads(row["tags"]) if row["tags"] else [],
+            "notes": row["notes"],
+            "thumbnail_hash": row["thumbnail_hash"]
+        }
+    
+    def get_thumbnail(self, blob_hash: str) -> Optional[Image.Image]:
+        """
+        サムネイルを読み込み（DBには触れないため、別スレッドから呼び出せます）
+        
+        Args:
+            blob_hash: get_history_pageが返した thumbnail_hash
+        
+        Returns:
+            サムネイル画像（ファイルがない場合はNone）
+        """
+        try:
+            return self.blob_store.open_image(blob_hash, STORED_FORMATS)
+        except FileNotFoundError:
+            pass
         
-        return history_list
+        # アーカイブした履歴のサムネイル
+        try:
+            return self.archive.open_image(blob_hash)
+        except FileNotFoundError:
+            print(f"[History] 画像ファイルが見つかりません: {blob_hash}")
+            return None
     
-    def get_history_images(self, history_id: int, thumbnail_only: bool = False) -> List[Image.Image]:
+    def get_history_images(
+        self,
+        history_id: int,
+        thumbnail_only: bool = False,
+        thumbnail_size: Optional[int] = None
+    ) -> List[Image.Image]:
         """
         履歴の画像を取得
         
         Args:
             history_id: 履歴ID
-            thumbnail_only: サムネイルのみ取得
+            thumbnail_only: サムネイルのみ取得（標準サイズ）
+            thumbnail_size: 指定したサイズのサムネイルを取得（THUMBNAIL_SIZESのいずれか）
         
         Returns:
             画像のリスト
         """
+        if thumbnail_only and thumbnail_size is None:
+            thumbnail_size = DEFAULT_THUMBNAIL_SIZE
+        
         cursor = self.conn.cursor()
         
         cursor.execute("""
-            SELECT image_data, thumbnail_data, angle
-            FROM history_images
-            WHERE history_id = ?
-            ORDER BY image_index
-        """, (history_id,))
+            SELECT i.image_hash, i.angle, COALESCE(t.thumbnail_hash, i.thumbnail_hash) AS thumbnail_hash
+            FROM history_images AS i
+            LEFT JOIN history_thumbnails AS t ON t.image_id = i.id AND t.size = ?
+            WHERE i.history_id = ?
+            ORDER BY i.image_index
+        """, (thumbnail_size or 0, history_id))
         
         rows = cursor.fetchall()
+        if not rows:
+            # アーカイブした履歴
+            return self.archive.get_history_images(history_id, thumbnail_size)
         
         images = []
         for row in rows:
-            if thumbnail_only and row["thumbnail_data"]:
-                img_data = row["thumbnail_data"]
+            if thumbnail_size and row["thumbnail_hash"]:
+                blob_hash = row["thumbnail_hash"]
             else:
-                img_data = row["image_data"]
+                blob_hash = row["image_hash"]
             
-            img = Image.open(BytesIO(img_data))
-            images.append(img)
+            try:
+                images.append(self.blob_store.open_image(blob_hash, STORED_FORMATS))
+            except FileNotFoundError:
+                print(f"[History] 画像ファイルが見つかりません: {blob_hash}")
         
         return images
     
-    def toggle_favorite(self, history_id: int) -> bool:
+    @property
+    def similarity_index_ready(self) -> bool:
+        """類似画像検索の索引が作成済みか（未作成の間に検索すると、作成が終わるまで待つ）"""
+        return self._similarity_index is not None
+    
+    @property
+    def similarity_index(self) -> SimilarityIndex:
+        """類似画像検索の索引（未作成の場合はここで作成）"""
+        if self._similarity_index is None:
+            self.build_similarity_index()
+        return self._similarity_index
+    
+    def build_similarity_index(self):
         """
-        お気に入りをトグル
+        類似画像検索の索引を作成（作成済みの場合は何もしない）
+        
+        以前のバージョンで保存した画像は、先にpHashを計算して記録します。
+        画像のデコードを伴い時間がかかるため、UIスレッドではなく
+        HistoryMaintenanceのスレッドから呼び出します。書き込みのロックは
+        記録する間と最後に索引を読み込む間だけ持つため、計算中も履歴の保存は止まりません。
+        """
+        with self._index_build_lock:
+            if self._similarity_index is not None:
+                return
+            
+            # 計算中に保存された画像は、保存時にpHashが記録される
+            self._backfill_perceptual_hashes()
+            if self._closed:
+                return
+            
+            # 読み込んで差し替えるまでは書き込みを止め、その間の保存・削除を漏らさない
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT id, history_id, phash FROM history_images WHERE phash IS NOT NULL"
+                ).fetchall()
+                index = SimilarityIndex()
+                index.add(
+                    [row["id"] for row in rows],
+                    [row["history_id"] for row in rows],
+                    from_db_hashes(row["phash"] for row in rows),
+                )
+                self._similarity_index = index
+    
+    def _backfill_perceptual_hashes(self):
+        """pHashが未計算の画像（以前のバージョンで保存した画像）を計算して記録"""
+        last_id = 0
+        computed = 0
+        while not self._closed:
+            # 計算にはサムネイルを使う（最大サイズ → 標準サイズ → 元画像の順）
+            rows = self.conn.execute("""
+                SELECT i.id, COALESCE(t.thumbnail_hash, i.thumbnail_hash, i.image_hash) AS blob_hash
+                FROM history_images AS i
+                LEFT JOIN history_thumbnails AS t ON t.image_id = i.id AND t.size = ?
+                WHERE i.id > ? AND i.phash IS NULL
+                ORDER BY i.id
+                LIMIT ?
+            """, (max(THUMBNAIL_SIZES), last_id, MIGRATION_BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            
+            updates = []
+            for row in rows:
+                try:
+                    image = self.blob_store.open_image(row["blob_hash"], STORED_FORMATS)
+                except FileNotFoundError:
+                    print(f"[History] 画像ファイルが見つかりません: {row['blob_hash']}")
+                    continue
+                updates.append((to_db_hash(phash(image)), row["id"]))
+            
+            with self._write() as cursor:
+                cursor.executemany("UPDATE history_images SET phash = ? WHERE id = ?", updates)
+            
+            last_id = rows[-1]["id"]
+            computed += len(updates)
+        
+        if computed:
+            print(f"[History] 類似画像検索用のハッシュを計算: {computed}件")
+    
+    def find_similar(
+        self,
+        history_id: int,
+        max_distance: int = SIMILAR_MAX_DISTANCE,
+        limit: int = 50,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE
+    ) -> List[Dict]:
+        """
+        似た画像を持つ履歴を検索
+        
+        索引が未作成の場合は作成が終わるまで待ちます（UIスレッドからは
+        similarity_index_ready を確認してから呼び出します）。
         
         Args:
-            history_id: 履歴ID
+            history_id: 基準にする履歴ID（いずれかの画像が似ていれば一致）
+            max_distance: pHashの最大ハミング距離（0〜64、小さいほど厳しい）
+            limit: 取得件数
+            thumbnail_size: thumbnail_hashとして返すサムネイルのサイズ
         
         Returns:
-            新しいお気に入り状態
+            履歴のリスト（get_history_pageの項目に distance を加えたもの、近い順）
         """
-        cursor = self.conn.cursor()
-        
-        # 現在の状態を取得
-        cursor.execute(
-            "SELECT is_favorite FROM generation_history WHERE id = ?",
+        index = self.similarity_index
+        rows = self.conn.execute(
+            "SELECT phash FROM history_images WHERE history_id = ? AND phash IS NOT NULL",
             (history_id,)
-        )
-        row = cursor.fetchone()
+        ).fetchall()
+        queries = from_db_hashes(row["phash"] for row in rows)
         
-        if not row:
-            return False
+        matches = index.search(queries, max_distance, limit, exclude_history_ids=[history_id])
+        return self._histories_with_distance(matches, thumbnail_size)
+    
+    def find_duplicates(
+        self,
+        images: List[Image.Image],
+        max_distance: int = DUPLICATE_MAX_DISTANCE,
+        limit: int = 10,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE
+    ) -> List[Dict]:
+        """
+        保存前の画像とほぼ同じ画像を持つ履歴を検索
         
-        new_state = 0 if row["is_favorite"] else 1
+        索引が未作成の場合は作成が終わるまで待ちます（UIスレッドからは
+        similarity_index_ready を確認してから呼び出します）。
         
-        # 更新
-        cursor.execute(
-            "UPDATE generation_history SET is_favorite = ? WHERE id = ?",
-            (new_state, history_id)
-        )
-        self.conn.commit()
+        Args:
+            images: 保存しようとしている画像
+            max_distance: pHashの最大ハミング距離
+            limit: 取得件数
+            thumbnail_size: thumbnail_hashとして返すサムネイルのサイズ
+        
+        Returns:
+            履歴のリスト（get_history_pageの項目に distance を加えたもの、近い順）
+        """
+        queries = [phash(img) for img in images]
+        matches = self.similarity_index.search(queries, max_distance, limit)
+        return self._histories_with_distance(matches, thumbnail_size)
+    
+    def _histories_with_distance(self, matches: List[Tuple[int, int]], thumbnail_size: int) -> List[Dict]:
+        """(履歴ID, 距離) のリストを、同じ順の履歴のリストにする"""
+        if not matches:
+            return []
+        
+        ids = [history_id for history_id, _ in matches]
+        rows = self.conn.execute(
+            f"SELECT {_history_columns(thumbnail_size)} FROM generation_history AS h "
+            f"WHERE h.id IN ({', '.join('?' * len(ids))})",
+            ids
+        ).fetchall()
+        histories = {row["id"]: self._row_to_history(row) for row in rows}
+        
+        results = []
+        for history_id, distance in matches:
+            history = histories.get(history_id)
+            if history is not None:
+                history["distance"] = distance
+                results.append(history)
+        return results
+    
+    def toggle_favorite(self, history_id: int) -> bool:
+        """
+        お気に入りをトグル
+        
+        Args:
+            history_id: 履歴ID
+        
+        Returns:
+            新しいお気に入り状態
+        """
+        with self._write() as cursor:
+            # 現在の状態を取得
+            cursor.execute(
+                "SELECT is_favorite FROM generation_history WHERE id = ?",
+                (history_id,)
+            )
+            row = cursor.fetchone()
+            
+            if not row:
+                return False
+            
+            new_state = 0 if row["is_favorite"] else 1
+            
+            # 更新
+            cursor.execute(
+                "UPDATE generation_history SET is_favorite = ? WHERE id = ?",
+                (new_state, history_id)
+            )
         
         return bool(new_state)
     
@@ -277,14 +1262,14 @@ class HistoryManager:
             history_id: 履歴ID
             tags: タグのリスト
         """
-        cursor = self.conn.cursor()
-        tags_json = json.dumps(tags, ensure_ascii=False)
-        
-        cursor.execute(
-            "UPDATE generation_history SET tags = ? WHERE id = ?",
-            (tags_json, history_id)
-        )
-        self.conn.commit()
+        with self._write() as cursor:
+            tags_json = json.dumps(tags, ensure_ascii=False)
+            
+            cursor.execute(
+                "UPDATE generation_history SET tags = ? WHERE id = ?",
+                (tags_json, history_id)
+            )
+            self._index_history(cursor, history_id, tags=tags)
     
     def update_notes(self, history_id: int, notes: str):
         """
@@ -294,13 +1279,12 @@ class HistoryManager:
             history_id: 履歴ID
             notes: メモ
         """
-        cursor = self.conn.cursor()
-        
-        cursor.execute(
-            "UPDATE generation_history SET notes = ? WHERE id = ?",
-            (notes, history_id)
-        )
-        self.conn.commit()
+        with self._write() as cursor:
+            cursor.execute(
+                "UPDATE generation_history SET notes = ? WHERE id = ?",
+                (notes, history_id)
+            )
+            self._index_history(cursor, history_id, notes=notes)
     
     def delete_history(self, history_id: int):
         """
@@ -309,17 +1293,222 @@ class HistoryManager:
         Args:
             history_id: 履歴ID
         """
-        cursor = self.conn.cursor()
+        self.delete_histories([history_id])
+    
+    def delete_histories(self, history_ids: Iterable[int]):
+        """
+        複数の履歴を1トランザクションで削除
+        
+        Args:
+            history_ids: 履歴IDのリスト
+        """
+        params = [(history_id,) for history_id in history_ids]
+        if not params:
+            return
+        
+        self._delete_rows(params)
+        
+        for (history_id,) in params:
+            print(f"[History] 履歴削除: ID={history_id}")
+    
+    def _delete_rows(self, params: List[Tuple[int]]):
+        """履歴の行と、参照されなくなった画像ファイルを削除"""
+        with self._lock:
+            with self._write() as cursor:
+                blob_hashes = []
+                for param in params:
+                    for row in cursor.execute("""
+                        SELECT image_hash AS blob_hash FROM history_images WHERE history_id = ?1
+                        UNION
+                        SELECT thumbnail_hash FROM history_images WHERE history_id = ?1
+                        UNION
+                        SELECT t.thumbnail_hash FROM history_thumbnails AS t
+                        JOIN history_images AS i ON i.id = t.image_id
+                        WHERE i.history_id = ?1
+                    """, param).fetchall():
+                        blob_hashes.append(row["blob_hash"])
+                
+                # サムネイル・画像を削除
+                cursor.executemany("""
+                    DELETE FROM history_thumbnails
+                    WHERE image_id IN (SELECT id FROM history_images WHERE history_id = ?)
+                """, params)
+                cursor.executemany("DELETE FROM history_images WHERE history_id = ?", params)
+                
+                # タグ・全文検索から削除
+                cursor.executemany("DELETE FROM history_tags WHERE history_id = ?", params)
+                if self.fts_enabled:
+                    cursor.executemany("DELETE FROM history_fts WHERE rowid = ?", params)
+                
+                # 履歴を削除
+                cursor.executemany("DELETE FROM generation_history WHERE id = ?", params)
+            
+            if self._similarity_index is not None:
+                self._similarity_index.remove_histories(history_id for (history_id,) in params)
+            
+            # 他の履歴から参照されていない画像ファイルを削除
+            self._release_blobs(blob_hashes)
+    
+    def prune_full_images(self, older_than_days: int) -> int:
+        """
+        お気に入り以外の古い履歴のフルサイズ画像を削除し、サムネイルだけを残す
+        
+        画像は最大サイズのサムネイルに置き換えるため、履歴を開くと
+        サムネイルが表示されます。お気に入りの履歴は期間に関係なく残します。
+        
+        Args:
+            older_than_days: この日数より前の履歴が対象
+        
+        Returns:
+            サムネイルだけにした画像の数
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        last_id = 0
+        pruned = 0
         
-        # 画像を削除
-        cursor.execute("DELETE FROM history_images WHERE history_id = ?", (history_id,))
+        while True:
+            rows = self.conn.execute("""
+                SELECT i.id, i.image_hash, COALESCE(t.thumbnail_hash, i.thumbnail_hash) AS preview_hash
+                FROM history_images AS i
+                JOIN generation_history AS h ON h.id = i.history_id
+                LEFT JOIN history_thumbnails AS t ON t.image_id = i.id AND t.size = ?
+                WHERE i.id > ? AND h.is_favorite = 0 AND h.created_at < ?
+                  AND COALESCE(t.thumbnail_hash, i.thumbnail_hash) IS NOT NULL
+                  AND i.image_hash <> COALESCE(t.thumbnail_hash, i.thumbnail_hash)
+                ORDER BY i.id
+                LIMIT ?
+            """, (max(THUMBNAIL_SIZES), last_id, cutoff, MIGRATION_BATCH_SIZE * 8)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            
+            updates = []
+            for row in rows:
+                try:
+                    # 寸法と形式はヘッダーだけ読んで調べる
+                    with self.blob_store.open(row["preview_hash"]) as mapped:
+                        with Image.open(mapped, formats=STORED_FORMATS) as preview:
+                            width, height = preview.size
+                            codec = preview.format.lower()
+                    size = self.blob_store.size(row["preview_hash"])
+                except FileNotFoundError:
+                    print(f"[History] 画像ファイルが見つかりません: {row['preview_hash']}")
+                    continue
+                updates.append((row["preview_hash"], size, width, height, codec, row["id"]))
+            
+            with self._lock:
+                with self._write() as cursor:
+                    cursor.executemany("""
+                        UPDATE history_images
+                        SET image_hash = ?, image_size = ?, width = ?, height = ?, codec = ?
+                        WHERE id = ?
+                    """, updates)
+                self._release_blobs(row["image_hash"] for row in rows)
+            pruned += len(updates)
+        
+        if pruned:
+            print(f"[History] 保存期間を過ぎた画像をサムネイルのみに: {pruned}件")
+        return pruned
+    
+    def archive_histories(self, older_than_days: int, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """
+        お気に入り以外の古い履歴をアーカイブに移す
         
-        # 履歴を削除
-        cursor.execute("DELETE FROM generation_history WHERE id = ?", (history_id,))
+        アーカイブに書き込んでから、このデータベースと画像ファイルから削除します。
+        移した履歴は include_archive=True の get_history_page や get_history_images で
+        引き続き読めます。
         
-        self.conn.commit()
+        Args:
+            older_than_days: この日数より前の履歴が対象
+            batch_size: 1回に移す履歴の数
+        
+        Returns:
+            移した履歴の数
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        archived = 0
+        
+        while True:
+            rows = self.conn.execute("""
+                SELECT * FROM generation_history
+                WHERE is_favorite = 0 AND created_at < ?
+                ORDER BY created_at, id
+                LIMIT ?
+            """, (cutoff, batch_size)).fetchall()
+            if not rows:
+                break
+            
+            self.archive.append([self._archive_entry(row) for row in rows])
+            self._delete_rows([(row["id"],) for row in rows])
+            archived += len(rows)
         
-        print(f"[History] 履歴削除: ID={history_id}")
+        if archived:
+            print(f"[History] 古い履歴をアーカイブに移動: {archived}件")
+        return archived
+    
+    def _archive_entry(self, row: sqlite3.Row) -> Dict:
+        """アーカイブに書き込む1件分のデータ（画像ファイルの中身を含む）"""
+        images = []
+        blobs = {}
+        for image in self.conn.execute(
+            "SELECT * FROM history_images WHERE history_id = ? ORDER BY image_index", (row["id"],)
+        ).fetchall():
+            thumbnails = {
+                t["size"]: t["thumbnail_hash"]
+                for t in self.conn.execute(
+                    "SELECT size, thumbnail_hash FROM history_thumbnails WHERE image_id = ?", (image["id"],)
+                )
+            }
+            if not thumbnails and image["thumbnail_hash"]:
+                thumbnails[DEFAULT_THUMBNAIL_SIZE] = image["thumbnail_hash"]
+            images.append({**dict(image), "thumbnails": thumbnails})
+            
+            for blob_hash in {image["image_hash"], *thumbnails.values()}:
+                try:
+                    blobs[blob_hash] = self.blob_store.read(blob_hash)
+                except FileNotFoundError:
+                    print(f"[History] 画像ファイルが見つかりません: {blob_hash}")
+        
+        return {
+            "history": dict(row),
+            "tags": json.loads(row["tags"]) if row["tags"] else [],
+            "images": images,
+            "blobs": blobs,
+        }
+    
+    def compact(self, max_pages: Optional[int] = None) -> int:
+        """
+        削除で空いた領域をデータベースファイルから解放（インクリメンタルVACUUM）
+        
+        以前のバージョンで作ったデータベースは、初回だけ全体をVACUUMして
+        インクリメンタルVACUUMが使える形式に変換します。
+        
+        Args:
+            max_pages: 1回に解放する最大ページ数（Noneの場合はすべて）
+        
+        Returns:
+            解放したページ数
+        """
+        with self._lock:
+            conn = self.conn
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != INCREMENTAL_VACUUM:
+                print("[History] データベースをインクリメンタルVACUUMの形式に変換中")
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+            elif free_pages:
+                # incremental_vacuumは1ステップに1ページずつ解放するため、
+                # 最後まで実行されるexecutescriptで呼ぶ
+                conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages or 0)})")
+            
+            freed = free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # WALの内容をデータベースに書き戻し、WALファイルを切り詰める
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        
+        if freed:
+            print(f"[History] 空き領域を解放: {freed}ページ")
+        return freed
     
     def get_statistics(self) -> Dict:
         """
@@ -334,9 +1523,16 @@ class HistoryManager:
         cursor.execute("SELECT COUNT(*) as count FROM generation_history")
         total_generations = cursor.fetchone()["count"]
         
-        # 総画像数
-        cursor.execute("SELECT COUNT(*) as count FROM history_images")
-        total_images = cursor.fetchone()["count"]
+        # 総画像数・保存サイズ
+        cursor.execute("""
+            SELECT COUNT(*) as count, COUNT(DISTINCT image_hash) as unique_count,
+                   COALESCE(SUM(image_size), 0) as total_bytes
+            FROM history_images
+        """)
+        row = cursor.fetchone()
+        total_images = row["count"]
+        unique_images = row["unique_count"]
+        total_bytes = row["total_bytes"]
         
         # お気に入り数
         cursor.execute("SELECT COUNT(*) as count FROM generation_history WHERE is_favorite = 1")
@@ -353,14 +1549,22 @@ class HistoryManager:
         return {
             "total_generations": total_generations,
             "total_images": total_images,
+            "unique_images": unique_images,
+            "total_image_bytes": total_bytes,
             "favorite_count": favorite_count,
-            "mode_counts": mode_counts
+            "mode_counts": mode_counts,
+            "archived_generations": self.archive.count()
         }
     
     def close(self):
-        """データベース接続を閉じる"""
-        if self.conn:
-            self.conn.close()
+        """データベース接続を閉じる（すべてのスレッドの接続）"""
+        with self._lock:
+            self._closed = True
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local = threading.local()
+        self.archive.close()
 
 
 # テスト用
@@ -0,0 +1,610 @@
+"""Streaming bulk export and import of generation history"""
+
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.history.blob_store import content_hash
+from core.history.image_codecs import CODECS, STORED_FORMATS, encode, resolve_codec
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+# 書き出し形式のバージョン（manifest.json）
+EXPORT_FORMAT_VERSION = 1
+
+# 1トランザクション・1回のメタデータ書き込みで扱う履歴の数
+DEFAULT_CHUNK_SIZE = 256
+
+# 画像の読み書き・エンコードの並列数
+DEFAULT_WORKERS = max(2, min(8, os.cpu_count() or 2))
+
+# 並列数あたりの、同時にメモリに置く画像の数（画像のメモリ使用量はチャンクの大きさによらない）
+IMAGES_IN_FLIGHT_PER_WORKER = 2
+
+# 書き出しのファイル名
+MANIFEST_FILE = "manifest.json"
+METADATA_FILES = {"jsonl": "history.jsonl", "parquet": "history.parquet"}
+IMAGE_CONTAINERS = {"folder": "images", "tar": "images.tar"}
+
+# 保存形式 → 拡張子
+_EXTENSIONS = {"PNG": ".png", "WEBP": ".webp", "JPEG": ".jpg"}
+
+
+def _require_parquet():
+    """Parquetを使う前に確認"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquetの読み書きにはpyarrowが必要です（pip install pyarrow）")
+
+
+def _image_name(image_hash: str, codec: str) -> str:
+    """書き出し先での画像ファイル名（内容ハッシュで同じ画像は1つにまとめる）"""
+    fmt = CODECS[codec][0] if codec in CODECS else codec.upper()
+    return f"images/{image_hash[:2]}/{image_hash}{_EXTENSIONS.get(fmt, '.' + codec)}"
+
+
+class HistoryExporter:
+    """履歴の一括書き出し
+
+    履歴をIDの順に DEFAULT_CHUNK_SIZE 件ずつ読み、メタデータ（JSONLまたはParquet）と
+    画像（フォルダまたはtar）に書き出します。一度に持つのは1チャンク分の行と、
+    並列数に応じた枚数の画像だけなので、履歴全体の大きさに関係なく一定のメモリで
+    動きます。画像は保存済みのファイルを
+    そのままコピーし、codecを指定した場合だけ並列に再エンコードします。
+    アーカイブに移した履歴も、通常の履歴の後に続けて書き出します（archived=True）。
+    """
+
+    def __init__(self, history_manager, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS):
+        """
+        Args:
+            history_manager: 書き出すHistoryManager
+            chunk_size: 1回に読む履歴の数
+            workers: 画像の読み書き・エンコードの並列数
+        """
+        self.history_manager = history_manager
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def export(
+        self,
+        dest_dir: Union[str, Path],
+        metadata_format: str = "jsonl",
+        image_container: str = "folder",
+        codec: Optional[str] = None,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> Dict:
+        """
+        履歴を書き出す
+
+        Args:
+            dest_dir: 書き出し先のディレクトリ
+            metadata_format: メタデータの形式（jsonl/parquet）
+            image_container: 画像の置き方（folder: images/ 以下のファイル, tar: images.tar）
+            codec: 画像を再エンコードする形式（Noneの場合は保存済みのファイルをそのまま書き出す）
+            progress: 書き出した履歴の累計数を受け取る関数
+
+        Returns:
+            manifest.jsonの内容
+        """
+        if metadata_format not in METADATA_FILES:
+            raise ValueError(f"未対応のメタデータ形式です: {metadata_format}")
+        if image_container not in IMAGE_CONTAINERS:
+            raise ValueError(f"未対応の画像の置き方です: {image_container}")
+        if metadata_format == "parquet":
+            _require_parquet()
+        if codec is not None:
+            codec = resolve_codec(codec)
+
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+
+        # 書き出した画像（元の内容ハッシュ → 書き出したファイル名と内容ハッシュ）
+        exported: Dict[str, Tuple[str, str]] = {}
+        histories = 0
+        archived_histories = 0
+        image_bytes = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="history-export") as executor, \
+                _MetadataWriter(dest_dir / METADATA_FILES[metadata_format], metadata_format) as metadata, \
+                _ImageWriter(dest_dir, image_container) as images:
+            for rows, image_rows, archived in self._chunks():
+                # このチャンクで初めて出てくる画像
+                new_images = {}
+                for image in image_rows:
+                    if image["image_hash"] not in exported:
+                        new_images.setdefault(image["image_hash"], image)
+
+                # 並列に読み込み（再エンコード）、チャンク内の順序どおりに書き出す
+                # （tarの中の順序が決まる）。書き出した画像の内容はすぐに手放す
+                prepared = _bounded_map(
+                    executor,
+                    lambda image: self._prepare_image(image, codec, images, archived),
+                    new_images.values(),
+                    self.workers * IMAGES_IN_FLIGHT_PER_WORKER,
+                )
+                for image_hash, (name, data_hash, data) in zip(new_images, prepared):
+                    if data is not None:
+                        images.add(name, data)
+                    image_bytes += images.size_of(name)
+                    exported[image_hash] = (name, data_hash)
+
+                by_history: Dict[int, List[Dict]] = {}
+                for image in image_rows:
+                    name, data_hash = exported[image["image_hash"]]
+                    by_history.setdefault(image["history_id"], []).append({
+                        "file": name,
+                        "hash": data_hash,
+                        "codec": codec or image["codec"],
+                        "width": image["width"],
+                        "height": image["height"],
+                        "angle": image["angle"],
+                    })
+
+                metadata.write([
+                    {
+                        "id": row["id"],
+                        "created_at": row["created_at"],
+                        "generation_mode": row["generation_mode"],
+                        "parameters": json.loads(row["parameters"]),
+                        "is_favorite": bool(row["is_favorite"]),
+                        "tags": json.loads(row["tags"]) if row["tags"] else [],
+                        "notes": row["notes"] or "",
+                        "images": by_history.get(row["id"], []),
+                        "archived": archived,
+                    }
+                    for row in rows
+                ])
+
+                histories += len(rows)
+                if archived:
+                    archived_histories += len(rows)
+                if progress:
+                    progress(histories)
+
+        manifest = {
+            "format_version": EXPORT_FORMAT_VERSION,
+            "exported_at": datetime.now().isoformat(),
+            "metadata": METADATA_FILES[metadata_format],
+            "images": IMAGE_CONTAINERS[image_container],
+            "histories": histories,
+            "archived_histories": archived_histories,
+            "unique_images": len(exported),
+            "image_bytes": image_bytes,
+        }
+        with open(dest_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        print(
+            f"[History] 書き出し完了: {histories}件（うちアーカイブ{archived_histories}件）, "
+            f"画像{len(exported)}枚 → {dest_dir}"
+        )
+        return manifest
+
+    def _chunks(self) -> Iterator[Tuple[List, List, bool]]:
+        """
+        履歴とその画像をIDの順にチャンクごとに読む
+
+        通常の履歴を読み終えてから、アーカイブした履歴を読みます。書き出し中に
+        アーカイブへ移された履歴は、通常の履歴として書き出し済みなら読み飛ばします。
+
+        Yields:
+            (履歴の行, 画像の行, アーカイブした履歴か)
+        """
+        conn = self.history_manager.conn
+        exported_ids = set()
+        last_id = 0
+        while True:
+            # 履歴と画像を同じスナップショットから読む
+            conn.execute("BEGIN")
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM generation_history WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.chunk_size)
+                ).fetchall()
+                image_rows = conn.execute("""
+                    SELECT history_id, image_hash, codec, width, height, angle FROM history_images
+                    WHERE history_id BETWEEN ? AND ?
+                    ORDER BY history_id, image_index
+                """, (rows[0]["id"], rows[-1]["id"])).fetchall() if rows else []
+            finally:
+                conn.execute("COMMIT")
+
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            exported_ids.update(row["id"] for row in rows)
+            yield rows, image_rows, False
+
+        archive = self.history_manager.archive
+        last_id = 0
+        while True:
+            rows, image_rows = archive.export_chunk(last_id, self.chunk_size)
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            rows = [row for row in rows if row["id"] not in exported_ids]
+            if rows:
+                ids = {row["id"] for row in rows}
+                yield rows, [image for image in image_rows if image["history_id"] in ids], True
+
+    def _prepare_image(
+        self,
+        image,
+        codec: Optional[str],
+        images: "_ImageWriter",
+        archived: bool = False
+    ) -> Tuple[str, str, Optional[bytes]]:
+        """
+        1枚の画像を書き出し用に準備（スレッドプールで実行）
+
+        フォルダに書き出す場合はここでファイルまで書き込みます。
+
+        Args:
+            image: 画像の行（history_images または archived_images）
+            codec: 再エンコードする形式（Noneの場合はそのまま）
+            images: 書き出し先
+            archived: アーカイブした履歴の画像か（アーカイブのファイルから読む）
+
+        Returns:
+            (ファイル名, 書き出す内容のハッシュ, tarに追加する内容（書き込み済みならNone）)
+        """
+        blob_store = self.history_manager.blob_store
+        archive = self.history_manager.archive
+        image_hash = image["image_hash"]
+
+        if codec is None or codec == image["codec"]:
+            name = _image_name(image_hash, image["codec"])
+            if archived:
+                data = archive.read_blob(image_hash)
+            elif images.container == "folder":
+                images.copy_file(name, blob_store.path_for(image_hash))
+                return name, image_hash, None
+            else:
+                data = blob_store.read(image_hash)
+            if images.container == "folder":
+                images.write_file(name, data)
+                return name, image_hash, None
+            return name, image_hash, data
+
+        if archived:
+            source = archive.open_image(image_hash)
+        else:
+            source = blob_store.open_image(image_hash, STORED_FORMATS)
+        data = encode(source, codec)
+        data_hash = content_hash(data)
+        name = _image_name(data_hash, codec)
+        if images.container == "folder":
+            images.write_file(name, data)
+            return name, data_hash, None
+        return name, data_hash, data
+
+
+class HistoryImporter:
+    """履歴の一括読み込み
+
+    HistoryExporterで書き出した履歴をチャンクごとに読み、画像のデコードと
+    サムネイル作成を並列に行ってから、1チャンクを1トランザクションで記録します。
+    画像は内容ハッシュで重複を除き、既に保存されている画像はデコードせずに使います。
+    作成日時と画像が同じ履歴が既にある場合は読み込みません（同じ書き出しを2回読んでも増えない）。
+    アーカイブから書き出された履歴も通常の履歴として読み込みます（読み込み先の
+    HistoryMaintenanceが、その設定に従って改めてアーカイブします）。
+    """
+
+    def __init__(self, history_manager, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS):
+        """
+        Args:
+            history_manager: 読み込み先のHistoryManager
+            chunk_size: 1トランザクションで記録する履歴の数
+            workers: 画像のデコード・サムネイル作成の並列数
+        """
+        self.history_manager = history_manager
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def import_from(self, source_dir: Union[str, Path], progress: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        書き出した履歴を読み込む
+
+        Args:
+            source_dir: HistoryExporterの書き出し先
+            progress: 処理した履歴の累計数を受け取る関数
+
+        Returns:
+            {"imported": 読み込んだ履歴数, "skipped": 既にあったため読み込まなかった履歴数,
+             "decoded_images": デコードした画像数, "reused_images": 保存済みだった画像数}
+        """
+        source_dir = Path(source_dir)
+        with open(source_dir / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version", 0) > EXPORT_FORMAT_VERSION:
+            raise ValueError(f"新しい形式の書き出しです（version {manifest['format_version']}）")
+
+        result = {"imported": 0, "skipped": 0, "decoded_images": 0, "reused_images": 0}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="history-import") as executor, \
+                _ImageReader(source_dir / manifest["images"]) as images:
+            for records in _read_metadata(source_dir / manifest["metadata"], self.chunk_size):
+                new_records = [record for record in records if not self._exists(record)]
+                result["skipped"] += len(records) - len(new_records)
+
+                entries = self._prepare_entries(new_records, images, executor, result)
+                self.history_manager.save_encoded(entries)
+                result["imported"] += len(entries)
+
+                if progress:
+                    progress(result["imported"] + result["skipped"])
+
+        print(f"[History] 読み込み完了: {result['imported']}件（既にあったためスキップ: {result['skipped']}件）")
+        return result
+
+    def _prepare_entries(self, records: List[Dict], images: "_ImageReader", executor, result: Dict) -> List[Dict]:
+        """1チャンク分の画像を保存し、save_encodedに渡す形にする"""
+        manager = self.history_manager
+
+        # 同じ画像は内容ハッシュごとに1回だけ保存する（保存済みならデコードしない）
+        jobs: Dict[str, Future] = {}
+        in_flight: Deque[Future] = deque()
+        window = self.workers * IMAGES_IN_FLIGHT_PER_WORKER
+        try:
+            for record in records:
+                for image in record["images"]:
+                    key = image.get("hash") or image["file"]
+                    if key in jobs:
+                        continue
+                    stored = manager.find_stored_image(image["hash"]) if image.get("hash") else None
+                    if stored is not None:
+                        result["reused_images"] += 1
+                        jobs[key] = _done(stored)
+                        continue
+                    # 読み出した画像がwindow枚を超えてメモリに溜まらないよう、古いものの完了を待つ
+                    while len(in_flight) >= window:
+                        in_flight.popleft().result()
+                    # 読み出しは順番に行い（tarは並列に読めない）、デコードとサムネイル作成を並列にする
+                    jobs[key] = executor.submit(manager.encode_image_data, images.read(image["file"]))
+                    in_flight.append(jobs[key])
+                    result["decoded_images"] += 1
+
+            stored_by_key = {key: job.result() for key, job in jobs.items()}
+        except BaseException:
+            # 保存できた画像の予約を解除してから中断
+            for job in jobs.values():
+                if not job.cancel() and job.exception() is None:
+                    manager.release_encoded([job.result()])
+            raise
+
+        entries = []
+        used = set()
+        for record in records:
+            stored_images = []
+            for image in record["images"]:
+                key = image.get("hash") or image["file"]
+                stored = stored_by_key[key]
+                if key in used:
+                    # 2回目以降に使う分も、記録されるまで予約する
+                    manager.reserve_encoded([stored])
+                used.add(key)
+                stored_images.append(stored)
+
+            entries.append({
+                "stored_images": stored_images,
+                "parameters": record.get("parameters") or {},
+                "generation_mode": record.get("generation_mode") or "variety",
+                "angles": [image.get("angle") for image in record["images"]],
+                "tags": record.get("tags") or [],
+                "notes": record.get("notes") or "",
+                "created_at": record.get("created_at"),
+                "is_favorite": record.get("is_favorite", False),
+            })
+        return entries
+
+    def _exists(self, record: Dict) -> bool:
+        """作成日時と画像（内容ハッシュ）が同じ履歴が既にあるか"""
+        if not record.get("created_at"):
+            return False
+        hashes = [image.get("hash") for image in record["images"]]
+        conn = self.history_manager.conn
+        for row in conn.execute(
+            "SELECT id FROM generation_history WHERE created_at = ?", (record["created_at"],)
+        ).fetchall():
+            existing = [
+                image_row["image_hash"] for image_row in conn.execute(
+                    "SELECT image_hash FROM history_images WHERE history_id = ? ORDER BY image_index",
+                    (row["id"],)
+                )
+            ]
+            if existing == hashes:
+                return True
+        return False
+
+
+def _bounded_map(executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    executor.mapと同じく入力の順に結果を返す（実行中・未取得の結果はwindow件まで）
+
+    executor.mapはすべての入力を先に投入するため、結果が大きい場合は
+    取り出されるまで全件分がメモリに残ります。
+    """
+    pending: Deque[Future] = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _done(value) -> Future:
+    """結果が決まっているFuture"""
+    future: Future = Future()
+    future.set_result(value)
+    return future
+
+
+class _MetadataWriter:
+    """メタデータをJSONL（1行1履歴）またはParquet（チャンクごとに1行グループ）で書き出す"""
+
+    def __init__(self, path: Path, metadata_format: str):
+        self.path = path
+        self.metadata_format = metadata_format
+        self._file = None
+        self._parquet = None
+
+    def __enter__(self):
+        if self.metadata_format == "jsonl":
+            self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def write(self, records: List[Dict]):
+        if self.metadata_format == "jsonl":
+            for record in records:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+
+        # 入れ子の項目はJSON文字列の列にする（分析側でそのまま展開できる）
+        table = pa.table({
+            "id": [record["id"] for record in records],
+            "created_at": [record["created_at"] for record in records],
+            "generation_mode": [record["generation_mode"] for record in records],
+            "parameters": [json.dumps(record["parameters"], ensure_ascii=False) for record in records],
+            "is_favorite": [record["is_favorite"] for record in records],
+            "tags": pa.array([record["tags"] for record in records], type=pa.list_(pa.string())),
+            "notes": [record["notes"] for record in records],
+            "images": [json.dumps(record["images"], ensure_ascii=False) for record in records],
+            "archived": [record.get("archived", False) for record in records],
+        })
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        self._parquet.write_table(table)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def _read_metadata(path: Path, chunk_size: int) -> Iterator[List[Dict]]:
+    """書き出したメタデータをチャンクごとに読む"""
+    if path.suffix == ".parquet":
+        _require_parquet()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            records = batch.to_pylist()
+            for record in records:
+                record["parameters"] = json.loads(record["parameters"])
+                record["images"] = json.loads(record["images"])
+            yield records
+        return
+
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ImageWriter:
+    """画像をフォルダまたはtarに書き出す"""
+
+    def __init__(self, dest_dir: Path, container: str):
+        self.dest_dir = dest_dir
+        self.container = container
+        self._tar: Optional[tarfile.TarFile] = None
+        self._sizes: Dict[str, int] = {}
+
+    def __enter__(self):
+        if self.container == "tar":
+            # 画像は圧縮済みのため、tar自体は圧縮しない
+            self._tar = tarfile.open(self.dest_dir / IMAGE_CONTAINERS["tar"], "w")
+        return self
+
+    def copy_file(self, name: str, source: Path):
+        """保存済みのファイルをそのままコピー（フォルダ、別スレッドから呼べる）"""
+        path = self.dest_dir / name
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            os.close(fd)
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, path)
+
+    def write_file(self, name: str, data: bytes):
+        """内容を書き込む（フォルダ、別スレッドから呼べる）"""
+        path = self.dest_dir / name
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+    def add(self, name: str, data: bytes):
+        """tarに追加（書き出しスレッドからのみ）"""
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(datetime.now().timestamp())
+        self._tar.addfile(info, BytesIO(data))
+        self._sizes[name] = len(data)
+
+    def size_of(self, name: str) -> int:
+        """書き出した画像のサイズ"""
+        if self.container == "tar":
+            return self._sizes[name]
+        return (self.dest_dir / name).stat().st_size
+
+    def __exit__(self, *exc):
+        if self._tar is not None:
+            self._tar.close()
+
+
+class _ImageReader:
+    """書き出した画像をフォルダまたはtarから読む"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tar: Optional[tarfile.TarFile] = None
+        self._members: Dict[str, tarfile.TarInfo] = {}
+
+    def __enter__(self):
+        if self.path.suffix == ".tar":
+            # ヘッダーだけを読んで名前の一覧を作る（画像の中身は必要な時に読む）
+            self._tar = tarfile.open(self.path, "r:")
+            self._members = {member.name: member for member in self._tar.getmembers() if member.isfile()}
+        return self
+
+    def read(self, name: str) -> bytes:
+        """画像ファイルの内容"""
+        if self._tar is not None:
+            member = self._members.get(name)
+            if member is None:
+                raise FileNotFoundError(name)
+            return self._tar.extractfile(member).read()
+
+        # 書き出し先の外を指すパスは読まない
+        root = self.path.parent.resolve()
+        path = (root / name).resolve()
+        if root not in path.parents:
+            raise ValueError(f"不正な画像のパスです: {name}")
+        return path.read_bytes()
+
+    def __exit__(self, *exc):
+        if self._tar is not None:
+            self._tar.close()
@@ -0,0 +1,198 @@
+"""Write-behind queue for generation history"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+
+# 画像エンコードの並列数
+DEFAULT_ENCODE_WORKERS = 2
+
+# 1トランザクションでまとめて書き込む最大件数
+DEFAULT_BATCH_SIZE = 8
+
+# 後続の保存を同じトランザクションにまとめるために待つ時間（秒）
+DEFAULT_BATCH_WINDOW = 0.05
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """履歴の非同期書き込み（ライトビハインド）
+
+    save_generation は画像をキューに積んで即座に戻ります。画像のエンコードと
+    サムネイル作成はスレッドプールで並列に行い、書き込みスレッドが
+    エンコードの終わった保存をまとめて1トランザクションでコミットします。
+    コミット後に on_saved で履歴IDを通知します（書き込みスレッドから呼ばれます）。
+    """
+
+    def __init__(
+        self,
+        history_manager,
+        on_saved: Optional[Callable[[List[int]], None]] = None,
+        encode_workers: int = DEFAULT_ENCODE_WORKERS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_window: float = DEFAULT_BATCH_WINDOW,
+    ):
+        """
+        Args:
+            history_manager: 書き込み先のHistoryManager
+            on_saved: コミット後に呼ばれる関数（そのトランザクションで保存した履歴IDのリスト）
+            encode_workers: 画像エンコードの並列数
+            batch_size: 1トランザクションの最大件数
+            batch_window: 後続の保存を待つ時間（秒）
+        """
+        self.history_manager = history_manager
+        self.on_saved = on_saved
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._encoder = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="history-encode")
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        """まだコミットされていない保存の数"""
+        with self._idle:
+            return self._pending
+
+    def save_generation(
+        self,
+        images: List[Image.Image],
+        parameters: Dict,
+        generation_mode: str = "variety",
+        angles: Optional[List[int]] = None,
+        tags: Optional[List[str]] = None,
+        notes: str = ""
+    ) -> Future:
+        """
+        生成結果の保存をキューに追加（HistoryManager.save_generationと同じ引数）
+
+        Returns:
+            コミット後に履歴IDを返すFuture
+        """
+        if self._closed:
+            raise RuntimeError("HistoryWriterは終了しています")
+
+        # 作成日時は保存を依頼した時点のものにする
+        entry = {
+            "parameters": parameters,
+            "generation_mode": generation_mode,
+            "angles": angles,
+            "tags": tags,
+            "notes": notes,
+            "created_at": datetime.now().isoformat(),
+        }
+        # エンコードはバッチを待たずにすぐ開始
+        encodes = [self._encoder.submit(self.history_manager.encode_image, img) for img in images]
+        future: Future = Future()
+
+        with self._idle:
+            self._pending += 1
+        self._queue.put((entry, encodes, future))
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        キューに積まれた保存がすべてコミットされるまで待つ
+
+        Args:
+            timeout: 最大待ち時間（秒、Noneの場合は無制限）
+
+        Returns:
+            すべてコミットされたか
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        残りの保存を書き込んでから終了
+
+        Args:
+            timeout: 最大待ち時間（秒、Noneの場合は無制限）
+
+        Returns:
+            すべてコミットされたか
+        """
+        if self._closed:
+            return self.pending == 0
+        self._closed = True
+
+        if self.pending:
+            print(f"[History] 未保存の履歴を書き込み中: {self.pending}件")
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._encoder.shutdown(wait=False)
+
+        flushed = self.pending == 0
+        if not flushed:
+            print(f"[History] 書き込みが終わらなかった履歴: {self.pending}件")
+        return flushed
+
+    def _run(self):
+        """書き込みスレッド"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            # 少しだけ待って、続けて届いた保存を同じトランザクションにまとめる
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+
+    def _write(self, batch: List):
+        """エンコードの完了を待ってまとめてコミット"""
+        ready = []
+        for entry, encodes, future in batch:
+            try:
+                entry["stored_images"] = [encode.result() for encode in encodes]
+                ready.append((entry, future))
+            except Exception as e:
+                print(f"[History] 画像のエンコードエラー: {e}")
+                future.set_exception(e)
+
+        history_ids = []
+        if ready:
+            try:
+                history_ids = self.history_manager.save_encoded([entry for entry, _ in ready])
+            except Exception as e:
+                print(f"[History] 履歴保存エラー: {e}")
+                for _, future in ready:
+                    future.set_exception(e)
+            else:
+                for (_, future), history_id in zip(ready, history_ids):
+                    future.set_result(history_id)
+
+        with self._idle:
+            self._pending -= len(batch)
+            self._idle.notify_all()
+
+        if history_ids and self.on_saved:
+            try:
+                self.on_saved(history_ids)
+            except Exception as e:
+                print(f"[History] 保存通知エラー: {e}")
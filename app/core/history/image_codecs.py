@@ -0,0 +1,106 @@
+"""Storage codecs and thumbnail pyramid for history images"""
+
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+from PIL import Image, features
+
+
+# 保存形式 → (PILの形式名, 保存オプション, 可逆か)
+CODECS: Dict[str, Tuple[str, Dict, bool]] = {
+    "png": ("PNG", {"compress_level": 6}, True),
+    "webp_lossless": ("WEBP", {"lossless": True, "quality": 80, "method": 4}, True),
+    "webp": ("WEBP", {"quality": 92, "method": 4}, False),
+    "jpeg": ("JPEG", {"quality": 92, "subsampling": 0, "optimize": True}, False),
+}
+
+DEFAULT_CODEC = "png"
+
+# 保存したファイルの画像形式（読み込み時に試す形式を限定する）
+STORED_FORMATS = tuple(dict.fromkeys(fmt for fmt, _, _ in CODECS.values()))
+
+# UIが実際に描画するサイズ（履歴リスト・標準サムネイル・ギャラリー）
+THUMBNAIL_SIZES = (60, 200, 400)
+
+# history_images.thumbnail_hash に記録する標準サムネイルのサイズ
+DEFAULT_THUMBNAIL_SIZE = 200
+
+# サムネイルは表示専用なので、使えればWebPで小さく保存
+THUMBNAIL_CODEC = "webp" if features.check("webp") else "png"
+
+
+def available_codecs() -> List[str]:
+    """このPILで使える保存形式"""
+    return [name for name, (fmt, _, _) in CODECS.items() if fmt != "WEBP" or features.check("webp")]
+
+
+def resolve_codec(codec: str) -> str:
+    """
+    保存形式名を確認（使えない形式はPNGにする）
+
+    Args:
+        codec: 保存形式名
+
+    Returns:
+        実際に使う保存形式名
+    """
+    codec = (codec or DEFAULT_CODEC).lower()
+    if codec not in CODECS:
+        print(f"[History] 未対応の保存形式です: {codec}（PNGで保存します）")
+        return DEFAULT_CODEC
+    if codec not in available_codecs():
+        print(f"[History] この環境では{codec}が使えません（PNGで保存します）")
+        return DEFAULT_CODEC
+    return codec
+
+
+def encode(image: Image.Image, codec: str) -> bytes:
+    """
+    画像を指定の形式でエンコード
+
+    Args:
+        image: 画像
+        codec: 保存形式名（CODECSのキー）
+
+    Returns:
+        エンコードしたバイト列
+    """
+    fmt, options, _ = CODECS[codec]
+
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        # JPEGは透過を持てないため白背景に合成
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    elif fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def thumbnail_pyramid(image: Image.Image, sizes=THUMBNAIL_SIZES) -> Dict[int, Image.Image]:
+    """
+    複数サイズのサムネイルを作成
+
+    大きいサイズから順に縮小し、次のサイズはその結果から作るため、
+    元画像を縮小するのは1回だけです。元画像より大きいサイズは作りません
+    （元画像をそのまま使います）。
+
+    Args:
+        image: 元画像
+        sizes: 長辺のサイズ（px）
+
+    Returns:
+        {サイズ: サムネイル}
+    """
+    pyramid = {}
+    source = image
+    for size in sorted(sizes, reverse=True):
+        thumb = source.copy()
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        pyramid[size] = thumb
+        source = thumb
+    return pyramid
@@ -0,0 +1,180 @@
+"""Perceptual hashing and Hamming-distance search for history images"""
+
+import threading
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+# DCTをかける縮小画像の一辺（px）
+PHASH_IMAGE_SIZE = 32
+
+# ハッシュに使う低周波成分の一辺（8x8 = 64ビット）
+PHASH_HASH_SIZE = 8
+
+# 「似ている」とみなす最大ハミング距離（64ビット中）
+SIMILAR_MAX_DISTANCE = 12
+
+# ほぼ同じ画像（重複）とみなす最大ハミング距離
+DUPLICATE_MAX_DISTANCE = 4
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """n点のDCT-II（正規直交）の変換行列"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+# 8ビットごとの立っているビット数（np.bitwise_countがないNumPy用）
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(image: Image.Image) -> int:
+    """
+    画像のperceptual hash（pHash、64ビット）
+
+    グレースケールの32x32に縮小してDCTをかけ、左上8x8の低周波成分が
+    中央値より大きいかを1ビットずつ並べます。縮小・再圧縮・わずかな色の
+    違いではほとんど変わらず、構図や被写体が違えば大きく変わります。
+
+    Args:
+        image: 画像
+
+    Returns:
+        符号なし64ビットの整数
+    """
+    gray = image.convert("L").resize(
+        (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0
+    )
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_HASH_SIZE, :PHASH_HASH_SIZE]
+    bits = (low > np.median(low)).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_db_hash(value: int) -> int:
+    """符号なし64ビットのハッシュを、SQLiteのINTEGER（符号付き）に収まる値に変換"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_db_hashes(values: Iterable[int]) -> np.ndarray:
+    """SQLiteから読んだハッシュを符号なし64ビットの配列に変換"""
+    return np.fromiter(values, dtype=np.int64).view(np.uint64)
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """
+    ハッシュの配列と1つのハッシュとのハミング距離
+
+    Args:
+        hashes: 符号なし64ビットの配列
+        query: 比較するハッシュ
+
+    Returns:
+        各ハッシュとの距離（0〜64）
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class SimilarityIndex:
+    """perceptual hashのメモリ上の索引
+
+    全画像のハッシュを1本のuint64配列に詰めて持ち、検索はXORとpopcountを
+    配列全体に1回かけるだけで行います（10万枚でも数ミリ秒）。
+    更新は配列を作り直して差し替えるため、検索はロックなしで行えます。
+    """
+
+    def __init__(self):
+        # (ハッシュ, 画像ID, 履歴ID) の配列の組（差し替えのみで、中身は変更しない）
+        self._arrays: Tuple[np.ndarray, np.ndarray, np.ndarray] = (
+            np.empty(0, dtype=np.uint64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._arrays[0])
+
+    def add(self, image_ids: Sequence[int], history_ids: Sequence[int], hashes: Sequence[int]):
+        """
+        画像を追加
+
+        Args:
+            image_ids: 画像IDのリスト
+            history_ids: 各画像の履歴ID
+            hashes: 各画像のハッシュ（符号なし）
+        """
+        if not len(hashes):
+            return
+        with self._lock:
+            old_hashes, old_image_ids, old_history_ids = self._arrays
+            self._arrays = (
+                np.concatenate([old_hashes, np.asarray(hashes, dtype=np.uint64)]),
+                np.concatenate([old_image_ids, np.asarray(image_ids, dtype=np.int64)]),
+                np.concatenate([old_history_ids, np.asarray(history_ids, dtype=np.int64)]),
+            )
+
+    def remove_histories(self, history_ids: Iterable[int]):
+        """
+        履歴の画像を取り除く
+
+        Args:
+            history_ids: 履歴IDのリスト
+        """
+        history_ids = np.fromiter(history_ids, dtype=np.int64)
+        with self._lock:
+            hashes, image_ids, owners = self._arrays
+            keep = ~np.isin(owners, history_ids)
+            self._arrays = (hashes[keep], image_ids[keep], owners[keep])
+
+    def search(
+        self,
+        queries: Sequence[int],
+        max_distance: int = SIMILAR_MAX_DISTANCE,
+        limit: int = 50,
+        exclude_history_ids: Iterable[int] = ()
+    ) -> List[Tuple[int, int]]:
+        """
+        似た画像を持つ履歴を検索
+
+        複数のハッシュを渡した場合は、いずれかとの最小距離で判定します。
+
+        Args:
+            queries: 比較するハッシュ（符号なし）
+            max_distance: 最大ハミング距離
+            limit: 返す履歴の最大数
+            exclude_history_ids: 結果から除く履歴ID
+
+        Returns:
+            (履歴ID, 距離) のリスト（距離の近い順、同じ距離なら新しい履歴から）
+        """
+        hashes, _, owners = self._arrays
+        if not len(hashes) or not len(queries):
+            return []
+
+        distances = hamming_distances(hashes, queries[0])
+        for query in queries[1:]:
+            np.minimum(distances, hamming_distances(hashes, query), out=distances)
+
+        matched = distances <= max_distance
+        exclude = np.fromiter(exclude_history_ids, dtype=np.int64)
+        if len(exclude):
+            matched &= ~np.isin(owners, exclude)
+        candidates = np.flatnonzero(matched)
+
+        # 距離の近い順（同じ距離は新しい履歴から）に並べ、履歴ごとに最初の1枚だけ残す
+        candidates = candidates[np.lexsort((-owners[candidates], distances[candidates]))]
+        _, first = np.unique(owners[candidates], return_index=True)
+        best = candidates[np.sort(first)][:limit]
+
+        return [(int(owners[i]), int(distances[i])) for i in best]
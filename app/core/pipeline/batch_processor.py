@@ -95,7 +95,9 @@ class BatchProcessor:
     def load_garments_from_directory(
         self,
         directory: str,
-        clothing_type: str = "TOP"
+        clothing_type: str = "TOP",
+        index=None,
+        progress_callback: Optional[Callable[[str, int], None]] = None
     ) -> List[ClothingItem]:
         """
         ディレクトリから衣類画像を一括読み込み
@@ -103,6 +105,8 @@ class BatchProcessor:
         Args:
             directory: ディレクトリパス
             clothing_type: 衣類タイプ（デフォルト: TOP）
+            index: GarmentIndex（指定時は分析済みの色・柄・描写を付与）
+            progress_callback: インデックス更新の進捗コールバック
         
         Returns:
             ClothingItemのリスト
@@ -121,16 +125,35 @@ class BatchProcessor:
             image_files.extend(dir_path.glob(f"*{ext}"))
             image_files.extend(dir_path.glob(f"*{ext.upper()}"))
         
+        # インデックスを更新（変更されたファイルのみ並列に分析）
+        entries = {}
+        if index is not None:
+            entries = index.scan(directory, clothing_type, progress_callback=progress_callback)
+        
         # ClothingItemを作成
         garments = []
         for img_file in image_files:
             try:
-                garment = ClothingItem(
-                    image_path=str(img_file),
-                    clothing_type=clothing_type,
-                    colors=[],
-                    analyzed_description=f"{clothing_type.lower()} garment from {img_file.name}"
-                )
+                entry = entries.get(str(img_file.resolve()))
+                if entry:
+                    garment = ClothingItem(
+                        image_path=str(img_file),
+                        clothing_type=clothing_type,
+                        colors=entry["colors"],
+                        pattern=entry["pattern"],
+                        analyzed_description=entry["description"],
+                        fingerprint={
+                            "content_hash": entry["content_hash"],
+                            "texture": entry["texture"],
+                        }
+                    )
+                else:
+                    garment = ClothingItem(
+                        image_path=str(img_file),
+                        clothing_type=clothing_type,
+                        colors=[],
+                        analyzed_description=f"{clothing_type.lower()} garment from {img_file.name}"
+                    )
                 garments.append(garment)
                 print(f"[Batch] 読み込み: {img_file.name}")
             except Exception as e:
@@ -0,0 +1,516 @@
+"""Region-limited chat edit session"""
+
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+
+# Geminiに送る画像の最大サイズ（長辺px）
+MAX_UPLOAD_SIZE = 1024
+
+# 切り出し範囲がこの割合を超える場合は画像全体を送る
+FULL_IMAGE_RATIO = 0.6
+
+# 編集に使うモデル
+EDIT_MODEL = "gemini-2.0-flash-exp-image-generation"
+
+# 候補ごとの追加指示（候補を並行生成する時に言い回しを変える）
+PROMPT_VARIANTS = [
+    "",
+    "Be as conservative as possible: change the fewest pixels needed.",
+    "Interpret the request naturally, as a professional photo retoucher would.",
+    "Keep lighting, textures and edges identical to the original wherever the request does not apply.",
+]
+
+# 領域ごとのキーワード（日本語・英語）
+# 日本語は部分一致で判定するため、1文字の語（手・指など）は熟語に含まれないものだけにする
+#（「手」は派手・上手、「指」は指示に一致してしまう）
+REGION_KEYWORDS: Dict[str, List[str]] = {
+    "head": [
+        "髪", "顔", "表情", "笑顔", "帽子", "メガネ", "眼鏡", "イヤリング", "ピアス", "メイク", "口紅",
+        "hair", "face", "smile", "expression", "hat", "cap", "glasses", "earring", "makeup", "lipstick",
+    ],
+    "feet": [
+        "靴", "足元", "スニーカー", "ブーツ", "サンダル", "ヒール", "靴下",
+        "shoe", "sneaker", "boot", "sandal", "heel", "sock", "feet",
+    ],
+    "hands": [
+        "手元", "両手", "片手", "右手", "左手", "手のひら", "手袋", "指先", "ネイル", "バッグ", "鞄", "時計", "ブレスレット", "指輪",
+        "hand", "finger", "nail", "bag", "watch", "bracelet", "ring",
+    ],
+    "lower": [
+        "パンツ", "ズボン", "スカート", "ジーンズ", "ショーツ", "ベルト",
+        "pants", "trousers", "skirt", "jeans", "shorts", "belt",
+    ],
+    "upper": [
+        "シャツ", "トップス", "ジャケット", "コート", "袖", "襟", "ネックレス", "ボタン", "セーター", "ニット",
+        "shirt", "top", "jacket", "coat", "sleeve", "collar", "necklace", "button", "sweater", "blouse",
+    ],
+}
+
+# 画像全体に関わる指示（これを含む場合は領域を絞らない）
+GLOBAL_KEYWORDS = [
+    "背景", "全体", "明る", "暗く", "照明", "ライティング", "ポーズ", "構図", "雰囲気", "色調",
+    "background", "whole", "entire", "bright", "dark", "lighting", "pose", "composition", "mood", "tone",
+]
+
+# 領域ごとに使うランドマーク
+REGION_LANDMARKS: Dict[str, List[str]] = {
+    "head": ["nose", "left_shoulder", "right_shoulder"],
+    "upper": ["left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+              "left_wrist", "right_wrist", "left_hip", "right_hip"],
+    "lower": ["left_hip", "right_hip", "left_knee", "right_knee", "left_ankle", "right_ankle"],
+    "feet": ["left_knee", "right_knee", "left_ankle", "right_ankle"],
+    "hands": ["left_elbow", "right_elbow", "left_wrist", "right_wrist"],
+}
+
+
+def detect_region(instruction: str) -> Optional[str]:
+    """
+    指示文から編集対象の体の領域を推定
+
+    Args:
+        instruction: ユーザーの指示文
+
+    Returns:
+        領域名（head, upper, lower, feet, hands）またはNone（画像全体）
+    """
+    text = instruction.lower()
+    if any(_contains(text, keyword) for keyword in GLOBAL_KEYWORDS):
+        return None
+
+    for region, keywords in REGION_KEYWORDS.items():
+        if any(_contains(text, keyword) for keyword in keywords):
+            return region
+    return None
+
+
+def _contains(text: str, keyword: str) -> bool:
+    """キーワードを含むか（英単語は単語の先頭で一致させる: hat が that に一致しないように）"""
+    if keyword.isascii():
+        return re.search(r"\b" + re.escape(keyword), text) is not None
+    return keyword in text
+
+
+def region_box(
+    region: str,
+    landmarks: Dict[str, Sequence[float]],
+    size: Tuple[int, int],
+    padding: float = 1.0,
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    ポーズランドマークから領域の切り出し範囲を計算
+
+    Args:
+        region: 領域名
+        landmarks: {名前: (x, y, z)}（0〜1の正規化座標）
+        size: 画像サイズ (width, height)
+        padding: 余白の倍率（0の場合は領域そのもの）
+
+    Returns:
+        (left, top, right, bottom) またはNone（ランドマークが足りない場合）
+    """
+    names = REGION_LANDMARKS.get(region, [])
+    if not names or any(name not in landmarks for name in names):
+        return None
+
+    width, height = size
+    points = np.array([landmarks[name][:2] for name in names], dtype=np.float32)
+    points *= (width, height)
+
+    shoulder_width = abs(
+        landmarks["left_shoulder"][0] - landmarks["right_shoulder"][0]
+    ) * width if "left_shoulder" in landmarks and "right_shoulder" in landmarks else 0.0
+
+    left, top = points.min(axis=0)
+    right, bottom = points.max(axis=0)
+
+    if region == "head":
+        # 鼻と肩から頭部全体（髪・帽子を含む）を推定
+        nose_x, nose_y = points[0]
+        half = max(shoulder_width * 0.8, width * 0.08)
+        left, right = nose_x - half, nose_x + half
+        top = nose_y - half * 1.5
+        bottom = points[1:, 1].max()
+
+    pad = max(right - left, bottom - top) * 0.2 + min(width, height) * 0.04
+    if region == "feet":
+        # 足首より下の靴を含める
+        top = (top + bottom) / 2
+        bottom += pad * 2
+    pad *= padding
+
+    box = (
+        max(0, int(left - pad)),
+        max(0, int(top - pad)),
+        min(width, int(np.ceil(right + pad))),
+        min(height, int(np.ceil(bottom + pad))),
+    )
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return None
+    return box
+
+
+class ChatEditSession:
+    """チャット編集セッション
+
+    genai.Clientとエンコード済みのベース画像を保持し、同じ画像への
+    連続した指示で再作成・再エンコードしないようにします。体の一部だけを
+    対象とする指示では、その領域だけを切り出して送信し、結果を元の画像に
+    貼り戻します。
+    """
+
+    def __init__(self, api_key: str, feather_radius: int = 8):
+        """
+        Args:
+            api_key: Gemini APIキー
+            feather_radius: 貼り戻し時の境界ぼかし半径（px）
+        """
+        self.api_key = api_key
+        self.feather_radius = feather_radius
+        self.last_edit_info: Dict = {}
+
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._base_image: Optional[Image.Image] = None
+        self._base_hash: Optional[str] = None
+        self._landmarks: Optional[Dict] = None
+        self._landmarks_ready = False
+        self._encoded: Dict[Optional[Tuple[int, int, int, int]], Tuple[bytes, Tuple[int, int]]] = {}
+
+    @property
+    def base_image(self) -> Optional[Image.Image]:
+        """現在のベース画像"""
+        return self._base_image
+
+    def set_base_image(self, image: Image.Image):
+        """
+        ベース画像を設定（同じ画像なら何もしない）
+
+        Args:
+            image: 編集対象の画像
+        """
+        image = image.convert('RGB')
+        image_hash = hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+        image_hash += f":{image.width}x{image.height}"
+        if image_hash == self._base_hash:
+            return
+
+        self._base_image = image
+        self._base_hash = image_hash
+        self._landmarks = None
+        self._landmarks_ready = False
+        self._encoded.clear()
+
+    def set_landmarks(self, landmarks: Optional[Dict]):
+        """ベース画像のポーズランドマークを設定（正規化座標）"""
+        self._landmarks = landmarks
+        self._landmarks_ready = True
+
+    def edit(
+        self,
+        instruction: str,
+        mask: Optional[Image.Image] = None,
+    ) -> Optional[Image.Image]:
+        """
+        ベース画像を編集
+
+        Args:
+            instruction: ユーザーの指示
+            mask: 編集範囲を示すブラシマスク（Noneの場合は指示とポーズから推定）
+
+        Returns:
+            編集後の画像（ベース画像と同じサイズ）、失敗時はNone
+        """
+        plan = self._plan(instruction, mask)
+        img_bytes, _ = self._encode(plan["crop_box"])
+
+        edited = self._generate(img_bytes, self._build_prompt(instruction, plan["crop_box"] is not None))
+        if edited is None:
+            return None
+        return self._apply(edited.convert('RGB'), plan)
+
+    def edit_candidates(
+        self,
+        instruction: str,
+        count: int = 3,
+        mask: Optional[Image.Image] = None,
+        on_candidate: Optional[Callable[[Image.Image, float, int], None]] = None,
+    ) -> List[Tuple[Image.Image, float]]:
+        """
+        言い回しを変えた編集リクエストを並行して送り、複数の候補を作成
+
+        候補は指示の対象領域の外がどれだけ変化したか（ベース画像との平均画素差）で
+        評価し、変化が少ない順に並べます。
+
+        Args:
+            instruction: ユーザーの指示
+            count: 候補数
+            mask: 編集範囲を示すブラシマスク
+            on_candidate: 候補が届くたびに呼ばれる関数 (画像, スコア, 候補番号)
+
+        Returns:
+            [(画像, スコア)] スコアの小さい順（失敗した候補は含まない）
+        """
+        plan = self._plan(instruction, mask)
+        img_bytes, _ = self._encode(plan["crop_box"])
+        cropped = plan["crop_box"] is not None
+        prompts = [self._build_prompt(instruction, cropped, variant) for variant in range(count)]
+
+        candidates = []
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = {
+                executor.submit(self._generate, img_bytes, prompt): index
+                for index, prompt in enumerate(prompts)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    edited = future.result()
+                except Exception as e:
+                    print(f"[Chat Edit] 候補{index + 1}の生成エラー: {e}")
+                    continue
+                if edited is None:
+                    continue
+
+                result = self._apply(edited.convert('RGB'), plan)
+                score = self._change_score(result, plan)
+                print(f"[Chat Edit] 候補{index + 1}を受信 (領域外の変化: {score:.2f})")
+                candidates.append((result, score))
+                if on_candidate:
+                    on_candidate(result, score, index)
+
+        candidates.sort(key=lambda candidate: candidate[1])
+        self.last_edit_info["scores"] = [score for _, score in candidates]
+        return candidates
+
+    def _plan(self, instruction: str, mask: Optional[Image.Image]) -> Dict:
+        """送信範囲と評価範囲を決める"""
+        if self._base_image is None:
+            raise ValueError("ベース画像が設定されていません")
+
+        image = self._base_image
+        focus_box = None
+        if mask is not None:
+            mask = mask.convert('L')
+            if mask.size != image.size:
+                mask = mask.resize(image.size, Image.Resampling.NEAREST)
+            crop_box = self._mask_box(mask)
+            region = "mask"
+        else:
+            region = detect_region(instruction)
+            crop_box = None
+            if region is not None:
+                landmarks = self._get_landmarks()
+                if landmarks:
+                    crop_box = region_box(region, landmarks, image.size)
+                    focus_box = region_box(region, landmarks, image.size, padding=0.0)
+
+        if crop_box is not None:
+            crop_area = (crop_box[2] - crop_box[0]) * (crop_box[3] - crop_box[1])
+            if crop_area > image.width * image.height * FULL_IMAGE_RATIO:
+                crop_box = None
+
+        img_bytes, upload_size = self._encode(crop_box)
+        self.last_edit_info = {
+            "region": region if crop_box is not None else None,
+            "crop_box": list(crop_box) if crop_box is not None else None,
+            "upload_size": list(upload_size),
+            "upload_bytes": len(img_bytes),
+        }
+        print(
+            f"[Chat Edit] 送信: {upload_size[0]}x{upload_size[1]} "
+            f"({len(img_bytes) // 1024}KB, 領域: {self.last_edit_info['region'] or '全体'})"
+        )
+
+        return {"crop_box": crop_box, "mask": mask, "focus_box": focus_box}
+
+    def _apply(self, edited: Image.Image, plan: Dict) -> Image.Image:
+        """編集結果をベース画像と同じサイズの画像にする"""
+        image = self._base_image
+        crop_box, mask = plan["crop_box"], plan["mask"]
+
+        if crop_box is None:
+            if mask is not None and mask.getbbox() is not None:
+                # 全体を送った場合もブラシ範囲の外は元画像のまま
+                return self._composite(edited, (0, 0, image.width, image.height), mask)
+            if edited.size != image.size:
+                edited = edited.resize(image.size, Image.Resampling.LANCZOS)
+            return edited
+
+        return self._composite(edited, crop_box, mask)
+
+    def _change_score(self, result: Image.Image, plan: Dict, max_size: int = 256) -> float:
+        """
+        指示の対象領域の外の変化量（0〜255の平均画素差、小さいほど良い）
+
+        切り出して編集した場合は切り出し範囲内、全体を編集した場合は画像全体を
+        縮小して比較します。対象領域（ブラシマスクやランドマークの範囲）は除外します。
+        """
+        box = plan["crop_box"] or (0, 0, self._base_image.width, self._base_image.height)
+        base = self._base_image.crop(box)
+        edited = result.crop(box)
+
+        ignore = Image.new('L', base.size, 0)
+        if plan["mask"] is not None:
+            # 貼り戻し時のぼかしが及ぶ範囲も対象領域とみなす
+            ignore = plan["mask"].crop(box).filter(ImageFilter.GaussianBlur(self.feather_radius * 2))
+            ignore = ignore.point(lambda v: 255 if v > 0 else 0)
+        elif plan["focus_box"] is not None:
+            fx1, fy1, fx2, fy2 = plan["focus_box"]
+            ignore.paste(255, (fx1 - box[0], fy1 - box[1], fx2 - box[0], fy2 - box[1]))
+
+        scale = min(1.0, max_size / max(base.size))
+        if scale < 1.0:
+            size = (max(1, int(base.width * scale)), max(1, int(base.height * scale)))
+            base = base.resize(size, Image.Resampling.BILINEAR)
+            edited = edited.resize(size, Image.Resampling.BILINEAR)
+            ignore = ignore.resize(size, Image.Resampling.BILINEAR)
+
+        diff = np.abs(
+            np.asarray(edited, dtype=np.int16) - np.asarray(base, dtype=np.int16)
+        ).mean(axis=2)
+        weight = 1.0 - np.asarray(ignore, dtype=np.float32) / 255.0
+        total = weight.sum()
+        if total <= 0:
+            return 0.0
+        return float((diff * weight).sum() / total)
+
+    def close(self):
+        """保持しているクライアントと画像を解放"""
+        self._client = None
+        self._base_image = None
+        self._base_hash = None
+        self._encoded.clear()
+
+    def _get_client(self):
+        """genai.Clientを取得（初回のみ作成）"""
+        with self._client_lock:
+            if self._client is None:
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+            return self._client
+
+    def _get_landmarks(self) -> Optional[Dict]:
+        """ベース画像のポーズランドマーク（初回のみ検出）"""
+        if not self._landmarks_ready:
+            try:
+                from core.vton.pose_extractor import get_pose_extractor
+                extractor = get_pose_extractor()
+                if extractor.mediapipe_available:
+                    self._landmarks = extractor._detect_landmarks(np.asarray(self._base_image))
+            except Exception as e:
+                print(f"[Chat Edit] ポーズ検出エラー: {e}")
+            self._landmarks_ready = True
+        return self._landmarks
+
+    def _encode(self, crop_box: Optional[Tuple[int, int, int, int]]) -> Tuple[bytes, Tuple[int, int]]:
+        """送信用PNGを作成（同じ範囲はキャッシュを使う）"""
+        cached = self._encoded.get(crop_box)
+        if cached is not None:
+            return cached
+
+        image = self._base_image if crop_box is None else self._base_image.crop(crop_box)
+        if max(image.size) > MAX_UPLOAD_SIZE:
+            ratio = MAX_UPLOAD_SIZE / max(image.size)
+            new_size = tuple(max(1, int(dim * ratio)) for dim in image.size)
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        result = (buffer.getvalue(), image.size)
+        self._encoded[crop_box] = result
+        return result
+
+    def _mask_box(self, mask: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """ブラシマスクの外接矩形に余白を加えた範囲"""
+        bbox = mask.point(lambda v: 255 if v > 0 else 0).getbbox()
+        if bbox is None:
+            return None
+        left, top, right, bottom = bbox
+        pad = max(right - left, bottom - top) // 5 + self.feather_radius * 2
+        return (
+            max(0, left - pad),
+            max(0, top - pad),
+            min(mask.width, right + pad),
+            min(mask.height, bottom + pad),
+        )
+
+    def _composite(
+        self,
+        edited: Image.Image,
+        crop_box: Tuple[int, int, int, int],
+        mask: Optional[Image.Image],
+    ) -> Image.Image:
+        """編集した切り出し画像をベース画像に貼り戻す"""
+        crop_size = (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1])
+        if edited.size != crop_size:
+            edited = edited.resize(crop_size, Image.Resampling.LANCZOS)
+
+        if mask is not None:
+            alpha = mask.crop(crop_box)
+        else:
+            # 矩形の内側を不透明にし、端に向かって滑らかに元画像へ戻す
+            inset = self.feather_radius * 2
+            alpha = Image.new('L', crop_size, 0)
+            alpha.paste(255, (inset, inset, max(inset, crop_size[0] - inset), max(inset, crop_size[1] - inset)))
+        alpha = alpha.filter(ImageFilter.GaussianBlur(self.feather_radius))
+
+        blended = Image.composite(edited, self._base_image.crop(crop_box), alpha)
+        result = self._base_image.copy()
+        result.paste(blended, crop_box[:2])
+        return result
+
+    @staticmethod
+    def _build_prompt(instruction: str, cropped: bool, variant: int = 0) -> str:
+        """編集プロンプトを構築（variantで候補ごとに言い回しを変える）"""
+        scope = (
+            "This is a cropped detail of a larger photograph. Keep the framing and scale exactly the same."
+            if cropped else
+            "Keep the EXACT same camera angle."
+        )
+        return f"""
+Make a minor edit to this photograph.
+
+USER REQUEST: {instruction}
+
+STRICT REQUIREMENTS:
+1. Keep the EXACT same person (identical face and body)
+2. Keep the EXACT same outfit (same clothes, same style, same colors)
+3. Keep the EXACT same pose and body position
+4. {scope}
+5. Apply ONLY the change requested above - nothing else
+{PROMPT_VARIANTS[variant % len(PROMPT_VARIANTS)]}
+Output the edited photograph.
+"""
+
+    def _generate(self, img_bytes: bytes, prompt: str) -> Optional[Image.Image]:
+        """Geminiに画像と指示を送信して編集結果を取得"""
+        from google.genai import types
+
+        client = self._get_client()
+        response = client.models.generate_content(
+            model=EDIT_MODEL,
+            contents=[
+                types.Part.from_bytes(data=img_bytes, mime_type="image/png"),
+                prompt
+            ],
+            config=types.GenerateContentConfig(
+                response_modalities=["TEXT", "IMAGE"]
+            )
+        )
+
+        for candidate in response.candidates or []:
+            if candidate.content and candidate.content.parts:
+                for part in candidate.content.parts:
+                    if part.inline_data and part.inline_data.data:
+                        return Image.open(BytesIO(part.inline_data.data))
+
+        print(f"[Chat Edit] 画像が生成されませんでした: {response}")
+        return None
@@ -1,12 +1,33 @@
 """Chat instruction parser using Gemini API"""
 
-import google.generativeai as genai
+import copy
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional
 import json
 
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+from core.pipeline.local_instruction_parser import LocalInstructionParser, normalize_instruction
+
+
+# 解析結果キャッシュの最大件数
+PARSE_CACHE_SIZE = 256
+
+# キャッシュキーに含めるパラメータ
+CACHE_PARAM_KEYS = ("gender", "age_range", "ethnicity", "body_type", "pose", "background")
+
 
 class ChatInstructionParser:
-    """チャット指示を解析してパラメータ変更を抽出"""
+    """チャット指示を解析してパラメータ変更を抽出
+    
+    定型的な指示はローカルのキーワード辞書で即座に解析し、
+    解釈できない指示だけをGeminiに送ります。解析結果は正規化した指示文と
+    現在のパラメータをキーにキャッシュします。
+    """
     
     def __init__(self, api_key: str):
         """
@@ -14,9 +35,18 @@ class ChatInstructionParser:
             api_key: Google Generative AI APIキー
         """
         self.api_key = api_key
-        genai.configure(api_key=api_key)
-        # 通常の画像生成と同じモデルを使用（クォータ共有）
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = None
+        if genai is not None:
+            genai.configure(api_key=api_key)
+            # 通常の画像生成と同じモデルを使用（クォータ共有）
+            self.model = genai.GenerativeModel('gemini-2.0-flash')
+        
+        self.local_parser = LocalInstructionParser()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.local_parses = 0
+        self._cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def parse_instruction(
         self,
@@ -35,6 +65,27 @@ class ChatInstructionParser:
         Returns:
             変更すべきパラメータの辞書
         """
+        cache_key = self._cache_key(instruction, current_params)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            print(f"[Chat Parser] キャッシュから解析結果を取得: {cached['changes']}")
+            return cached
+        
+        # 定型的な指示はローカルで解析（ネットワーク不要）
+        modifications = self.local_parser.parse(instruction, current_params)
+        if modifications is not None:
+            self.local_parses += 1
+            print(f"[Chat Parser] ローカル解析結果: {modifications}")
+            self._put_cached(cache_key, modifications)
+            return copy.deepcopy(modifications)
+        
+        if self.model is None:
+            print("[Chat Parser] google-generativeaiが利用できないため、指示をそのまま使用します")
+            return {
+                "changes": {"prompt_additions": instruction},
+                "ai_response": f"「{instruction}」という指示を反映して画像を再生成します。"
+            }
+        
         # プロンプトを構築
         prompt = self._build_analysis_prompt(instruction, current_params, conversation_history)
         
@@ -43,7 +94,7 @@ class ChatInstructionParser:
             response = self.model.generate_content(prompt)
             
             # デバッグ: 生のレスポンスを出力
-            print(f"[Chat Parser] Gemini生レスポンス:")
+            print("[Chat Parser] Gemini生レスポンス:")
             print(f"{response.text[:500]}...")
             
             # レスポンスをパース
@@ -51,7 +102,10 @@ class ChatInstructionParser:
             
             print(f"[Chat Parser] 解析結果: {modifications}")
             
-            return modifications
+            if not modifications.pop("_fallback", False):
+                self._put_cached(cache_key, modifications)
+            
+            return copy.deepcopy(modifications)
         
         except Exception as e:
             print(f"[Chat Parser] エラー: {e}")
@@ -61,6 +115,46 @@ class ChatInstructionParser:
                 "ai_response": f"「{instruction}」という指示を反映して画像を再生成します。"
             }
     
+    def cache_stats(self) -> Dict[str, int]:
+        """キャッシュのヒット数・ミス数・ローカル解析数"""
+        with self._cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "local": self.local_parses,
+                "size": len(self._cache),
+            }
+    
+    def clear_cache(self):
+        """解析結果のキャッシュをクリア"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    @staticmethod
+    def _cache_key(instruction: str, current_params: Dict) -> tuple:
+        """正規化した指示文と現在のパラメータからキャッシュキーを作成"""
+        params = tuple(str(current_params.get(key)) for key in CACHE_PARAM_KEYS)
+        return (normalize_instruction(instruction),) + params
+    
+    def _get_cached(self, cache_key: tuple) -> Optional[Dict]:
+        """キャッシュから取得（LRU順を更新）"""
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+            if cached is None:
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(cache_key)
+            self.cache_hits += 1
+            return copy.deepcopy(cached)
+    
+    def _put_cached(self, cache_key: tuple, modifications: Dict):
+        """キャッシュに保存（古いものから破棄）"""
+        with self._cache_lock:
+            self._cache[cache_key] = copy.deepcopy(modifications)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > PARSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
     def _build_analysis_prompt(
         self,
         instruction: str,
@@ -155,12 +249,13 @@ class ChatInstructionParser:
             print(f"[Chat Parser] JSONパースエラー: {e}")
             print(f"[Chat Parser] レスポンス: {response_text}")
             
-            # フォールバック: プロンプトに直接追加
+            # フォールバック: プロンプトに直接追加（キャッシュしない）
             return {
                 "changes": {
                     "prompt_additions": response_text[:200]  # 最初の200文字
                 },
-                "ai_response": "指示を反映して画像を再生成します。"
+                "ai_response": "指示を反映して画像を再生成します。",
+                "_fallback": True
             }
     
     def apply_modifications(
@@ -2,6 +2,7 @@
 
 import copy
 import sys
+from collections import deque
 from typing import Dict, List, Tuple, Optional
 from PIL import Image
 from pathlib import Path
@@ -14,6 +15,12 @@ from app.models.clothing_item import ClothingItem
 from app.models.model_attributes import ModelAttributes
 from app.models.generation_config import GenerationConfig
 from app.core.pipeline.chat_instruction_parser import ChatInstructionParser
+from app.core.pipeline.chat_edit_session import ChatEditSession
+from app.core.pipeline.version_tree import VersionTree, image_hash
+
+
+# 保持する修正履歴の件数（古いものから破棄）
+REFINEMENT_HISTORY_LIMIT = 100
 
 
 class ChatRefinementService:
@@ -26,7 +33,12 @@ class ChatRefinementService:
         """
         self.api_key = api_key  # APIキーを保存
         self.parser = ChatInstructionParser(api_key)
-        self.refinement_history: List[Dict] = []
+        self.refinement_history = deque(maxlen=REFINEMENT_HISTORY_LIMIT)
+        # 同じ画像への連続した編集でクライアントとエンコード結果を使い回す
+        self.edit_session = ChatEditSession(api_key)
+        # 選択画像ごとの修正バージョン（差分タイルで保持）
+        self.version_tree: Optional[VersionTree] = None
+        self.last_candidate_versions: Dict[int, int] = {}
     
     async def refine_image(
         self,
@@ -49,6 +61,7 @@ class ChatRefinementService:
             base_model_attrs: ベースモデル属性
             base_config: ベース生成設定
             conversation_history: 会話履歴
+            base_image: 修正対象の画像
             progress_callback: 進捗コールバック
         
         Returns:
@@ -68,16 +81,22 @@ class ChatRefinementService:
         
         # 修正対象の画像がある場合は、それをGeminiに送信して編集
         if base_image:
-            print(f"[Chat Refinement] 画像編集モード: 選択画像をベースに修正")
+            print(f"[Chat Refinement] 画像編集モード: 選択画像の現在のバージョンをベースに修正")
+            
+            tree = self._version_tree_for(base_image)
+            parent_id = tree.current_id
             
             # Geminiに画像を送信して編集指示（APIを1回だけ呼ぶ）
             images = await self._edit_with_gemini(
-                base_image,
+                tree.get_image(),
                 instruction,
                 changes,
                 generate_service.adapter
             )
-            metadata = {"method": "gemini_edit"}
+            metadata = {"method": "gemini_edit", "edit": dict(self.edit_session.last_edit_info)}
+            if images:
+                metadata["version"] = tree.add(images[0], instruction)
+                metadata["parent_version"] = parent_id
         else:
             # 修正対象画像がない場合は再生成（ベースのmodel_attrsを使用）
             print(f"[Chat Refinement] 再生成モード: 1から生成")
@@ -107,13 +126,139 @@ class ChatRefinementService:
         
         return images, ai_response, metadata
     
+    async def refine_candidates(
+        self,
+        instruction: str,
+        base_image: Image.Image,
+        num_candidates: int = 3,
+        candidate_callback=None,
+        progress_callback=None
+    ) -> Tuple[List[Image.Image], str, Dict]:
+        """
+        複数の編集候補を並行して生成
+        
+        Args:
+            instruction: ユーザーの修正指示
+            base_image: 修正対象の画像
+            num_candidates: 候補数
+            candidate_callback: 候補が届くたびに呼ばれる関数 (画像, スコア, 候補番号)
+            progress_callback: 進捗コールバック
+        
+        Returns:
+            (候補画像リスト（領域外の変化が少ない順）, AI応答メッセージ, メタデータ)
+        """
+        print(f"\n[Chat Refinement] ユーザー指示: {instruction} (候補{num_candidates}件)")
+        
+        if progress_callback:
+            progress_callback(f"{num_candidates}件の候補を生成しています...", 20)
+        
+        received = []
+        tree = self._version_tree_for(base_image)
+        parent_id = tree.current_id
+        versions: Dict[int, int] = {}
+        
+        def on_candidate(image, score, index):
+            received.append(index)
+            # 候補はすべて同じ親からの分岐として残す
+            versions[id(image)] = tree.add(
+                image, instruction, parent_id=parent_id,
+                metadata={"score": score, "candidate": index}, make_current=False
+            )
+            self.last_candidate_versions[index] = versions[id(image)]
+            if progress_callback:
+                percentage = 20 + int(75 * len(received) / num_candidates)
+                progress_callback(f"候補を受信しました ({len(received)}/{num_candidates})", percentage)
+            if candidate_callback:
+                candidate_callback(image, score, index)
+        
+        self.last_candidate_versions = {}
+        try:
+            self.edit_session.set_base_image(tree.get_image())
+            candidates = self.edit_session.edit_candidates(
+                instruction,
+                count=num_candidates,
+                on_candidate=on_candidate
+            )
+        except Exception as e:
+            print(f"[Chat Refinement] 候補生成エラー: {e}")
+            candidates = []
+        
+        images = [image for image, _ in candidates]
+        scores = [score for _, score in candidates]
+        if images:
+            tree.checkout(versions[id(images[0])])
+        
+        if images:
+            ai_response = (
+                f"「{instruction}」の候補を{len(images)}件作成しました。"
+                f"指示した部分以外の変化が最も少ない候補を採用しています。"
+            )
+        else:
+            ai_response = f"「{instruction}」の候補を作成できませんでした。"
+        
+        changes = {"instruction": instruction}
+        self.refinement_history.append({
+            "instruction": instruction,
+            "changes": changes,
+            "ai_response": ai_response,
+            "result": "success" if images else "failed"
+        })
+        
+        metadata = {
+            "method": "gemini_edit_candidates",
+            "edit": dict(self.edit_session.last_edit_info),
+            "scores": scores,
+            "refinement": {
+                "instruction": instruction,
+                "changes": changes,
+                "history_count": len(self.refinement_history)
+            }
+        }
+        
+        return images, ai_response, metadata
+    
+    def adopt_candidate(self, index: int) -> Optional[Image.Image]:
+        """
+        直前に生成した候補を現在のバージョンにする
+        
+        Args:
+            index: 候補番号
+        
+        Returns:
+            候補の画像（見つからない場合はNone）
+        """
+        node_id = self.last_candidate_versions.get(index)
+        if self.version_tree is None or node_id is None:
+            return None
+        return self.version_tree.checkout(node_id)
+    
+    def undo(self) -> Optional[Image.Image]:
+        """
+        1つ前のバージョンに戻す
+        
+        Returns:
+            戻った先の画像（これ以上戻れない場合はNone）
+        """
+        if self.version_tree is None:
+            return None
+        return self.version_tree.undo()
+    
     def get_refinement_history(self) -> List[Dict]:
         """修正履歴を取得"""
-        return self.refinement_history.copy()
+        return list(self.refinement_history)
     
     def clear_history(self):
         """履歴をクリア"""
-        self.refinement_history = []
+        self.refinement_history.clear()
+        self.version_tree = None
+        self.last_candidate_versions = {}
+    
+    def _version_tree_for(self, base_image: Image.Image) -> VersionTree:
+        """選択画像のバージョンツリーを取得（別の画像が選ばれたら作り直す）"""
+        if self.version_tree is None or self.version_tree.base_hash != image_hash(base_image.convert('RGB')):
+            self.version_tree = VersionTree(base_image)
+            self.last_candidate_versions = {}
+        return self.version_tree
     
     async def _edit_with_gemini(
         self,
@@ -124,6 +269,8 @@ class ChatRefinementService:
     ) -> List[Image.Image]:
         """Geminiを使用して画像を編集
 
+        体の一部への指示は、その領域だけを送信して元の画像に貼り戻します。
+
         Args:
             base_image: 編集対象の画像
             instruction: ユーザーの指示
@@ -133,83 +280,21 @@ class ChatRefinementService:
         Returns:
             編集された画像のリスト
         """
-        from google import genai
-        from google.genai import types
-
         print(f"[Chat Refinement] Geminiで画像編集: {instruction}")
         print(f"[Chat Refinement] 元の画像サイズ: {base_image.size}")
 
         try:
-            # 画像をリサイズ（トークン数を削減）
-            max_size = 1024
-            if max(base_image.size) > max_size:
-                ratio = max_size / max(base_image.size)
-                new_size = tuple(int(dim * ratio) for dim in base_image.size)
-                base_image = base_image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"[Chat Refinement] リサイズ後: {base_image.size}")
-
-            # RGBに変換（PNG等の形式問題を回避）
-            if base_image.mode != 'RGB':
-                base_image = base_image.convert('RGB')
-                print(f"[Chat Refinement] RGBに変換")
-
-            # 新しいSDK（google-genai）を使用
-            client = genai.Client(api_key=self.api_key)
-
-            # プロンプトを構築 - 元画像の維持を明確に指示
-            edit_prompt = f"""
-Make a minor edit to this photograph.
-
-USER REQUEST: {instruction}
-
-STRICT REQUIREMENTS:
-1. Keep the EXACT same person (identical face and body)
-2. Keep the EXACT same outfit (same clothes, same style, same colors)
-3. Keep the EXACT same pose and body position
-4. Keep the EXACT same camera angle
-5. Apply ONLY the change requested above - nothing else
-
-Output the edited photograph.
-"""
-
-            print(f"[Chat Refinement] Gemini編集プロンプト: {edit_prompt[:200]}...")
-
-            # 画像をバイト列に変換
-            from io import BytesIO
-            img_buffer = BytesIO()
-            base_image.save(img_buffer, format='PNG')
-            img_bytes = img_buffer.getvalue()
+            self.edit_session.set_base_image(base_image)
 
             print(f"[Chat Refinement] Gemini APIを呼び出し中...")
+            edited_image = self.edit_session.edit(instruction)
 
-            # Gemini 3 Pro Imageで画像編集
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-exp-image-generation",
-                contents=[
-                    types.Part.from_bytes(data=img_bytes, mime_type="image/png"),
-                    edit_prompt
-                ],
-                config=types.GenerateContentConfig(
-                    response_modalities=["TEXT", "IMAGE"]
-                )
-            )
-
-            print(f"[Chat Refinement] Gemini APIレスポンス受信")
+            if edited_image is None:
+                print(f"[Chat Refinement] 画像が生成されませんでした")
+                return []
 
-            # レスポンスから画像を取得
-            if response.candidates:
-                print(f"[Chat Refinement] candidates数: {len(response.candidates)}")
-                for candidate in response.candidates:
-                    if candidate.content and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if part.inline_data and part.inline_data.data:
-                                edited_image = Image.open(BytesIO(part.inline_data.data))
-                                print(f"[Chat Refinement] 画像編集成功")
-                                return [edited_image]
-
-            print(f"[Chat Refinement] 画像が生成されませんでした")
-            print(f"[Chat Refinement] response: {response}")
-            return []
+            print(f"[Chat Refinement] 画像編集成功")
+            return [edited_image]
 
         except Exception as e:
             print(f"[Chat Refinement] Gemini編集エラー: {e}")
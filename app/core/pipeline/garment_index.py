@@ -0,0 +1,367 @@
+"""Persistent garment analysis index for catalog directories"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from core.vton.clothing_analyzer import ClothingAnalyzer
+
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+# プロセスプールを使う最小件数（これ未満はプロセス起動コストの方が大きい）
+MIN_PARALLEL_ITEMS = 4
+
+# 何件ごとにコミットするか
+COMMIT_INTERVAL = 100
+
+# ワーカープロセス内で使い回すアナライザー
+_worker_analyzer: Optional[ClothingAnalyzer] = None
+
+
+def _analyze_file(image_path: str, clothing_type: str) -> Dict:
+    """1ファイルを分析（プロセスプールのワーカーで実行）
+
+    Args:
+        image_path: 衣類画像のパス
+        clothing_type: 衣類タイプ
+
+    Returns:
+        {colors, pattern, texture, description} または {error}
+    """
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = ClothingAnalyzer()
+
+    try:
+        features = _worker_analyzer.analyze_clothing(image_path)
+        return {
+            "colors": features["colors"],
+            "pattern": features["pattern"],
+            "texture": features["texture"],
+            "description": _worker_analyzer.generate_detailed_description(
+                features, clothing_type
+            ),
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def file_content_hash(image_path: str) -> str:
+    """ファイル内容のハッシュ（BLAKE2b）"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GarmentIndex:
+    """衣類カタログの分析インデックス
+
+    ディレクトリ内の衣類画像を並列に分析し、結果をパスと内容ハッシュで
+    SQLiteに保存します。再スキャン時は変更されたファイルだけを分析します。
+    """
+
+    def __init__(self, db_path: str = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            db_path: インデックスDBのパス（Noneの場合はデフォルト）
+            max_workers: 分析プロセス数（Noneの場合はCPU数、1の場合は同一プロセスで実行）
+        """
+        if db_path is None:
+            app_data = Path.home() / "AppData" / "Local" / "VirtualFashionTryOn"
+            app_data.mkdir(parents=True, exist_ok=True)
+            db_path = str(app_data / "garment_index.db")
+
+        self.db_path = db_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.conn = None
+        self.last_scan_stats: Dict[str, int] = {}
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """データベースを初期化"""
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS garment_index (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                clothing_type TEXT NOT NULL,
+                colors TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                texture TEXT NOT NULL,
+                description TEXT NOT NULL,
+                analyzed_at TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_garment_hash
+            ON garment_index(content_hash)
+        """)
+        self.conn.commit()
+
+    def scan(
+        self,
+        directory: str,
+        clothing_type: str = "TOP",
+        recursive: bool = False,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+    ) -> Dict[str, Dict]:
+        """
+        ディレクトリをスキャンしてインデックスを更新
+
+        サイズと更新日時が変わっていないファイルは読み込まず、内容ハッシュが
+        既存エントリと一致するファイル（コピー・移動）は分析結果を再利用します。
+        ディレクトリから消えたファイルのエントリは削除されます。
+
+        Args:
+            directory: 衣類画像のディレクトリ
+            clothing_type: 衣類タイプ
+            recursive: サブディレクトリも対象にするか
+            progress_callback: 進捗コールバック (メッセージ, パーセント)
+
+        Returns:
+            {パス: エントリ} の辞書（ディレクトリ内の全画像）
+        """
+        dir_path = Path(directory).resolve()
+        if not dir_path.exists():
+            print(f"[Garment Index] ディレクトリが見つかりません: {directory}")
+            return {}
+
+        pattern = "**/*" if recursive else "*"
+        files = sorted(
+            p for p in dir_path.glob(pattern)
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+        )
+
+        stats = {"total": len(files), "unchanged": 0, "reused": 0, "analyzed": 0,
+                 "failed": 0, "removed": 0}
+        existing = self._load_entries_under(dir_path, recursive)
+        pending = []  # (path, content_hash, size, mtime_ns)
+
+        for file_path in files:
+            path = str(file_path)
+            stat = file_path.stat()
+            entry = existing.get(path)
+
+            if (
+                entry
+                and entry["file_size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                if entry["clothing_type"] != clothing_type:
+                    self._retype_entry(entry, clothing_type)
+                stats["unchanged"] += 1
+                continue
+
+            content_hash = file_content_hash(path)
+            source = self._find_by_hash(content_hash)
+            if source:
+                # 内容が同じエントリの分析結果を再利用
+                self._upsert(path, content_hash, stat.st_size, stat.st_mtime_ns,
+                             clothing_type, source)
+                stats["reused"] += 1
+                continue
+
+            pending.append((path, content_hash, stat.st_size, stat.st_mtime_ns))
+
+        if pending:
+            print(f"[Garment Index] {len(pending)}/{len(files)}枚を分析します")
+            self._analyze_pending(pending, clothing_type, stats, progress_callback)
+
+        # 消えたファイルのエントリを削除
+        current_paths = {str(p) for p in files}
+        removed = [path for path in existing if path not in current_paths]
+        if removed:
+            self.conn.executemany(
+                "DELETE FROM garment_index WHERE path = ?", [(p,) for p in removed]
+            )
+            stats["removed"] = len(removed)
+
+        self.conn.commit()
+        self.last_scan_stats = stats
+
+        if progress_callback:
+            progress_callback("カタログの分析が完了しました", 100)
+
+        print(
+            f"[Garment Index] スキャン完了: 全{stats['total']}枚 "
+            f"(分析 {stats['analyzed']}, 再利用 {stats['reused']}, "
+            f"変更なし {stats['unchanged']}, 失敗 {stats['failed']}, 削除 {stats['removed']})"
+        )
+
+        entries = self._load_entries_under(dir_path, recursive)
+        return {str(p): entries[str(p)] for p in files if str(p) in entries}
+
+    def get(self, image_path: str) -> Optional[Dict]:
+        """
+        インデックスのエントリを取得
+
+        Args:
+            image_path: 衣類画像のパス
+
+        Returns:
+            エントリ（未登録の場合はNone）
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT * FROM garment_index WHERE path = ?",
+            (str(Path(image_path).resolve()),)
+        )
+        row = cursor.fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def count(self) -> int:
+        """登録済みエントリ数"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS count FROM garment_index")
+        return cursor.fetchone()["count"]
+
+    def close(self):
+        """データベース接続を閉じる"""
+        if self.conn:
+            self.conn.close()
+
+    def _analyze_pending(
+        self,
+        pending: List[tuple],
+        clothing_type: str,
+        stats: Dict[str, int],
+        progress_callback: Optional[Callable[[str, int], None]],
+    ):
+        """未分析ファイルを分析して登録"""
+        total = len(pending)
+
+        def _store(item: tuple, result: Dict, done: int):
+            path, content_hash, size, mtime_ns = item
+            if "error" in result:
+                print(f"[Garment Index] 分析エラー({Path(path).name}): {result['error']}")
+                stats["failed"] += 1
+            else:
+                self._upsert(path, content_hash, size, mtime_ns, clothing_type, result)
+                stats["analyzed"] += 1
+
+            if done % COMMIT_INTERVAL == 0:
+                self.conn.commit()
+            if progress_callback:
+                progress_callback(f"衣類を分析中 ({done}/{total})...", int(done / total * 100))
+
+        if self.max_workers <= 1 or total < MIN_PARALLEL_ITEMS:
+            for done, item in enumerate(pending, start=1):
+                _store(item, _analyze_file(item[0], clothing_type), done)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, total)) as executor:
+            futures = {
+                executor.submit(_analyze_file, item[0], clothing_type): item
+                for item in pending
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                _store(futures[future], result, done)
+
+    def _upsert(
+        self,
+        path: str,
+        content_hash: str,
+        size: int,
+        mtime_ns: int,
+        clothing_type: str,
+        analysis: Dict,
+    ):
+        """エントリを登録・更新"""
+        description = analysis["description"]
+        if analysis.get("clothing_type", clothing_type) != clothing_type:
+            description = self._describe(analysis, clothing_type)
+
+        self.conn.execute("""
+            INSERT OR REPLACE INTO garment_index
+            (path, content_hash, file_size, mtime_ns, clothing_type,
+             colors, pattern, texture, description, analyzed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            path,
+            content_hash,
+            size,
+            mtime_ns,
+            clothing_type,
+            json.dumps(analysis["colors"]),
+            analysis["pattern"],
+            analysis["texture"],
+            description,
+            datetime.now().isoformat(),
+        ))
+
+    def _retype_entry(self, entry: Dict, clothing_type: str):
+        """衣類タイプだけが変わったエントリの描写を再生成（画像の再分析は不要）"""
+        self.conn.execute(
+            "UPDATE garment_index SET clothing_type = ?, description = ? WHERE path = ?",
+            (clothing_type, self._describe(entry, clothing_type), entry["path"])
+        )
+
+    def _describe(self, features: Dict, clothing_type: str) -> str:
+        """保存済みの特徴から描写文を生成"""
+        return ClothingAnalyzer().generate_detailed_description(
+            {
+                "colors": features["colors"],
+                "pattern": features["pattern"],
+                "texture": features["texture"],
+            },
+            clothing_type,
+        )
+
+    def _find_by_hash(self, content_hash: str) -> Optional[Dict]:
+        """同じ内容ハッシュのエントリを探す"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT * FROM garment_index WHERE content_hash = ? LIMIT 1",
+            (content_hash,)
+        )
+        row = cursor.fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def _load_entries_under(self, dir_path: Path, recursive: bool) -> Dict[str, Dict]:
+        """ディレクトリ配下のエントリを読み込み"""
+        prefix = str(dir_path) + os.sep
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT * FROM garment_index WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix)
+        )
+
+        entries = {}
+        for row in cursor.fetchall():
+            if not recursive and os.sep in row["path"][len(prefix):]:
+                continue
+            entries[row["path"]] = self._row_to_entry(row)
+        return entries
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict:
+        """行を辞書に変換"""
+        return {
+            "path": row["path"],
+            "content_hash": row["content_hash"],
+            "file_size": row["file_size"],
+            "mtime_ns": row["mtime_ns"],
+            "clothing_type": row["clothing_type"],
+            "colors": json.loads(row["colors"]),
+            "pattern": row["pattern"],
+            "texture": row["texture"],
+            "description": row["description"],
+            "analyzed_at": row["analyzed_at"],
+        }
@@ -0,0 +1,188 @@
+"""Local rule-based parser for common chat instructions"""
+
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+AGE_ORDER = ["10s", "20s", "30s", "40s", "50s+"]
+AGE_LABELS = {"10s": "10代", "20s": "20代", "30s": "30代", "40s": "40代", "50s+": "50代以上"}
+
+# 変更項目の表示名（AI応答用）
+FIELD_LABELS = {
+    "gender": "性別",
+    "age_range": "年代",
+    "body_type": "体型",
+    "pose": "ポーズ",
+    "background": "背景",
+    "lighting": "明るさ",
+    "expression": "表情",
+}
+
+# 背景に指定できる色・場所（日本語/英語 → 値, 表示名）
+BACKGROUND_WORDS: Dict[str, Tuple[str, str]] = {
+    "白": ("white", "白"), "ホワイト": ("white", "白"), "white": ("white", "白"),
+    "黒": ("black", "黒"), "ブラック": ("black", "黒"), "black": ("black", "黒"),
+    "グレー": ("gray", "グレー"), "灰色": ("gray", "グレー"), "gray": ("gray", "グレー"), "grey": ("gray", "グレー"),
+    "青": ("blue", "青"), "ブルー": ("blue", "青"), "blue": ("blue", "青"),
+    "ピンク": ("pink", "ピンク"), "pink": ("pink", "ピンク"),
+    "ベージュ": ("beige", "ベージュ"), "beige": ("beige", "ベージュ"),
+    "透過": ("transparent", "透過"), "透明": ("transparent", "透過"), "transparent": ("transparent", "透過"),
+    "スタジオ": ("studio", "スタジオ"), "studio": ("studio", "スタジオ"),
+    "海": ("beach", "ビーチ"), "ビーチ": ("beach", "ビーチ"), "beach": ("beach", "ビーチ"),
+    "街": ("city", "街並み"), "街中": ("city", "街並み"), "都会": ("city", "街並み"), "city": ("city", "街並み"), "street": ("city", "街並み"),
+    "室内": ("indoor", "室内"), "屋内": ("indoor", "室内"), "indoor": ("indoor", "室内"),
+    "自然": ("nature", "自然"), "公園": ("nature", "自然"), "森": ("nature", "自然"), "nature": ("nature", "自然"), "park": ("nature", "自然"),
+}
+
+_BG_ALTERNATION = "|".join(sorted(map(re.escape, BACKGROUND_WORDS), key=len, reverse=True))
+
+# 値は固定値、または現在のパラメータから値を決める関数
+Value = Union[str, Callable[[Dict], Optional[str]]]
+
+
+def _shift_age(step: int) -> Callable[[Dict], Optional[str]]:
+    """年代を1段階ずらす関数"""
+    def shift(current_params: Dict) -> Optional[str]:
+        current = current_params.get("age_range", "20s")
+        if current not in AGE_ORDER:
+            return None
+        index = min(max(AGE_ORDER.index(current) + step, 0), len(AGE_ORDER) - 1)
+        return AGE_ORDER[index]
+    return shift
+
+
+# (正規表現, 項目, 値, 表示名)
+RULES: List[Tuple[str, str, Value, str]] = [
+    # 背景（「背景を白に」「white background」「background to white」）
+    (rf"背景(?:色)?(?:を|は|が)?(?P<bg>{_BG_ALTERNATION})(?:色)?", "background", "", ""),
+    (rf"(?P<bg>{_BG_ALTERNATION})(?:色)?の?背景", "background", "", ""),
+    (rf"\bbackground (?:to |into |as )?(?P<bg>{_BG_ALTERNATION})\b", "background", "", ""),
+    (rf"\b(?P<bg>{_BG_ALTERNATION}) background\b", "background", "", ""),
+
+    # 性別
+    (r"男性|男の人|男|\bmale\b|\bman\b|\bmen\b", "gender", "male", "男性"),
+    (r"女性|女の人|女|\bfemale\b|\bwoman\b|\bwomen\b", "gender", "female", "女性"),
+
+    # 年代
+    (r"10代|ティーン|\bteens?\b|\bteenager\b", "age_range", "10s", "10代"),
+    (r"20代|\btwenties\b|\b20s\b", "age_range", "20s", "20代"),
+    (r"30代|\bthirties\b|\b30s\b", "age_range", "30s", "30代"),
+    (r"40代|\bforties\b|\b40s\b", "age_range", "40s", "40代"),
+    (r"(?:50|60|70)代(?:以上)?|シニア|\bfifties\b|\b50s\b|\bsenior\b", "age_range", "50s+", "50代以上"),
+    (r"若く|若返|\byounger\b", "age_range", _shift_age(-1), "若く"),
+    (r"年上|大人っぽく|老け|\bolder\b|\bmore mature\b", "age_range", _shift_age(1), "年上に"),
+
+    # 体型
+    (r"スリム|細身|細く|痩せ|やせ|\bslim(?:mer)?\b|\bthin(?:ner)?\b", "body_type", "slim", "スリム"),
+    (r"標準体型|普通体型|\baverage build\b", "body_type", "standard", "標準"),
+    (r"筋肉質|アスリート|マッチョ|\bathletic\b|\bmuscular\b", "body_type", "athletic", "アスリート"),
+    (r"ぽっちゃり|ふくよか|\bplus[- ]size\b|\bcurvy\b", "body_type", "plus-size", "ぽっちゃり"),
+
+    # ポーズ
+    (r"正面(?:向き)?|\bfront(?:al)?\b|\bfacing (?:the )?camera\b", "pose", "front", "正面"),
+    (r"横向き|側面|\bside(?: view)?\b|\bprofile\b", "pose", "side", "横向き"),
+    (r"歩いて(?:いる|る)?|歩く|歩行|ウォーキング|\bwalking\b", "pose", "walking", "歩行"),
+    (r"座って(?:いる|る)?|座る|座位|\bsitting\b|\bseated\b", "pose", "sitting", "座位"),
+    (r"腕組み|腕を組|\barms crossed\b", "pose", "arms_crossed", "腕組み"),
+    (r"腰に手|\bhands on hips\b", "pose", "hands_on_hips", "腰に手"),
+
+    # 表情の明るさ（「明るい表情」は照明ではなく表情の指示なので、明るさより先に判定）
+    (r"明るい表情|表情を?明るく|\bcheerful\b", "expression", "bright, cheerful expression", "明るい表情"),
+    (r"暗い表情|表情を?暗く|\bgloomy\b", "expression", "gloomy, melancholic expression", "暗い表情"),
+
+    # 明るさ
+    (r"明るく|明るい|\bbright(?:er)?\b|\blighter\b", "lighting", "brighter, well-lit lighting", "明るく"),
+    (r"暗く|暗い|\bdark(?:er)?\b|\bmoody\b", "lighting", "darker, moody lighting", "暗く"),
+
+    # 表情
+    (r"笑顔|笑って|にっこり|\bsmil(?:e|ing)\b", "expression", "smiling", "笑顔"),
+    (r"真顔|無表情|クールな表情|\bserious\b|\bneutral expression\b", "expression", "neutral, serious expression", "真顔"),
+]
+
+_COMPILED_RULES = [(re.compile(pattern), field, value, label) for pattern, field, value, label in RULES]
+
+# 意味を持たない言い回し（ルールで消費されなかった部分がこれだけなら解析成功）
+FILLERS = re.compile(
+    r"してください|して下さい|してほしい|にしたい|お願いします|お願い|ください|下さい"
+    r"|変更して|変えて|変更|にして|して|にする|する|なって|なる|っぽく|らしく|みたいに"
+    r"|もっと|もう少し|少し|ちょっと|すこし|さらに|より|感じ|雰囲気で|モデル|人物|画像|写真"
+    r"|[をにへではがのと、。,.!！?？・\s]"
+    r"|\b(?:please|make|it|her|him|them|the|a|an|to|into|more|bit|little|slightly|much|lot|"
+    r"change|set|turn|switch|be|look|looking|should|can|you|and|with|model|person|image|photo|"
+    r"instead|of|use|show|have|as|so|that)\b"
+)
+
+# 項目名そのもの（その項目を変更する指示の中でだけ読み飛ばす）
+# 「明るいポーズ」のように、別の項目の言葉と組み合わさった場合はLLMに任せる
+FIELD_NOUNS = {
+    "pose": re.compile(r"ポーズ|\bpose\b"),
+    "expression": re.compile(r"表情|\bexpression\b"),
+}
+
+
+def normalize_instruction(instruction: str) -> str:
+    """指示文を正規化（全角・半角、大文字・小文字、前後の空白と句読点を統一）"""
+    text = unicodedata.normalize("NFKC", instruction).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" 。、.,!！?？")
+
+
+class LocalInstructionParser:
+    """キーワード辞書による指示解析
+
+    「背景を白に」「もっと明るく」「男性にして」のような定型的な指示を
+    ネットワークを使わずに解析し、Gemini解析と同じchanges形式で返します。
+    指示の一部でも解釈できない場合はNoneを返し、LLMに任せます。
+    """
+
+    def parse(self, instruction: str, current_params: Dict) -> Optional[Dict[str, any]]:
+        """
+        指示を解析
+
+        Args:
+            instruction: ユーザーの指示文
+            current_params: 現在のパラメータ
+
+        Returns:
+            {"changes": {...}, "ai_response": str}、解釈できない場合はNone
+        """
+        text = normalize_instruction(instruction)
+        if not text:
+            return None
+
+        changes: Dict[str, str] = {}
+        labels: Dict[str, str] = {}
+
+        for pattern, field, value, label in _COMPILED_RULES:
+            for match in pattern.finditer(text):
+                if field == "background":
+                    value, label = BACKGROUND_WORDS[match.group("bg")]
+                resolved = value(current_params) if callable(value) else value
+                if resolved is None:
+                    return None
+                # 同じ項目に異なる値が指定された場合は曖昧なのでLLMに任せる
+                if changes.get(field, resolved) != resolved:
+                    return None
+                changes[field] = resolved
+                labels[field] = AGE_LABELS[resolved] if field == "age_range" else label
+
+            # 解釈した部分を取り除き、以降のルールで二重に一致しないようにする
+            text = pattern.sub(" ", text)
+
+        if not changes:
+            return None
+
+        for field, noun in FIELD_NOUNS.items():
+            if field in changes:
+                text = noun.sub(" ", text)
+
+        residue = FILLERS.sub("", text)
+        if residue.strip():
+            return None
+
+        summary = "、".join(f"{FIELD_LABELS[field]}を「{labels[field]}」" for field in changes)
+        return {
+            "changes": changes,
+            "ai_response": f"{summary}に変更して画像を再生成します。"
+        }
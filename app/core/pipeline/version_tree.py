@@ -0,0 +1,259 @@
+"""Refinement version tree with delta-compressed tiles"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+@dataclass
+class VersionNode:
+    """修正履歴の1バージョン
+
+    親バージョンから変化した矩形だけを圧縮したタイルとして保持します。
+    """
+
+    node_id: int
+    parent_id: Optional[int]
+    instruction: str
+    size: Tuple[int, int]
+    box: Optional[Tuple[int, int, int, int]]  # 変化した範囲（Noneは変化なし）
+    tile: bytes  # 変化した範囲のPNG
+    created_at: float = field(default_factory=time.time)
+    metadata: Dict = field(default_factory=dict)
+
+    @property
+    def stored_bytes(self) -> int:
+        """保存しているタイルのバイト数"""
+        return len(self.tile)
+
+
+def image_hash(image: Image.Image) -> str:
+    """画像内容のハッシュ"""
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    return digest.hexdigest()
+
+
+class VersionTree:
+    """ベース画像ごとの修正バージョンツリー
+
+    各バージョンは親へのポインタと差分タイルだけを持ち、画像全体は
+    必要になった時に祖先のタイルを順に重ねて復元します。復元した画像は
+    LRUキャッシュに少数だけ保持するため、長い編集セッションでもメモリは
+    ほぼ一定です。元に戻す・別の案に分岐するのはポインタの移動だけです。
+    """
+
+    def __init__(self, base_image: Image.Image, cache_size: int = 4):
+        """
+        Args:
+            base_image: ルートとなる画像
+            cache_size: 復元済み画像を保持する数
+        """
+        base_image = base_image.convert('RGB')
+        self.base_hash = image_hash(base_image)
+        self.cache_size = cache_size
+        self.nodes: Dict[int, VersionNode] = {}
+        self.current_id = 0
+
+        self._cache: "OrderedDict[int, Image.Image]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        root = VersionNode(
+            node_id=0,
+            parent_id=None,
+            instruction="",
+            size=base_image.size,
+            box=(0, 0, base_image.width, base_image.height),
+            tile=self._encode(base_image),
+        )
+        self.nodes[0] = root
+        self._remember(0, base_image)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def root_id(self) -> int:
+        return 0
+
+    def add(
+        self,
+        image: Image.Image,
+        instruction: str = "",
+        parent_id: Optional[int] = None,
+        metadata: Optional[Dict] = None,
+        make_current: bool = True,
+    ) -> int:
+        """
+        新しいバージョンを追加
+
+        Args:
+            image: 修正後の画像
+            instruction: 修正指示
+            parent_id: 親バージョン（Noneの場合は現在のバージョン）
+            metadata: 任意の付加情報
+            make_current: 追加したバージョンを現在のバージョンにするか
+
+        Returns:
+            追加したバージョンのID
+        """
+        image = image.convert('RGB')
+
+        with self._lock:
+            if parent_id is None:
+                parent_id = self.current_id
+            parent = self.get_image(parent_id)
+
+            if image.size != parent.size:
+                # サイズが変わった場合は画像全体を保存
+                box = (0, 0, image.width, image.height)
+            else:
+                box = self._changed_box(parent, image)
+
+            node_id = max(self.nodes) + 1
+            self.nodes[node_id] = VersionNode(
+                node_id=node_id,
+                parent_id=parent_id,
+                instruction=instruction,
+                size=image.size,
+                box=box,
+                tile=self._encode(image.crop(box)) if box else b"",
+                metadata=dict(metadata or {}),
+            )
+            self._remember(node_id, image)
+
+            if make_current:
+                self.current_id = node_id
+            return node_id
+
+    def get_image(self, node_id: Optional[int] = None) -> Image.Image:
+        """
+        バージョンの画像を取得（キャッシュになければ祖先から復元）
+
+        Args:
+            node_id: バージョンID（Noneの場合は現在のバージョン）
+
+        Returns:
+            画像（キャッシュと共有するため、変更する場合はコピーしてください）
+        """
+        with self._lock:
+            if node_id is None:
+                node_id = self.current_id
+            if node_id not in self.nodes:
+                raise KeyError(f"バージョンが見つかりません: {node_id}")
+
+            cached = self._cache.get(node_id)
+            if cached is not None:
+                self._cache.move_to_end(node_id)
+                return cached
+
+            # キャッシュ済みの祖先（なければルート）まで遡る
+            chain = []
+            current = node_id
+            image = None
+            while current is not None:
+                image = self._cache.get(current)
+                if image is not None:
+                    break
+                chain.append(self.nodes[current])
+                current = self.nodes[current].parent_id
+
+            for node in reversed(chain):
+                image = self._apply(image, node)
+
+            self._remember(node_id, image)
+            return image
+
+    def checkout(self, node_id: int) -> Image.Image:
+        """指定したバージョンを現在のバージョンにする（分岐元の選択）"""
+        with self._lock:
+            image = self.get_image(node_id)
+            self.current_id = node_id
+            return image
+
+    def undo(self) -> Optional[Image.Image]:
+        """
+        親バージョンに戻る
+
+        Returns:
+            戻った先の画像（ルートの場合はNone）
+        """
+        with self._lock:
+            parent_id = self.nodes[self.current_id].parent_id
+            if parent_id is None:
+                return None
+            return self.checkout(parent_id)
+
+    def children(self, node_id: int) -> List[int]:
+        """子バージョンのID（作成順）"""
+        return [n.node_id for n in self.nodes.values() if n.parent_id == node_id]
+
+    def path(self, node_id: Optional[int] = None) -> List[int]:
+        """ルートから指定バージョンまでのID"""
+        if node_id is None:
+            node_id = self.current_id
+        ids = []
+        while node_id is not None:
+            ids.append(node_id)
+            node_id = self.nodes[node_id].parent_id
+        return list(reversed(ids))
+
+    def stats(self) -> Dict[str, int]:
+        """保存サイズの統計"""
+        with self._lock:
+            width, height = self.nodes[0].size
+            return {
+                "versions": len(self.nodes),
+                "stored_bytes": sum(n.stored_bytes for n in self.nodes.values()),
+                "cached_images": len(self._cache),
+                "full_image_bytes": width * height * 3,
+            }
+
+    def _remember(self, node_id: int, image: Image.Image):
+        """LRUキャッシュに追加"""
+        self._cache[node_id] = image
+        self._cache.move_to_end(node_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _changed_box(before: Image.Image, after: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """2枚の画像で変化した画素を囲む矩形"""
+        changed = np.any(np.asarray(before) != np.asarray(after), axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(changed.any(axis=0))
+        return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+    @staticmethod
+    def _encode(image: Image.Image) -> bytes:
+        """タイルを可逆圧縮"""
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', compress_level=6)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _apply(parent: Optional[Image.Image], node: VersionNode) -> Image.Image:
+        """親の画像にタイルを重ねて復元"""
+        if node.box is None:
+            return parent
+
+        with Image.open(BytesIO(node.tile)) as tile:
+            tile = tile.convert('RGB')
+
+        if parent is None or parent.size != node.size or node.box == (0, 0, *node.size):
+            if tile.size == node.size:
+                return tile
+            image = Image.new('RGB', node.size)
+        else:
+            image = parent.copy()
+        image.paste(tile, node.box[:2])
+        return image
@@ -0,0 +1,248 @@
+"""Local background replacement for white-background outputs"""
+
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class BackgroundCompositor:
+    """背景差し替え
+
+    白背景の生成画像から人物を1回だけ切り抜き（色キー + マッティング補正）、
+    アルファマットをキャッシュします。以降はギャラリー背景・カスタム背景への
+    合成をローカルで行うため、背景違いのためにAPIで再生成する必要はありません。
+    """
+
+    def __init__(
+        self,
+        key_tolerance: float = 12.0,
+        key_softness: float = 10.0,
+        matting_radius: int = 4,
+        cache_size: int = 8,
+    ):
+        """
+        Args:
+            key_tolerance: 背景色とみなすLab距離
+            key_softness: 背景から前景へ遷移させるLab距離の幅
+            matting_radius: マッティング補正（ガイデッドフィルタ）の半径
+            cache_size: アルファマットを保持する画像数
+        """
+        self.key_tolerance = key_tolerance
+        self.key_softness = key_softness
+        self.matting_radius = matting_radius
+        self.cache_size = cache_size
+
+        self._alpha_cache: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._background_cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+
+    def extract_alpha(self, image: Image.Image) -> np.ndarray:
+        """
+        人物のアルファマットを取得（同じ画像は再計算しない）
+
+        Args:
+            image: 白背景の生成画像
+
+        Returns:
+            アルファマット（0.0〜1.0のfloat32, HxW）
+        """
+        return self._matte(np.asarray(image.convert('RGB')))[0]
+
+    def composite(
+        self,
+        image: Image.Image,
+        background: Union[str, Tuple[int, int, int], Image.Image],
+        color_match: float = 0.0,
+    ) -> Image.Image:
+        """
+        人物を別の背景に合成
+
+        Args:
+            image: 白背景の生成画像
+            background: 背景画像のパス / 画像 / 単色（RGB）
+            color_match: 人物の色味を背景に寄せる強さ（0.0〜1.0、0で無効）
+
+        Returns:
+            合成後の画像
+        """
+        img_rgb = np.asarray(image.convert('RGB'))
+        alpha, key_color = self._matte(img_rgb)
+        height, width = alpha.shape
+
+        bg = self._load_background(background, (width, height))
+        foreground = self._decontaminate(img_rgb, alpha, key_color)
+
+        if color_match > 0:
+            foreground = self._match_colors(foreground, alpha, bg, color_match)
+
+        a = alpha[:, :, None]
+        result = foreground * a + bg.astype(np.float32) * (1 - a)
+
+        return Image.fromarray(np.clip(result + 0.5, 0, 255).astype(np.uint8))
+
+    def clear_cache(self):
+        """キャッシュをクリア"""
+        self._alpha_cache.clear()
+        self._background_cache.clear()
+
+    def _matte(self, img_rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """アルファマットと背景色を取得（キャッシュ付き）"""
+        key = hashlib.blake2b(img_rgb.tobytes(), digest_size=16).hexdigest()
+        key += f"_{img_rgb.shape[1]}x{img_rgb.shape[0]}"
+
+        cached = self._alpha_cache.get(key)
+        if cached is not None:
+            self._alpha_cache.move_to_end(key)
+            return cached
+
+        print("[Background] 人物を切り抜き中...")
+        result = self._compute_alpha(img_rgb)
+
+        self._alpha_cache[key] = result
+        while len(self._alpha_cache) > self.cache_size:
+            self._alpha_cache.popitem(last=False)
+
+        return result
+
+    def _compute_alpha(self, img_rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """色キーで切り抜き、ガイデッドフィルタで境界を補正"""
+        # 画像の縁から背景色を推定
+        border = np.concatenate([
+            img_rgb[0], img_rgb[-1], img_rgb[:, 0], img_rgb[:, -1]
+        ]).astype(np.float32)
+        key_color = np.median(border, axis=0)
+
+        # 背景色からのLab距離
+        lab = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2LAB).astype(np.float32)
+        key_lab = cv2.cvtColor(
+            np.uint8([[np.round(key_color)]]), cv2.COLOR_RGB2LAB
+        )[0, 0].astype(np.float32)
+        distance = np.linalg.norm(lab - key_lab, axis=2)
+
+        # 背景色に近く、画像の縁とつながっている領域だけを背景とする
+        # （白い服など、人物の内側にある背景色に近い領域は残す）
+        candidate = (distance < self.key_tolerance + self.key_softness).astype(np.uint8)
+        _, labels = cv2.connectedComponents(candidate, connectivity=4)
+        border_labels = np.unique(np.concatenate([
+            labels[0], labels[-1], labels[:, 0], labels[:, -1]
+        ]))
+        border_labels = border_labels[border_labels != 0]
+        background = np.isin(labels, border_labels)
+
+        soft = np.clip((distance - self.key_tolerance) / self.key_softness, 0, 1)
+        alpha = np.where(background, soft, 1.0).astype(np.float32)
+
+        # ガイデッドフィルタで境界を画像のエッジに沿わせる
+        guide = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY).astype(np.float32) / 255.0
+        refined = self._guided_filter(guide, alpha, self.matting_radius, 1e-3)
+
+        # 確実な前景・背景は補正前の値を維持
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE, (2 * self.matting_radius + 1,) * 2
+        )
+        sure_fg = cv2.erode((alpha > 0.99).astype(np.uint8), kernel).astype(bool)
+        sure_bg = cv2.erode((alpha < 0.01).astype(np.uint8), kernel).astype(bool)
+        refined[sure_fg] = 1.0
+        refined[sure_bg] = 0.0
+
+        return np.clip(refined, 0, 1).astype(np.float32), key_color
+
+    @staticmethod
+    def _guided_filter(guide: np.ndarray, src: np.ndarray, radius: int, eps: float) -> np.ndarray:
+        """グレースケールのガイデッドフィルタ（He et al.）"""
+        ksize = (2 * radius + 1, 2 * radius + 1)
+
+        mean_i = cv2.boxFilter(guide, -1, ksize)
+        mean_p = cv2.boxFilter(src, -1, ksize)
+        corr_ip = cv2.boxFilter(guide * src, -1, ksize)
+        var_i = cv2.boxFilter(guide * guide, -1, ksize) - mean_i * mean_i
+
+        a = (corr_ip - mean_i * mean_p) / (var_i + eps)
+        b = mean_p - a * mean_i
+
+        return cv2.boxFilter(a, -1, ksize) * guide + cv2.boxFilter(b, -1, ksize)
+
+    @staticmethod
+    def _decontaminate(img_rgb: np.ndarray, alpha: np.ndarray, key_color: np.ndarray) -> np.ndarray:
+        """境界の半透明部分から背景色の混入を除去（I = aF + (1-a)K を F について解く）"""
+        image = img_rgb.astype(np.float32)
+        a = alpha[:, :, None]
+
+        edge = (alpha > 0.05) & (alpha < 0.99)
+        foreground = image.copy()
+        foreground[edge] = np.clip(
+            (image[edge] - (1 - a[edge]) * key_color) / a[edge], 0, 255
+        )
+
+        return foreground
+
+    @staticmethod
+    def _match_colors(
+        foreground: np.ndarray,
+        alpha: np.ndarray,
+        bg_rgb: np.ndarray,
+        strength: float,
+    ) -> np.ndarray:
+        """人物の平均色（Lab）を背景の平均色に寄せる"""
+        person = alpha > 0.5
+        if not person.any():
+            return foreground
+
+        fg_lab = cv2.cvtColor(np.clip(foreground, 0, 255).astype(np.uint8), cv2.COLOR_RGB2LAB)
+        fg_lab = fg_lab.astype(np.float32)
+        bg_lab = cv2.cvtColor(bg_rgb, cv2.COLOR_RGB2LAB).astype(np.float32)
+
+        shift = (bg_lab.reshape(-1, 3).mean(axis=0) - fg_lab[person].mean(axis=0)) * strength
+        # 明るさは控えめに合わせる（人物が背景に溶け込みすぎないように）
+        shift[0] *= 0.5
+
+        matched = np.clip(fg_lab + shift, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(matched, cv2.COLOR_LAB2RGB).astype(np.float32)
+
+    def _load_background(
+        self,
+        background: Union[str, Tuple[int, int, int], Image.Image],
+        size: Tuple[int, int],
+    ) -> np.ndarray:
+        """背景を出力サイズに合わせて用意（画像の場合は中央でトリミング）"""
+        width, height = size
+
+        if isinstance(background, tuple):
+            return np.full((height, width, 3), background, dtype=np.uint8)
+
+        if isinstance(background, Image.Image):
+            return self._cover(np.asarray(background.convert('RGB')), size)
+
+        key = (str(Path(background).resolve()), size)
+        cached = self._background_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with Image.open(background) as img:
+            bg = self._cover(np.asarray(img.convert('RGB')), size)
+
+        self._background_cache[key] = bg
+        while len(self._background_cache) > self.cache_size:
+            self._background_cache.popitem(last=False)
+
+        return bg
+
+    @staticmethod
+    def _cover(bg_rgb: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+        """アスペクト比を保ったまま出力サイズを覆うようにリサイズしてトリミング"""
+        width, height = size
+        bg_h, bg_w = bg_rgb.shape[:2]
+        scale = max(width / bg_w, height / bg_h)
+
+        new_w = max(width, round(bg_w * scale))
+        new_h = max(height, round(bg_h * scale))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        resized = cv2.resize(bg_rgb, (new_w, new_h), interpolation=interpolation)
+
+        x = (new_w - width) // 2
+        y = (new_h - height) // 2
+        return np.ascontiguousarray(resized[y:y + height, x:x + width])
@@ -1,6 +1,9 @@
 """Clothing image analysis"""
 
-from typing import Dict, List
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 import numpy as np
 import cv2
 from PIL import Image
@@ -12,9 +15,23 @@ except ImportError:
     SKLEARN_AVAILABLE = False
 
 
+# 主要色抽出の設定
+COLOR_SAMPLE_MAX_SIDE = 160  # クラスタリング前に縮小する長辺サイズ
+COLOR_QUANT_STEP = 4  # Lab各チャンネルの量子化幅
+BACKGROUND_DISTANCE = 12.0  # 背景色とみなすLab距離
+BACKGROUND_BORDER_SPREAD = 10.0  # 背景とみなす枠の色ばらつき上限
+MIN_FOREGROUND_RATIO = 0.05  # 背景除去後に残すべき画素の割合
+COLOR_CACHE_SIZE = 256
+
+
 class ClothingAnalyzer:
     """衣類画像を分析して詳細な描写を生成"""
 
+    # 主要色の抽出結果キャッシュ（画像ハッシュ → Hex値リスト）
+    _color_cache: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+    # キャッシュはワーカースレッドとUIスレッドで共有する
+    _color_cache_lock = threading.Lock()
+
     def analyze_clothing(self, image_path: str) -> Dict:
         """
         画像から衣類の特徴を抽出
@@ -126,22 +143,117 @@ class ClothingAnalyzer:
     def _extract_dominant_colors(
         self, img: np.ndarray, n_colors: int = 3
     ) -> List[str]:
-        """主要色を抽出（Hex値）"""
-        if SKLEARN_AVAILABLE:
-            # K-meansクラスタリングを使用
-            pixels = img.reshape(-1, 3)
-            kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            colors = kmeans.cluster_centers_.astype(int)
-        else:
-            # フォールバック: 画像の平均色を使用
-            mean_color = np.mean(img.reshape(-1, 3), axis=0).astype(int)
-            colors = [mean_color]
-
-        # Hex値に変換
-        hex_colors = [self._rgb_to_hex(color) for color in colors]
+        """主要色を抽出（Hex値、画素数の多い順）
 
-        return hex_colors
+        全画素をK-meansにかける代わりに、縮小・背景除去・Lab空間での量子化で
+        点数を数千程度まで減らしてから、重み付きK-means（初期化1回）を実行します。
+        結果は画像ハッシュでキャッシュされます。
+        """
+        cache_key = (self._image_hash(img), n_colors)
+        with self._color_cache_lock:
+            cached = self._color_cache.get(cache_key)
+            if cached is not None:
+                self._color_cache.move_to_end(cache_key)
+                return list(cached)
+
+        # クラスタリングはロックの外で行う（同じ画像を同時に計算しても結果は同じ）
+        hex_colors = [
+            self._rgb_to_hex(color) for color in self._cluster_colors(img, n_colors)
+        ]
+
+        with self._color_cache_lock:
+            self._color_cache[cache_key] = hex_colors
+            self._color_cache.move_to_end(cache_key)
+            if len(self._color_cache) > COLOR_CACHE_SIZE:
+                self._color_cache.popitem(last=False)
+
+        return list(hex_colors)
+
+    def _cluster_colors(self, img: np.ndarray, n_colors: int) -> np.ndarray:
+        """縮小画像の画素を量子化してクラスタリングし、代表色（RGB）を返す"""
+        pixels_rgb = self._sample_pixels(img)
+        pixels_lab = cv2.cvtColor(
+            pixels_rgb.reshape(-1, 1, 3), cv2.COLOR_RGB2LAB
+        ).reshape(-1, 3)
+
+        # 背景（枠と同じ色の画素）を除外
+        foreground = self._foreground_mask(img, pixels_lab)
+        pixels_rgb = pixels_rgb[foreground]
+        pixels_lab = pixels_lab[foreground]
+
+        # Lab空間で量子化し、同じビンの画素をまとめる
+        quantized = (pixels_lab // COLOR_QUANT_STEP).astype(np.int32)
+        packed = (quantized[:, 0] << 16) | (quantized[:, 1] << 8) | quantized[:, 2]
+        _, first_index, inverse, counts = np.unique(
+            packed, return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        points = pixels_lab[first_index].astype(np.float32)
+        n_clusters = min(n_colors, len(points))
+
+        if SKLEARN_AVAILABLE and n_clusters > 1:
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=1)
+            bin_labels = kmeans.fit_predict(points, sample_weight=counts)
+        else:
+            # フォールバック: 頻度の高いビンをそのまま代表色にする
+            top_bins = np.argsort(counts)[::-1][:n_clusters]
+            bin_labels = np.full(len(points), -1, dtype=np.int64)
+            bin_labels[top_bins] = np.arange(len(top_bins))
+
+        # 各画素のクラスタで元のRGBを平均（量子化誤差を残さない）
+        pixel_labels = bin_labels[inverse]
+        valid = pixel_labels >= 0
+        sizes = np.bincount(pixel_labels[valid], minlength=n_clusters)
+        sums = np.zeros((n_clusters, 3), dtype=np.float64)
+        np.add.at(sums, pixel_labels[valid], pixels_rgb[valid])
+
+        order = np.argsort(sizes)[::-1]
+        order = order[sizes[order] > 0]
+        return (sums[order] / sizes[order, None]).round().astype(int)
+
+    def _sample_pixels(self, img: np.ndarray) -> np.ndarray:
+        """長辺COLOR_SAMPLE_MAX_SIDEまで間引いた画素配列（N×3, uint8）を返す
+
+        補間で境界の中間色が生まれないよう、最近傍で間引きます。
+        """
+        height, width = img.shape[:2]
+        scale = COLOR_SAMPLE_MAX_SIDE / max(height, width)
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_NEAREST)
+        return np.ascontiguousarray(img, dtype=np.uint8).reshape(-1, 3)
+
+    def _foreground_mask(self, img: np.ndarray, pixels_lab: np.ndarray) -> np.ndarray:
+        """背景とみなせない画素のマスクを返す
+
+        画像の外周が一様な色（白背景など）の場合のみ、その色に近い画素を背景とします。
+        衣類が枠いっぱいに写っている場合は全画素を残します。
+        """
+        keep_all = np.ones(len(pixels_lab), dtype=bool)
+
+        border = np.concatenate([img[0], img[-1], img[:, 0], img[:, -1]]).astype(np.uint8)
+        border_lab = cv2.cvtColor(border.reshape(-1, 1, 3), cv2.COLOR_RGB2LAB).reshape(-1, 3)
+        border_lab = border_lab.astype(np.float32)
+        background = np.median(border_lab, axis=0)
+
+        spread = np.median(np.linalg.norm(border_lab - background, axis=1))
+        if spread > BACKGROUND_BORDER_SPREAD:
+            return keep_all
+
+        distance = np.linalg.norm(pixels_lab.astype(np.float32) - background, axis=1)
+        foreground = distance > BACKGROUND_DISTANCE
+        if foreground.mean() < MIN_FOREGROUND_RATIO:
+            return keep_all
+
+        return foreground
+
+    @staticmethod
+    def _image_hash(img: np.ndarray) -> str:
+        """画像配列の内容ハッシュ"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(img.shape).encode())
+        digest.update(np.ascontiguousarray(img).data)
+        return digest.hexdigest()
 
     def _rgb_to_hex(self, rgb: np.ndarray) -> str:
         """RGB値をHex値に変換"""
@@ -38,43 +38,72 @@ class ColorChanger:
             色変更後の画像
         """
         # PIL画像をNumPy配列に変換
-        img_array = np.array(image.convert('RGB'))
+        img_rgb = np.asarray(image.convert('RGB'))
         
-        # BGR形式に変換（OpenCV用）
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+        # HSV色空間に変換し、ルックアップテーブルで各チャンネルを調整
+        img_hsv = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2HSV)
+        lut = self.build_hsv_lut(hue_shift, saturation_scale, value_scale)
         
-        # HSV色空間に変換
-        img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV).astype(np.float32)
+        result_rgb = self.apply_hsv_lut(img_hsv, lut, img_rgb, mask)
+        
+        # PIL画像に変換
+        return Image.fromarray(result_rgb)
+    
+    @staticmethod
+    def build_hsv_lut(
+        hue_shift: float = 0,
+        saturation_scale: float = 1.0,
+        value_scale: float = 1.0
+    ) -> np.ndarray:
+        """
+        HSV各チャンネルのルックアップテーブルを作成
+        
+        Args:
+            hue_shift: 色相のシフト（-180〜180）
+            saturation_scale: 彩度の倍率（0.0〜2.0）
+            value_scale: 明度の倍率（0.0〜2.0）
+        
+        Returns:
+            cv2.LUT用のテーブル（256x1x3, uint8）
+        """
+        levels = np.arange(256, dtype=np.float32)
+        lut = np.empty((256, 1, 3), dtype=np.uint8)
         
-        # 色相をシフト
-        if hue_shift != 0:
-            img_hsv[:, :, 0] = (img_hsv[:, :, 0] + hue_shift) % 180
+        # 色相は0〜179の範囲で循環
+        lut[:, 0, 0] = ((levels + np.float32(hue_shift)) % 180).astype(np.uint8)
+        lut[:, 0, 1] = np.clip(levels * np.float32(saturation_scale), 0, 255).astype(np.uint8)
+        lut[:, 0, 2] = np.clip(levels * np.float32(value_scale), 0, 255).astype(np.uint8)
         
-        # 彩度を調整
-        if saturation_scale != 1.0:
-            img_hsv[:, :, 1] = np.clip(img_hsv[:, :, 1] * saturation_scale, 0, 255)
+        return lut
+    
+    @staticmethod
+    def apply_hsv_lut(
+        img_hsv: np.ndarray,
+        lut: np.ndarray,
+        img_rgb: np.ndarray,
+        mask: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        HSV画像にルックアップテーブルを適用してRGBに戻す
         
-        # 明度を調整
-        if value_scale != 1.0:
-            img_hsv[:, :, 2] = np.clip(img_hsv[:, :, 2] * value_scale, 0, 255)
+        Args:
+            img_hsv: HSV画像（uint8）
+            lut: build_hsv_lutで作成したテーブル
+            img_rgb: 元のRGB画像（マスク外の画素に使用）
+            mask: マスク（Noneの場合は全体に適用）
         
-        # BGR色空間に戻す
-        img_hsv = img_hsv.astype(np.uint8)
-        img_bgr_modified = cv2.cvtColor(img_hsv, cv2.COLOR_HSV2BGR)
+        Returns:
+            RGB画像（uint8）
+        """
+        result = cv2.cvtColor(cv2.LUT(img_hsv, lut), cv2.COLOR_HSV2RGB)
         
         # マスクを適用（指定された場合のみ）
         if mask is not None:
-            mask_3ch = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) if len(mask.shape) == 2 else mask
+            mask_3ch = cv2.cvtColor(mask, cv2.COLOR_GRAY2RGB) if len(mask.shape) == 2 else mask
             mask_3ch = mask_3ch.astype(np.float32) / 255.0
-            img_bgr_modified = (img_bgr_modified * mask_3ch + img_bgr * (1 - mask_3ch)).astype(np.uint8)
+            result = (result * mask_3ch + img_rgb * (1 - mask_3ch)).astype(np.uint8)
         
-        # RGB形式に変換
-        img_rgb = cv2.cvtColor(img_bgr_modified, cv2.COLOR_BGR2RGB)
-        
-        # PIL画像に変換
-        result_image = Image.fromarray(img_rgb)
-        
-        return result_image
+        return result
     
     def create_mask_by_color(
         self,
@@ -104,19 +133,19 @@ class ColorChanger:
         
         # ターゲット色をHSVに変換
         target_bgr = np.uint8([[[target_color[2], target_color[1], target_color[0]]]])
-        target_hsv = cv2.cvtColor(target_bgr, cv2.COLOR_BGR2HSV)[0][0]
+        target_hsv = cv2.cvtColor(target_bgr, cv2.COLOR_BGR2HSV)[0][0].astype(int)
         
-        # 色範囲を設定
+        # 色範囲を設定（uint8のままだと減算でオーバーフローするためintで計算）
         lower_bound = np.array([
             max(0, target_hsv[0] - tolerance),
             max(0, target_hsv[1] - tolerance),
             max(0, target_hsv[2] - tolerance)
-        ])
+        ], dtype=np.uint8)
         upper_bound = np.array([
             min(180, target_hsv[0] + tolerance),
             255,
             255
-        ])
+        ], dtype=np.uint8)
         
         # マスクを作成
         mask = cv2.inRange(img_hsv, lower_bound, upper_bound)
@@ -0,0 +1,129 @@
+"""Real-time color change preview engine"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.vton.color_changer import ColorChanger
+
+
+# プレビュー用プロキシの長辺サイズ（px）
+DEFAULT_PROXY_SIZE = 512
+
+
+class ColorPreviewEngine:
+    """色変更のリアルタイムプレビュー
+
+    画像を設定した時にHSV変換と縮小プロキシを1回だけ作成し、スライダー操作中は
+    プロキシにルックアップテーブルを適用するだけでプレビューを更新します。
+    フル解像度の描画は確定時にバックグラウンドスレッドで行います。
+    """
+
+    def __init__(
+        self,
+        image: Image.Image,
+        mask: Optional[np.ndarray] = None,
+        proxy_size: int = DEFAULT_PROXY_SIZE,
+    ):
+        """
+        Args:
+            image: 色を変更する画像
+            mask: マスク（Noneの場合は全体に適用）
+            proxy_size: プレビュー用プロキシの長辺サイズ
+        """
+        self.changer = ColorChanger()
+
+        # フル解像度（確定時に使用）
+        self.full_rgb = np.asarray(image.convert('RGB'))
+        self.full_hsv = cv2.cvtColor(self.full_rgb, cv2.COLOR_RGB2HSV)
+        self.full_mask = mask
+
+        # プレビュー用プロキシ
+        height, width = self.full_rgb.shape[:2]
+        scale = min(1.0, proxy_size / max(height, width))
+        if scale < 1.0:
+            proxy_dims = (max(1, round(width * scale)), max(1, round(height * scale)))
+            self.proxy_rgb = cv2.resize(self.full_rgb, proxy_dims, interpolation=cv2.INTER_AREA)
+            self.proxy_mask = (
+                cv2.resize(mask, proxy_dims, interpolation=cv2.INTER_AREA)
+                if mask is not None else None
+            )
+        else:
+            self.proxy_rgb = self.full_rgb
+            self.proxy_mask = mask
+        self.proxy_hsv = cv2.cvtColor(self.proxy_rgb, cv2.COLOR_RGB2HSV)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="color-commit")
+        self._pending: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    @property
+    def proxy_size(self) -> Tuple[int, int]:
+        """プロキシのサイズ (幅, 高さ)"""
+        return self.proxy_rgb.shape[1], self.proxy_rgb.shape[0]
+
+    def preview(
+        self,
+        hue_shift: int = 0,
+        saturation_scale: float = 1.0,
+        value_scale: float = 1.0,
+    ) -> np.ndarray:
+        """
+        プロキシ上でプレビューを描画（スライダー操作中に呼ぶ）
+
+        Args:
+            hue_shift: 色相のシフト（-180〜180）
+            saturation_scale: 彩度の倍率（0.0〜2.0）
+            value_scale: 明度の倍率（0.0〜2.0）
+
+        Returns:
+            プレビュー画像（RGB配列、QImageへの変換用）
+        """
+        lut = self.changer.build_hsv_lut(hue_shift, saturation_scale, value_scale)
+        return self.changer.apply_hsv_lut(self.proxy_hsv, lut, self.proxy_rgb, self.proxy_mask)
+
+    def render(
+        self,
+        hue_shift: int = 0,
+        saturation_scale: float = 1.0,
+        value_scale: float = 1.0,
+    ) -> Image.Image:
+        """
+        フル解像度で描画（ColorChanger.change_colorと同じ結果）
+
+        Returns:
+            色変更後の画像
+        """
+        lut = self.changer.build_hsv_lut(hue_shift, saturation_scale, value_scale)
+        result = self.changer.apply_hsv_lut(self.full_hsv, lut, self.full_rgb, self.full_mask)
+        return Image.fromarray(result)
+
+    def commit(
+        self,
+        hue_shift: int = 0,
+        saturation_scale: float = 1.0,
+        value_scale: float = 1.0,
+    ) -> Future:
+        """
+        フル解像度の描画をバックグラウンドで開始（確定時に呼ぶ）
+
+        まだ開始していない前回の確定はキャンセルされます。
+
+        Returns:
+            結果の画像を返すFuture
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.cancel()
+            self._pending = self._executor.submit(
+                self.render, hue_shift, saturation_scale, value_scale
+            )
+            return self._pending
+
+    def close(self):
+        """バックグラウンドスレッドを終了"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
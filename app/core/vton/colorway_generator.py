@@ -0,0 +1,153 @@
+"""Batch colorway generation from a single generated image"""
+
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.vton.clothing_analyzer import ClothingAnalyzer
+from core.vton.color_changer import ColorChanger
+
+
+class ColorwayGenerator:
+    """カラーバリエーション生成
+
+    生成画像から衣類の色領域を1回だけ検出し、HSV変換とマスクを共有したまま
+    複数の色を一括で描画します。色違いごとに画像APIを呼ぶ必要はありません。
+    """
+
+    def __init__(self, tolerance: int = 30):
+        """
+        Args:
+            tolerance: 衣類の色領域を抽出する際の色の許容範囲
+        """
+        self.tolerance = tolerance
+        self.changer = ColorChanger()
+        self.analyzer = ClothingAnalyzer()
+
+    def detect_garment_color(self, image: Image.Image) -> Tuple[int, int, int]:
+        """
+        衣類の主要色を検出
+
+        Args:
+            image: 生成画像
+
+        Returns:
+            主要色（RGB）
+        """
+        hex_color = self.analyzer._extract_dominant_colors(np.asarray(image.convert('RGB')))[0]
+        return tuple(int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+
+    def generate(
+        self,
+        image: Image.Image,
+        target_colors: List[Tuple[int, int, int]],
+        source_color: Optional[Tuple[int, int, int]] = None,
+        match_tone: bool = True,
+    ) -> Tuple[List[Image.Image], Dict]:
+        """
+        カラーバリエーションを一括生成
+
+        Args:
+            image: 生成画像
+            target_colors: 変更先の色（RGB）のリスト
+            source_color: 衣類の色（Noneの場合は自動検出）
+            match_tone: 彩度・明度も変更先の色に合わせるか
+                （Falseの場合はchange_to_specific_colorと同じく色相のみ変更）
+
+        Returns:
+            (色違い画像のリスト, メタデータ)
+        """
+        if source_color is None:
+            source_color = self.detect_garment_color(image)
+
+        print(f"[Colorway] {len(target_colors)}色のバリエーションを生成中 (元の色: RGB{source_color})")
+
+        # HSV変換とマスクは全ての色で共有
+        img_rgb = np.asarray(image.convert('RGB'))
+        img_hsv = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2HSV)
+        mask = self.changer.create_mask_by_color(image, source_color, self.tolerance)
+
+        luts = np.stack([
+            self.changer.build_hsv_lut(*self._adjustment(source_color, color, match_tone))
+            for color in target_colors
+        ])  # (N, 256, 1, 3)
+
+        # 全ての色をまとめてルックアップし、1回のcvtColorでRGBに戻す
+        height, width = img_hsv.shape[:2]
+        variants_hsv = np.stack(
+            [luts[:, img_hsv[:, :, c], 0, c] for c in range(3)], axis=-1
+        )  # (N, H, W, 3)
+        variants_rgb = cv2.cvtColor(
+            variants_hsv.reshape(len(target_colors) * height, width, 3), cv2.COLOR_HSV2RGB
+        ).reshape(len(target_colors), height, width, 3)
+
+        # マスク外の画素（元画像側の項）も共有
+        mask_3ch = cv2.cvtColor(mask, cv2.COLOR_GRAY2RGB).astype(np.float32) / 255.0
+        original_term = img_rgb * (1 - mask_3ch)
+
+        images = [
+            Image.fromarray((variant * mask_3ch + original_term).astype(np.uint8))
+            for variant in variants_rgb
+        ]
+
+        metadata = {
+            "mode": "colorway",
+            "source_color": list(source_color),
+            "target_colors": [list(c) for c in target_colors],
+            "mask_coverage": float(np.count_nonzero(mask)) / mask.size,
+        }
+
+        print(f"[Colorway] 生成完了 (マスク面積: {metadata['mask_coverage']:.1%})")
+
+        return images, metadata
+
+    def save_to_history(
+        self,
+        history_manager,
+        images: List[Image.Image],
+        metadata: Dict,
+        parameters: Optional[Dict] = None,
+        tags: Optional[List[str]] = None,
+    ) -> int:
+        """
+        カラーバリエーションを1件の生成として履歴に保存
+
+        Args:
+            history_manager: HistoryManager（またはHistoryWriter）
+            images: 色違い画像のリスト
+            metadata: generateが返したメタデータ
+            parameters: 元の生成パラメータ（あれば）
+            tags: タグのリスト
+
+        Returns:
+            履歴ID（HistoryWriterの場合は履歴IDを返すFuture）
+        """
+        params = dict(parameters or {})
+        params["colorway"] = metadata
+
+        return history_manager.save_generation(
+            images=images,
+            parameters=params,
+            generation_mode="colorway",
+            tags=tags or [],
+        )
+
+    @staticmethod
+    def _adjustment(
+        source_color: Tuple[int, int, int],
+        target_color: Tuple[int, int, int],
+        match_tone: bool,
+    ) -> Tuple[int, float, float]:
+        """元の色から変更先の色への (色相シフト, 彩度倍率, 明度倍率)"""
+        colors = np.uint8([[source_color, target_color]])
+        source_hsv, target_hsv = cv2.cvtColor(colors, cv2.COLOR_RGB2HSV)[0].astype(int)
+
+        hue_shift = int(target_hsv[0]) - int(source_hsv[0])
+        if not match_tone:
+            return hue_shift, 1.0, 1.0
+
+        saturation_scale = target_hsv[1] / max(int(source_hsv[1]), 1)
+        value_scale = target_hsv[2] / max(int(source_hsv[2]), 1)
+        return hue_shift, float(saturation_scale), float(value_scale)
@@ -1,9 +1,36 @@
 """Face swapping utility for reference person feature"""
 
+import threading
+from functools import lru_cache
+
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+
+
+@lru_cache(maxsize=32)
+def _radial_mask(height: int, width: int) -> np.ndarray:
+    """
+    中心が1、端が0の放射状マスクを作成（サイズごとにキャッシュ）
+    
+    Args:
+        height: マスクの高さ
+        width: マスクの幅
+    
+    Returns:
+        (height, width, 1) のfloat32マスク（読み取り専用）
+    """
+    center_x = max(width // 2, 1)
+    center_y = max(height // 2, 1)
+    
+    dist_x = np.abs(np.arange(width) - width // 2) / center_x
+    dist_y = np.abs(np.arange(height) - height // 2) / center_y
+    dist = np.sqrt(dist_y[:, None] ** 2 + dist_x[None, :] ** 2)
+    
+    mask = np.maximum(0, 1 - dist).astype(np.float32)[:, :, None]
+    mask.setflags(write=False)
+    return mask
 
 
 class FaceSwapper:
@@ -12,9 +39,18 @@ class FaceSwapper:
     参考人物の顔を、生成された画像に移植します
     """
     
-    def __init__(self):
-        """初期化"""
-        pass
+    # Haar Cascade分類器（全インスタンスで共有し、初回のみ読み込む）
+    _face_cascade = None
+    _cascade_lock = threading.Lock()
+    
+    def __init__(self, seamless: bool = False):
+        """
+        初期化
+        
+        Args:
+            seamless: Trueの場合、cv2.seamlessCloneで境界を馴染ませる
+        """
+        self.seamless = seamless
     
     def swap_face(
         self,
@@ -33,61 +69,131 @@ class FaceSwapper:
         """
         print("[Face Swapper] 顔交換を開始...")
         
-        # PIL → OpenCV形式に変換
-        source_cv = cv2.cvtColor(np.array(source_image.convert('RGB')), cv2.COLOR_RGB2BGR)
-        target_cv = cv2.cvtColor(np.array(target_image.convert('RGB')), cv2.COLOR_RGB2BGR)
-        
-        # 顔検出
-        source_face_box = self._detect_face(source_cv)
-        target_face_box = self._detect_face(target_cv)
+        source_face = self._extract_source_face(source_image)
+        if source_face is None:
+            print("[Face Swapper] 顔が検出できませんでした。元の画像を返します。")
+            return target_image
         
-        if source_face_box is None or target_face_box is None:
+        result_image = self._swap_onto(source_face, target_image)
+        if result_image is None:
             print("[Face Swapper] 顔が検出できませんでした。元の画像を返します。")
             return target_image
         
-        # 顔を抽出
-        sx1, sy1, sx2, sy2 = source_face_box
-        tx1, ty1, tx2, ty2 = target_face_box
+        print("[Face Swapper] 顔交換完了")
         
-        source_face = source_cv[sy1:sy2, sx1:sx2]
+        return result_image
+    
+    def swap_face_batch(
+        self,
+        source_image: Image.Image,
+        target_images: List[Image.Image],
+    ) -> List[Image.Image]:
+        """
+        1枚の参考人物の顔を複数の生成画像に移植
         
-        # ターゲットサイズにリサイズ
-        target_width = tx2 - tx1
-        target_height = ty2 - ty1
-        resized_face = cv2.resize(source_face, (target_width, target_height))
+        参考人物の顔検出・切り出しは1回だけ行います。
+        
+        Args:
+            source_image: 参考人物画像（この顔を使用）
+            target_images: 生成画像のリスト
         
-        # 顔を貼り付け
-        result_cv = target_cv.copy()
-        result_cv[ty1:ty2, tx1:tx2] = resized_face
+        Returns:
+            顔交換後の画像のリスト（顔が検出できなかった画像は元のまま）
+        """
+        print(f"[Face Swapper] {len(target_images)}枚に顔交換を開始...")
         
-        # ぼかして境界を自然に
-        result_cv = self._blend_face(result_cv, target_cv, target_face_box)
+        source_face = self._extract_source_face(source_image)
+        if source_face is None:
+            print("[Face Swapper] 参考人物の顔が検出できませんでした。元の画像を返します。")
+            return list(target_images)
         
-        # OpenCV → PIL形式に変換
-        result_rgb = cv2.cvtColor(result_cv, cv2.COLOR_BGR2RGB)
-        result_image = Image.fromarray(result_rgb)
+        results = []
+        swapped = 0
+        for target_image in target_images:
+            result_image = self._swap_onto(source_face, target_image)
+            if result_image is None:
+                results.append(target_image)
+            else:
+                results.append(result_image)
+                swapped += 1
         
-        print("[Face Swapper] 顔交換完了")
+        print(f"[Face Swapper] 顔交換完了 ({swapped}/{len(target_images)}枚)")
         
-        return result_image
+        return results
+    
+    def _extract_source_face(self, source_image: Image.Image) -> Optional[np.ndarray]:
+        """
+        参考人物の顔領域を切り出し
+        
+        Args:
+            source_image: 参考人物画像
+        
+        Returns:
+            顔領域（RGB配列）または None
+        """
+        source_rgb = np.asarray(source_image.convert('RGB'))
+        source_face_box = self._detect_face(source_rgb)
+        
+        if source_face_box is None:
+            return None
+        
+        sx1, sy1, sx2, sy2 = source_face_box
+        return source_rgb[sy1:sy2, sx1:sx2]
+    
+    def _swap_onto(
+        self,
+        source_face: np.ndarray,
+        target_image: Image.Image,
+    ) -> Optional[Image.Image]:
+        """
+        切り出し済みの顔を生成画像に貼り付け
+        
+        Args:
+            source_face: 参考人物の顔領域（RGB配列）
+            target_image: 生成画像
+        
+        Returns:
+            顔交換後の画像（顔が検出できない場合はNone）
+        """
+        result = np.array(target_image.convert('RGB'))
+        target_face_box = self._detect_face(result)
+        
+        if target_face_box is None:
+            return None
+        
+        # ターゲットサイズにリサイズ
+        tx1, ty1, tx2, ty2 = target_face_box
+        resized_face = cv2.resize(source_face, (tx2 - tx1, ty2 - ty1))
+        
+        # 顔領域だけをブレンド（境界を自然に）
+        if not (self.seamless and self._seamless_clone(result, resized_face, target_face_box)):
+            self._blend_face(result, resized_face, target_face_box)
+        
+        return Image.fromarray(result)
+    
+    @classmethod
+    def _get_face_cascade(cls):
+        """Haar Cascade分類器を取得（初回のみXMLから読み込む）"""
+        if cls._face_cascade is None:
+            with cls._cascade_lock:
+                if cls._face_cascade is None:
+                    cls._face_cascade = cv2.CascadeClassifier(
+                        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+                    )
+        return cls._face_cascade
     
-    def _detect_face(self, image_cv: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    def _detect_face(self, image_rgb: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
         """
         顔を検出
         
         Args:
-            image_cv: OpenCV形式の画像
+            image_rgb: RGB形式の画像配列
         
         Returns:
             (x1, y1, x2, y2) または None
         """
-        # Haar Cascade分類器で顔検出
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        
-        gray = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+        faces = self._get_face_cascade().detectMultiScale(gray, 1.1, 4)
         
         if len(faces) == 0:
             return None
@@ -100,55 +206,58 @@ class FaceSwapper:
         expand = 0.3
         x1 = max(0, int(x - w * expand))
         y1 = max(0, int(y - h * expand * 1.5))  # 上は髪があるので more
-        x2 = min(image_cv.shape[1], int(x + w * (1 + expand)))
-        y2 = min(image_cv.shape[0], int(y + h * (1 + expand * 0.5)))
+        x2 = min(image_rgb.shape[1], int(x + w * (1 + expand)))
+        y2 = min(image_rgb.shape[0], int(y + h * (1 + expand * 0.5)))
         
         return (x1, y1, x2, y2)
     
     def _blend_face(
         self,
         result: np.ndarray,
-        original: np.ndarray,
+        face: np.ndarray,
         face_box: Tuple[int, int, int, int]
-    ) -> np.ndarray:
+    ) -> None:
         """
-        顔の境界をぼかして自然に
+        顔を放射状マスクで合成（resultの顔領域をその場で書き換え）
         
         Args:
-            result: 顔交換後の画像
-            original: 元の画像
+            result: 生成画像（元の画素を保持）
+            face: 顔領域サイズにリサイズ済みの顔
             face_box: 顔の領域
-        
-        Returns:
-            ぼかし処理後の画像
         """
         x1, y1, x2, y2 = face_box
+        mask = _radial_mask(y2 - y1, x2 - x1)
         
-        # マスクを作成（中心が1、端が0）
-        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.float32)
-        center_x = (x2 - x1) // 2
-        center_y = (y2 - y1) // 2
-        
-        for y in range(y2 - y1):
-            for x in range(x2 - x1):
-                dist_x = abs(x - center_x) / center_x
-                dist_y = abs(y - center_y) / center_y
-                dist = np.sqrt(dist_x**2 + dist_y**2)
-                mask[y, x] = max(0, 1 - dist)
+        roi = result[y1:y2, x1:x2]
+        orig_region = roi.astype(np.float32)
         
-        # マスクを3チャンネルに
-        mask_3ch = cv2.merge([mask, mask, mask])
-        
-        # ブレンド
-        face_region = result[y1:y2, x1:x2].astype(np.float32)
-        orig_region = original[y1:y2, x1:x2].astype(np.float32)
+        blended = face.astype(np.float32) * mask + orig_region * (1 - mask)
+        roi[...] = blended.astype(np.uint8)
+    
+    def _seamless_clone(
+        self,
+        result: np.ndarray,
+        face: np.ndarray,
+        face_box: Tuple[int, int, int, int]
+    ) -> bool:
+        """
+        cv2.seamlessCloneで顔を合成（resultをその場で書き換え）
         
-        blended = (face_region * mask_3ch + orig_region * (1 - mask_3ch)).astype(np.uint8)
+        Returns:
+            成功した場合True（失敗時はresultを変更しない）
+        """
+        x1, y1, x2, y2 = face_box
+        mask = (_radial_mask(y2 - y1, x2 - x1)[:, :, 0] > 0).astype(np.uint8) * 255
+        center = (x1 + (x2 - x1) // 2, y1 + (y2 - y1) // 2)
         
-        result_blended = result.copy()
-        result_blended[y1:y2, x1:x2] = blended
+        try:
+            cloned = cv2.seamlessClone(face, result, mask, center, cv2.NORMAL_CLONE)
+        except cv2.error as e:
+            print(f"[Face Swapper] seamlessClone失敗、通常のブレンドを使用: {e}")
+            return False
         
-        return result_blended
+        result[y1:y2, x1:x2] = cloned[y1:y2, x1:x2]
+        return True
 
 
 # テスト用
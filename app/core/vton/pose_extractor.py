@@ -1,19 +1,58 @@
 """Pose extraction using MediaPipe"""
 
+import hashlib
+import json
+import os
+import threading
 import numpy as np
 from PIL import Image
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 from pathlib import Path
 
 
+# ランドマークキャッシュの形式バージョン（変更時は古いキャッシュを無視）
+POSE_CACHE_VERSION = 1
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+_shared_extractor = None
+_shared_lock = threading.Lock()
+
+
+def get_pose_extractor() -> "PoseExtractor":
+    """アプリ全体で共有するPoseExtractorを取得（検出器の読み込みは1回だけ）"""
+    global _shared_extractor
+    with _shared_lock:
+        if _shared_extractor is None:
+            _shared_extractor = PoseExtractor()
+        return _shared_extractor
+
+
 class PoseExtractor:
-    """MediaPipeを使用してポーズを抽出"""
+    """MediaPipeを使用してポーズを抽出
+    
+    検出器は初回使用時に1回だけ読み込み、以降の呼び出しで使い回します。
+    抽出結果は画像の内容ハッシュをキーとしてディスクにキャッシュします。
+    """
     
-    def __init__(self):
-        """初期化"""
+    def __init__(self, cache_dir: str = None):
+        """
+        初期化
+        
+        Args:
+            cache_dir: ランドマークキャッシュの保存先（Noneの場合はデフォルト）
+        """
         self.mediapipe_available = False
         self.pose_detector = None
         
+        if cache_dir is None:
+            app_data = Path.home() / "AppData" / "Local" / "VirtualFashionTryOn"
+            cache_dir = str(app_data / "pose_cache")
+        self.cache_dir = Path(cache_dir)
+        
+        # MediaPipeのグラフはスレッドセーフではないため検出はロックで直列化
+        self._detector_lock = threading.Lock()
+        
         # MediaPipeのインポートを試みる
         try:
             import mediapipe as mp
@@ -39,48 +78,47 @@ class PoseExtractor:
                 'pose_type': 推定されたポーズタイプ
             }
         """
-        if not self.mediapipe_available:
-            print("[WARN] MediaPipeが利用できないため、ポーズ抽出をスキップします")
-            return None
-        
         if not Path(image_path).exists():
             print(f"[ERROR] 画像が見つかりません: {image_path}")
             return None
         
         try:
+            # キャッシュを確認（MediaPipeがなくても抽出済みの結果は使える）
+            image_hash = self._image_hash(image_path)
+            cached = self._load_cached(image_hash)
+            if cached is not None:
+                return cached.get('pose')
+            
+            if not self.mediapipe_available:
+                print("[WARN] MediaPipeが利用できないため、ポーズ抽出をスキップします")
+                return None
+            
             # 画像を読み込み
             image = Image.open(image_path)
             image_rgb = np.array(image.convert('RGB'))
             
-            # ポーズ検出器を初期化（都度初期化）
-            with self.mp_pose.Pose(
-                static_image_mode=True,
-                model_complexity=2,  # 0, 1, or 2
-                enable_segmentation=False,
-                min_detection_confidence=0.5
-            ) as pose:
-                # ポーズを検出
-                results = pose.process(image_rgb)
-                
-                if not results.pose_landmarks:
-                    print("[WARN] ポーズが検出できませんでした")
-                    return None
-                
-                # ランドマークを抽出
-                landmarks = self._extract_landmarks(results.pose_landmarks)
-                
+            landmarks = self._detect_landmarks(image_rgb)
+            
+            if landmarks is None:
+                print("[WARN] ポーズが検出できませんでした")
+                pose_info = None
+            else:
                 # ポーズタイプを推定
                 pose_type = self._estimate_pose_type(landmarks)
                 
                 # テキスト記述を生成
                 description = self._generate_description(landmarks, pose_type)
                 
-                return {
+                pose_info = {
                     'landmarks': landmarks,
                     'description': description,
                     'pose_type': pose_type,
                     'confidence': 0.8  # TODO: 実際の信頼度を計算
                 }
+            
+            # 検出できなかった結果もキャッシュ（同じ画像で再検出しない）
+            self._save_cached(image_hash, pose_info)
+            return pose_info
         
         except Exception as e:
             print(f"[ERROR] ポーズ抽出エラー: {e}")
@@ -88,6 +126,125 @@ class PoseExtractor:
             traceback.print_exc()
             return None
     
+    def extract_poses_from_directory(
+        self,
+        directory: str,
+        recursive: bool = False,
+        progress_callback: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, Optional[Dict]]:
+        """ディレクトリ内の全画像からポーズを抽出
+        
+        Args:
+            directory: 画像ディレクトリ
+            recursive: サブディレクトリも対象にするか
+            progress_callback: 進捗コールバック (メッセージ, パーセント)
+        
+        Returns:
+            {画像パス: ポーズ情報またはNone}
+        """
+        dir_path = Path(directory)
+        if not dir_path.exists():
+            print(f"[ERROR] ディレクトリが見つかりません: {directory}")
+            return {}
+        
+        pattern = "**/*" if recursive else "*"
+        image_files = sorted(
+            p for p in dir_path.glob(pattern)
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+        )
+        
+        results = {}
+        for i, image_file in enumerate(image_files, start=1):
+            results[str(image_file)] = self.extract_pose(str(image_file))
+            if progress_callback:
+                progress_callback(
+                    f"ポーズを抽出中 ({i}/{len(image_files)})...",
+                    int(i / len(image_files) * 100)
+                )
+        
+        detected = sum(1 for r in results.values() if r)
+        print(f"[INFO] ポーズ抽出完了: {detected}/{len(image_files)}枚で検出")
+        
+        return results
+    
+    def close(self):
+        """検出器を解放"""
+        with self._detector_lock:
+            if self.pose_detector is not None:
+                self.pose_detector.close()
+                self.pose_detector = None
+    
+    def _get_detector(self):
+        """検出器を取得（初回のみモデルを読み込む）"""
+        if self.pose_detector is None:
+            self.pose_detector = self.mp_pose.Pose(
+                static_image_mode=True,
+                model_complexity=2,  # 0, 1, or 2
+                enable_segmentation=False,
+                min_detection_confidence=0.5
+            )
+        return self.pose_detector
+    
+    def _process(self, image_rgb: np.ndarray):
+        """MediaPipeでポーズを検出"""
+        with self._detector_lock:
+            return self._get_detector().process(image_rgb)
+    
+    def _detect_landmarks(self, image_rgb: np.ndarray) -> Optional[Dict[str, Tuple[float, float, float]]]:
+        """画像からランドマークを検出（検出できない場合はNone）"""
+        results = self._process(image_rgb)
+        
+        if not results.pose_landmarks:
+            return None
+        
+        return self._extract_landmarks(results.pose_landmarks)
+    
+    @staticmethod
+    def _image_hash(image_path: str) -> str:
+        """画像ファイルの内容ハッシュ"""
+        digest = hashlib.blake2b(digest_size=20)
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _cache_path(self, image_hash: str) -> Path:
+        """キャッシュファイルのパス（先頭2文字でディレクトリを分割）"""
+        return self.cache_dir / image_hash[:2] / f"{image_hash}.json"
+    
+    def _load_cached(self, image_hash: str) -> Optional[Dict]:
+        """キャッシュを読み込み（ない場合はNone）"""
+        cache_path = self._cache_path(image_hash)
+        if not cache_path.exists():
+            return None
+        
+        try:
+            data = json.loads(cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        
+        if data.get('version') != POSE_CACHE_VERSION:
+            return None
+        
+        pose = data.get('pose')
+        if pose:
+            pose['landmarks'] = {k: tuple(v) for k, v in pose['landmarks'].items()}
+        return data
+    
+    def _save_cached(self, image_hash: str, pose_info: Optional[Dict]):
+        """キャッシュを保存（一時ファイル経由で置き換え）"""
+        cache_path = self._cache_path(image_hash)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(".tmp")
+            temp_path.write_text(
+                json.dumps({'version': POSE_CACHE_VERSION, 'pose': pose_info}),
+                encoding="utf-8"
+            )
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"[WARN] ポーズキャッシュの保存に失敗: {e}")
+    
     def _extract_landmarks(self, pose_landmarks) -> Dict[str, Tuple[float, float, float]]:
         """ランドマーク座標を抽出"""
         landmarks = {}
@@ -201,24 +358,18 @@ class PoseExtractor:
             image = cv2.imread(image_path)
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
-            # ポーズを検出
-            with self.mp_pose.Pose(
-                static_image_mode=True,
-                model_complexity=2,
-                enable_segmentation=False,
-                min_detection_confidence=0.5
-            ) as pose:
-                results = pose.process(image_rgb)
-                
-                if results.pose_landmarks:
-                    # ランドマークを描画
-                    self.mp_drawing.draw_landmarks(
-                        image,
-                        results.pose_landmarks,
-                        self.mp_pose.POSE_CONNECTIONS,
-                        self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                        self.mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
-                    )
+            # ポーズを検出（共有の検出器を使用）
+            results = self._process(image_rgb)
+            
+            if results.pose_landmarks:
+                # ランドマークを描画
+                self.mp_drawing.draw_landmarks(
+                    image,
+                    results.pose_landmarks,
+                    self.mp_pose.POSE_CONNECTIONS,
+                    self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
+                    self.mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
+                )
             
             # PIL Imageに変換
             result_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
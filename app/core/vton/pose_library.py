@@ -0,0 +1,194 @@
+"""Pose library with vectorised nearest-neighbour search"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# 比較に使うランドマーク（PoseExtractor._extract_landmarksと同じ13点）
+LANDMARK_NAMES = [
+    'nose',
+    'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist',
+    'left_hip', 'right_hip',
+    'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle',
+]
+
+VECTOR_SIZE = len(LANDMARK_NAMES) * 2
+
+# この類似度以上ならプリセットの記述をそのまま使う
+PRESET_MATCH_THRESHOLD = 0.95
+
+_shared_library = None
+_shared_lock = threading.Lock()
+
+
+def normalize_landmarks(
+    landmarks: Union[Dict[str, Sequence[float]], np.ndarray]
+) -> np.ndarray:
+    """
+    ランドマークを位置・スケールに依存しないベクトルに変換
+
+    x, y座標を重心が原点になるよう平行移動し、全体のノルムが1になるよう
+    スケーリングします。正規化済みベクトル同士の内積がコサイン類似度になります。
+
+    Args:
+        landmarks: {名前: (x, y, z)} の辞書、または (13, 2以上) の配列
+
+    Returns:
+        (26,) のfloat32ベクトル
+    """
+    if isinstance(landmarks, dict):
+        points = np.array([landmarks[name][:2] for name in LANDMARK_NAMES], dtype=np.float32)
+    else:
+        points = np.asarray(landmarks, dtype=np.float32)[:, :2]
+
+    points = points - points.mean(axis=0)
+    norm = np.linalg.norm(points)
+    if norm > 0:
+        points /= norm
+
+    return points.reshape(-1)
+
+
+def get_pose_library() -> "PoseLibrary":
+    """アプリ全体で共有するPoseLibraryを取得"""
+    global _shared_library
+    with _shared_lock:
+        if _shared_library is None:
+            _shared_library = PoseLibrary()
+        return _shared_library
+
+
+class PoseLibrary:
+    """ポーズライブラリ
+
+    プリセットポーズのランドマークを、正規化済みのNumPy行列として保持します。新しい画像のポーズは行列との
+    内積1回で全ポーズとの類似度を計算し、最も近いポーズを求めます。
+    """
+
+    def __init__(self):
+        self.pose_ids: List[str] = []
+        self.descriptions: List[str] = []
+        self.matrix = np.empty((0, VECTOR_SIZE), dtype=np.float32)
+        self.presets_loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pose_ids)
+
+    def add(
+        self,
+        pose_id: str,
+        landmarks: Union[Dict[str, Sequence[float]], np.ndarray],
+        description: str,
+    ):
+        """
+        ポーズを追加（同じIDは置き換え）
+
+        Args:
+            pose_id: ポーズID
+            landmarks: ランドマーク
+            description: ポーズの記述
+        """
+        vector = normalize_landmarks(landmarks)
+
+        with self._lock:
+            if pose_id in self.pose_ids:
+                index = self.pose_ids.index(pose_id)
+                self.matrix[index] = vector
+                self.descriptions[index] = description
+            else:
+                self.pose_ids.append(pose_id)
+                self.descriptions.append(description)
+                self.matrix = np.vstack([self.matrix, vector[None, :]])
+
+    def add_presets(self, presets: Dict[str, Dict[str, str]], extractor) -> int:
+        """
+        プリセットポーズ画像からランドマークを抽出して追加
+
+        抽出結果はPoseExtractorのキャッシュに残るため、2回目以降は高速です。
+
+        Args:
+            presets: {pose_id: {"image": パス, "description": 記述}}
+            extractor: PoseExtractor
+
+        Returns:
+            追加したポーズ数
+        """
+        added = 0
+        for pose_id, info in presets.items():
+            if not Path(info["image"]).exists():
+                continue
+            pose_info = extractor.extract_pose(info["image"])
+            if pose_info:
+                self.add(pose_id, pose_info["landmarks"], info["description"])
+                added += 1
+
+        self.presets_loaded = True
+        print(f"[Pose Library] プリセット{added}件を登録 (全{len(self)}件)")
+        return added
+
+    def query(
+        self,
+        landmarks: Union[Dict[str, Sequence[float]], np.ndarray],
+        top_k: int = 3,
+    ) -> List[Tuple[str, float]]:
+        """
+        類似ポーズを検索
+
+        Args:
+            landmarks: 検索するランドマーク
+            top_k: 返す件数
+
+        Returns:
+            [(pose_id, 類似度)] 類似度の高い順（類似度は-1.0〜1.0）
+        """
+        with self._lock:
+            if len(self.pose_ids) == 0:
+                return []
+
+            similarities = self.matrix @ normalize_landmarks(landmarks)
+
+            count = min(top_k, len(similarities))
+            top = np.argpartition(-similarities, count - 1)[:count]
+            top = top[np.argsort(-similarities[top])]
+
+            return [(self.pose_ids[i], float(similarities[i])) for i in top]
+
+    def similarities(
+        self,
+        landmarks: Union[Dict[str, Sequence[float]], np.ndarray],
+    ) -> Dict[str, float]:
+        """
+        全ポーズとの類似度を取得
+
+        Returns:
+            {pose_id: 類似度}
+        """
+        with self._lock:
+            if len(self.pose_ids) == 0:
+                return {}
+            scores = self.matrix @ normalize_landmarks(landmarks)
+            return dict(zip(self.pose_ids, scores.tolist()))
+
+    def nearest(
+        self,
+        landmarks: Union[Dict[str, Sequence[float]], np.ndarray],
+    ) -> Optional[Tuple[str, str, float]]:
+        """
+        最も近いポーズを取得
+
+        Returns:
+            (pose_id, 記述, 類似度) または None（ライブラリが空の場合）
+        """
+        matches = self.query(landmarks, top_k=1)
+        if not matches:
+            return None
+
+        pose_id, similarity = matches[0]
+        return pose_id, self.descriptions[self.pose_ids.index(pose_id)], similarity
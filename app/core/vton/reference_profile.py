@@ -0,0 +1,172 @@
+"""Reference person feature profile shared across generation jobs"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+# 保存形式のバージョン（変更時は古いキャッシュを作り直す）
+PROFILE_VERSION = 1
+
+
+@dataclass
+class ReferencePersonProfile:
+    """参考人物の特徴プロファイル
+
+    参考人物画像を設定した時に1回だけ計算し、画像が変わるまで
+    全ての生成ジョブで使い回します。
+    """
+
+    content_hash: str
+    image: Image.Image  # RGBに正規化した画像
+    upload_bytes: bytes  # アップロード用にエンコード済みのPNG
+
+
+class ReferenceProfileStore:
+    """参考人物プロファイルのキャッシュ
+
+    メモリ上ではパス・サイズ・更新日時で、ディスク上では画像内容のハッシュで
+    プロファイルを保持します。再起動後も再計算は不要です。
+    """
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Args:
+            cache_dir: 保存先ディレクトリ（Noneの場合はデフォルト）
+        """
+        if cache_dir is None:
+            app_data = Path.home() / "AppData" / "Local" / "VirtualFashionTryOn"
+            cache_dir = str(app_data / "reference_profiles")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._profiles: Dict[Tuple[str, int, int], ReferencePersonProfile] = {}
+        self._lock = threading.Lock()
+
+    def get(self, image_path: str) -> Optional[ReferencePersonProfile]:
+        """
+        プロファイルを取得（未計算の場合は計算して保存）
+
+        Args:
+            image_path: 参考人物画像のパス
+
+        Returns:
+            プロファイル（画像が読めない場合はNone）
+        """
+        path = Path(image_path)
+        if not path.exists():
+            print(f"[Reference Profile] 画像が見つかりません: {image_path}")
+            return None
+
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+        # 同じ画像の計算が並行して走らないようにロック
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                return profile
+
+            try:
+                content_hash = self._content_hash(path)
+                profile = self._load(content_hash)
+                if profile is None:
+                    profile = self._build(path, content_hash)
+                    self._save(profile)
+            except Exception as e:
+                print(f"[Reference Profile] プロファイル作成エラー: {e}")
+                return None
+
+            # 古いバージョンの同じパスは破棄
+            for old_key in [k for k in self._profiles if k[0] == key[0]]:
+                del self._profiles[old_key]
+            self._profiles[key] = profile
+            return profile
+
+    def clear(self):
+        """メモリ上のキャッシュをクリア（ディスク上のキャッシュは残す）"""
+        with self._lock:
+            self._profiles.clear()
+
+    def _build(self, path: Path, content_hash: str) -> ReferencePersonProfile:
+        """画像からプロファイルを計算"""
+        print(f"[Reference Profile] プロファイルを作成中: {path.name}")
+
+        with Image.open(path) as img:
+            image = img.convert('RGB')
+
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+
+        return ReferencePersonProfile(
+            content_hash=content_hash,
+            image=image,
+            upload_bytes=buffer.getvalue(),
+        )
+
+    def _load(self, content_hash: str) -> Optional[ReferencePersonProfile]:
+        """ディスクからプロファイルを読み込み"""
+        profile_dir = self.cache_dir / content_hash
+        meta_path = profile_dir / "profile.json"
+        image_path = profile_dir / "person.png"
+
+        if not meta_path.exists() or not image_path.exists():
+            return None
+
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("version") != PROFILE_VERSION:
+                return None
+
+            upload_bytes = image_path.read_bytes()
+            with Image.open(BytesIO(upload_bytes)) as img:
+                image = img.convert('RGB')
+        except Exception as e:
+            print(f"[Reference Profile] キャッシュ読み込みエラー: {e}")
+            return None
+
+        return ReferencePersonProfile(
+            content_hash=content_hash,
+            image=image,
+            upload_bytes=upload_bytes,
+        )
+
+    def _save(self, profile: ReferencePersonProfile):
+        """プロファイルをディスクに保存（一時ファイル経由で置き換え）"""
+        profile_dir = self.cache_dir / profile.content_hash
+        profile_dir.mkdir(parents=True, exist_ok=True)
+
+        meta = {
+            "version": PROFILE_VERSION,
+            "size": list(profile.image.size),
+        }
+
+        self._atomic_write(profile_dir / "person.png", profile.upload_bytes)
+        self._atomic_write(
+            profile_dir / "profile.json",
+            json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        )
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        """一時ファイルに書いてから置き換え"""
+        temp_path = path.with_suffix(path.suffix + ".tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _content_hash(path: Path) -> str:
+        """画像ファイルの内容ハッシュ"""
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
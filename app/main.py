@@ -2,6 +2,7 @@
 
 import sys
 import os
+import multiprocessing
 
 # Add parent directory to path to allow absolute imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -79,5 +80,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # PyInstaller版で衣類分析のプロセスプールを使うために必要
+    multiprocessing.freeze_support()
     main()
 
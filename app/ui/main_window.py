@@ -162,8 +162,9 @@ class ChatRefinementWorker(QThread):
     progress_updated = Signal(int, str)
     refinement_completed = Signal(Image.Image, str)  # 画像, AI応答
     refinement_failed = Signal(str)
+    candidate_ready = Signal(Image.Image, float, int)  # 候補画像, スコア, 候補番号
 
-    def __init__(self, chat_service, instruction, generate_service, garments, model_attrs, config, conversation_history, base_image=None):
+    def __init__(self, chat_service, instruction, generate_service, garments, model_attrs, config, conversation_history, base_image=None, num_candidates=1):
         super().__init__()
         self.chat_service = chat_service
         self.instruction = instruction
@@ -173,6 +174,7 @@ class ChatRefinementWorker(QThread):
         self.config = config
         self.conversation_history = conversation_history
         self.base_image = base_image  # 編集対象の画像
+        self.num_candidates = num_candidates  # 2以上なら候補を並行生成
 
     def run(self):
         """バックグラウンドで実行"""
@@ -190,19 +192,34 @@ class ChatRefinementWorker(QThread):
             # サービスに進捗コールバックを渡す
             self.generate_service.progress_callback = progress_callback
             
-            # チャット修正を実行（選択画像を渡す）
-            images, ai_response, metadata = loop.run_until_complete(
-                self.chat_service.refine_image(
-                    self.instruction,
-                    self.generate_service,
-                    self.garments,
-                    self.model_attrs,
-                    self.config,
-                    self.conversation_history,
-                    self.base_image,  # 編集対象の画像
-                    progress_callback
+            if self.base_image is not None and self.num_candidates > 1:
+                # 複数の候補を並行生成し、届いた順にUIへ送る
+                def candidate_callback(image, score, index):
+                    self.candidate_ready.emit(image, score, index)
+                
+                images, ai_response, metadata = loop.run_until_complete(
+                    self.chat_service.refine_candidates(
+                        self.instruction,
+                        self.base_image,
+                        self.num_candidates,
+                        candidate_callback,
+                        progress_callback
+                    )
+                )
+            else:
+                # チャット修正を実行（選択画像を渡す）
+                images, ai_response, metadata = loop.run_until_complete(
+                    self.chat_service.refine_image(
+                        self.instruction,
+                        self.generate_service,
+                        self.garments,
+                        self.model_attrs,
+                        self.config,
+                        self.conversation_history,
+                        self.base_image,  # 編集対象の画像
+                        progress_callback
+                    )
                 )
-            )
             
             if images and len(images) > 0:
                 self.refinement_completed.emit(images[0], ai_response)
@@ -346,6 +363,85 @@ class VideoRefinementWorker(QThread):
             loop.close()
 
 
+class HistoryTransferWorker(QThread):
+    """履歴の書き出し・読み込みワーカースレッド"""
+
+    progress_updated = Signal(int)  # 処理した履歴数
+    transfer_finished = Signal(dict)  # 結果
+    transfer_failed = Signal(str)
+
+    def __init__(self, history_manager, history_writer, mode: str, path: str, options: Optional[dict] = None):
+        super().__init__()
+        self.history_manager = history_manager
+        self.history_writer = history_writer
+        self.mode = mode  # "export" / "import"
+        self.path = path
+        self.options = options or {}
+
+    def run(self):
+        """バックグラウンドで実行"""
+        try:
+            from core.history.history_transfer import HistoryExporter, HistoryImporter
+
+            if self.mode == "export":
+                # 保存待ちの履歴も含める（コミットを待つのはこのスレッド）
+                self.history_writer.flush()
+                result = HistoryExporter(self.history_manager).export(
+                    self.path, progress=self.progress_updated.emit, **self.options
+                )
+            else:
+                result = HistoryImporter(self.history_manager).import_from(
+                    self.path, progress=self.progress_updated.emit
+                )
+            self.transfer_finished.emit(result)
+        except Exception as e:
+            self.transfer_failed.emit(str(e))
+
+
+class ColorwayWorker(QThread):
+    """カラーバリエーション生成ワーカースレッド"""
+
+    colorway_finished = Signal(list, dict)  # 画像リスト, メタデータ
+    colorway_failed = Signal(str)
+
+    def __init__(self, generator, image, target_colors: list):
+        super().__init__()
+        self.generator = generator
+        self.image = image
+        self.target_colors = target_colors
+
+    def run(self):
+        """バックグラウンドで実行"""
+        try:
+            images, metadata = self.generator.generate(self.image, self.target_colors)
+            self.colorway_finished.emit(images, metadata)
+        except Exception as e:
+            print(f"[Colorway] エラー: {e}")
+            self.colorway_failed.emit(str(e))
+
+
+class BackgroundReplaceWorker(QThread):
+    """背景差し替えワーカースレッド"""
+
+    replace_finished = Signal(object)  # 差し替え後の画像
+    replace_failed = Signal(str)
+
+    def __init__(self, compositor, image, background):
+        super().__init__()
+        self.compositor = compositor
+        self.image = image
+        self.background = background
+
+    def run(self):
+        """バックグラウンドで実行"""
+        try:
+            new_image = self.compositor.composite(self.image, self.background, color_match=0.3)
+            self.replace_finished.emit(new_image)
+        except Exception as e:
+            print(f"[Background] エラー: {e}")
+            self.replace_failed.emit(str(e))
+
+
 class FashnTryonWorker(QThread):
     """FASHN Virtual Try-On処理ワーカースレッド"""
 
@@ -353,13 +449,15 @@ class FashnTryonWorker(QThread):
     generation_completed = Signal(list, dict)
     generation_failed = Signal(str)
 
-    def __init__(self, adapter, person_image_path, garment_image_path, category, num_samples):
+    def __init__(self, adapter, person_image_path, garment_image_path, category, num_samples,
+                 profile_store=None):
         super().__init__()
         self.adapter = adapter
         self.person_image_path = person_image_path
         self.garment_image_path = garment_image_path
         self.category = category
         self.num_samples = num_samples
+        self.profile_store = profile_store
 
     def run(self):
         """バックグラウンドで実行"""
@@ -370,7 +468,17 @@ class FashnTryonWorker(QThread):
             
             # 画像を読み込み
             progress_callback("画像を読み込み中...", 5)
-            person_image = Image.open(self.person_image_path)
+            profile = None
+            if self.profile_store is not None:
+                profile = self.profile_store.get(self.person_image_path)
+            
+            if profile is not None:
+                # 設定時に計算済みの画像とエンコード結果を再利用
+                person_image = profile.image
+                person_image_bytes = profile.upload_bytes
+            else:
+                person_image = Image.open(self.person_image_path)
+                person_image_bytes = None
             garment_image = Image.open(self.garment_image_path)
             
             # FASHN Virtual Try-Onを実行
@@ -381,7 +489,8 @@ class FashnTryonWorker(QThread):
                 garment_photo_type="flat-lay",
                 mode="quality",
                 num_samples=self.num_samples,
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                person_image_bytes=person_image_bytes
             )
             
             progress_callback("完了", 100)
@@ -398,6 +507,9 @@ class FashnTryonWorker(QThread):
 class MainWindow(QMainWindow):
     """メインウィンドウ"""
 
+    history_saved = Signal(list)  # コミットされた履歴IDのリスト（書き込みスレッドから発行）
+    legacy_images_migrated = Signal(int)  # 移行した旧形式の画像数（メンテナンススレッドから発行）
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Virtual Model Generator")
@@ -417,7 +529,24 @@ class MainWindow(QMainWindow):
         
         # 履歴管理
         from core.history.history_manager import HistoryManager
-        self.history_manager = HistoryManager()
+        from core.history.history_writer import HistoryWriter
+        from core.history.history_maintenance import HistoryMaintenance
+        self.history_manager = HistoryManager(
+            image_codec=self.config_manager.get("HISTORY_IMAGE_CODEC", "png")
+        )
+        # 保存はバックグラウンドで行い、コミット後に履歴パネルを更新
+        self.history_writer = HistoryWriter(self.history_manager, on_saved=self.history_saved.emit)
+        self.history_saved.connect(self._on_history_saved)
+        # 保存期間・アーカイブ・空き領域の解放を定期的に実行（日数が0の処理は行わない）
+        # 以前のバージョンのデータベースは、開始直後にこのスレッドで画像を移行する
+        self.legacy_images_migrated.connect(self._on_legacy_images_migrated)
+        self.history_maintenance = HistoryMaintenance(
+            self.history_manager,
+            full_image_days=self.config_manager.get_int("HISTORY_FULL_IMAGE_DAYS", 0) or None,
+            archive_days=self.config_manager.get_int("HISTORY_ARCHIVE_DAYS", 0) or None,
+            on_migrated=self.legacy_images_migrated.emit,
+        )
+        self.history_maintenance.start()
 
         # 衣類アイテムのリスト
         self.garments: List[ClothingItem] = []
@@ -425,6 +554,16 @@ class MainWindow(QMainWindow):
         # 参考人物画像（オプション）
         self.reference_person_image: Optional[str] = None
         self.reference_person_name: str = ""
+        
+        # 参考人物プロファイル（設定時に1回だけ計算して全ジョブで再利用）
+        from core.vton.reference_profile import ReferenceProfileStore
+        self.reference_profile_store = ReferenceProfileStore()
+        
+        # 背景差し替え（切り抜き結果をキャッシュするため使い回す）
+        self.background_compositor = None
+        
+        # チャット修正（編集セッションを保持するため使い回す）
+        self.chat_service = None
 
         # ワーカースレッド
         self.worker: Optional[GenerationWorker] = None
@@ -444,6 +583,9 @@ class MainWindow(QMainWindow):
 
         # UIを構築
         self._setup_ui()
+        
+        if self.history_manager.legacy_images_pending:
+            self.statusBar().showMessage("以前のバージョンの履歴画像を移行中です...", 0)
 
         # APIキーの確認（未設定なら設定画面を表示）
         self._check_and_show_api_key_setup()
@@ -507,6 +649,8 @@ class MainWindow(QMainWindow):
         self.edit_screen.image_selected.connect(self._on_gallery_image_selected_from_screen)
         self.edit_screen.video_regeneration_requested.connect(self._on_video_regeneration_requested_from_screen)
         self.edit_screen.video_refinement_requested.connect(self._on_video_refinement_requested)
+        self.edit_screen.candidate_selected.connect(self._on_chat_candidate_selected)
+        self.edit_screen.undo_requested.connect(self._on_chat_undo_requested)
         self.content_stack.addWidget(self.edit_screen)
 
     def _navigate_to(self, screen_name: str):
@@ -531,6 +675,7 @@ class MainWindow(QMainWindow):
         if image_path:
             self.reference_person_image = image_path
             self.reference_person_name = Path(image_path).stem
+            self._prepare_reference_profile(image_path)
         else:
             self.reference_person_image = None
             self.reference_person_name = ""
@@ -694,7 +839,8 @@ class MainWindow(QMainWindow):
             self.reference_person_image,
             garment_path,
             category,
-            config.num_outputs
+            config.num_outputs,
+            profile_store=self.reference_profile_store
         )
         self.tryon_worker.progress_updated.connect(self._update_progress)
         self.tryon_worker.generation_completed.connect(self._on_generation_completed)
@@ -773,6 +919,16 @@ class MainWindow(QMainWindow):
         self.reference_person_name = name
         print(f"[Reference Person] 参考人物を設定: {name}")
         self.statusBar().showMessage(f"参考人物を設定しました: {name}", 3000)
+        self._prepare_reference_profile(image_path)
+    
+    def _prepare_reference_profile(self, image_path: str):
+        """参考人物プロファイルをバックグラウンドで計算（生成開始時に待たないように）"""
+        import threading
+        threading.Thread(
+            target=self.reference_profile_store.get,
+            args=(image_path,),
+            daemon=True
+        ).start()
     
     def _on_reference_person_cleared(self):
         """参考人物がクリアされた時"""
@@ -1134,16 +1290,14 @@ class MainWindow(QMainWindow):
         print(f"\n[Chat Refinement] 修正開始: {instruction}")
         print(f"[Chat Refinement] context keys: {context.keys()}")
         
-        from core.pipeline.chat_refinement_service import ChatRefinementService
-        
         # Gemini APIキーを取得
         gemini_key = self.api_key_manager.load_api_key("gemini")
         if not gemini_key:
             self.edit_screen.on_refinement_failed("Gemini APIキーが設定されていません")
             return
 
-        # ChatRefinementServiceを作成
-        chat_service = ChatRefinementService(gemini_key)
+        # ChatRefinementServiceを取得
+        chat_service = self._get_chat_service(gemini_key)
 
         # パラメータを復元
         params = context.get("params", {})
@@ -1216,9 +1370,11 @@ class MainWindow(QMainWindow):
             model_attrs,
             config,
             conversation_history,
-            selected_image  # 選択画像を渡す
+            selected_image,  # 選択画像を渡す
+            context.get("num_candidates", 1)
         )
         self.chat_worker.progress_updated.connect(self._update_chat_refinement_progress)
+        self.chat_worker.candidate_ready.connect(self.edit_screen.add_refinement_candidate)
         self.chat_worker.refinement_completed.connect(self._on_chat_refinement_completed)
         self.chat_worker.refinement_failed.connect(self._on_chat_refinement_failed)
 
@@ -1240,6 +1396,27 @@ class MainWindow(QMainWindow):
         # EditScreenに通知（チャットウィジェットに内部で転送）
         self.edit_screen.on_refinement_completed(new_image, ai_response)
 
+        self._add_chat_refinement_image(new_image, ai_response)
+        
+        self.statusBar().showMessage("修正画像を生成しました", 3000)
+    
+    def _on_chat_candidate_selected(self, image: Image.Image, index: int):
+        """チャット修正の候補が選ばれた時の処理"""
+        # 以降の修正はこの候補から続ける
+        if self.chat_service is not None:
+            self.chat_service.adopt_candidate(index)
+        self._add_chat_refinement_image(image, "候補から選択した修正画像")
+        self.statusBar().showMessage("選択した候補をギャラリーに追加しました", 3000)
+    
+    def _on_chat_undo_requested(self):
+        """チャット修正を1つ前のバージョンに戻す"""
+        image = self.chat_service.undo() if self.chat_service is not None else None
+        self.edit_screen.on_undo_completed(image)
+        if image is not None:
+            self.statusBar().showMessage("1つ前の修正結果に戻しました", 3000)
+    
+    def _add_chat_refinement_image(self, new_image: Image.Image, ai_response: str):
+        """チャット修正画像をギャラリーと履歴に追加"""
         # ギャラリーに追加
         current_images = self.edit_screen.get_images()
         current_images.append(new_image)
@@ -1265,7 +1442,8 @@ class MainWindow(QMainWindow):
                 "ai_response": ai_response
             }
             
-            history_id = self.history_manager.save_generation(
+            # コミット後に履歴パネルを更新（_on_history_saved）
+            self.history_writer.save_generation(
                 images=[new_image],
                 parameters=chat_params,
                 generation_mode="chat_refinement",
@@ -1273,14 +1451,9 @@ class MainWindow(QMainWindow):
                 notes=ai_response[:100] if ai_response else ""
             )
             
-            # 履歴パネルを更新
-            self.edit_screen.refresh_history()
-            
-            print(f"[History] チャット修正画像を履歴に保存: ID={history_id}")
+            print("[History] チャット修正画像の保存を予約")
         except Exception as e:
             print(f"[History] チャット修正画像の保存エラー: {e}")
-        
-        self.statusBar().showMessage("修正画像を生成しました", 3000)
     
     def _on_chat_refinement_failed(self, error_message: str):
         """チャット修正失敗時の処理"""
@@ -1292,8 +1465,6 @@ class MainWindow(QMainWindow):
         """動画修正が要求された時（チャットから）"""
         print(f"[Video Refinement] 動画修正要求: {instruction}")
 
-        from core.pipeline.chat_refinement_service import ChatRefinementService
-
         # Gemini APIキーを取得
         gemini_key = self.api_key_manager.load_api_key("gemini")
         if not gemini_key:
@@ -1306,8 +1477,8 @@ class MainWindow(QMainWindow):
             self.edit_screen.on_refinement_failed("FASHN APIキーが設定されていません")
             return
 
-        # ChatRefinementServiceを作成
-        chat_service = ChatRefinementService(gemini_key)
+        # ChatRefinementServiceを取得
+        chat_service = self._get_chat_service(gemini_key)
 
         # パラメータを復元
         params = context.get("params", {})
@@ -1690,7 +1861,8 @@ class MainWindow(QMainWindow):
                 self.reference_person_image,
                 garment_path,
                 category,
-                config.num_outputs
+                config.num_outputs,
+                profile_store=self.reference_profile_store
             )
             self.tryon_worker.progress_updated.connect(self._update_progress)
             self.tryon_worker.generation_completed.connect(self._on_generation_completed)
@@ -1762,6 +1934,14 @@ class MainWindow(QMainWindow):
 
         self.worker.start()
 
+    def _get_chat_service(self, gemini_key: str):
+        """ChatRefinementServiceを取得（APIキーが同じ間は使い回す）"""
+        from core.pipeline.chat_refinement_service import ChatRefinementService
+
+        if self.chat_service is None or self.chat_service.api_key != gemini_key:
+            self.chat_service = ChatRefinementService(gemini_key)
+        return self.chat_service
+
     def _create_adapter(self, provider: str):
         """プロバイダアダプタを作成"""
         api_key = self.api_key_manager.load_api_key(provider)
@@ -1829,6 +2009,12 @@ class MainWindow(QMainWindow):
     def _save_to_history(self, images: List[Image.Image], metadata: Dict):
         """生成結果を履歴に保存"""
         try:
+            # ほぼ同じ画像が既に履歴にある場合は確認（HISTORY_DUPLICATE_WARNING=true の場合のみ）
+            if self.config_manager.get_bool("HISTORY_DUPLICATE_WARNING", False):
+                if not self._confirm_duplicate_save(images):
+                    print("[History] 重複した画像のため履歴に保存しませんでした")
+                    return
+            
             # 角度情報を抽出
             angles = None
             if metadata.get("mode") == "multi_angle" and metadata.get("angles"):
@@ -1843,8 +2029,8 @@ class MainWindow(QMainWindow):
                 else:
                     json_safe_params[key] = value
             
-            # 履歴に保存
-            history_id = self.history_manager.save_generation(
+            # 履歴に保存（エンコードと書き込みはバックグラウンド、コミット後に履歴パネルを更新）
+            self.history_writer.save_generation(
                 images=images,
                 parameters=json_safe_params,
                 generation_mode=self.generation_mode,
@@ -1852,16 +2038,57 @@ class MainWindow(QMainWindow):
                 tags=[],
                 notes=""
             )
-            
-            # 履歴パネルを更新
-            self.edit_screen.refresh_history()
-            
-            print(f"[History] 履歴保存完了: ID={history_id}")
         
         except Exception as e:
             print(f"[History] 履歴保存エラー: {e}")
             # エラーでも処理は続行
 
+    def _confirm_duplicate_save(self, images: List[Image.Image]) -> bool:
+        """
+        ほぼ同じ画像が履歴にある場合に、保存するかを確認
+        
+        Returns:
+            保存するか
+        """
+        from datetime import datetime
+        
+        # 索引の作成中（起動直後）は確認しない（作成を待つとUIが止まるため）
+        if not self.history_manager.similarity_index_ready:
+            print("[History] 類似画像検索の索引を作成中のため、重複の確認を省略します")
+            return True
+        
+        duplicates = self.history_manager.find_duplicates(images)
+        if not duplicates:
+            return True
+        
+        dates = "\n".join(
+            datetime.fromisoformat(history["created_at"]).strftime("%Y-%m-%d %H:%M")
+            for history in duplicates[:5]
+        )
+        reply = QMessageBox.question(
+            self,
+            "確認",
+            f"ほぼ同じ画像が既に履歴にあります（{len(duplicates)}件）:\n{dates}\n\n履歴に保存しますか？",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        return reply == QMessageBox.Yes
+    
+    def _on_history_saved(self, history_ids: list):
+        """履歴の書き込みがコミットされた時"""
+        self.edit_screen.refresh_history()
+        print(f"[History] 履歴を書き込み: ID={history_ids}")
+    
+    def _on_legacy_images_migrated(self, count: int):
+        """旧形式の履歴画像の移行が完了した時"""
+        self.edit_screen.refresh_history()
+        self.statusBar().showMessage(f"以前のバージョンの履歴画像を移行しました（{count}枚）", 5000)
+
+    def closeEvent(self, event):
+        """終了時に未保存の履歴を書き込む"""
+        self.history_maintenance.stop(timeout=5)
+        self.history_writer.close()
+        super().closeEvent(event)
+
     def _setup_menubar(self):
         """メニューバーをセットアップ"""
         menubar = self.menuBar()
@@ -1879,6 +2106,15 @@ class MainWindow(QMainWindow):
         
         file_menu.addSeparator()
         
+        # 履歴の書き出し・読み込み（別のPCへの移行や分析用）
+        export_history_action = file_menu.addAction("履歴を書き出し...")
+        export_history_action.triggered.connect(self._export_history)
+        
+        import_history_action = file_menu.addAction("履歴を読み込み...")
+        import_history_action.triggered.connect(self._import_history)
+        
+        file_menu.addSeparator()
+        
         # プロジェクトメニュー
         project_submenu = file_menu.addMenu("プロジェクト")
         
@@ -1910,9 +2146,13 @@ class MainWindow(QMainWindow):
         batch_action.triggered.connect(self._open_batch_processor)
         
         # 色変更ツール
-        color_action = tools_menu.addAction("衣類色変更...")
+        color_action = tools_menu.addAction("カラーバリエーション生成")
         color_action.triggered.connect(self._open_color_changer)
         
+        # 背景差し替え（再生成せずにローカルで合成）
+        background_action = tools_menu.addAction("背景を差し替え")
+        background_action.triggered.connect(self._replace_background)
+        
         tools_menu.addSeparator()
         
         # 統計情報
@@ -2029,6 +2269,60 @@ class MainWindow(QMainWindow):
             "プロジェクトインポート\n※次回実装します"
         )
     
+    def _export_history(self):
+        """履歴をフォルダに書き出し"""
+        dest_dir = QFileDialog.getExistingDirectory(self, "履歴の書き出し先を選択")
+        if dest_dir:
+            self._start_history_transfer("export", dest_dir, {"image_container": "tar"})
+    
+    def _import_history(self):
+        """書き出した履歴を読み込み"""
+        source_dir = QFileDialog.getExistingDirectory(self, "書き出した履歴のフォルダを選択")
+        if source_dir:
+            if not (Path(source_dir) / "manifest.json").exists():
+                QMessageBox.warning(self, "エラー", "履歴の書き出しフォルダではありません（manifest.jsonがありません）")
+                return
+            self._start_history_transfer("import", source_dir)
+    
+    def _start_history_transfer(self, mode: str, path: str, options: Optional[dict] = None):
+        """履歴の書き出し・読み込みをバックグラウンドで開始"""
+        if getattr(self, "history_transfer_worker", None) and self.history_transfer_worker.isRunning():
+            QMessageBox.information(self, "情報", "履歴の書き出し・読み込みを実行中です。")
+            return
+        if self.history_manager.legacy_images_pending:
+            QMessageBox.information(self, "情報", "以前のバージョンの履歴画像を移行中です。完了後にもう一度お試しください。")
+            return
+        
+        label = "書き出し" if mode == "export" else "読み込み"
+        self.history_transfer_worker = HistoryTransferWorker(
+            self.history_manager, self.history_writer, mode, path, options
+        )
+        self.history_transfer_worker.progress_updated.connect(
+            lambda count: self.statusBar().showMessage(f"履歴を{label}中: {count}件", 0)
+        )
+        self.history_transfer_worker.transfer_finished.connect(
+            lambda result: self._on_history_transfer_finished(mode, result)
+        )
+        self.history_transfer_worker.transfer_failed.connect(
+            lambda error: QMessageBox.critical(self, "エラー", f"履歴の{label}に失敗しました:\n{error}")
+        )
+        self.history_transfer_worker.start()
+        self.statusBar().showMessage(f"履歴を{label}中...", 0)
+    
+    def _on_history_transfer_finished(self, mode: str, result: dict):
+        """履歴の書き出し・読み込みが完了した時"""
+        if mode == "export":
+            message = f"{result['histories']}件の履歴を書き出しました。"
+            if result.get("archived_histories"):
+                message += f"\n（アーカイブした{result['archived_histories']}件を含みます）"
+        else:
+            message = f"{result['imported']}件の履歴を読み込みました。"
+            if result["skipped"]:
+                message += f"\n（既にあった{result['skipped']}件はスキップしました）"
+            self.edit_screen.refresh_history()
+        self.statusBar().showMessage(message.splitlines()[0], 5000)
+        QMessageBox.information(self, "完了", message)
+    
     def _open_batch_processor(self):
         """バッチ処理ダイアログを開く"""
         QMessageBox.information(
@@ -2038,12 +2332,97 @@ class MainWindow(QMainWindow):
         )
     
     def _open_color_changer(self):
-        """色変更ダイアログを開く"""
-        QMessageBox.information(
-            self,
-            "情報",
-            "色変更ツール\n※次回実装します"
+        """選択中の画像からカラーバリエーションを生成"""
+        if self.selected_image_for_edit is None:
+            QMessageBox.information(
+                self,
+                "情報",
+                "色を変更する画像をギャラリーで選択してください。"
+            )
+            return
+        
+        if getattr(self, "colorway_worker", None) and self.colorway_worker.isRunning():
+            QMessageBox.information(self, "情報", "カラーバリエーションを生成中です。")
+            return
+        
+        from core.vton.colorway_generator import ColorwayGenerator
+        
+        generator = ColorwayGenerator()
+        target_colors = list(generator.changer.preset_colors().values())
+        
+        # 生成中もUIを止めないようにワーカーで実行（完了まで属性で保持）
+        self.colorway_worker = ColorwayWorker(generator, self.selected_image_for_edit, target_colors)
+        self.colorway_worker.colorway_finished.connect(self._on_colorway_finished)
+        self.colorway_worker.colorway_failed.connect(
+            lambda error: QMessageBox.warning(self, "エラー", f"カラーバリエーションの生成に失敗しました:\n{error}")
         )
+        self.colorway_worker.start()
+        self.statusBar().showMessage("カラーバリエーションを生成中...", 0)
+    
+    def _on_colorway_finished(self, images: list, metadata: dict):
+        """カラーバリエーションの生成が完了した時"""
+        # 色違いはまとめて1件の履歴として保存（バックグラウンド）
+        self.colorway_worker.generator.save_to_history(self.history_writer, images, metadata)
+        
+        self.edit_screen.set_images(images, metadata)
+        self.statusBar().showMessage(f"{len(images)}色のバリエーションを生成しました", 3000)
+    
+    def _replace_background(self):
+        """選択中の画像の背景を、背景タブで選択中の背景に差し替え"""
+        if self.selected_image_for_edit is None:
+            QMessageBox.information(
+                self,
+                "情報",
+                "背景を差し替える画像をギャラリーで選択してください。"
+            )
+            return
+        
+        if getattr(self, "background_worker", None) and self.background_worker.isRunning():
+            QMessageBox.information(self, "情報", "背景を差し替え中です。")
+            return
+        
+        gallery = self.generation_screen.background_gallery
+        bg_id, _, bg_image = gallery.get_selected_background()
+        if bg_image:
+            background = bg_image
+        else:
+            # 画像のないプリセット（白・グレー）は単色で合成
+            color = gallery.background_presets.get(bg_id, {}).get("color", "#FFFFFF")
+            background = tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+        
+        if self.background_compositor is None:
+            from core.vton.background_compositor import BackgroundCompositor
+            self.background_compositor = BackgroundCompositor()
+        
+        # 合成中もUIを止めないようにワーカーで実行（完了まで属性で保持）
+        self.background_worker = BackgroundReplaceWorker(
+            self.background_compositor, self.selected_image_for_edit, background
+        )
+        self.background_worker.replace_finished.connect(
+            lambda new_image: self._on_background_replaced(new_image, bg_id, bg_image)
+        )
+        self.background_worker.replace_failed.connect(
+            lambda error: QMessageBox.warning(self, "エラー", f"背景の差し替えに失敗しました:\n{error}")
+        )
+        self.background_worker.start()
+        self.statusBar().showMessage("背景を差し替え中...", 0)
+    
+    def _on_background_replaced(self, new_image, bg_id: str, bg_image: Optional[str]):
+        """背景の差し替えが完了した時"""
+        current_images = self.edit_screen.get_images()
+        current_images.append(new_image)
+        self.edit_screen.set_images(current_images, {})
+        
+        try:
+            self.history_writer.save_generation(
+                images=[new_image],
+                parameters={"background": bg_id, "background_image": bg_image},
+                generation_mode="background_swap",
+            )
+        except Exception as e:
+            print(f"[History] 履歴保存エラー: {e}")
+        
+        self.statusBar().showMessage("背景を差し替えました", 3000)
     
     def _show_statistics(self):
         """統計情報を表示"""
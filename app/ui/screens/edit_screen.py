@@ -15,7 +15,7 @@ from PIL import Image
 from typing import List, Dict, Optional
 
 from ui.styles import Styles, Colors, Fonts, Spacing, BorderRadius
-from ui.widgets.gallery_view import GalleryView
+from ui.widgets.gallery_view import GalleryView, PREVIEW_SIZE
 from ui.widgets.history_panel import HistoryPanel
 from ui.widgets.chat_refinement import ChatRefinementWidget
 
@@ -30,6 +30,8 @@ class EditScreen(QWidget):
     history_item_selected = Signal(int, list, dict)  # history_id, images, parameters
     video_edit_requested = Signal(Image.Image, str)  # 動画修正リクエスト（ギャラリーから）
     video_refinement_requested = Signal(str, dict)  # 動画修正リクエスト（チャットから）
+    candidate_selected = Signal(Image.Image, int)  # チャット修正の候補が選ばれた時（画像, 候補番号）
+    undo_requested = Signal()  # チャット修正を1つ戻す
 
     def __init__(self, history_manager, parent=None):
         super().__init__(parent)
@@ -126,6 +128,8 @@ class EditScreen(QWidget):
         self.chat_widget = ChatRefinementWidget()
         self.chat_widget.refinement_requested.connect(self._on_refinement_requested)
         self.chat_widget.video_refinement_requested.connect(self._on_video_refinement_requested)
+        self.chat_widget.candidate_selected.connect(self.candidate_selected.emit)
+        self.chat_widget.undo_requested.connect(self.undo_requested.emit)
         layout.addWidget(self.chat_widget)
 
         group.setLayout(layout)
@@ -138,7 +142,9 @@ class EditScreen(QWidget):
         # ギャラリーに画像を表示
         if images:
             self.current_images = images
-            self.gallery_view.set_images(images, parameters)
+            # 表示には保存済みのプレビュー用サムネイルを使い、元画像の縮小を省く
+            previews = self.history_manager.get_history_images(history_id, thumbnail_size=PREVIEW_SIZE)
+            self.gallery_view.set_images(images, parameters, previews=previews)
         # MainWindowにも通知
         self.history_item_selected.emit(history_id, images, parameters)
 
@@ -195,12 +201,20 @@ class EditScreen(QWidget):
         """修正完了時の処理"""
         self.chat_widget.on_refinement_completed(new_image, ai_response)
 
+    def add_refinement_candidate(self, image: Image.Image, score: float, index: int):
+        """チャット修正の候補を表示"""
+        self.chat_widget.add_candidate(image, score, index)
+
     def on_video_refinement_completed(self, new_image: Image.Image, video_path: str, ai_response: str):
         """動画修正完了時の処理"""
         self.chat_widget.on_video_refinement_completed(new_image, video_path, ai_response)
         # ギャラリーの動画も更新
         self.gallery_view.set_video(video_path, new_image)
 
+    def on_undo_completed(self, image: Optional[Image.Image]):
+        """チャット修正を1つ戻した時の処理"""
+        self.chat_widget.on_undo_completed(image)
+
     def on_refinement_failed(self, error_message: str):
         """修正失敗時の処理"""
         self.chat_widget.on_refinement_failed(error_message)
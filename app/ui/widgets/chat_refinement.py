@@ -11,6 +11,7 @@ from PySide6.QtWidgets import (
     QScrollArea,
     QFrame,
     QProgressBar,
+    QSpinBox,
 )
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QPixmap
@@ -24,11 +25,20 @@ from ui.styles import Styles, Colors, Fonts, BorderRadius
 class ChatMessage(QFrame):
     """チャットメッセージウィジェット"""
     
-    def __init__(self, sender: str, message: str, image: Optional[Image.Image] = None, parent=None):
+    def __init__(
+        self,
+        sender: str,
+        message: str,
+        image: Optional[Image.Image] = None,
+        action_text: Optional[str] = None,
+        parent=None
+    ):
         super().__init__(parent)
         self.sender = sender  # "user" or "ai"
         self.message = message
         self.image = image
+        self.action_text = action_text  # 画像の下に表示するボタン（任意）
+        self.action_button: Optional[QPushButton] = None
         self._setup_ui()
     
     def _setup_ui(self):
@@ -72,6 +82,24 @@ class ChatMessage(QFrame):
             image_label.setStyleSheet("background: transparent;")
             layout.addWidget(image_label)
 
+        if self.action_text:
+            self.action_button = QPushButton(self.action_text)
+            self.action_button.setCursor(Qt.PointingHandCursor)
+            self.action_button.setStyleSheet(f"""
+                QPushButton {{
+                    background-color: {Colors.PRIMARY};
+                    color: white;
+                    border-radius: {BorderRadius.SM}px;
+                    padding: 4px 10px;
+                    font-size: {Fonts.SIZE_SM};
+                }}
+                QPushButton:disabled {{
+                    background-color: {Colors.BG_TERTIARY};
+                    color: {Colors.TEXT_PRIMARY};
+                }}
+            """)
+            layout.addWidget(self.action_button, alignment=Qt.AlignLeft)
+
         # スタイル設定
         bg_color = Colors.PRIMARY_LIGHT if self.sender == "user" else Colors.SUCCESS_LIGHT
         self.setStyleSheet(f"""
@@ -98,6 +126,8 @@ class ChatRefinementWidget(QWidget):
 
     refinement_requested = Signal(str, dict)  # instruction, context
     video_refinement_requested = Signal(str, dict)  # instruction, context (動画修正用)
+    candidate_selected = Signal(Image.Image, int)  # 候補から選ばれた画像, 候補番号
+    undo_requested = Signal()  # 1つ前のバージョンに戻す
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -108,6 +138,8 @@ class ChatRefinementWidget(QWidget):
         self.is_video_mode: bool = False
         self.video_source_image: Optional[Image.Image] = None
         self.video_path: Optional[str] = None
+        # 候補生成モード用
+        self.candidate_messages: List[ChatMessage] = []
         self._setup_ui()
     
     def _setup_ui(self):
@@ -163,11 +195,27 @@ class ChatRefinementWidget(QWidget):
             }
         """
         
+        # 候補数（2以上で複数の候補を並行生成）
+        self.candidate_spin = QSpinBox()
+        self.candidate_spin.setRange(1, 4)
+        self.candidate_spin.setValue(1)
+        self.candidate_spin.setPrefix("候補 ")
+        self.candidate_spin.setMinimumHeight(40)
+        self.candidate_spin.setToolTip("複数の候補を同時に生成し、指示した部分以外の変化が少ない順に表示します")
+        input_layout.addWidget(self.candidate_spin)
+        
         self.send_btn = QPushButton("送信")
         self.send_btn.setMinimumSize(80, 40)
         self.send_btn.setStyleSheet(BUTTON_STYLE)
         self.send_btn.clicked.connect(self._send_message)
         input_layout.addWidget(self.send_btn)
+        
+        self.undo_btn = QPushButton("戻す")
+        self.undo_btn.setMinimumSize(60, 40)
+        self.undo_btn.setToolTip("1つ前の修正結果に戻します")
+        self.undo_btn.setStyleSheet(BUTTON_STYLE)
+        self.undo_btn.clicked.connect(self.undo_requested.emit)
+        input_layout.addWidget(self.undo_btn)
 
         layout.addLayout(input_layout)
 
@@ -287,8 +335,13 @@ class ChatRefinementWidget(QWidget):
         context = {
             "image": self.current_image,
             "params": self.original_params,
-            "history": self.conversation_history
+            "history": self.conversation_history,
+            "num_candidates": self.candidate_spin.value()
         }
+        # 前回の候補は選べないようにする（候補番号は最新の修正の候補を指すため）
+        for candidate in self.candidate_messages:
+            candidate.action_button.setEnabled(False)
+        self.candidate_messages = []
 
         # 動画モードの場合は動画修正シグナルを発火
         if self.is_video_mode:
@@ -302,6 +355,12 @@ class ChatRefinementWidget(QWidget):
         """修正完了時の処理"""
         self.current_image = new_image
 
+        # 自動で採用された候補は選択済みにする
+        for candidate in self.candidate_messages:
+            if candidate.image is new_image:
+                candidate.action_button.setEnabled(False)
+                candidate.action_button.setText("採用済み")
+
         # プログレスバーを非表示
         self.progress_bar.setVisible(False)
 
@@ -313,6 +372,27 @@ class ChatRefinementWidget(QWidget):
         self.input_field.setEnabled(True)
         self.input_field.setFocus()
 
+    def add_candidate(self, image: Image.Image, score: float, index: int):
+        """生成された候補を届いた順に表示"""
+        msg_widget = ChatMessage(
+            "ai",
+            f"候補{index + 1}（指示以外の変化: {score:.1f}）",
+            image,
+            action_text="この候補を使う"
+        )
+        msg_widget.action_button.clicked.connect(
+            lambda: self._on_candidate_chosen(msg_widget, index)
+        )
+        self.chat_layout.insertWidget(self.chat_layout.count() - 1, msg_widget)
+        self.candidate_messages.append(msg_widget)
+
+    def _on_candidate_chosen(self, msg_widget: ChatMessage, index: int):
+        """候補が選ばれた時"""
+        self.current_image = msg_widget.image
+        msg_widget.action_button.setEnabled(False)
+        msg_widget.action_button.setText("採用済み")
+        self.candidate_selected.emit(msg_widget.image, index)
+
     def on_video_refinement_completed(self, new_image: Image.Image, video_path: str, ai_response: str):
         """動画修正完了時の処理"""
         self.current_image = new_image
@@ -330,6 +410,14 @@ class ChatRefinementWidget(QWidget):
         self.input_field.setEnabled(True)
         self.input_field.setFocus()
     
+    def on_undo_completed(self, image: Optional[Image.Image]):
+        """1つ前のバージョンに戻った時の処理"""
+        if image is None:
+            self._add_ai_message("これ以上戻せません。")
+            return
+        self.current_image = image
+        self._add_ai_message("1つ前の状態に戻しました。ここから別の修正を試せます。", image=image)
+
     def on_refinement_failed(self, error_message: str):
         """修正失敗時の処理"""
         # プログレスバーを非表示
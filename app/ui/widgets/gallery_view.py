@@ -2,9 +2,8 @@
 
 from PySide6.QtWidgets import QWidget, QGridLayout, QLabel, QScrollArea, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox
 from PySide6.QtCore import Qt, Signal, QUrl
-from PySide6.QtGui import QPixmap
+from PySide6.QtGui import QPixmap, QImage
 from PIL import Image
-from io import BytesIO
 from typing import List, Optional
 from pathlib import Path
 import subprocess
@@ -23,6 +22,9 @@ except ImportError:
     VIDEO_PLAYBACK_AVAILABLE = False
     print("[Warning] QtMultimedia not available, video preview will use thumbnail")
 
+# ギャラリーに表示する画像の長辺（px）
+PREVIEW_SIZE = 400
+
 
 class GalleryView(QWidget):
     """結果ギャラリービュー"""
@@ -33,6 +35,7 @@ class GalleryView(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.images: List[Image.Image] = []
+        self.previews: Optional[List[Image.Image]] = None  # 表示用の縮小画像（履歴から読み込んだ場合）
         self.metadata = {}
         self.selected_index = -1
         self.video_path: Optional[str] = None  # 生成された動画のパス
@@ -59,15 +62,18 @@ class GalleryView(QWidget):
 
         main_layout.addWidget(scroll_area)
 
-    def set_images(self, images: List[Image.Image], metadata: dict):
+    def set_images(self, images: List[Image.Image], metadata: dict,
+                   previews: Optional[List[Image.Image]] = None):
         """
         画像を設定
 
         Args:
             images: PIL画像のリスト
             metadata: メタデータ
+            previews: 表示用の縮小画像（imagesと同じ順序、Noneの場合はimagesを縮小）
         """
         self.images = images
+        self.previews = previews if previews and len(previews) == len(images) else None
         self.metadata = metadata
         self._update_display()
 
@@ -78,6 +84,7 @@ class GalleryView(QWidget):
     def clear(self):
         """表示をクリア"""
         self.images = []
+        self.previews = None
         self.metadata = {}
         self.video_path = None
         self._update_display()
@@ -110,9 +117,10 @@ class GalleryView(QWidget):
             container_layout = QVBoxLayout(container)
             container_layout.setContentsMargins(5, 5, 5, 5)
 
-            # PIL画像をQPixmapに変換
-            pixmap = self._pil_to_pixmap(img)
-            scaled_pixmap = pixmap.scaled(400, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            # PIL画像をQPixmapに変換（保存済みのプレビューがあればそれを使う）
+            preview = self.previews[i] if self.previews else img
+            pixmap = self._pil_to_pixmap(preview)
+            scaled_pixmap = pixmap.scaled(PREVIEW_SIZE, PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
 
             # ラベルに設定
             label = QLabel()
@@ -399,15 +407,12 @@ class GalleryView(QWidget):
 
     def _pil_to_pixmap(self, pil_image: Image.Image) -> QPixmap:
         """PIL画像をQPixmapに変換"""
-        # PIL画像をバイト列に変換
-        buffer = BytesIO()
-        pil_image.save(buffer, format="PNG")
-        buffer.seek(0)
-
-        # QPixmapに変換
-        pixmap = QPixmap()
-        pixmap.loadFromData(buffer.getvalue())
+        # PNGを経由せず、画素データから直接変換
+        image = pil_image.convert("RGBA")
+        data = image.tobytes("raw", "RGBA")
+        qimage = QImage(data, image.width, image.height, image.width * 4, QImage.Format_RGBA8888)
 
-        return pixmap
+        # QImageはdataを参照するだけなので、QPixmapにコピーしてから返す
+        return QPixmap.fromImage(qimage.copy())
 
 
@@ -1,120 +1,327 @@
 """History panel widget"""
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
 from PySide6.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QHBoxLayout,
-    QListWidget,
-    QListWidgetItem,
-    QPushButton,
     QLabel,
-    QLineEdit,
+    QListView,
     QComboBox,
-    QTextEdit,
-    QDialog,
-    QDialogButtonBox,
-    QGroupBox,
-    QGridLayout,
-    QScrollArea,
+    QMenu,
+    QPushButton,
+    QAbstractItemView,
+    QStyle,
+    QStyledItemDelegate,
+    QStyleOptionViewItem,
+)
+from PySide6.QtCore import (
+    Qt,
+    Signal,
+    QAbstractListModel,
+    QEvent,
+    QModelIndex,
+    QRect,
+    QSize,
 )
-from PySide6.QtCore import Qt, Signal, QSize
-from PySide6.QtGui import QPixmap, QIcon
+from PySide6.QtGui import QColor, QFont, QImage, QPainter, QPen, QPixmap
 from PIL import Image
-from io import BytesIO
-from typing import List, Dict, Optional
-from datetime import datetime
 
 from ui.styles import Styles, Colors
 
 
-class HistoryItemWidget(QWidget):
-    """履歴アイテムウィジェット"""
-    
-    item_clicked = Signal(int)  # history_id
-    favorite_toggled = Signal(int)  # history_id
-    delete_requested = Signal(int)  # history_id
-    
-    def __init__(self, history_data: Dict, thumbnail: Image.Image, parent=None):
+# 1回の読み込みで取得する履歴の件数
+PAGE_SIZE = 200
+
+# サムネイルの表示サイズ（px）
+THUMBNAIL_SIZE = 60
+
+# 行の高さ（px）
+ROW_HEIGHT = 80
+
+# デコード済みサムネイルを保持する数
+THUMBNAIL_CACHE_SIZE = 512
+
+# サムネイルをデコードするスレッド数
+THUMBNAIL_WORKERS = 2
+
+# フィルター名 → (お気に入りのみ, 生成モード)
+FILTERS = {
+    "すべて": (False, None),
+    "お気に入り": (True, None),
+    "種類違い": (False, "variety"),
+    "角度違い": (False, "angle"),
+}
+
+
+class HistoryListModel(QAbstractListModel):
+    """履歴リストのモデル
+
+    履歴はスクロールに合わせてキーセットページングで少しずつ読み込み、
+    サムネイルは行が表示された時にバックグラウンドでデコードします。
+    何万件の履歴があっても、読み込むのは表示した範囲だけです。
+    """
+
+    HistoryRole = Qt.UserRole + 1
+
+    # サムネイルのデコード完了（スレッドプールから発行）
+    _thumbnail_decoded = Signal(str, QImage)
+
+    def __init__(self, history_manager, page_size: int = PAGE_SIZE, parent=None):
         super().__init__(parent)
-        self.history_data = history_data
-        self.thumbnail = thumbnail
-        self._setup_ui()
-    
-    def _setup_ui(self):
-        """UIをセットアップ"""
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-        layout.setSpacing(8)
-
-        # サムネイル
-        thumb_label = QLabel()
-        pixmap = self._pil_to_pixmap(self.thumbnail)
-        scaled_pixmap = pixmap.scaled(60, 60, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        thumb_label.setPixmap(scaled_pixmap)
-        thumb_label.setFixedSize(60, 60)
-        layout.addWidget(thumb_label)
-
-        # 日時のみ表示
-        created_at = datetime.fromisoformat(self.history_data["created_at"])
-        date_label = QLabel(created_at.strftime("%Y-%m-%d\n%H:%M"))
-        date_label.setStyleSheet(f"font-size: 10pt; color: {Colors.TEXT_PRIMARY};")
-        layout.addWidget(date_label)
-
-        layout.addStretch()
-
-        # 削除ボタン（元のデザイン）
-        delete_btn = QPushButton("×")
-        delete_btn.setFixedSize(28, 28)
-        delete_btn.setCursor(Qt.PointingHandCursor)
-        delete_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #3498db;
-                color: white;
-                font-weight: bold;
-                border-radius: 5px;
-                padding: 2px;
-            }
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-        """)
-        delete_btn.clicked.connect(lambda: self.delete_requested.emit(self.history_data["id"]))
-        layout.addWidget(delete_btn)
-
-        # 固定の高さを設定
-        self.setMinimumHeight(70)
-
-        # クリック可能に
-        self.setCursor(Qt.PointingHandCursor)
-    
-    def mousePressEvent(self, event):
-        """クリック時"""
-        if event.button() == Qt.LeftButton:
-            self.item_clicked.emit(self.history_data["id"])
-    
-    def _pil_to_pixmap(self, pil_image: Image.Image) -> QPixmap:
-        """PIL画像をQPixmapに変換"""
-        buffer = BytesIO()
-        pil_image.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        pixmap = QPixmap()
-        pixmap.loadFromData(buffer.getvalue())
-        return pixmap
-    
+        self.history_manager = history_manager
+        self.page_size = page_size
+        self.favorites_only = False
+        self.generation_mode: Optional[str] = None
+
+        self._rows: List[Dict] = []
+        self._has_more = True
+        self._pixmaps: "OrderedDict[str, Optional[QPixmap]]" = OrderedDict()
+        self._decoding = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS, thread_name_prefix="history-thumbnail"
+        )
+        self._thumbnail_decoded.connect(self._on_thumbnail_decoded)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+
+        history = self._rows[index.row()]
+
+        if role == self.HistoryRole:
+            return history
+
+        if role == Qt.DisplayRole:
+            created_at = datetime.fromisoformat(history["created_at"])
+            text = created_at.strftime("%Y-%m-%d\n%H:%M")
+            if "distance" in history:
+                # 類似画像の検索結果（pHashの64ビット中、一致したビットの割合）
+                text += f"  類似度 {round((64 - history['distance']) * 100 / 64)}%"
+            return text
+
+        if role == Qt.DecorationRole:
+            return self._thumbnail(history.get("thumbnail_hash"))
+
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        """次のページを読み込み（ビューが末尾までスクロールした時に呼ばれる）"""
+        if parent.isValid() or not self._has_more:
+            return
+
+        before = None
+        if self._rows:
+            last = self._rows[-1]
+            before = (last["created_at"], last["id"])
+
+        page = self.history_manager.get_history_page(
+            limit=self.page_size,
+            before=before,
+            favorites_only=self.favorites_only,
+            generation_mode=self.generation_mode,
+            thumbnail_size=THUMBNAIL_SIZE,
+            include_archive=True,
+        )
+        self._has_more = len(page) == self.page_size
+        if not page:
+            return
+
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def reload(self, favorites_only: bool = False, generation_mode: Optional[str] = None):
+        """
+        フィルターを設定して先頭から読み直す
+
+        Args:
+            favorites_only: お気に入りのみ
+            generation_mode: 生成モードでフィルタ
+        """
+        self.beginResetModel()
+        self.favorites_only = favorites_only
+        self.generation_mode = generation_mode
+        self._rows = []
+        self._has_more = True
+        self.endResetModel()
+        self.fetchMore()
+
+    def show_histories(self, histories: List[Dict]):
+        """
+        指定した履歴だけを表示（類似画像の検索結果など、続きは読み込まない）
+
+        Args:
+            histories: 表示する履歴（get_history_pageの項目と同じ形式）
+        """
+        self.beginResetModel()
+        self._rows = list(histories)
+        self._has_more = False
+        self.endResetModel()
+
+    def remove_history(self, history_id: int):
+        """削除した履歴の行を取り除く（他の行は読み直さない）"""
+        for row, history in enumerate(self._rows):
+            if history["id"] == history_id:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._rows[row]
+                self.endRemoveRows()
+                return
+
+    def _thumbnail(self, thumbnail_hash: Optional[str]) -> Optional[QPixmap]:
+        """キャッシュ済みのサムネイル（なければデコードを依頼してNone）"""
+        if not thumbnail_hash:
+            return None
+
+        if thumbnail_hash in self._pixmaps:
+            self._pixmaps.move_to_end(thumbnail_hash)
+            return self._pixmaps[thumbnail_hash]
+
+        if thumbnail_hash not in self._decoding:
+            self._decoding.add(thumbnail_hash)
+            self._executor.submit(self._decode_thumbnail, thumbnail_hash)
+        return None
+
+    def _decode_thumbnail(self, thumbnail_hash: str):
+        """サムネイルをデコードして縮小（スレッドプールで実行）"""
+        qimage = QImage()
+        try:
+            image = self.history_manager.get_thumbnail(thumbnail_hash)
+            if image is not None:
+                image = image.convert("RGBA")
+                image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+                # QPixmapはGUIスレッドでしか作れないため、ここではQImageまで変換
+                qimage = QImage(
+                    image.tobytes(), image.width, image.height,
+                    image.width * 4, QImage.Format_RGBA8888
+                ).copy()
+        except Exception as e:
+            print(f"[History] サムネイルの読み込みエラー: {e}")
+
+        try:
+            self._thumbnail_decoded.emit(thumbnail_hash, qimage)
+        except RuntimeError:
+            # モデルが既に破棄されている
+            pass
+
+    def _on_thumbnail_decoded(self, thumbnail_hash: str, qimage: QImage):
+        """デコードしたサムネイルをキャッシュして再描画"""
+        self._decoding.discard(thumbnail_hash)
+        self._pixmaps[thumbnail_hash] = None if qimage.isNull() else QPixmap.fromImage(qimage)
+        while len(self._pixmaps) > THUMBNAIL_CACHE_SIZE:
+            self._pixmaps.popitem(last=False)
+
+        if self._rows:
+            # ビューは表示中の行だけを再描画する
+            self.dataChanged.emit(
+                self.index(0), self.index(len(self._rows) - 1), [Qt.DecorationRole]
+            )
+
+
+class HistoryItemDelegate(QStyledItemDelegate):
+    """履歴アイテムの描画（行ごとのウィジェットを作らない）"""
+
+    delete_requested = Signal(int)  # history_id
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(0, ROW_HEIGHT)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # カード
+        rect = option.rect.adjusted(2, 3, -2, -3)
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        painter.setPen(QPen(QColor(Colors.BORDER_SUBTLE), 1))
+        painter.setBrush(QColor(Colors.BG_CARD_HOVER if hovered else Colors.BG_CARD))
+        painter.drawRoundedRect(rect, 8, 8)
+
+        # サムネイル（デコード中はプレースホルダー）
+        thumb_rect = QRect(
+            rect.left() + 5, rect.top() + (rect.height() - THUMBNAIL_SIZE) // 2,
+            THUMBNAIL_SIZE, THUMBNAIL_SIZE
+        )
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            x = thumb_rect.left() + (THUMBNAIL_SIZE - pixmap.width()) // 2
+            y = thumb_rect.top() + (THUMBNAIL_SIZE - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        else:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(Colors.BG_TERTIARY))
+            painter.drawRoundedRect(thumb_rect, 4, 4)
+
+        # 日時
+        font = QFont(option.font)
+        font.setPointSize(10)
+        painter.setFont(font)
+        painter.setPen(QColor(Colors.TEXT_PRIMARY))
+        delete_rect = self._delete_rect(option.rect)
+        text_rect = QRect(
+            thumb_rect.right() + 9, rect.top(),
+            delete_rect.left() - thumb_rect.right() - 17, rect.height()
+        )
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, index.data(Qt.DisplayRole))
+
+        # 削除ボタン（アーカイブした履歴は読み取り専用のため出さない）
+        history = index.data(HistoryListModel.HistoryRole)
+        if history and history.get("archived"):
+            painter.restore()
+            return
+
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#3498db"))
+        painter.drawRoundedRect(delete_rect, 5, 5)
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QColor("white"))
+        painter.drawText(delete_rect, Qt.AlignCenter, "×")
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        """削除ボタンのクリックを処理（行のクリックとは区別する）"""
+        if (
+            event.type() == QEvent.MouseButtonRelease
+            and event.button() == Qt.LeftButton
+            and self._delete_rect(option.rect).contains(event.position().toPoint())
+        ):
+            history = index.data(HistoryListModel.HistoryRole)
+            if history and not history.get("archived"):
+                self.delete_requested.emit(history["id"])
+                return True
+        return super().editorEvent(event, model, option, index)
+
+    @staticmethod
+    def _delete_rect(item_rect: QRect) -> QRect:
+        """削除ボタンの範囲"""
+        return QRect(item_rect.right() - 7 - 28, item_rect.center().y() - 14, 28, 28)
 
 
 class HistoryPanel(QWidget):
     """履歴パネルウィジェット"""
-    
+
     history_selected = Signal(int, list, dict)  # history_id, images, parameters
-    
+
     def __init__(self, history_manager, parent=None):
         super().__init__(parent)
         self.history_manager = history_manager
+        self._similar_to: Optional[int] = None  # 類似画像を表示中の基準の履歴ID
         self._setup_ui()
         self._load_history()
-    
+
     def _setup_ui(self):
         """UIをセットアップ"""
         layout = QVBoxLayout(self)
@@ -122,99 +329,126 @@ class HistoryPanel(QWidget):
 
         # フィルターコンボボックス（非表示で保持、内部でのみ使用）
         self.filter_combo = QComboBox()
-        self.filter_combo.addItems(["すべて", "お気に入り", "種類違い", "角度違い"])
+        self.filter_combo.addItems(list(FILTERS))
         self.filter_combo.setVisible(False)  # 非表示にする
 
-        # 履歴リスト
-        self.history_list = QListWidget()
-        self.history_list.setSpacing(2)
-        self.history_list.setStyleSheet(Styles.LIST_WIDGET + Styles.SCROLL_AREA + f"""
-            QListWidget::item {{
-                padding: 4px;
-                min-height: 72px;
-            }}
-        """)
+        # 類似画像の表示中に出すバー（「戻る」で通常の履歴に戻る）
+        self.similar_bar = QWidget()
+        bar_layout = QHBoxLayout(self.similar_bar)
+        bar_layout.setContentsMargins(4, 0, 4, 0)
+        self.similar_label = QLabel()
+        self.similar_label.setStyleSheet(Styles.LABEL_MUTED)
+        bar_layout.addWidget(self.similar_label, 1)
+        back_btn = QPushButton("戻る")
+        back_btn.setCursor(Qt.PointingHandCursor)
+        back_btn.setStyleSheet(Styles.BUTTON_SECONDARY)
+        back_btn.clicked.connect(self._load_history)
+        bar_layout.addWidget(back_btn)
+        self.similar_bar.setVisible(False)
+        layout.addWidget(self.similar_bar)
+
+        # 履歴リスト（表示中の行だけを描画する仮想リスト）
+        self.history_model = HistoryListModel(self.history_manager, parent=self)
+        self.history_delegate = HistoryItemDelegate(self)
+        self.history_delegate.delete_requested.connect(self._on_delete_requested)
+
+        self.history_list = QListView()
+        self.history_list.setModel(self.history_model)
+        self.history_list.setItemDelegate(self.history_delegate)
+        self.history_list.setUniformItemSizes(True)
+        self.history_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.history_list.setSelectionMode(QAbstractItemView.NoSelection)
+        self.history_list.setMouseTracking(True)
+        self.history_list.viewport().setCursor(Qt.PointingHandCursor)
+        self.history_list.setStyleSheet(
+            Styles.LIST_WIDGET.replace("QListWidget", "QListView") + Styles.SCROLL_AREA
+        )
+        self.history_list.clicked.connect(self._on_history_clicked)
+        self.history_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.history_list.customContextMenuRequested.connect(self._on_context_menu)
         layout.addWidget(self.history_list)
-    
+
     def _load_history(self):
-        """履歴を読み込み"""
-        # 現在のフィルターを取得
-        filter_text = self.filter_combo.currentText()
-        
-        favorites_only = (filter_text == "お気に入り")
-        
-        # 履歴を取得
-        history_list = self.history_manager.get_history_list(
-            limit=50,
-            favorites_only=favorites_only
-        )
-        
-        # フィルター適用
-        if filter_text == "種類違い":
-            history_list = [h for h in history_list if h["generation_mode"] == "variety"]
-        elif filter_text == "角度違い":
-            history_list = [h for h in history_list if h["generation_mode"] == "angle"]
-        
-        # リストをクリア
-        self.history_list.clear()
-        
-        # アイテムを追加
-        for history in history_list:
-            # サムネイルを取得
-            thumbnails = self.history_manager.get_history_images(
-                history["id"],
-                thumbnail_only=True
-            )
-            
-            if thumbnails:
-                # ウィジェットを作成
-                item_widget = HistoryItemWidget(history, thumbnails[0])
-                item_widget.item_clicked.connect(self._on_history_clicked)
-                item_widget.delete_requested.connect(self._on_delete_requested)
-
-                # リストアイテムを作成
-                item = QListWidgetItem(self.history_list)
-                # 固定の高さを明示的に設定（十分な高さを確保）
-                item.setSizeHint(QSize(0, 80))
-                self.history_list.addItem(item)
-                self.history_list.setItemWidget(item, item_widget)
-    
+        """履歴を読み込み（先頭のページのみ、続きはスクロールに合わせて読み込む）"""
+        self._similar_to = None
+        self.similar_bar.setVisible(False)
+        favorites_only, generation_mode = FILTERS.get(self.filter_combo.currentText(), (False, None))
+        self.history_model.reload(favorites_only, generation_mode)
+
+    def show_similar(self, history_id: int):
+        """
+        指定した履歴と似た画像を持つ履歴を表示
+
+        Args:
+            history_id: 基準にする履歴ID（先頭に表示）
+        """
+        # 索引の作成（以前の画像のpHash計算）はメンテナンスのスレッドで行い、ここでは待たない
+        if not self.history_manager.similarity_index_ready:
+            print("[History] 類似画像検索の索引を作成中です")
+            return
+
+        base = self.history_manager.get_history(history_id, thumbnail_size=THUMBNAIL_SIZE)
+        if base is None:
+            return
+        results = self.history_manager.find_similar(history_id, thumbnail_size=THUMBNAIL_SIZE)
+
+        self._similar_to = history_id
+        self.history_model.show_histories([base] + results)
+        self.similar_label.setText(f"似た画像: {len(results)}件")
+        self.similar_bar.setVisible(True)
+        self.history_list.scrollToTop()
+        print(f"[History] 類似画像: ID={history_id}, {len(results)}件")
+
+    def _on_context_menu(self, pos):
+        """右クリックメニュー"""
+        history_data = self.history_list.indexAt(pos).data(HistoryListModel.HistoryRole)
+        if not history_data:
+            return
+
+        menu = QMenu(self)
+        similar_action = menu.addAction("似た画像を表示")
+        if not self.history_manager.similarity_index_ready:
+            similar_action.setText("似た画像を表示（準備中）")
+            similar_action.setEnabled(False)
+        if menu.exec(self.history_list.viewport().mapToGlobal(pos)) == similar_action:
+            self.show_similar(history_data["id"])
+
     def _on_filter_changed(self, filter_text: str):
         """フィルターが変更された時"""
         self._load_history()
-    
-    def _on_history_clicked(self, history_id: int):
+
+    def _on_history_clicked(self, index: QModelIndex):
         """履歴がクリックされた時"""
-        # 画像とパラメータを取得
+        history_data = index.data(HistoryListModel.HistoryRole)
+        if not history_data:
+            return
+
+        history_id = history_data["id"]
         images = self.history_manager.get_history_images(history_id)
-        
-        # 履歴情報を取得
-        history_list = self.history_manager.get_history_list(limit=1000)
-        history_data = next((h for h in history_list if h["id"] == history_id), None)
-        
-        if history_data:
-            # シグナルを発火
-            self.history_selected.emit(history_id, images, history_data["parameters"])
-            print(f"[History] 履歴選択: ID={history_id}")
-    
+
+        # シグナルを発火
+        self.history_selected.emit(history_id, images, history_data["parameters"])
+        print(f"[History] 履歴選択: ID={history_id}")
+
     def _on_delete_requested(self, history_id: int):
         """削除が要求された時"""
         from PySide6.QtWidgets import QMessageBox
-        
+
         reply = QMessageBox.question(
             self,
             "確認",
             "この履歴を削除しますか？",
             QMessageBox.Yes | QMessageBox.No
         )
-        
+
         if reply == QMessageBox.Yes:
             self.history_manager.delete_history(history_id)
-            self._load_history()
+            self.history_model.remove_history(history_id)
             print(f"[History] 履歴削除: ID={history_id}")
-    
-    def refresh(self):
-        """履歴を更新"""
-        self._load_history()
-
 
+    def refresh(self):
+        """履歴を更新（類似画像の表示中は検索し直す）"""
+        if self._similar_to is not None:
+            self.show_similar(self._similar_to)
+        else:
+            self._load_history()
@@ -11,14 +11,57 @@ from PySide6.QtWidgets import (
     QFileDialog,
     QButtonGroup,
 )
-from PySide6.QtCore import Qt, Signal, QSize
+from PySide6.QtCore import Qt, Signal, QSize, QThread
 from PySide6.QtGui import QPixmap, QIcon
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Set
 
 from ui.styles import Styles
 
 
+DEFAULT_CUSTOM_POSE_DESCRIPTION = "custom pose from uploaded image, natural standing position"
+
+
+class PoseExtractionWorker(QThread):
+    """カスタムポーズ画像からポーズ説明を抽出するワーカースレッド"""
+    
+    pose_extracted = Signal(str, str, dict)  # image_path, description, {pose_id: 類似度}
+    
+    def __init__(self, image_path: str, presets: Dict[str, Dict[str, str]]):
+        super().__init__()
+        self.image_path = image_path
+        self.presets = presets
+    
+    def run(self):
+        """バックグラウンドで実行（検出器とポーズライブラリはアプリ全体で共有）"""
+        description = DEFAULT_CUSTOM_POSE_DESCRIPTION
+        scores = {}
+        try:
+            from core.vton.pose_extractor import get_pose_extractor
+            from core.vton.pose_library import get_pose_library, PRESET_MATCH_THRESHOLD
+            
+            extractor = get_pose_extractor()
+            pose_info = extractor.extract_pose(self.image_path)
+            if pose_info and pose_info.get('description'):
+                description = pose_info['description']
+                
+                library = get_pose_library()
+                if not library.presets_loaded:
+                    library.add_presets(self.presets, extractor)
+                
+                # 全プリセットとの類似度を一括計算し、十分近ければプリセットの記述を使う
+                scores = library.similarities(pose_info['landmarks'])
+                nearest = library.nearest(pose_info['landmarks'])
+                if nearest and nearest[2] >= PRESET_MATCH_THRESHOLD:
+                    description = nearest[1]
+                    print(f"[INFO] 最も近いプリセット: {nearest[0]} ({nearest[2]:.2f})")
+        
+        except Exception as e:
+            print(f"[WARN] ポーズ抽出に失敗: {e}")
+        
+        self.pose_extracted.emit(self.image_path, description, scores)
+
+
 class PoseGalleryWidget(QWidget):
     """ポーズギャラリーウィジェット
     
@@ -31,6 +74,9 @@ class PoseGalleryWidget(QWidget):
         super().__init__(parent)
         self.selected_pose_id = "front"  # デフォルト選択
         self.custom_pose_image = None  # カスタムポーズ画像のパス
+        # 実行中のポーズ抽出（終わるまで参照を持ち、途中で破棄されないようにする）
+        self.extraction_workers: Set[PoseExtractionWorker] = set()
+        self.pose_buttons: Dict[str, QToolButton] = {}
         
         # プリセットポーズの定義
         self.pose_presets = self._load_pose_presets()
@@ -118,6 +164,7 @@ class PoseGalleryWidget(QWidget):
             # ポーズボタンを作成
             btn = self._create_pose_button(pose_id, pose_info)
             grid_layout.addWidget(btn, row, col)
+            self.pose_buttons[pose_id] = btn
             
             # ボタングループに追加
             self.button_group.addButton(btn)
@@ -190,6 +237,7 @@ class PoseGalleryWidget(QWidget):
         """ポーズが選択された時の処理"""
         self.selected_pose_id = pose_id
         self.custom_pose_image = None  # カスタム画像をクリア
+        self._show_similarity_scores({})
         
         # シグナルを発火
         self.pose_selected.emit(
@@ -215,32 +263,41 @@ class PoseGalleryWidget(QWidget):
             for btn in self.button_group.buttons():
                 btn.setChecked(False)
             
-            # MediaPipeでポーズを抽出
-            description = self._extract_pose_description(file_path)
-            
-            # シグナルを発火
-            self.pose_selected.emit("custom", description, file_path)
-            
+            # 抽出が終わるまでは既定の説明で選択状態にする
+            self.pose_selected.emit("custom", DEFAULT_CUSTOM_POSE_DESCRIPTION, file_path)
             print(f"[INFO] カスタムポーズ画像を選択: {file_path}")
-            print(f"[INFO] 抽出されたポーズ: {description}")
-    
-    def _extract_pose_description(self, image_path: str) -> str:
-        """MediaPipeを使用してポーズ説明を抽出"""
-        try:
-            from core.vton.pose_extractor import PoseExtractor
             
-            extractor = PoseExtractor()
-            pose_info = extractor.extract_pose(image_path)
-            
-            if pose_info and pose_info.get('description'):
-                return pose_info['description']
-            else:
-                # ポーズが検出できない場合はデフォルト
-                return "custom pose from uploaded image, natural standing position"
+            # MediaPipeでのポーズ抽出はバックグラウンドで実行（UIを止めない）
+            # 前の画像の抽出がまだ実行中でも、その結果は_on_pose_extractedで無視される
+            worker = PoseExtractionWorker(file_path, self.pose_presets)
+            worker.pose_extracted.connect(self._on_pose_extracted)
+            worker.finished.connect(lambda w=worker: self._on_extraction_finished(w))
+            self.extraction_workers.add(worker)
+            worker.start()
+    
+    def _on_extraction_finished(self, worker: PoseExtractionWorker):
+        """ポーズ抽出スレッドの終了時に参照を解放"""
+        self.extraction_workers.discard(worker)
+        worker.deleteLater()
+    
+    def _on_pose_extracted(self, image_path: str, description: str, scores: dict):
+        """ポーズ抽出完了時の処理"""
+        # 抽出中に別の画像・プリセットが選ばれていたら無視
+        if image_path != self.custom_pose_image:
+            return
         
-        except Exception as e:
-            print(f"[WARN] ポーズ抽出に失敗: {e}")
-            return "custom pose from uploaded image"
+        self._show_similarity_scores(scores)
+        self.pose_selected.emit("custom", description, image_path)
+        print(f"[INFO] 抽出されたポーズ: {description}")
+    
+    def _show_similarity_scores(self, scores: Dict[str, float]):
+        """カスタムポーズと各プリセットの類似度をボタンに表示（空の場合は元に戻す）"""
+        for pose_id, btn in self.pose_buttons.items():
+            name = self.pose_presets[pose_id]["name"]
+            if pose_id in scores:
+                btn.setText(f"{name} {max(0.0, scores[pose_id]):.0%}")
+            else:
+                btn.setText(name)
     
     def get_selected_pose(self) -> tuple:
         """選択されているポーズ情報を取得
@@ -0,0 +1,491 @@
+"""Scale benchmark and synthetic data generator for generation history
+
+合成した生成履歴を N 件保存したデータベースを作り、HistoryManager と
+HistoryPanel の性能（保存のスループット・一覧／絞り込み／タグ／全文検索の
+レイテンシ・サムネイル読み込み・データベースのサイズ・パネルの読み込み時間）を
+件数ごとに計測します。
+
+使い方:
+    python -m tests.benchmarks.bench_history --output bench_history.json
+    python -m tests.benchmarks.bench_history --rows 1000 10000 --baseline bench_history.json
+    python -m tests.benchmarks.bench_history --generate history.db --rows 10000
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT / "app"))
+
+from core.history.history_manager import HistoryManager
+from tests.benchmarks.bench_pipeline import compare_results, measure
+
+
+DEFAULT_ROW_COUNTS = [1000, 10000, 100000]
+
+# 合成画像の長辺（px、履歴ごとに順番に使う）
+DEFAULT_IMAGE_SIZES = [512]
+
+# 合成履歴に付けるタグ
+DEFAULT_TAGS = ["casual", "formal", "summer", "winter", "outdoor", "studio", "denim", "dress"]
+
+# 合成画像の種類（これを使い回して保存する。すべて別の画像にすると100k件の作成に時間がかかる）
+DEFAULT_UNIQUE_IMAGES = 256
+
+# 1回のトランザクションで保存する履歴の数
+GENERATE_BATCH_SIZE = 500
+
+# 一覧の1ページの件数（HistoryPanelと同じ）
+PAGE_SIZE = 200
+
+# パネルで表示するサムネイルのサイズ（HistoryPanelと同じ）
+PANEL_THUMBNAIL_SIZE = 60
+
+# 全文検索で計測する語（合成パラメータのプロンプトに含まれる）
+SEARCH_TERM = "linen"
+
+POSES = ["front", "side", "back", "walking", "sitting"]
+BACKGROUNDS = ["white", "street", "studio", "beach"]
+FABRICS = ["cotton", "linen", "wool", "silk", "denim"]
+
+
+def make_generation_image(size: int, seed: int) -> Image.Image:
+    """
+    合成の生成画像を作成（白背景に、位置と色が乱数で変わる人物大のブロック）
+
+    seedごとに構図が変わるため、pHashも画像ごとに異なります。
+
+    Args:
+        size: 長辺のピクセル数
+        seed: 乱数シード
+
+    Returns:
+        RGB画像（縦長 3:4）
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size, int(size * 0.75)
+
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    block_h = int(height * rng.uniform(0.4, 0.8))
+    block_w = int(width * rng.uniform(0.3, 0.6))
+    y1 = int(rng.integers(0, height - block_h + 1))
+    x1 = int(rng.integers(0, width - block_w + 1))
+
+    base = rng.integers(20, 236, 3).astype(np.float32)
+    gradient = np.linspace(-40, 40, block_h, dtype=np.float32)[:, None, None]
+    block = base + gradient + rng.normal(0, 8, (block_h, block_w, 3))
+    img[y1:y1 + block_h, x1:x1 + block_w] = np.clip(block, 0, 255).astype(np.uint8)
+
+    return Image.fromarray(img)
+
+
+def _synthetic_parameters(rng: np.random.Generator, index: int) -> Dict:
+    """合成の生成パラメータ"""
+    fabric = FABRICS[int(rng.integers(len(FABRICS)))]
+    pose = POSES[int(rng.integers(len(POSES)))]
+    background = BACKGROUNDS[int(rng.integers(len(BACKGROUNDS)))]
+    return {
+        "prompt": f"{fabric} outfit, {pose} pose, {background} background",
+        "pose": pose,
+        "background": background,
+        "seed": int(rng.integers(0, 2 ** 31)),
+        "index": index,
+    }
+
+
+def generate_history(
+    manager: HistoryManager,
+    count: int,
+    image_sizes: Sequence[int] = DEFAULT_IMAGE_SIZES,
+    images_per_generation: int = 4,
+    tags: Sequence[str] = DEFAULT_TAGS,
+    tags_per_generation: int = 2,
+    favorite_ratio: float = 0.05,
+    angle_ratio: float = 0.2,
+    unique_images: int = DEFAULT_UNIQUE_IMAGES,
+    days: int = 365,
+    seed: int = 0,
+    batch_size: int = GENERATE_BATCH_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict:
+    """
+    合成の生成履歴をデータベースに保存
+
+    画像は unique_images 種類だけエンコードし、それを使い回して保存します
+    （BlobStoreでは1つにまとまり、DBの行は履歴ごとに作られます）。
+    作成日時は過去 days 日に均等に散らし、古い履歴ほどIDが小さくなります。
+
+    Args:
+        manager: 保存先のHistoryManager
+        count: 作成する履歴の数
+        image_sizes: 合成画像の長辺（画像ごとに順番に使う）
+        images_per_generation: 1履歴あたりの最大画像数（1〜この数）
+        tags: 付けるタグの候補
+        tags_per_generation: 1履歴あたりの最大タグ数（0〜この数）
+        favorite_ratio: お気に入りにする割合
+        angle_ratio: 角度違い（angle）にする割合
+        unique_images: エンコードする画像の種類
+        days: 作成日時を散らす日数
+        seed: 乱数シード
+        batch_size: 1トランザクションで保存する履歴の数
+        progress: 保存した件数を受け取るコールバック
+
+    Returns:
+        {"histories", "images", "unique_images", "favorites", "seconds",
+         "encode_seconds": 画像のエンコードにかかった秒数, "rows_per_s": save_encodedの1秒あたりの件数}
+    """
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    # 使い回す画像をエンコード（encode_imageの予約は最後にまとめて解除する）
+    pool_size = max(1, min(unique_images, count * images_per_generation))
+    pool = [
+        manager.encode_image(make_generation_image(image_sizes[i % len(image_sizes)], seed * 100003 + i))
+        for i in range(pool_size)
+    ]
+    encode_seconds = time.perf_counter() - start
+
+    now = datetime.now()
+    span = timedelta(days=days)
+    saved = images = favorites = 0
+    try:
+        for batch_start in range(0, count, batch_size):
+            entries = []
+            for index in range(batch_start, min(count, batch_start + batch_size)):
+                num_images = int(rng.integers(1, images_per_generation + 1))
+                stored_images = [pool[int(i)] for i in rng.integers(0, pool_size, num_images)]
+                is_angle = rng.random() < angle_ratio
+                is_favorite = rng.random() < favorite_ratio
+                num_tags = int(rng.integers(0, min(tags_per_generation, len(tags)) + 1))
+                entries.append({
+                    "stored_images": stored_images,
+                    "parameters": _synthetic_parameters(rng, index),
+                    "generation_mode": "angle" if is_angle else "variety",
+                    "angles": [i * 45 for i in range(num_images)] if is_angle else None,
+                    "tags": [str(tag) for tag in rng.choice(tags, num_tags, replace=False)] if num_tags else [],
+                    "notes": f"synthetic #{index}",
+                    "created_at": (now - span + span * (index + 1) / count).isoformat(),
+                    "is_favorite": is_favorite,
+                })
+                images += num_images
+                favorites += int(is_favorite)
+
+            # save_encodedは記録した画像の予約を解除するため、使う分だけ予約する
+            manager.reserve_encoded(stored for entry in entries for stored in entry["stored_images"])
+            # 1件ごとの保存ログは出さない（10万件分の出力で作成が遅くなる）
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.save_encoded(entries)
+            saved += len(entries)
+            if progress is not None:
+                progress(saved)
+    finally:
+        manager.release_encoded(pool)
+
+    seconds = time.perf_counter() - start
+    save_seconds = seconds - encode_seconds
+    return {
+        "histories": saved,
+        "images": images,
+        "unique_images": pool_size,
+        "favorites": favorites,
+        "seconds": seconds,
+        "encode_seconds": encode_seconds,
+        "rows_per_s": saved / save_seconds if save_seconds > 0 else 0.0,
+    }
+
+
+def storage_size(manager: HistoryManager) -> Dict:
+    """
+    データベースと画像ファイルのサイズ
+
+    WALの内容をデータベースに書き戻してから計測します。
+
+    Returns:
+        {"db_bytes", "wal_bytes", "blob_bytes", "blob_files", "archive_bytes", "total_bytes"}
+    """
+    def file_size(path: Path) -> int:
+        return path.stat().st_size if path.exists() else 0
+
+    manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    db_path = Path(manager.db_path)
+    blobs = [path for path in manager.blob_store.root_dir.rglob("*") if path.is_file()]
+    sizes = {
+        "db_bytes": file_size(db_path),
+        "wal_bytes": file_size(db_path.with_name(db_path.name + "-wal")),
+        "blob_bytes": sum(path.stat().st_size for path in blobs),
+        "blob_files": len(blobs),
+        "archive_bytes": file_size(manager.archive.archive_path),
+    }
+    sizes["total_bytes"] = sizes["db_bytes"] + sizes["wal_bytes"] + sizes["blob_bytes"] + sizes["archive_bytes"]
+    return sizes
+
+
+def build_cases(
+    manager: HistoryManager,
+    tags: Sequence[str],
+    image_size: int,
+) -> Dict[str, Callable[[], object]]:
+    """
+    件数を埋めたデータベースに対するベンチマークケースを定義
+
+    Args:
+        manager: 合成履歴を保存済みのHistoryManager
+        tags: 合成履歴に付けたタグ
+        image_size: save_generationで保存する画像の長辺
+
+    Returns:
+        {ケース名: 計測対象の関数}
+    """
+    conn = manager.conn
+    count = conn.execute("SELECT COUNT(*) FROM generation_history").fetchone()[0]
+
+    # 一覧の中ほどのページ（キーセットページングの続き）
+    middle = conn.execute(
+        "SELECT created_at, id FROM generation_history ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+        (count // 2,)
+    ).fetchone()
+    before = (middle["created_at"], middle["id"])
+
+    # 直近30日分（合成履歴は過去1年に散らしてある）
+    newest = conn.execute("SELECT MAX(created_at) FROM generation_history").fetchone()[0]
+    date_to = datetime.fromisoformat(newest)
+    date_from = date_to - timedelta(days=30)
+
+    page = manager.get_history_page(limit=PAGE_SIZE, thumbnail_size=PANEL_THUMBNAIL_SIZE)
+    thumbnail_hashes = itertools.cycle([h["thumbnail_hash"] for h in page if h["thumbnail_hash"]])
+    history_ids = itertools.cycle([h["id"] for h in page])
+    lookup_ids = itertools.cycle(
+        int(i) for i in np.random.default_rng(1).integers(1, count + 1, 64)
+    )
+    new_images = itertools.cycle([make_generation_image(image_size, 10 ** 9 + i) for i in range(8)])
+
+    def save_generation():
+        return manager.save_generation(
+            [next(new_images)], {"prompt": "benchmark"}, generation_mode="benchmark"
+        )
+
+    def page_of(**filters):
+        return lambda: manager.get_history_page(
+            limit=PAGE_SIZE, thumbnail_size=PANEL_THUMBNAIL_SIZE, **filters
+        )
+
+    return {
+        "HistoryManager.save_generation": save_generation,
+        "get_history_page.first": page_of(),
+        "get_history_page.middle": page_of(before=before),
+        "get_history_page.favorites": page_of(favorites_only=True),
+        "get_history_page.mode": page_of(generation_mode="angle"),
+        "get_history_page.tag": page_of(tag=tags[0]),
+        "get_history_page.search": page_of(search=SEARCH_TERM),
+        "get_history_page.date_range": page_of(date_from=date_from, date_to=date_to),
+        "HistoryManager.get_history": lambda: manager.get_history(next(lookup_ids)),
+        "HistoryManager.get_thumbnail": lambda: manager.get_thumbnail(next(thumbnail_hashes)),
+        "HistoryManager.get_history_images": lambda: manager.get_history_images(next(history_ids)),
+        "HistoryManager.find_similar": lambda: manager.find_similar(next(history_ids)),
+    }
+
+
+def build_panel_cases(manager: HistoryManager) -> Dict[str, Callable[[], object]]:
+    """
+    HistoryPanelの読み込みのケースを定義（PySide6がない場合は空）
+
+    パネルを1つ作り、フィルターを切り替えた時と同じ先頭ページの読み込みを計測します。
+    """
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtWidgets import QApplication
+        from ui.widgets.history_panel import HistoryListModel, HistoryPanel
+    except ImportError:
+        return {}
+
+    app = QApplication.instance() or QApplication([])
+    panel = HistoryPanel(manager)
+
+    def reload_model():
+        model = HistoryListModel(manager)
+        model.reload()
+        app.processEvents()
+        return model
+
+    return {
+        "HistoryPanel.load": lambda: (panel._load_history(), app.processEvents()),
+        "HistoryListModel.reload": reload_model,
+    }
+
+
+def run_suite(
+    row_counts: List[int] = None,
+    iterations: int = 5,
+    warmup: int = 1,
+    case_filter: Optional[List[str]] = None,
+    generator_options: Optional[Dict] = None,
+) -> Dict:
+    """
+    ベンチマークスイートを実行
+
+    件数ごとに新しいデータベースを作って合成履歴を保存し、各ケースを計測します。
+
+    Args:
+        row_counts: 計測する履歴の件数
+        iterations: 各ケースの計測回数
+        warmup: ウォームアップ回数
+        case_filter: 実行するケース名の部分一致リスト（Noneで全て）
+        generator_options: generate_historyに渡す追加の引数
+
+    Returns:
+        {"meta": {...}, "results": {"ケース/件数": 統計値},
+         "generate": {件数: 作成の結果}, "storage": {件数: サイズ}}
+    """
+    row_counts = row_counts or DEFAULT_ROW_COUNTS
+    generator_options = dict(generator_options or {})
+    tags = generator_options.get("tags", DEFAULT_TAGS)
+    image_size = max(generator_options.get("image_sizes", DEFAULT_IMAGE_SIZES))
+    results = {}
+    generated = {}
+    storage = {}
+    panel_available = None
+
+    for count in row_counts:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = HistoryManager(str(Path(temp_dir) / "history.db"))
+            try:
+                generated[count] = generate_history(manager, count, **generator_options)
+                storage[count] = storage_size(manager)
+                print(
+                    f"[Bench] 合成履歴 {count}件: {generated[count]['seconds']:.1f}s "
+                    f"({generated[count]['rows_per_s']:.0f}件/s), "
+                    f"{storage[count]['total_bytes'] / (1024 * 1024):.1f}MB"
+                )
+
+                cases = build_cases(manager, tags, image_size)
+                panel_cases = build_panel_cases(manager)
+                panel_available = bool(panel_cases)
+                cases.update(panel_cases)
+                if case_filter:
+                    cases = {
+                        name: case for name, case in cases.items()
+                        if any(f in name for f in case_filter)
+                    }
+
+                for case_name, func in cases.items():
+                    key = f"{case_name}/{count}"
+                    stats = measure(func, iterations=iterations, warmup=warmup)
+                    results[key] = stats
+                    print(
+                        f"[Bench] {key}: p50={stats['p50_ms']:.2f}ms "
+                        f"p90={stats['p90_ms']:.2f}ms peak={stats['peak_memory_mb']:.1f}MB"
+                    )
+            finally:
+                manager.close()
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "row_counts": row_counts,
+            "iterations": iterations,
+            "generator": {k: list(v) if isinstance(v, (list, tuple)) else v
+                          for k, v in generator_options.items()},
+            # PySide6がない環境ではパネルのケースを計測しない
+            "panel_measured": panel_available,
+        },
+        "results": results,
+        "generate": {str(count): stats for count, stats in generated.items()},
+        "storage": {str(count): sizes for count, sizes in storage.items()},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """コマンドライン実行"""
+    parser = argparse.ArgumentParser(description="History scale benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROW_COUNTS)
+    parser.add_argument("--image-sizes", type=int, nargs="+", default=DEFAULT_IMAGE_SIZES)
+    parser.add_argument("--images-per-generation", type=int, default=4)
+    parser.add_argument("--unique-images", type=int, default=DEFAULT_UNIQUE_IMAGES)
+    parser.add_argument("--tags", nargs="+", default=DEFAULT_TAGS)
+    parser.add_argument("--favorite-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--cases", nargs="+", default=None, help="ケース名の部分一致で絞り込み")
+    parser.add_argument("--output", default="bench_history.json")
+    parser.add_argument("--baseline", default=None, help="比較対象のJSON")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument(
+        "--generate", default=None, metavar="DB_PATH",
+        help="計測せず、このデータベースに --rows の最初の件数の合成履歴を保存する"
+    )
+    args = parser.parse_args(argv)
+
+    generator_options = {
+        "image_sizes": args.image_sizes,
+        "images_per_generation": args.images_per_generation,
+        "unique_images": args.unique_images,
+        "tags": args.tags,
+        "favorite_ratio": args.favorite_ratio,
+        "seed": args.seed,
+    }
+
+    if args.generate:
+        manager = HistoryManager(args.generate)
+        try:
+            result = generate_history(
+                manager, args.rows[0],
+                progress=lambda saved: print(f"[Bench] {saved}/{args.rows[0]}件"),
+                **generator_options,
+            )
+        finally:
+            manager.close()
+        print(f"[Bench] 合成履歴を保存: {args.generate} ({result['histories']}件, {result['seconds']:.1f}s)")
+        return 0
+
+    # 出力先と同じファイルを比較対象にできるよう、先に読み込む
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+
+    current = run_suite(
+        row_counts=args.rows,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        case_filter=args.cases,
+        generator_options=generator_options,
+    )
+
+    Path(args.output).write_text(json.dumps(current, indent=2), encoding="utf-8")
+    print(f"[Bench] 結果を保存: {args.output}")
+
+    if baseline is not None:
+        regressions = compare_results(current, baseline, args.threshold)
+        if regressions:
+            print(f"[Bench] 性能劣化を検出: {len(regressions)}件")
+            for r in regressions:
+                print(
+                    f"  - {r['case']}: {r['baseline']:.2f}ms -> {r['current']:.2f}ms "
+                    f"(x{r['ratio']:.2f})"
+                )
+            return 1
+        print("[Bench] 性能劣化なし")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""Benchmark suite for local image pipeline stages
+
+ローカルで実行される画像処理ステージ（忠実度チェック・衣類分析・色変更・
+顔交換・履歴保存）のCPUコストを計測します。
+
+使い方:
+    python -m tests.benchmarks.bench_pipeline --output bench_results.json
+    python -m tests.benchmarks.bench_pipeline --baseline bench_results.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT / "app"))
+
+from core.vton.fidelity_check import FidelityChecker
+from core.vton.clothing_analyzer import ClothingAnalyzer
+from core.vton.color_changer import ColorChanger
+from core.vton.color_preview import ColorPreviewEngine
+from core.vton.face_swapper import FaceSwapper
+from core.history.history_manager import HistoryManager
+
+
+DEFAULT_SIZES = [512, 1024, 1792]
+
+# リポジトリ同梱のサンプル画像（存在するものだけ使用）
+SAMPLE_IMAGES = [
+    "generated_1.png",
+    "trim_ofbfg_item8239dfbe466811f0b3970242ac11000a.jpg",
+]
+
+
+def make_synthetic_image(size: int, seed: int = 0) -> Image.Image:
+    """合成画像を作成（白背景 + グラデーション + ノイズ入りの衣類ブロック）
+
+    Args:
+        size: 長辺のピクセル数
+        seed: 乱数シード
+
+    Returns:
+        RGB画像（縦長 3:4）
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size, int(size * 0.75)
+
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # 衣類に見立てた中央ブロック（グラデーション + ノイズ）
+    y1, y2 = int(height * 0.25), int(height * 0.75)
+    x1, x2 = int(width * 0.2), int(width * 0.8)
+    gradient = np.linspace(60, 200, x2 - x1, dtype=np.float32)
+    block = np.empty((y2 - y1, x2 - x1, 3), dtype=np.float32)
+    block[..., 0] = gradient
+    block[..., 1] = 40
+    block[..., 2] = 255 - gradient
+    block += rng.normal(0, 12, block.shape)
+    img[y1:y2, x1:x2] = np.clip(block, 0, 255).astype(np.uint8)
+
+    return Image.fromarray(img)
+
+
+def resize_longest(image: Image.Image, size: int) -> Image.Image:
+    """長辺が size になるようにリサイズ"""
+    ratio = size / max(image.size)
+    new_size = (max(1, int(image.width * ratio)), max(1, int(image.height * ratio)))
+    return image.convert("RGB").resize(new_size, Image.Resampling.LANCZOS)
+
+
+def load_sources(size: int, include_samples: bool = True) -> Dict[str, Image.Image]:
+    """計測に使う入力画像を用意
+
+    Returns:
+        {ソース名: 画像}
+    """
+    sources = {"synthetic": make_synthetic_image(size)}
+
+    if include_samples:
+        for name in SAMPLE_IMAGES:
+            path = REPO_ROOT / name
+            if path.exists():
+                sources[Path(name).stem[:24]] = resize_longest(Image.open(path), size)
+
+    return sources
+
+
+def measure(
+    func: Callable[[], object],
+    iterations: int = 5,
+    warmup: int = 1,
+) -> Dict[str, float]:
+    """関数のレイテンシ分布とピークメモリを計測
+
+    レイテンシはtracemallocを無効にした状態で計測し、
+    ピークメモリは別途1回だけtracemalloc有効で実行して計測します。
+
+    Args:
+        func: 計測対象（引数なし）
+        iterations: 計測回数
+        warmup: ウォームアップ回数
+
+    Returns:
+        統計値の辞書（ミリ秒 / MB）
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": _percentile(timings, 50),
+        "p90_ms": _percentile(timings, 90),
+        "p99_ms": _percentile(timings, 99),
+        "mean_ms": statistics.fmean(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """線形補間でパーセンタイルを計算"""
+    return float(np.percentile(np.asarray(values, dtype=np.float64), pct))
+
+
+def build_cases(work_dir: Path) -> Dict[str, Callable[[str, Image.Image], Callable[[], object]]]:
+    """ベンチマークケースを定義
+
+    各ケースは (ソース名, 画像) を受け取り、計測対象の関数を返します。
+
+    Args:
+        work_dir: 一時ファイルの保存先
+    """
+    checker = FidelityChecker()
+    analyzer = ClothingAnalyzer()
+    changer = ColorChanger()
+    swapper = FaceSwapper()
+    history = HistoryManager(str(work_dir / "bench_history.db"))
+
+    def _save_original(source_name: str, image: Image.Image) -> str:
+        path = work_dir / f"{source_name}_{image.width}x{image.height}.png"
+        if not path.exists():
+            image.save(path)
+        return str(path)
+
+    def _perturbed(image: Image.Image) -> Image.Image:
+        # 生成画像の代わりに、元画像を少し変化させたものを使用
+        return changer.change_color(image, hue_shift=8, value_scale=0.95)
+
+    def fidelity_evaluate(source_name, image):
+        original_path = _save_original(source_name, image)
+        generated = _perturbed(image)
+        return lambda: checker.evaluate(original_path, generated)
+
+    def fidelity_heatmap(source_name, image):
+        original_path = _save_original(source_name, image)
+        generated = _perturbed(image)
+        return lambda: checker.generate_heatmap(original_path, generated)
+
+    def analyze_clothing(source_name, image):
+        path = _save_original(source_name, image)
+        return lambda: analyzer.analyze_clothing(path)
+
+    def change_color(source_name, image):
+        return lambda: changer.change_color(
+            image, hue_shift=30, saturation_scale=1.2, value_scale=0.9
+        )
+
+    def color_preview(source_name, image):
+        engine = ColorPreviewEngine(image)
+        return lambda: engine.preview(hue_shift=30, saturation_scale=1.2, value_scale=0.9)
+
+    def swap_face(source_name, image):
+        target = _perturbed(image)
+        return lambda: swapper.swap_face(image, target)
+
+    def save_generation(source_name, image):
+        params = {"source": source_name, "size": list(image.size)}
+        return lambda: history.save_generation([image], params, generation_mode="benchmark")
+
+    return {
+        "FidelityChecker.evaluate": fidelity_evaluate,
+        "FidelityChecker.generate_heatmap": fidelity_heatmap,
+        "ClothingAnalyzer.analyze_clothing": analyze_clothing,
+        "ColorChanger.change_color": change_color,
+        "ColorPreviewEngine.preview": color_preview,
+        "FaceSwapper.swap_face": swap_face,
+        "HistoryManager.save_generation": save_generation,
+    }
+
+
+def run_suite(
+    sizes: List[int] = None,
+    iterations: int = 5,
+    warmup: int = 1,
+    case_filter: Optional[List[str]] = None,
+    include_samples: bool = True,
+) -> Dict:
+    """ベンチマークスイートを実行
+
+    Args:
+        sizes: 計測する画像サイズ（長辺px）
+        iterations: 各ケースの計測回数
+        warmup: ウォームアップ回数
+        case_filter: 実行するケース名の部分一致リスト（Noneで全て）
+        include_samples: 同梱サンプル画像も計測するか
+
+    Returns:
+        {"meta": {...}, "results": {"ケース/サイズ/ソース": 統計値}}
+    """
+    sizes = sizes or DEFAULT_SIZES
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cases = build_cases(Path(temp_dir))
+        if case_filter:
+            cases = {
+                name: case for name, case in cases.items()
+                if any(f in name for f in case_filter)
+            }
+
+        for size in sizes:
+            sources = load_sources(size, include_samples)
+            for case_name, setup in cases.items():
+                for source_name, image in sources.items():
+                    key = f"{case_name}/{size}/{source_name}"
+                    func = setup(source_name, image)
+                    stats = measure(func, iterations=iterations, warmup=warmup)
+                    results[key] = stats
+                    print(
+                        f"[Bench] {key}: p50={stats['p50_ms']:.1f}ms "
+                        f"p90={stats['p90_ms']:.1f}ms peak={stats['peak_memory_mb']:.1f}MB"
+                    )
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+def compare_results(
+    current: Dict,
+    baseline: Dict,
+    threshold: float = 0.2,
+    metric: str = "p50_ms",
+) -> List[Dict]:
+    """前回結果と比較して性能劣化を検出
+
+    Args:
+        current: 今回の結果
+        baseline: 比較対象の結果
+        threshold: 劣化とみなす増加率（0.2 = 20%）
+        metric: 比較する統計値
+
+    Returns:
+        劣化したケースのリスト
+    """
+    regressions = []
+    baseline_results = baseline.get("results", {})
+
+    for key, stats in current.get("results", {}).items():
+        before = baseline_results.get(key, {}).get(metric)
+        after = stats.get(metric)
+        if not before or after is None:
+            continue
+
+        ratio = after / before
+        if ratio > 1 + threshold:
+            regressions.append({
+                "case": key,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "ratio": ratio,
+            })
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """コマンドライン実行"""
+    parser = argparse.ArgumentParser(description="Local pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--cases", nargs="+", default=None, help="ケース名の部分一致で絞り込み")
+    parser.add_argument("--no-samples", action="store_true", help="合成画像のみで計測")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="比較対象のJSON")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    # 出力先と同じファイルを比較対象にできるよう、先に読み込む
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+
+    current = run_suite(
+        sizes=args.sizes,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        case_filter=args.cases,
+        include_samples=not args.no_samples,
+    )
+
+    Path(args.output).write_text(json.dumps(current, indent=2), encoding="utf-8")
+    print(f"[Bench] 結果を保存: {args.output}")
+
+    if baseline is not None:
+        regressions = compare_results(current, baseline, args.threshold)
+        if regressions:
+            print(f"[Bench] 性能劣化を検出: {len(regressions)}件")
+            for r in regressions:
+                print(
+                    f"  - {r['case']}: {r['baseline']:.1f}ms -> {r['current']:.1f}ms "
+                    f"(x{r['ratio']:.2f})"
+                )
+            return 1
+        print("[Bench] 性能劣化なし")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
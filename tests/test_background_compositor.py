@@ -0,0 +1,79 @@
+"""Tests for background compositor"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.background_compositor import BackgroundCompositor
+
+
+@pytest.fixture
+def portrait():
+    """白背景の人物（内側に白い服）"""
+    img = np.full((240, 180, 3), 255, dtype=np.uint8)
+    cv2.ellipse(img, (90, 120), (50, 100), 0, 0, 360, (60, 40, 120), -1, cv2.LINE_AA)
+    cv2.rectangle(img, (75, 100), (105, 140), (250, 250, 248), -1)
+    return Image.fromarray(img)
+
+
+class TestBackgroundCompositor:
+    """BackgroundCompositorのテスト"""
+
+    def test_alpha_separates_person(self, portrait):
+        """背景は0、人物（白い服を含む）は1"""
+        alpha = BackgroundCompositor().extract_alpha(portrait)
+
+        assert alpha[5, 5] == 0.0
+        assert alpha[120, 90] == 1.0  # 白い服
+        assert alpha[60, 90] == 1.0
+        # 境界は滑らかに遷移
+        edge = alpha[120, 35:45]
+        assert edge.min() < 0.5 < edge.max()
+
+    def test_alpha_cached(self, portrait, monkeypatch):
+        """同じ画像の切り抜きは1回だけ"""
+        compositor = BackgroundCompositor()
+        calls = []
+        original = compositor._compute_alpha
+        monkeypatch.setattr(
+            compositor, "_compute_alpha", lambda img: calls.append(1) or original(img)
+        )
+
+        compositor.composite(portrait, (0, 0, 0))
+        compositor.composite(portrait, (0, 128, 255))
+
+        assert len(calls) == 1
+
+    def test_composite_replaces_background(self, portrait, tmp_path):
+        """背景だけが差し替わり、人物はそのまま"""
+        bg_path = tmp_path / "bg.png"
+        Image.new("RGB", (400, 200), (20, 120, 40)).save(bg_path)
+
+        result = np.asarray(BackgroundCompositor().composite(portrait, str(bg_path)))
+
+        assert result.shape == (240, 180, 3)
+        assert tuple(result[5, 5]) == (20, 120, 40)
+        assert tuple(result[60, 90]) == (60, 40, 120)
+        assert tuple(result[120, 90]) == (250, 250, 248)
+
+    def test_edges_have_no_white_fringe(self, portrait):
+        """境界に元の白背景がにじまない"""
+        result = np.asarray(BackgroundCompositor().composite(portrait, (0, 0, 0)))
+
+        edge = result[120, 35:45].astype(int)
+        assert edge.max() <= 130
+
+    def test_color_match_shifts_person(self, portrait):
+        """色合わせを有効にすると人物の色味が背景に寄る"""
+        compositor = BackgroundCompositor()
+        plain = np.asarray(compositor.composite(portrait, (0, 160, 0))).astype(int)
+        matched = np.asarray(compositor.composite(portrait, (0, 160, 0), color_match=0.5)).astype(int)
+
+        assert matched[60, 90, 1] > plain[60, 90, 1]
+        assert tuple(matched[5, 5]) == (0, 160, 0)
@@ -0,0 +1,77 @@
+"""Tests for benchmark helpers"""
+
+import pytest
+
+from tests.benchmarks.bench_history import HistoryManager, generate_history, run_suite
+from tests.benchmarks.bench_pipeline import compare_results, make_synthetic_image, measure
+
+
+class TestBenchmarkHelpers:
+    """ベンチマーク補助関数のテスト"""
+
+    def test_measure_reports_percentiles(self):
+        """計測結果にパーセンタイルとピークメモリが含まれる"""
+        stats = measure(lambda: sum(range(1000)), iterations=3, warmup=0)
+
+        assert stats["iterations"] == 3
+        assert stats["min_ms"] <= stats["p50_ms"] <= stats["p90_ms"] <= stats["max_ms"]
+        assert stats["peak_memory_mb"] >= 0
+
+    def test_synthetic_image_size(self):
+        """合成画像は長辺が指定サイズ"""
+        img = make_synthetic_image(512)
+        assert max(img.size) == 512
+
+    def test_compare_results_flags_regression(self):
+        """閾値を超えて遅くなったケースを検出"""
+        baseline = {"results": {"a/512/x": {"p50_ms": 10.0}, "b/512/x": {"p50_ms": 10.0}}}
+        current = {"results": {"a/512/x": {"p50_ms": 15.0}, "b/512/x": {"p50_ms": 10.5}}}
+
+        regressions = compare_results(current, baseline, threshold=0.2)
+
+        assert [r["case"] for r in regressions] == ["a/512/x"]
+        assert regressions[0]["ratio"] == pytest.approx(1.5)
+
+
+class TestHistoryBenchmark:
+    """履歴のスケールベンチマークのテスト"""
+
+    def test_generate_history(self, tmp_path):
+        """指定した件数の合成履歴が、古い順のIDで保存される"""
+        manager = HistoryManager(str(tmp_path / "history.db"))
+        try:
+            progress = []
+            result = generate_history(
+                manager, 30, image_sizes=[64], unique_images=4, favorite_ratio=0.5,
+                batch_size=16, progress=progress.append,
+            )
+
+            assert progress == [16, 30]
+            stats = manager.get_statistics()
+            assert stats["total_generations"] == result["histories"] == 30
+            assert stats["total_images"] == result["images"]
+            assert stats["unique_images"] == result["unique_images"] == 4
+            assert stats["favorite_count"] == result["favorites"] > 0
+
+            page = manager.get_history_page()
+            assert [h["id"] for h in page] == list(range(30, 0, -1))
+            assert any(h["tags"] for h in page)
+            assert manager.get_thumbnail(page[0]["thumbnail_hash"]) is not None
+        finally:
+            manager.close()
+
+    def test_run_suite_reports_cases_and_storage(self):
+        """件数ごとにケースの計測結果とサイズを返す"""
+        result = run_suite(
+            row_counts=[20], iterations=1, warmup=0,
+            generator_options={"image_sizes": [64], "unique_images": 4},
+        )
+
+        assert "HistoryManager.save_generation/20" in result["results"]
+        assert "get_history_page.tag/20" in result["results"]
+        assert result["results"]["get_history_page.first/20"]["p50_ms"] > 0
+        assert result["generate"]["20"]["histories"] == 20
+        assert result["storage"]["20"]["db_bytes"] > 0
+        assert result["storage"]["20"]["blob_files"] > 0
+        # PySide6がある環境だけパネルを計測する
+        assert ("HistoryPanel.load/20" in result["results"]) == result["meta"]["panel_measured"]
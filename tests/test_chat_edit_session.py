@@ -0,0 +1,187 @@
+"""Tests for chat edit session"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.pipeline.chat_edit_session import ChatEditSession, PROMPT_VARIANTS, detect_region, region_box
+
+
+# 正面立ちのランドマーク（正規化座標）
+FRONT_LANDMARKS = {
+    'nose': (0.5, 0.1, 0.0),
+    'left_shoulder': (0.6, 0.25, 0.0),
+    'right_shoulder': (0.4, 0.25, 0.0),
+    'left_elbow': (0.65, 0.4, 0.0),
+    'right_elbow': (0.35, 0.4, 0.0),
+    'left_wrist': (0.66, 0.52, 0.0),
+    'right_wrist': (0.34, 0.52, 0.0),
+    'left_hip': (0.56, 0.55, 0.0),
+    'right_hip': (0.44, 0.55, 0.0),
+    'left_knee': (0.56, 0.75, 0.0),
+    'right_knee': (0.44, 0.75, 0.0),
+    'left_ankle': (0.56, 0.92, 0.0),
+    'right_ankle': (0.44, 0.92, 0.0),
+}
+
+
+@pytest.fixture
+def portrait():
+    """グラデーションの人物画像（800x1200）"""
+    y = np.linspace(0, 255, 1200, dtype=np.uint8)
+    img = np.stack([np.tile(y[:, None], (1, 800))] * 3, axis=-1)
+    return Image.fromarray(img)
+
+
+def _make_session(image, calls, landmarks=FRONT_LANDMARKS):
+    """Gemini呼び出しを差し替えたセッション（受け取った画像を赤くして返す）"""
+    session = ChatEditSession("test-key")
+    session.set_base_image(image)
+    session.set_landmarks(landmarks)
+
+    def fake_generate(img_bytes, prompt):
+        from io import BytesIO
+        sent = Image.open(BytesIO(img_bytes))
+        calls.append((sent.size, img_bytes))
+        return Image.new("RGB", sent.size, (255, 0, 0))
+
+    session._generate = fake_generate
+    return session
+
+
+class TestDetectRegion:
+    """detect_regionのテスト"""
+
+    def test_regions(self):
+        """指示文から領域を推定"""
+        assert detect_region("靴を赤くして") == "feet"
+        assert detect_region("髪を短くして") == "head"
+        assert detect_region("Make the skirt longer") == "lower"
+        assert detect_region("シャツの袖をまくって") == "upper"
+
+    def test_global_instructions(self):
+        """背景や全体の指示は領域を絞らない"""
+        assert detect_region("背景を海にして") is None
+        assert detect_region("靴も含めて全体を明るくして") is None
+        # 英単語は単語単位で一致（that の hat に反応しない）
+        assert detect_region("make it look like that") is None
+
+    def test_japanese_compounds_not_matched(self):
+        """熟語の一部（派手・上手・指示）を手や指と誤認しない"""
+        assert detect_region("もっと派手にして") is None
+        assert detect_region("上手に仕上げて") is None
+        assert detect_region("指示どおりシャツを赤くして") == "upper"
+        assert detect_region("指先を細くして") == "hands"
+        assert detect_region("両手を下ろして") == "hands"
+
+
+class TestChatEditSession:
+    """ChatEditSessionのテスト"""
+
+    def test_region_edit_sends_crop_only(self, portrait):
+        """靴の指示では足元だけを送信し、それ以外は元のまま"""
+        calls = []
+        session = _make_session(portrait, calls)
+
+        result = session.edit("靴を赤くして")
+
+        (sent_size, _), = calls
+        left, top, right, bottom = session.last_edit_info["crop_box"]
+        assert session.last_edit_info["region"] == "feet"
+        assert sent_size[0] * sent_size[1] < portrait.width * portrait.height / 4
+
+        result = np.asarray(result)
+        original = np.asarray(portrait)
+        assert result.shape == original.shape
+        assert tuple(result[(top + bottom) // 2, (left + right) // 2]) == (255, 0, 0)
+        np.testing.assert_array_equal(result[:top], original[:top])
+
+    def test_global_edit_sends_whole_image(self, portrait):
+        """全体への指示は画像全体を送る"""
+        calls = []
+        session = _make_session(portrait, calls)
+
+        result = session.edit("背景を海にして")
+
+        assert session.last_edit_info["crop_box"] is None
+        assert max(calls[0][0]) == 1024
+        assert result.size == portrait.size
+
+    def test_brush_mask_limits_edit(self, portrait):
+        """ブラシマスクの範囲外は変わらない"""
+        calls = []
+        session = _make_session(portrait, calls, landmarks=None)
+        mask = Image.new("L", portrait.size, 0)
+        mask.paste(255, (300, 400, 400, 500))
+
+        result = np.asarray(session.edit("ここに模様を追加", mask=mask))
+        original = np.asarray(portrait)
+
+        assert tuple(result[450, 350]) == (255, 0, 0)
+        np.testing.assert_array_equal(result[:, :250], original[:, :250])
+        np.testing.assert_array_equal(result[600:], original[600:])
+
+    def test_encoding_reused(self, portrait):
+        """同じ画像・同じ範囲への連続した指示では再エンコードしない"""
+        calls = []
+        session = _make_session(portrait, calls)
+
+        session.edit("靴を赤くして")
+        session.set_base_image(portrait.copy())
+        session.edit("靴を青くして")
+
+        assert calls[0][1] is calls[1][1]
+
+    def test_region_box_within_image(self):
+        """切り出し範囲は画像内に収まる"""
+        for region in ("head", "upper", "lower", "feet", "hands"):
+            left, top, right, bottom = region_box(region, FRONT_LANDMARKS, (800, 1200))
+            assert 0 <= left < right <= 800
+            assert 0 <= top < bottom <= 1200
+
+    def test_candidates_ranked_by_change_outside_region(self, portrait):
+        """候補は領域外の変化が少ない順に並び、届くたびに通知される"""
+        session = ChatEditSession("test-key")
+        session.set_base_image(portrait)
+        session.set_landmarks(None)
+        colors = {0: (255, 0, 0), 1: (128, 128, 128), 2: (0, 0, 0)}
+        received = []
+
+        def fake_generate(img_bytes, prompt):
+            from io import BytesIO
+            sent = Image.open(BytesIO(img_bytes))
+            # 候補ごとに言い回しが違う（追加指示で判別）
+            variant = [i for i, line in enumerate(PROMPT_VARIANTS) if line and line in prompt]
+            color = colors[variant[0] if variant else 0]
+            edited = np.asarray(sent).copy()
+            edited[:, :] = edited[:, :] // 2 + np.array(color, dtype=np.uint8) // 2
+            return Image.fromarray(edited)
+
+        session._generate = fake_generate
+        candidates = session.edit_candidates(
+            "背景を海にして", count=3,
+            on_candidate=lambda image, score, index: received.append(index)
+        )
+
+        assert sorted(received) == [0, 1, 2]
+        scores = [score for _, score in candidates]
+        assert scores == sorted(scores)
+        assert all(image.size == portrait.size for image, _ in candidates)
+        assert session.last_edit_info["scores"] == scores
+
+    def test_candidate_score_ignores_brush_region(self, portrait):
+        """ブラシ範囲内だけが変わった候補のスコアは0"""
+        calls = []
+        session = _make_session(portrait, calls, landmarks=None)
+        mask = Image.new("L", portrait.size, 0)
+        mask.paste(255, (300, 400, 400, 500))
+
+        (image, score), = session.edit_candidates("ここに模様を追加", count=1, mask=mask)
+
+        assert tuple(np.asarray(image)[450, 350]) == (255, 0, 0)
+        assert score < 1.0
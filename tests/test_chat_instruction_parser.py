@@ -0,0 +1,116 @@
+"""Tests for chat instruction parser"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.pipeline.chat_instruction_parser import ChatInstructionParser
+from core.pipeline.local_instruction_parser import LocalInstructionParser
+
+
+CURRENT_PARAMS = {
+    "gender": "female",
+    "age_range": "20s",
+    "ethnicity": "asian",
+    "body_type": "standard",
+    "pose": "front",
+    "background": "white",
+}
+
+
+class FakeModel:
+    """Gemini呼び出しを記録するダミー"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+
+        class Response:
+            text = '{"changes": {"prompt_additions": "casual mood"}, "ai_response": "OK"}'
+        return Response()
+
+
+@pytest.fixture
+def parser():
+    parser = ChatInstructionParser("test-key")
+    parser.model = FakeModel()
+    return parser
+
+
+class TestLocalInstructionParser:
+    """LocalInstructionParserのテスト"""
+
+    @pytest.mark.parametrize("instruction, expected", [
+        ("背景を白に", {"background": "white"}),
+        ("もっと明るく", {"lighting": "brighter, well-lit lighting"}),
+        ("男性にして", {"gender": "male"}),
+        ("Make the background black, please", {"background": "black"}),
+        ("背景をビーチにして笑顔に", {"background": "beach", "expression": "smiling"}),
+        ("座ってるポーズにして", {"pose": "sitting"}),
+        ("表情を明るくして", {"expression": "bright, cheerful expression"}),
+        ("もっと明るい表情で", {"expression": "bright, cheerful expression"}),
+        ("笑顔の表情で背景を白に", {"expression": "smiling", "background": "white"}),
+    ])
+    def test_common_instructions(self, instruction, expected):
+        """定型的な指示はローカルで解析"""
+        result = LocalInstructionParser().parse(instruction, CURRENT_PARAMS)
+        assert result["changes"] == expected
+        assert result["ai_response"]
+
+    def test_relative_age(self):
+        """「若く」は現在の年代から1段階下げる"""
+        parser = LocalInstructionParser()
+        assert parser.parse("若くして", {"age_range": "30s"})["changes"] == {"age_range": "20s"}
+        assert parser.parse("older", {"age_range": "50s+"})["changes"] == {"age_range": "50s+"}
+
+    @pytest.mark.parametrize("instruction", [
+        "もっとカジュアルな雰囲気で",
+        "背景を青空に変更",
+        "横向きで歩いて",
+        "ジャケットを赤く",
+        "明るいポーズで",
+        "もっと明るく、表情も自然に",
+    ])
+    def test_ambiguous_instructions(self, instruction):
+        """解釈しきれない指示や矛盾する指示はLLMに任せる"""
+        assert LocalInstructionParser().parse(instruction, CURRENT_PARAMS) is None
+
+
+class TestChatInstructionParser:
+    """ChatInstructionParserのテスト"""
+
+    def test_local_fast_path(self, parser):
+        """定型的な指示ではGeminiを呼ばない"""
+        result = parser.parse_instruction("背景を白に", CURRENT_PARAMS, [])
+
+        assert result["changes"] == {"background": "white"}
+        assert parser.model.prompts == []
+
+    def test_llm_results_cached(self, parser):
+        """同じ指示・同じパラメータの2回目はキャッシュを使う"""
+        first = parser.parse_instruction("もっとカジュアルな雰囲気で", CURRENT_PARAMS, [])
+        second = parser.parse_instruction(" もっとカジュアルな雰囲気で。", CURRENT_PARAMS, [])
+
+        assert len(parser.model.prompts) == 1
+        assert second == first
+        assert parser.cache_stats()["hits"] == 1
+        assert parser.cache_stats()["misses"] == 1
+
+    def test_cache_keyed_by_params(self, parser):
+        """パラメータが変わればキャッシュを使わない"""
+        parser.parse_instruction("若くして", CURRENT_PARAMS, [])
+        result = parser.parse_instruction("若くして", dict(CURRENT_PARAMS, age_range="40s"), [])
+
+        assert result["changes"] == {"age_range": "30s"}
+        assert parser.cache_stats()["misses"] == 2
+
+    def test_cached_result_not_shared(self, parser):
+        """返した結果を変更してもキャッシュには影響しない"""
+        parser.parse_instruction("背景を白に", CURRENT_PARAMS, [])["changes"]["background"] = "black"
+
+        assert parser.parse_instruction("背景を白に", CURRENT_PARAMS, [])["changes"] == {"background": "white"}
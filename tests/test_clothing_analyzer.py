@@ -0,0 +1,105 @@
+"""Tests for clothing analyzer"""
+
+import pytest
+import numpy as np
+import cv2
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.clothing_analyzer import ClothingAnalyzer, SKLEARN_AVAILABLE
+
+
+def _hex_to_lab(hex_color: str) -> np.ndarray:
+    rgb = np.uint8([[[int(hex_color[i:i + 2], 16) for i in (1, 3, 5)]]])
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)[0, 0].astype(float)
+
+
+def _rgb_to_lab(rgb) -> np.ndarray:
+    return cv2.cvtColor(np.uint8([[rgb]]), cv2.COLOR_RGB2LAB)[0, 0].astype(float)
+
+
+def _reference_colors(pixels: np.ndarray, n_colors: int = 3) -> list:
+    """従来実装（全画素・n_init=10のK-means）による主要色"""
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10).fit(pixels)
+    order = np.argsort(np.bincount(kmeans.labels_))[::-1]
+    return [_rgb_to_lab(c.astype(np.uint8)) for c in kmeans.cluster_centers_[order]]
+
+
+@pytest.fixture
+def analyzer():
+    ClothingAnalyzer._color_cache.clear()
+    return ClothingAnalyzer()
+
+
+@pytest.fixture
+def garment_on_white():
+    """白背景に3色の衣類（面積比 3:2:1）"""
+    rng = np.random.default_rng(0)
+    img = np.full((600, 450, 3), 255, dtype=np.uint8)
+    img[100:400, 75:375] = (200, 30, 40)
+    img[400:500, 75:375] = (20, 40, 160)
+    img[500:550, 75:375] = (240, 200, 20)
+    noise = rng.normal(0, 4, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+class TestDominantColors:
+    """主要色抽出のテスト"""
+
+    def test_background_is_excluded(self, analyzer, garment_on_white):
+        """白背景は主要色に含まれず、面積順に並ぶ"""
+        colors = analyzer._extract_dominant_colors(garment_on_white)
+        expected = [(200, 30, 40), (20, 40, 160), (240, 200, 20)]
+
+        assert len(colors) == 3
+        for hex_color, rgb in zip(colors, expected):
+            assert np.linalg.norm(_hex_to_lab(hex_color) - _rgb_to_lab(rgb)) < 5
+
+    @pytest.mark.skipif(not SKLEARN_AVAILABLE, reason="scikit-learn is not installed")
+    def test_matches_full_kmeans_on_foreground(self, analyzer, garment_on_white):
+        """背景を除いた画素での従来K-meansと同じ色を返す"""
+        pixels = garment_on_white.reshape(-1, 3)
+        foreground = pixels[np.any(pixels < 200, axis=1)]
+        reference = _reference_colors(foreground)
+
+        colors = analyzer._extract_dominant_colors(garment_on_white)
+
+        for hex_color, ref_lab in zip(colors, reference):
+            assert np.linalg.norm(_hex_to_lab(hex_color) - ref_lab) < 5
+
+    @pytest.mark.skipif(not SKLEARN_AVAILABLE, reason="scikit-learn is not installed")
+    def test_matches_full_kmeans_when_frame_is_filled(self, analyzer):
+        """衣類が枠いっぱいの場合は全画素での従来K-meansと一致する"""
+        rng = np.random.default_rng(1)
+        img = np.zeros((300, 300, 3), dtype=np.uint8)
+        img[:, :150] = (30, 60, 120)
+        img[:, 150:250] = (180, 170, 150)
+        img[:, 250:] = (90, 20, 30)
+        img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+
+        reference = _reference_colors(img.reshape(-1, 3))
+        colors = analyzer._extract_dominant_colors(img)
+
+        assert len(colors) == 3
+        for hex_color, ref_lab in zip(colors, reference):
+            assert np.linalg.norm(_hex_to_lab(hex_color) - ref_lab) < 5
+
+    def test_single_color_image(self, analyzer):
+        """単色画像でも失敗しない"""
+        img = np.full((100, 100, 3), (10, 120, 200), dtype=np.uint8)
+        colors = analyzer._extract_dominant_colors(img)
+
+        assert colors == ["#0a78c8"]
+
+    def test_results_are_cached(self, analyzer, garment_on_white, monkeypatch):
+        """同じ画像は再計算しない"""
+        first = analyzer._extract_dominant_colors(garment_on_white)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should use cache")
+
+        monkeypatch.setattr(analyzer, "_cluster_colors", fail)
+        assert analyzer._extract_dominant_colors(garment_on_white.copy()) == first
@@ -0,0 +1,106 @@
+"""Tests for color changer and preview engine"""
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.color_changer import ColorChanger
+from core.vton.color_preview import ColorPreviewEngine
+
+
+def _reference_change_color(image, hue_shift=0, saturation_scale=1.0, value_scale=1.0, mask=None):
+    """従来実装（float32のHSV配列を直接操作）"""
+    img_bgr = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+    img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV).astype(np.float32)
+    img_hsv[:, :, 0] = (img_hsv[:, :, 0] + hue_shift) % 180
+    img_hsv[:, :, 1] = np.clip(img_hsv[:, :, 1] * saturation_scale, 0, 255)
+    img_hsv[:, :, 2] = np.clip(img_hsv[:, :, 2] * value_scale, 0, 255)
+    modified = cv2.cvtColor(img_hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+    if mask is not None:
+        mask_3ch = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR).astype(np.float32) / 255.0
+        modified = (modified * mask_3ch + img_bgr * (1 - mask_3ch)).astype(np.uint8)
+    return cv2.cvtColor(modified, cv2.COLOR_BGR2RGB)
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (240, 180, 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def mask():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 256, (240, 180), dtype=np.uint8)
+
+
+PARAMS = [(0, 1.0, 1.0), (30, 1.2, 0.9), (-170, 0.3, 1.7), (179, 2.0, 2.0)]
+
+
+class TestColorChanger:
+    """ColorChangerのテスト"""
+
+    @pytest.mark.parametrize("params", PARAMS)
+    def test_lut_matches_reference(self, image, mask, params):
+        """ルックアップテーブル版が従来実装と一致"""
+        changer = ColorChanger()
+        for m in (None, mask):
+            result = np.asarray(changer.change_color(image, *params, mask=m))
+            assert np.array_equal(result, _reference_change_color(image, *params, mask=m))
+
+
+class TestColorPreviewEngine:
+    """ColorPreviewEngineのテスト"""
+
+    def test_render_matches_change_color(self, image, mask):
+        """フル解像度の描画がchange_colorと一致"""
+        engine = ColorPreviewEngine(image, mask, proxy_size=64)
+        try:
+            expected = ColorChanger().change_color(image, 30, 1.2, 0.9, mask=mask)
+            assert np.array_equal(np.asarray(engine.render(30, 1.2, 0.9)), np.asarray(expected))
+        finally:
+            engine.close()
+
+    def test_preview_uses_proxy(self, image, mask):
+        """プレビューは縮小プロキシ上で描画"""
+        engine = ColorPreviewEngine(image, mask, proxy_size=64)
+        try:
+            preview = engine.preview(30, 1.2, 0.9)
+            assert preview.shape == (64, 48, 3)
+            assert engine.proxy_size == (48, 64)
+        finally:
+            engine.close()
+
+    def test_commit_renders_in_background(self, image):
+        """確定時の描画はバックグラウンドで行い、古い確定はキャンセル"""
+        engine = ColorPreviewEngine(image)
+        try:
+            future = engine.commit(60, 1.0, 1.0)
+            result = future.result(timeout=5)
+            expected = ColorChanger().change_color(image, 60)
+            assert np.array_equal(np.asarray(result), np.asarray(expected))
+        finally:
+            engine.close()
+
+    def test_preview_is_fast(self):
+        """大きな画像でもプレビュー更新は1フレーム（16ms）以内"""
+        rng = np.random.default_rng(2)
+        big = Image.fromarray(rng.integers(0, 256, (2048, 1536, 3), dtype=np.uint8))
+        engine = ColorPreviewEngine(big, np.full((2048, 1536), 255, dtype=np.uint8))
+        try:
+            engine.preview(10, 1.1, 0.9)
+            timings = []
+            for hue in range(0, 180, 20):
+                start = time.perf_counter()
+                engine.preview(hue, 1.1, 0.9)
+                timings.append(time.perf_counter() - start)
+            assert np.median(timings) < 0.016
+        finally:
+            engine.close()
@@ -0,0 +1,75 @@
+"""Tests for colorway generator"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.colorway_generator import ColorwayGenerator
+from core.history.history_manager import HistoryManager
+
+
+@pytest.fixture
+def outfit():
+    """白背景に赤い衣類"""
+    img = np.full((160, 120, 3), 255, dtype=np.uint8)
+    img[40:120, 30:90] = (200, 30, 40)
+    return Image.fromarray(img)
+
+
+def _hue(rgb):
+    return int(cv2.cvtColor(np.uint8([[rgb]]), cv2.COLOR_RGB2HSV)[0, 0, 0])
+
+
+class TestColorwayGenerator:
+    """ColorwayGeneratorのテスト"""
+
+    def test_detects_garment_color(self, outfit):
+        """白背景ではなく衣類の色を検出"""
+        r, g, b = ColorwayGenerator().detect_garment_color(outfit)
+        assert r > 150 and g < 80 and b < 80
+
+    def test_matches_per_color_change(self, outfit):
+        """一括生成の結果が1色ずつのchange_colorと一致"""
+        generator = ColorwayGenerator()
+        source = (200, 30, 40)
+        targets = [(30, 60, 200), (40, 180, 60), (240, 200, 30)]
+
+        images, _ = generator.generate(outfit, targets, source_color=source)
+
+        mask = generator.changer.create_mask_by_color(outfit, source, generator.tolerance)
+        for target, image in zip(targets, images):
+            expected = generator.changer.change_color(
+                outfit, *generator._adjustment(source, target, True), mask=mask
+            )
+            assert np.array_equal(np.asarray(image), np.asarray(expected))
+
+    def test_only_garment_recolored(self, outfit):
+        """衣類だけが変更先の色になり、背景は変わらない"""
+        target = (30, 60, 200)
+        images, metadata = ColorwayGenerator().generate(outfit, [target])
+        result = np.asarray(images[0])
+
+        assert abs(_hue(tuple(int(v) for v in result[80, 60])) - _hue(target)) <= 2
+        assert np.array_equal(result[:30], np.asarray(outfit)[:30])
+        assert 0.2 < metadata["mask_coverage"] < 0.3
+
+    def test_saved_as_one_generation(self, outfit, tmp_path):
+        """色違いは1件の履歴として保存"""
+        generator = ColorwayGenerator()
+        history = HistoryManager(str(tmp_path / "history.db"))
+        try:
+            images, metadata = generator.generate(outfit, [(30, 60, 200), (40, 180, 60)])
+            history_id = generator.save_to_history(history, images, metadata)
+
+            entries = history.get_history_list()
+            assert len(entries) == 1
+            assert entries[0]["generation_mode"] == "colorway"
+            assert len(history.get_history_images(history_id)) == 2
+        finally:
+            history.close()
@@ -0,0 +1,130 @@
+"""Tests for face swapper"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.face_swapper import FaceSwapper, _radial_mask
+
+
+def _reference_mask(height: int, width: int) -> np.ndarray:
+    """従来実装（画素ごとのループ）によるマスク"""
+    mask = np.zeros((height, width), dtype=np.float32)
+    center_x = width // 2
+    center_y = height // 2
+    for y in range(height):
+        for x in range(width):
+            dist_x = abs(x - center_x) / center_x
+            dist_y = abs(y - center_y) / center_y
+            mask[y, x] = max(0, 1 - np.sqrt(dist_x**2 + dist_y**2))
+    return mask
+
+
+def _random_image(seed: int, size=(120, 160)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def swapper(monkeypatch):
+    """顔検出を固定の領域に差し替えたFaceSwapper"""
+    swapper = FaceSwapper()
+    calls = []
+
+    def fake_detect(image_rgb):
+        calls.append(image_rgb.shape)
+        return (20, 30, 80, 110)
+
+    monkeypatch.setattr(swapper, "_detect_face", fake_detect)
+    swapper.detect_calls = calls
+    return swapper
+
+
+class TestFaceSwapper:
+    """FaceSwapperのテスト"""
+
+    @pytest.mark.parametrize("height,width", [(80, 60), (37, 51), (2, 2)])
+    def test_mask_matches_reference(self, height, width):
+        """ベクトル化したマスクが従来実装と一致"""
+        np.testing.assert_allclose(
+            _radial_mask(height, width)[:, :, 0], _reference_mask(height, width), atol=1e-6
+        )
+
+    def test_mask_cached_by_size(self):
+        """同じサイズのマスクは再利用"""
+        assert _radial_mask(40, 30) is _radial_mask(40, 30)
+
+    def test_blend_matches_reference(self, swapper):
+        """顔領域の合成結果が従来実装と一致"""
+        source = _random_image(0)
+        target = _random_image(1)
+
+        result = np.asarray(swapper.swap_face(source, target))
+
+        x1, y1, x2, y2 = 20, 30, 80, 110
+        face = cv2.resize(np.asarray(source)[y1:y2, x1:x2], (x2 - x1, y2 - y1))
+        mask = _reference_mask(y2 - y1, x2 - x1)[:, :, None]
+        orig = np.asarray(target)[y1:y2, x1:x2].astype(np.float32)
+        expected = (face.astype(np.float32) * mask + orig * (1 - mask)).astype(np.uint8)
+
+        assert np.abs(result[y1:y2, x1:x2].astype(int) - expected).max() <= 1
+        # 顔領域の外は変更しない
+        outside = np.ones(result.shape[:2], dtype=bool)
+        outside[y1:y2, x1:x2] = False
+        assert np.array_equal(result[outside], np.asarray(target)[outside])
+
+    def test_batch_detects_source_once(self, swapper):
+        """バッチ処理では参考人物の顔検出は1回だけ"""
+        targets = [_random_image(i + 1) for i in range(3)]
+
+        results = swapper.swap_face_batch(_random_image(0), targets)
+
+        assert len(results) == 3
+        assert len(swapper.detect_calls) == 1 + len(targets)
+        single = swapper.swap_face(_random_image(0), targets[1])
+        assert np.array_equal(np.asarray(results[1]), np.asarray(single))
+
+    def test_no_face_returns_target(self, monkeypatch):
+        """顔が検出できない場合は元の画像を返す"""
+        swapper = FaceSwapper()
+        monkeypatch.setattr(swapper, "_detect_face", lambda image_rgb: None)
+        target = _random_image(1)
+
+        assert swapper.swap_face(_random_image(0), target) is target
+        assert swapper.swap_face_batch(_random_image(0), [target]) == [target]
+
+    def test_detector_loaded_once(self, monkeypatch):
+        """Haar Cascade分類器は初回のみ読み込む"""
+        loads = []
+        original = cv2.CascadeClassifier
+
+        def counting_classifier(path):
+            loads.append(path)
+            return original(path)
+
+        monkeypatch.setattr(FaceSwapper, "_face_cascade", None)
+        monkeypatch.setattr(cv2, "CascadeClassifier", counting_classifier)
+
+        swapper = FaceSwapper()
+        image = np.asarray(_random_image(0))
+        swapper._detect_face(image)
+        FaceSwapper()._detect_face(image)
+
+        assert len(loads) == 1
+
+    def test_seamless_clone(self, monkeypatch):
+        """seamlessCloneでも顔領域の外は変更しない"""
+        swapper = FaceSwapper(seamless=True)
+        monkeypatch.setattr(swapper, "_detect_face", lambda image_rgb: (20, 30, 80, 110))
+        target = _random_image(1)
+
+        result = np.asarray(swapper.swap_face(_random_image(0), target))
+
+        assert result.shape == np.asarray(target).shape
+        assert np.array_equal(result[:30], np.asarray(target)[:30])
@@ -0,0 +1,121 @@
+"""Tests for garment analysis index"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.pipeline.garment_index import GarmentIndex
+from core.pipeline.batch_processor import BatchProcessor
+
+
+def _write_garment(path, color):
+    """白背景に単色の衣類ブロック"""
+    img = np.full((120, 90, 3), 255, dtype=np.uint8)
+    img[30:90, 20:70] = color
+    Image.fromarray(img).save(path)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog_dir = tmp_path / "catalog"
+    catalog_dir.mkdir()
+    _write_garment(catalog_dir / "red.png", (200, 30, 30))
+    _write_garment(catalog_dir / "blue.png", (30, 30, 200))
+    _write_garment(catalog_dir / "green.png", (30, 160, 40))
+    return catalog_dir
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = GarmentIndex(str(tmp_path / "index.db"), max_workers=1)
+    yield idx
+    idx.close()
+
+
+class TestGarmentIndex:
+    """GarmentIndexのテスト"""
+
+    def test_initial_scan_analyzes_all(self, index, catalog):
+        """初回スキャンで全ファイルを分析"""
+        entries = index.scan(str(catalog))
+
+        assert len(entries) == 3
+        assert index.last_scan_stats["analyzed"] == 3
+        red = index.get(str(catalog / "red.png"))
+        assert red["colors"]
+        assert red["description"]
+
+    def test_rescan_skips_unchanged(self, index, catalog):
+        """変更のないファイルは再分析しない"""
+        index.scan(str(catalog))
+        index.scan(str(catalog))
+
+        assert index.last_scan_stats["analyzed"] == 0
+        assert index.last_scan_stats["unchanged"] == 3
+
+    def test_modified_file_reanalyzed(self, index, catalog):
+        """内容が変わったファイルだけ再分析"""
+        index.scan(str(catalog))
+        before = index.get(str(catalog / "red.png"))["content_hash"]
+
+        _write_garment(catalog / "red.png", (240, 200, 20))
+        os.utime(catalog / "red.png", ns=(1, 1))
+        index.scan(str(catalog))
+
+        assert index.last_scan_stats["analyzed"] == 1
+        assert index.get(str(catalog / "red.png"))["content_hash"] != before
+
+    def test_copied_file_reuses_analysis(self, index, catalog):
+        """同じ内容のファイルは分析結果を再利用"""
+        index.scan(str(catalog))
+        shutil.copy(catalog / "blue.png", catalog / "blue_copy.png")
+        index.scan(str(catalog))
+
+        assert index.last_scan_stats["analyzed"] == 0
+        assert index.last_scan_stats["reused"] == 1
+        assert (
+            index.get(str(catalog / "blue_copy.png"))["colors"]
+            == index.get(str(catalog / "blue.png"))["colors"]
+        )
+
+    def test_deleted_file_pruned(self, index, catalog):
+        """消えたファイルのエントリを削除"""
+        index.scan(str(catalog))
+        (catalog / "green.png").unlink()
+        entries = index.scan(str(catalog))
+
+        assert len(entries) == 2
+        assert index.last_scan_stats["removed"] == 1
+        assert index.get(str(catalog / "green.png")) is None
+
+    def test_process_pool_matches_inline(self, tmp_path, catalog):
+        """プロセスプールでも同じ分析結果"""
+        for i in range(3):
+            _write_garment(catalog / f"extra_{i}.png", (40 * i + 50, 90, 120))
+
+        inline = GarmentIndex(str(tmp_path / "inline.db"), max_workers=1)
+        pooled = GarmentIndex(str(tmp_path / "pooled.db"), max_workers=2)
+        try:
+            inline_entries = inline.scan(str(catalog))
+            pooled_entries = pooled.scan(str(catalog))
+        finally:
+            inline.close()
+            pooled.close()
+
+        assert pooled_entries.keys() == inline_entries.keys()
+        for path, entry in inline_entries.items():
+            assert pooled_entries[path]["colors"] == entry["colors"]
+
+    def test_batch_processor_uses_index(self, index, catalog):
+        """BatchProcessorがインデックスの分析結果を付与"""
+        garments = BatchProcessor().load_garments_from_directory(str(catalog), "TOP", index=index)
+
+        assert len(garments) == 3
+        assert all(g.colors for g in garments)
+        assert all(g.fingerprint["content_hash"] for g in garments)
@@ -0,0 +1,666 @@
+"""Tests for history manager"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.history.history_maintenance import HistoryMaintenance
+from core.history import history_manager as history_manager_module
+from core.history.history_manager import HistoryManager
+from core.history.image_codecs import THUMBNAIL_SIZES
+from core.history import similarity
+from core.history.similarity import SimilarityIndex, hamming_distances
+
+
+# 1枚の画像で保存されるファイル数（フルサイズ画像 + サイズ別サムネイル）
+FILES_PER_IMAGE = 1 + len(THUMBNAIL_SIZES)
+
+
+def _image(seed: int, size=(64, 48)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+def _scene(seed: int, size=(256, 256)) -> Image.Image:
+    """なめらかな濃淡の画像（シードごとに構図が違う）"""
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 256, (6, 6, 3), dtype=np.uint8))
+    return small.resize(size, Image.Resampling.BICUBIC)
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _blob_files(manager):
+    return [p for p in manager.blob_store.root_dir.rglob("*") if p.is_file()]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = HistoryManager(str(tmp_path / "history.db"))
+    yield manager
+    manager.close()
+
+
+class TestHistoryBlobStore:
+    """画像をBlobStoreに保存するHistoryManagerのテスト"""
+
+    def test_round_trip(self, manager):
+        """保存した画像と同じ画像が読める"""
+        image = _image(0)
+        history_id = manager.save_generation([image], {"pose": "front"})
+
+        loaded, = manager.get_history_images(history_id)
+        thumb, = manager.get_history_images(history_id, thumbnail_only=True)
+
+        np.testing.assert_array_equal(np.asarray(loaded), np.asarray(image))
+        assert thumb.size == (64, 48)
+
+        row = manager.conn.execute("SELECT * FROM history_images").fetchone()
+        assert (row["width"], row["height"], row["codec"]) == (64, 48, "png")
+        assert row["image_size"] == manager.blob_store.size(row["image_hash"])
+
+    def test_database_holds_no_image_bytes(self, manager):
+        """データベースには画像本体を保存しない"""
+        manager.save_generation([_image(i, (256, 256)) for i in range(3)], {})
+        manager.conn.commit()
+
+        assert os.path.getsize(manager.db_path) < 100 * 1024
+        assert len(_blob_files(manager)) == 3 * FILES_PER_IMAGE
+
+    def test_identical_images_deduplicated(self, manager):
+        """同じ画像は1つのファイルにまとまる"""
+        image = _image(1, (300, 240))
+        manager.save_generation([image, image], {})
+        manager.save_generation([image], {})
+
+        assert len(_blob_files(manager)) == FILES_PER_IMAGE
+        assert manager.get_statistics()["unique_images"] == 1
+
+    def test_delete_keeps_shared_blobs(self, manager):
+        """他の履歴が参照している画像は削除しない"""
+        shared, own = _image(2, (300, 240)), _image(3, (300, 240))
+        first = manager.save_generation([shared, own], {})
+        second = manager.save_generation([shared], {})
+
+        manager.delete_history(first)
+
+        assert len(manager.get_history_images(second)) == 1
+        assert len(_blob_files(manager)) == FILES_PER_IMAGE
+
+        manager.delete_history(second)
+        assert _blob_files(manager) == []
+
+    def test_migrates_legacy_blob_rows(self, tmp_path):
+        """旧形式のBLOB行をBlobStoreに移行"""
+        db_path = tmp_path / "legacy.db"
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE generation_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL,
+                generation_mode TEXT NOT NULL, num_images INTEGER NOT NULL,
+                parameters TEXT NOT NULL, is_favorite INTEGER DEFAULT 0, tags TEXT, notes TEXT
+            );
+            CREATE TABLE history_images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, history_id INTEGER NOT NULL,
+                image_index INTEGER NOT NULL, image_data BLOB NOT NULL,
+                thumbnail_data BLOB, angle INTEGER
+            );
+        """)
+        images = [_image(i) for i in range(40)]
+        for i, image in enumerate(images):
+            conn.execute(
+                "INSERT INTO generation_history (created_at, generation_mode, num_images, parameters) "
+                "VALUES ('2024-01-01T00:00:00', 'variety', 1, '{}')"
+            )
+            conn.execute(
+                "INSERT INTO history_images (history_id, image_index, image_data, thumbnail_data, angle) "
+                "VALUES (?, 0, ?, ?, ?)",
+                (i + 1, _png(image), _png(image.resize((20, 15))), i)
+            )
+        conn.commit()
+        conn.close()
+
+        # 起動時には移行せず、移行待ちの状態になる
+        manager = HistoryManager(str(db_path))
+        try:
+            assert manager.legacy_images_pending
+
+            # 移行前の保存・削除も、旧形式の画像と混ざらない
+            early_id = manager.save_generation([_image(98)], {})
+            manager.delete_history(2)
+
+            assert manager.migrate_legacy_images() == 39
+            assert not manager.legacy_images_pending
+            assert manager.migrate_legacy_images() == 0
+
+            tables = [r[0] for r in manager.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+            assert "history_images_legacy" not in tables
+
+            loaded, = manager.get_history_images(40)
+            np.testing.assert_array_equal(np.asarray(loaded), np.asarray(images[39]))
+            assert manager.get_history_images(1, thumbnail_only=True)[0].size == (20, 15)
+            assert manager.get_history_images(2) == []
+            assert len(manager.get_history_images(early_id)) == 1
+            assert manager.get_statistics()["total_images"] == 40
+
+            # 移行後の追加保存は新しいIDになる
+            new_id = manager.save_generation([_image(99)], {})
+            assert len(manager.get_history_images(new_id)) == 1
+        finally:
+            manager.close()
+
+
+class TestHistoryPaging:
+    """キーセットページングのテスト"""
+
+    def _fill(self, manager, count):
+        """同じ作成日時を含む履歴を作成（画像は2枚ずつ、1枚目のサムネイルを記録）"""
+        first_thumbnails = {}
+        entries = []
+        for i in range(count):
+            stored = [manager.encode_image(_image(i)), manager.encode_image(_image(i + 1000))]
+            entries.append({
+                "stored_images": stored,
+                "parameters": {"index": i},
+                "generation_mode": "angle" if i % 3 == 0 else "variety",
+                "created_at": f"2024-01-01T00:00:{i // 2:02d}",
+            })
+        for history_id, entry in zip(manager.save_encoded(entries), entries):
+            first_thumbnails[history_id] = entry["stored_images"][0]["thumbnail_hash"]
+        return first_thumbnails
+
+    def test_pages_cover_all_rows_once(self, manager):
+        """ページを順に読むと全件が新しい順に1回ずつ得られる"""
+        first_thumbnails = self._fill(manager, 25)
+
+        rows, before = [], None
+        while True:
+            page = manager.get_history_page(limit=4, before=before)
+            rows.extend(page)
+            if len(page) < 4:
+                break
+            before = (page[-1]["created_at"], page[-1]["id"])
+
+        ids = [row["id"] for row in rows]
+        assert sorted(ids) == sorted(first_thumbnails)
+        assert len(set(ids)) == len(ids)
+        assert [(r["created_at"], r["id"]) for r in rows] == sorted(
+            ((r["created_at"], r["id"]) for r in rows), reverse=True
+        )
+        assert all(row["thumbnail_hash"] == first_thumbnails[row["id"]] for row in rows)
+
+    def test_page_filters(self, manager):
+        """生成モードで絞り込める"""
+        self._fill(manager, 12)
+
+        page = manager.get_history_page(limit=100, generation_mode="angle")
+
+        assert [row["parameters"]["index"] for row in page] == [9, 6, 3, 0]
+        assert manager.get_history_page(limit=100, favorites_only=True) == []
+        assert manager.get_thumbnail(page[0]["thumbnail_hash"]).size == (64, 48)
+
+
+class TestHistoryQuery:
+    """タグ・全文検索・絞り込みのテスト"""
+
+    @pytest.fixture
+    def filled(self, manager):
+        entries = [
+            ({"prompt": "red summer dress", "background": "beach"}, ["夏", "ドレス"], "海辺で撮影したイメージ", "2024-06-01T10:00:00"),
+            ({"prompt": "black leather jacket"}, ["冬"], "ジャケットの質感を確認", "2024-12-01T10:00:00"),
+            ({"prompt": "white shirt"}, ["夏"], "", "2025-01-15T10:00:00"),
+        ]
+        stored = manager.encode_image(_image(0))
+        ids = manager.save_encoded([
+            {"stored_images": [stored], "parameters": params, "tags": tags, "notes": notes, "created_at": created_at}
+            for params, tags, notes, created_at in entries
+        ])
+        return ids
+
+    def _ids(self, rows):
+        return [row["id"] for row in rows]
+
+    def test_get_history(self, manager, filled):
+        """IDで1件取得"""
+        history = manager.get_history(filled[1])
+
+        assert history["tags"] == ["冬"]
+        assert history["thumbnail_hash"] is not None
+        assert manager.get_history(9999) is None
+
+    def test_tag_filter_uses_tag_table(self, manager, filled):
+        """タグはhistory_tagsで絞り込む（部分一致しない）"""
+        assert self._ids(manager.get_history_list(tag_filter="夏")) == [filled[2], filled[0]]
+        assert manager.get_history_list(tag_filter="ドレ") == []
+
+        manager.update_tags(filled[2], ["冬"])
+        assert self._ids(manager.get_history_page(tag="夏")) == [filled[0]]
+        assert self._ids(manager.get_history_page(tag="冬")) == [filled[2], filled[1]]
+
+    def test_full_text_search(self, manager, filled):
+        """メモとプロンプトを全文検索"""
+        assert self._ids(manager.get_history_page(search="leather")) == [filled[1]]
+        assert self._ids(manager.get_history_page(search="ジャケット")) == [filled[1]]
+        assert self._ids(manager.get_history_page(search="summer beach")) == [filled[0]]
+        # 短い語も検索できる
+        assert self._ids(manager.get_history_page(search="海辺")) == [filled[0]]
+
+        manager.update_notes(filled[2], "襟元のアップ")
+        assert self._ids(manager.get_history_page(search="襟元の")) == [filled[2]]
+        assert self._ids(manager.get_history_page(search="white")) == [filled[2]]
+
+        manager.delete_history(filled[1])
+        assert manager.get_history_page(search="leather") == []
+
+    def test_date_range(self, manager, filled):
+        """作成日時の範囲で絞り込む"""
+        from datetime import datetime
+
+        rows = manager.get_history_page(date_from=datetime(2024, 7, 1), date_to="2025-01-01")
+        assert self._ids(rows) == [filled[1]]
+
+    def test_index_rebuilt_for_existing_database(self, tmp_path):
+        """検索用テーブルがないデータベースは開いた時に作り直す"""
+        db_path = str(tmp_path / "history.db")
+        manager = HistoryManager(db_path)
+        history_id = manager.save_generation([_image(0)], {"prompt": "denim"}, tags=["デニム"], notes="古い履歴")
+        manager.conn.executescript("DROP TABLE history_tags; DROP TABLE IF EXISTS history_fts;")
+        manager.close()
+
+        manager = HistoryManager(db_path)
+        try:
+            assert self._ids(manager.get_history_page(tag="デニム")) == [history_id]
+            assert self._ids(manager.get_history_page(search="denim")) == [history_id]
+        finally:
+            manager.close()
+
+
+class TestHistoryConcurrency:
+    """WALとスレッドごとの接続のテスト"""
+
+    def test_wal_and_per_thread_connections(self, manager):
+        """WALモードで、スレッドごとに別の接続を使う"""
+        import threading
+
+        assert manager.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(manager.conn))
+        thread.start()
+        thread.join()
+
+        assert other[0] is not manager.conn
+        assert manager.conn is manager.conn
+
+    def test_reads_do_not_block_on_writes(self, manager, tmp_path):
+        """書き込み中も読み取りは待たず、別の接続からの書き込みもロックエラーにならない"""
+        import threading
+
+        stored = manager.encode_image(_image(0))
+        errors = []
+        reads = []
+        done = threading.Event()
+
+        def write(target):
+            try:
+                for i in range(20):
+                    target.save_encoded([{"stored_images": [stored], "parameters": {"i": i}}])
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                while not done.is_set():
+                    reads.append(len(manager.get_history_page(limit=50)))
+            except Exception as e:
+                errors.append(e)
+
+        # 別プロセス相当（同じDBを開いた別のHistoryManager）
+        second = HistoryManager(manager.db_path)
+        threads = [
+            threading.Thread(target=write, args=(manager,)),
+            threading.Thread(target=write, args=(second,)),
+        ]
+        reader = threading.Thread(target=read)
+        reader.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        reader.join()
+        second.close()
+
+        assert errors == []
+        assert reads
+        assert manager.get_statistics()["total_generations"] == 40
+
+    def test_bulk_delete(self, manager):
+        """まとめて削除"""
+        ids = [manager.save_generation([_image(i, (300, 240))], {}) for i in range(5)]
+
+        manager.delete_histories(ids[:3])
+
+        assert [h["id"] for h in manager.get_history_list()] == [ids[4], ids[3]]
+        assert len(_blob_files(manager)) == 2 * FILES_PER_IMAGE
+
+
+class TestHistoryCodecs:
+    """保存形式とサイズ別サムネイルのテスト"""
+
+    @pytest.mark.parametrize("codec", ["png", "webp_lossless"])
+    def test_lossless_codecs_round_trip(self, tmp_path, codec):
+        """可逆形式は元の画素のまま読める"""
+        manager = HistoryManager(str(tmp_path / "history.db"), image_codec=codec)
+        try:
+            image = _image(0, (320, 200))
+            history_id = manager.save_generation([image], {})
+
+            loaded, = manager.get_history_images(history_id)
+            np.testing.assert_array_equal(np.asarray(loaded.convert("RGB")), np.asarray(image))
+            assert manager.conn.execute("SELECT codec FROM history_images").fetchone()[0] == codec
+        finally:
+            manager.close()
+
+    def test_lossy_codec_is_smaller(self, tmp_path):
+        """非可逆形式は画素が近く、ファイルが小さい"""
+        # 写真に近い画像（なめらかな変化 + 微小なノイズ）
+        y, x = np.mgrid[0:480, 0:640]
+        smooth = np.stack([x * 255 / 640, y * 255 / 480, (x + y) * 255 / 1120], axis=-1)
+        noise = np.random.default_rng(0).normal(0, 2, smooth.shape)
+        image = Image.fromarray(np.clip(smooth + noise, 0, 255).astype(np.uint8))
+        sizes = {}
+        for codec in ("png", "jpeg"):
+            manager = HistoryManager(str(tmp_path / f"{codec}.db"), image_codec=codec)
+            try:
+                history_id = manager.save_generation([image], {})
+                sizes[codec] = manager.get_statistics()["total_image_bytes"]
+                loaded = np.asarray(manager.get_history_images(history_id)[0], dtype=float)
+                assert np.abs(loaded - np.asarray(image, dtype=float)).mean() < 3
+            finally:
+                manager.close()
+
+        assert sizes["jpeg"] < sizes["png"]
+
+    def test_unknown_codec_falls_back_to_png(self, tmp_path):
+        """未対応の形式はPNGで保存"""
+        manager = HistoryManager(str(tmp_path / "history.db"), image_codec="bmp")
+        try:
+            assert manager.image_codec == "png"
+        finally:
+            manager.close()
+
+    def test_thumbnail_pyramid(self, manager):
+        """UIが描画するサイズのサムネイルをそのまま取得できる"""
+        history_id = manager.save_generation([_image(0, (800, 1200))], {})
+
+        for size in THUMBNAIL_SIZES:
+            thumb, = manager.get_history_images(history_id, thumbnail_size=size)
+            assert max(thumb.size) == size
+            page, = manager.get_history_page(thumbnail_size=size)
+            assert max(manager.get_thumbnail(page["thumbnail_hash"]).size) == size
+
+        assert max(manager.get_history_images(history_id, thumbnail_only=True)[0].size) == 200
+
+        manager.delete_history(history_id)
+        assert _blob_files(manager) == []
+
+
+class TestHistorySimilarity:
+    """pHashによる類似画像検索のテスト"""
+
+    def test_find_similar(self, manager):
+        """縮小・ノイズを加えた画像は見つかり、違う画像は見つからない"""
+        original = _scene(0)
+        noise = np.random.default_rng(1).normal(0, 4, (200, 200, 3))
+        variant = np.asarray(original.resize((200, 200)), dtype=np.float64) + noise
+        variant = Image.fromarray(np.clip(variant, 0, 255).astype(np.uint8))
+
+        base_id = manager.save_generation([original], {})
+        variant_id = manager.save_generation([variant], {})
+        other_ids = [manager.save_generation([_scene(seed)], {}) for seed in range(10, 20)]
+
+        similar = manager.find_similar(base_id)
+        assert [history["id"] for history in similar] == [variant_id]
+        assert similar[0]["distance"] <= similarity.DUPLICATE_MAX_DISTANCE
+        assert similar[0]["thumbnail_hash"]
+        # 基準の履歴自身は含まない
+        assert [history["id"] for history in manager.find_similar(variant_id)] == [base_id]
+        # 違う画像との距離はしきい値より大きい
+        assert all(base_id not in [h["id"] for h in manager.find_similar(other)] for other in other_ids)
+
+    def test_find_duplicates_tracks_saves_and_deletes(self, manager):
+        """索引の作成後に保存・削除した履歴も検索結果に反映される"""
+        image = _scene(3)
+        assert manager.find_duplicates([image]) == []
+
+        history_id = manager.save_generation([_scene(4), image], {})
+        assert [history["id"] for history in manager.find_duplicates([image])] == [history_id]
+
+        manager.delete_history(history_id)
+        assert manager.find_duplicates([image]) == []
+
+    def test_backfill_existing_images(self, tmp_path):
+        """pHashのない既存の画像は、索引の作成時に計算される"""
+        db_path = str(tmp_path / "history.db")
+        manager = HistoryManager(db_path)
+        first = manager.save_generation([_scene(5)], {})
+        second = manager.save_generation([_scene(5).resize((180, 180))], {})
+        with manager._write() as cursor:
+            cursor.execute("UPDATE history_images SET phash = NULL")
+        manager.close()
+
+        manager = HistoryManager(db_path)
+        assert [history["id"] for history in manager.find_similar(first)] == [second]
+        row = manager.conn.execute("SELECT COUNT(*) FROM history_images WHERE phash IS NULL").fetchone()
+        assert row[0] == 0
+        manager.close()
+
+    def test_backfill_runs_without_blocking_saves(self, tmp_path, monkeypatch):
+        """既存画像のpHash計算中も保存は止まらず、その間の保存も索引に入る"""
+        db_path = str(tmp_path / "history.db")
+        manager = HistoryManager(db_path)
+        manager.save_generation([_scene(5)], {})
+        with manager._write() as cursor:
+            cursor.execute("UPDATE history_images SET phash = NULL")
+        manager.close()
+
+        # 索引を作るスレッドでのpHash計算だけを、合図があるまで止める
+        started, release = threading.Event(), threading.Event()
+        original_phash = history_manager_module.phash
+
+        def slow_phash(image):
+            if threading.current_thread().name == "index-builder":
+                started.set()
+                release.wait(10)
+            return original_phash(image)
+
+        monkeypatch.setattr(history_manager_module, "phash", slow_phash)
+
+        manager = HistoryManager(db_path)
+        builder = threading.Thread(target=manager.build_similarity_index, name="index-builder")
+        builder.start()
+        try:
+            assert started.wait(5)
+            assert not manager.similarity_index_ready
+
+            saved = []
+            saver = threading.Thread(target=lambda: saved.append(manager.save_generation([_scene(6)], {})))
+            saver.start()
+            saver.join(5)
+            assert saved, "保存がpHashの計算を待っている"
+        finally:
+            release.set()
+            builder.join(10)
+
+        assert manager.similarity_index_ready
+        assert [history["id"] for history in manager.find_duplicates([_scene(6)])] == saved
+        manager.close()
+
+    def test_maintenance_builds_index_at_start(self, manager):
+        """メンテナンスのスレッドが開始直後に索引を作る"""
+        manager.save_generation([_scene(7)], {})
+        assert not manager.similarity_index_ready
+
+        maintenance = HistoryMaintenance(manager, initial_delay=3600)
+        maintenance.start()
+        try:
+            for _ in range(100):
+                if manager.similarity_index_ready:
+                    break
+                time.sleep(0.05)
+        finally:
+            maintenance.stop(timeout=5)
+        assert manager.similarity_index_ready
+
+    def test_index_matches_brute_force(self):
+        """ベクトル化した検索が1件ずつ比較した結果と一致する"""
+        rng = np.random.default_rng(0)
+        hashes = rng.integers(0, 2 ** 63, 5000, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        owners = np.arange(5000) // 2
+        index = SimilarityIndex()
+        index.add(np.arange(5000), owners, hashes)
+
+        query = int(hashes[10]) ^ 0b1011
+        distances = [bin(int(h) ^ query).count("1") for h in hashes]
+        expected = {}
+        for owner, distance in zip(owners, distances):
+            if distance <= 20:
+                expected[int(owner)] = min(distance, expected.get(int(owner), 64))
+
+        results = index.search([query], max_distance=20, limit=10000)
+        assert dict(results) == expected
+        assert results[0] == (5, 3)
+        assert [d for _, d in results] == sorted(d for _, d in results)
+
+        # popcountの表引き（古いNumPy用）も同じ距離になる
+        table = similarity._POPCOUNT_TABLE[(hashes ^ np.uint64(query)).view(np.uint8)]
+        assert table.reshape(-1, 8).sum(axis=1).tolist() == hamming_distances(hashes, query).tolist()
+
+        index.remove_histories([5])
+        assert 5 not in dict(index.search([query], max_distance=20, limit=10000))
+
+
+class TestHistoryRetention:
+    """保存期間・アーカイブ・空き領域の解放のテスト"""
+
+    @staticmethod
+    def _save(manager, image, days_ago, favorite=False, tags=None):
+        created_at = (datetime.now() - timedelta(days=days_ago)).isoformat()
+        history_id, = manager.save_encoded([{
+            "stored_images": [manager.encode_image(image)],
+            "parameters": {"prompt": f"{days_ago}日前"},
+            "tags": tags,
+            "created_at": created_at,
+        }])
+        if favorite:
+            manager.toggle_favorite(history_id)
+        return history_id
+
+    def test_prune_full_images(self, manager):
+        """お気に入り以外の古い画像だけがサムネイルのみになる"""
+        old_id = self._save(manager, _scene(0, (800, 600)), 60)
+        favorite_id = self._save(manager, _scene(1, (800, 600)), 60, favorite=True)
+        new_id = self._save(manager, _scene(2, (800, 600)), 1)
+        old_hash = manager.conn.execute(
+            "SELECT image_hash FROM history_images WHERE history_id = ?", (old_id,)
+        ).fetchone()[0]
+
+        assert manager.prune_full_images(30) == 1
+        assert manager.prune_full_images(30) == 0
+
+        assert manager.get_history_images(old_id)[0].size == (400, 300)
+        assert manager.get_history_images(favorite_id)[0].size == (800, 600)
+        assert manager.get_history_images(new_id)[0].size == (800, 600)
+        assert not manager.blob_store.exists(old_hash)
+        # 一覧のサムネイルはそのまま
+        assert manager.get_history_images(old_id, thumbnail_size=60)[0].size == (60, 45)
+
+    def test_archive_histories(self, manager):
+        """古い履歴はアーカイブに移り、アーカイブを含めれば引き続き読める"""
+        old_ids = [self._save(manager, _scene(seed, (300, 240)), 400 + seed, tags=["old"]) for seed in range(3)]
+        favorite_id = self._save(manager, _scene(10, (300, 240)), 500, favorite=True, tags=["old"])
+        new_id = self._save(manager, _scene(11, (300, 240)), 1)
+        thumbnails = {i: manager.get_history_images(i, thumbnail_size=60)[0].tobytes() for i in old_ids}
+        blob_count = len(_blob_files(manager))
+
+        assert manager.archive_histories(365) == 3
+
+        assert [h["id"] for h in manager.get_history_page()] == [new_id, favorite_id]
+        merged = manager.get_history_page(include_archive=True, thumbnail_size=60)
+        assert [h["id"] for h in merged] == [new_id] + old_ids + [favorite_id]
+        assert [h.get("archived", False) for h in merged] == [False, True, True, True, False]
+        assert merged[1]["parameters"] == {"prompt": "400日前"}
+        assert merged[1]["tags"] == ["old"]
+
+        # キーセットページングはアーカイブをまたいで続く
+        first = manager.get_history_page(limit=2, include_archive=True)
+        rest = manager.get_history_page(
+            before=(first[-1]["created_at"], first[-1]["id"]), include_archive=True
+        )
+        assert [h["id"] for h in first + rest] == [h["id"] for h in merged]
+
+        tagged = manager.get_history_page(tag="old", include_archive=True)
+        assert [h["id"] for h in tagged] == old_ids + [favorite_id]
+        assert manager.get_history_page(favorites_only=True, include_archive=True)[0]["id"] == favorite_id
+
+        # 画像はアーカイブから読み、元のファイルは削除される
+        for history_id in old_ids:
+            assert manager.get_history_images(history_id, thumbnail_size=60)[0].tobytes() == thumbnails[history_id]
+            assert manager.get_history_images(history_id)[0].size == (300, 240)
+        assert manager.get_thumbnail(merged[1]["thumbnail_hash"]).size == (60, 48)
+        assert manager.get_history(old_ids[0])["archived"]
+        assert len(_blob_files(manager)) == blob_count - 3 * FILES_PER_IMAGE
+        assert manager.get_statistics()["archived_generations"] == 3
+
+    def test_compact(self, manager):
+        """削除で空いたページが解放され、古い形式のデータベースは変換される"""
+        assert manager.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+        ids = [manager.save_generation([_image(0)], {}, notes="x" * 4000) for _ in range(100)]
+        manager.delete_histories(ids)
+        assert manager.conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+        assert manager.compact(max_pages=10) == 10
+        assert manager.compact() > 0
+        assert manager.conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+        # 以前のバージョンで作ったデータベース
+        with manager._lock:
+            manager.conn.execute("PRAGMA auto_vacuum=NONE")
+            manager.conn.execute("VACUUM")
+        assert manager.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        manager.compact()
+        assert manager.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def test_maintenance(self, manager):
+        """定期メンテナンスが保存期間・アーカイブ・解放を順に行う"""
+        self._save(manager, _scene(0, (800, 600)), 60)
+        self._save(manager, _scene(1, (800, 600)), 400)
+        self._save(manager, _scene(2, (800, 600)), 1)
+
+        maintenance = HistoryMaintenance(manager, full_image_days=30, archive_days=365)
+        result = maintenance.run_once()
+        assert result["pruned"] == 2
+        assert result["archived"] == 1
+        assert manager.get_statistics()["total_generations"] == 2
+
+        # 定期実行は停止を待たずに開始し、stopで終了する
+        maintenance = HistoryMaintenance(manager, initial_delay=0, interval=3600)
+        maintenance.start()
+        maintenance.stop(timeout=5)
+        assert not maintenance._thread.is_alive()
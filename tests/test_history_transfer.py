@@ -0,0 +1,207 @@
+"""Tests for history bulk export and import"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.history.history_manager import HistoryManager
+from core.history import history_transfer
+from core.history.history_transfer import HistoryExporter, HistoryImporter, IMAGES_IN_FLIGHT_PER_WORKER
+
+
+def _image(seed: int, size=(120, 90)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def source(tmp_path):
+    """共有画像・お気に入り・タグ・角度を含む履歴"""
+    manager = HistoryManager(str(tmp_path / "source" / "history.db"))
+    manager.save_generation([_image(0), _image(1)], {"pose": "front"}, tags=["a"], notes="最初")
+    favorite_id = manager.save_generation([_image(1)], {"pose": "side"}, generation_mode="angle", angles=[90])
+    manager.toggle_favorite(favorite_id)
+    for i in range(3):
+        manager.save_generation([_image(10 + i)], {"index": i})
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def target(tmp_path):
+    manager = HistoryManager(str(tmp_path / "target" / "history.db"))
+    yield manager
+    manager.close()
+
+
+def _snapshot(manager):
+    """比較用に履歴の内容を取り出す（IDは読み込み先で変わる）"""
+    rows = []
+    for history in reversed(manager.get_history_page()):
+        images = manager.conn.execute(
+            "SELECT image_hash, angle FROM history_images WHERE history_id = ? ORDER BY image_index",
+            (history["id"],)
+        ).fetchall()
+        rows.append((
+            history["created_at"], history["generation_mode"], history["parameters"],
+            history["is_favorite"], history["tags"], history["notes"],
+            [(image["image_hash"], image["angle"]) for image in images],
+        ))
+    return rows
+
+
+class TestHistoryTransfer:
+    """HistoryExporter / HistoryImporter のテスト"""
+
+    @pytest.mark.parametrize("container", ["folder", "tar"])
+    def test_round_trip(self, source, target, tmp_path, container):
+        """書き出して読み込むと、同じ履歴と画像が復元される"""
+        export_dir = tmp_path / "export"
+        progress = []
+        manifest = HistoryExporter(source, chunk_size=2).export(
+            export_dir, image_container=container, progress=progress.append
+        )
+
+        assert progress == [2, 4, 5]
+        assert manifest["histories"] == 5
+        assert manifest["unique_images"] == 5
+        assert (export_dir / ("images.tar" if container == "tar" else "images")).exists()
+        first = json.loads((export_dir / "history.jsonl").read_text(encoding="utf-8").splitlines()[0])
+        assert first["tags"] == ["a"] and len(first["images"]) == 2
+
+        result = HistoryImporter(target, chunk_size=2).import_from(export_dir)
+
+        assert result == {"imported": 5, "skipped": 0, "decoded_images": 5, "reused_images": 0}
+        assert _snapshot(target) == _snapshot(source)
+        assert target.get_statistics()["unique_images"] == 5
+        for src, dst in zip(source.get_history_page(), target.get_history_page()):
+            assert [img.tobytes() for img in target.get_history_images(dst["id"])] == \
+                [img.tobytes() for img in source.get_history_images(src["id"])]
+            assert target.get_history_images(dst["id"], thumbnail_size=60)[0].size == (60, 45)
+
+    @pytest.mark.parametrize("container", ["folder", "tar"])
+    def test_export_includes_archived(self, source, target, tmp_path, container):
+        """アーカイブに移した履歴も書き出され、読み込み先で復元される"""
+        with source._write() as cursor:
+            for history_id, days in ((1, 401), (3, 400)):
+                cursor.execute(
+                    "UPDATE generation_history SET created_at = ? WHERE id = ?",
+                    ((datetime.now() - timedelta(days=days)).isoformat(), history_id)
+                )
+        expected = _snapshot(source)
+        assert source.archive_histories(365) == 2
+
+        export_dir = tmp_path / "export"
+        manifest = HistoryExporter(source, chunk_size=2).export(export_dir, image_container=container)
+
+        assert manifest["histories"] == 5
+        assert manifest["archived_histories"] == 2
+        assert manifest["unique_images"] == 5
+
+        assert HistoryImporter(target).import_from(export_dir)["imported"] == 5
+        assert _snapshot(target) == expected
+        oldest = target.get_history_page()[-1]
+        assert [img.tobytes() for img in target.get_history_images(oldest["id"])] == \
+            [_image(0).tobytes(), _image(1).tobytes()]
+
+    def test_reimport_is_deduplicated(self, source, target, tmp_path):
+        """同じ書き出しを再び読んでも履歴は増えず、保存済みの画像はデコードしない"""
+        export_dir = tmp_path / "export"
+        HistoryExporter(source).export(export_dir, image_container="tar")
+
+        # 書き出し元に読み込んでも増えない
+        assert HistoryImporter(source).import_from(export_dir)["skipped"] == 5
+
+        HistoryImporter(target).import_from(export_dir)
+        assert HistoryImporter(target).import_from(export_dir)["skipped"] == 5
+        assert target.get_statistics()["total_generations"] == 5
+
+        # 同じ画像を持つ別の履歴は、保存済みの画像をそのまま使う
+        with target._write() as cursor:
+            cursor.execute("UPDATE generation_history SET created_at = '2000-01-01T00:00:00'")
+        result = HistoryImporter(target).import_from(export_dir)
+        assert result["imported"] == 5
+        assert (result["decoded_images"], result["reused_images"]) == (0, 5)
+        assert target.get_statistics()["unique_images"] == 5
+
+    def test_export_with_codec(self, source, target, tmp_path):
+        """codecを指定すると再エンコードして書き出す"""
+        export_dir = tmp_path / "export"
+        HistoryExporter(source, workers=4).export(export_dir, codec="webp_lossless")
+
+        files = list((export_dir / "images").rglob("*.webp"))
+        assert len(files) == 5
+
+        HistoryImporter(target).import_from(export_dir)
+        history = target.get_history_page()[-1]
+        image, = target.get_history_images(history["id"])[:1]
+        assert image.tobytes() == _image(0).tobytes()
+
+    def test_parquet_round_trip(self, source, target, tmp_path):
+        """Parquetのメタデータでも書き出して読み込める"""
+        pytest.importorskip("pyarrow")
+        export_dir = tmp_path / "export"
+        HistoryExporter(source, chunk_size=2).export(export_dir, metadata_format="parquet")
+
+        HistoryImporter(target, chunk_size=2).import_from(export_dir)
+        assert _snapshot(target) == _snapshot(source)
+
+    def test_images_in_flight_are_bounded(self, source, target, tmp_path, monkeypatch):
+        """チャンクが大きくても、読み出してまだ処理していない画像は一定数まで"""
+        export_dir = tmp_path / "export"
+        for i in range(20):
+            source.save_generation([_image(100 + i)], {"index": i})
+
+        # 書き出し: 準備した画像はtarに書いたらすぐ手放す
+        outstanding = []
+        prepare = HistoryExporter._prepare_image
+        prepared = []
+        written = []
+
+        def counting_prepare(self, *args, **kwargs):
+            value = prepare(self, *args, **kwargs)
+            prepared.append(value[0])
+            outstanding.append(len(prepared) - len(written))
+            return value
+
+        add = history_transfer._ImageWriter.add
+
+        def counting_add(self, name, data):
+            written.append(name)
+            add(self, name, data)
+
+        monkeypatch.setattr(HistoryExporter, "_prepare_image", counting_prepare)
+        monkeypatch.setattr(history_transfer._ImageWriter, "add", counting_add)
+        HistoryExporter(source, chunk_size=1000, workers=1).export(export_dir, image_container="tar")
+        assert len(written) == 25
+        assert max(outstanding) <= IMAGES_IN_FLIGHT_PER_WORKER + 1
+
+        # 読み込み: 読み出した画像はデコードが追いつくまで次を読まない
+        reads = []
+        decoded = []
+        read = history_transfer._ImageReader.read
+
+        def counting_read(self, name):
+            reads.append(name)
+            assert len(reads) - len(decoded) <= IMAGES_IN_FLIGHT_PER_WORKER
+            return read(self, name)
+
+        encode_image_data = target.encode_image_data
+
+        def counting_encode(data):
+            stored = encode_image_data(data)
+            decoded.append(stored)
+            return stored
+
+        monkeypatch.setattr(history_transfer._ImageReader, "read", counting_read)
+        monkeypatch.setattr(target, "encode_image_data", counting_encode)
+        result = HistoryImporter(target, chunk_size=1000, workers=1).import_from(export_dir)
+        assert result["imported"] == 25
+        assert len(reads) == 25
@@ -0,0 +1,99 @@
+"""Tests for history write-behind queue"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.history.history_manager import HistoryManager
+from core.history.history_writer import HistoryWriter
+
+
+def _image(seed: int, size=(96, 72)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = HistoryManager(str(tmp_path / "history.db"))
+    yield manager
+    manager.close()
+
+
+class TestHistoryWriter:
+    """HistoryWriterのテスト"""
+
+    def test_save_returns_before_commit(self, manager):
+        """保存は即座に戻り、flush後にDBへ書き込まれている"""
+        saved = []
+        writer = HistoryWriter(manager, on_saved=saved.extend)
+        gate = threading.Event()
+        original = manager.save_encoded
+
+        def slow_save(entries):
+            gate.wait(5)
+            return original(entries)
+
+        manager.save_encoded = slow_save
+        future = writer.save_generation([_image(1)], {"pose": "front"}, tags=["a"])
+
+        assert not future.done()
+        assert writer.pending == 1
+        assert manager.get_history_list() == []
+
+        gate.set()
+        assert writer.flush(timeout=5)
+        history_id = future.result(timeout=5)
+
+        assert saved == [history_id]
+        (entry,) = manager.get_history_list()
+        assert entry["id"] == history_id
+        assert entry["tags"] == ["a"]
+        assert manager.get_history_images(history_id)[0].tobytes() == _image(1).tobytes()
+        writer.close()
+
+    def test_saves_batched_in_order(self, manager):
+        """続けて積んだ保存は少ないトランザクションにまとめられ、順序が保たれる"""
+        batches = []
+        writer = HistoryWriter(manager, on_saved=batches.append, batch_window=0.5)
+
+        futures = [writer.save_generation([_image(i)], {"index": i}) for i in range(5)]
+        assert writer.flush(timeout=10)
+
+        ids = [future.result() for future in futures]
+        assert ids == sorted(ids)
+        assert len(batches) < 5
+        assert sum(batches, []) == ids
+        # 作成日時は依頼順
+        history = manager.get_history_list()
+        assert [entry["parameters"]["index"] for entry in history] == [4, 3, 2, 1, 0]
+        writer.close()
+
+    def test_close_flushes_queue(self, manager):
+        """終了時に残っている保存を書き込む"""
+        writer = HistoryWriter(manager, batch_size=2)
+        for i in range(4):
+            writer.save_generation([_image(i), _image(i + 10)], {})
+
+        assert writer.close(timeout=10)
+        assert manager.get_statistics()["total_generations"] == 4
+        with pytest.raises(RuntimeError):
+            writer.save_generation([_image(0)], {})
+
+    def test_pending_blob_survives_delete(self, manager):
+        """DBに記録される前の画像は、同じ画像を持つ履歴を削除しても消えない"""
+        image = _image(7)
+        old_id = manager.save_generation([image], {})
+
+        stored = manager.encode_image(image)
+        manager.delete_history(old_id)
+        assert manager.blob_store.exists(stored["image_hash"])
+
+        (new_id,) = manager.save_encoded([{"stored_images": [stored], "parameters": {}}])
+        assert manager.get_history_images(new_id)[0].tobytes() == image.tobytes()
@@ -0,0 +1,106 @@
+"""Tests for pose extractor"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.pose_extractor import PoseExtractor
+
+
+# 正面立ちのランドマーク（正規化座標）
+FRONT_LANDMARKS = {
+    'nose': (0.5, 0.1, 0.0),
+    'left_shoulder': (0.6, 0.25, 0.0),
+    'right_shoulder': (0.4, 0.25, 0.0),
+    'left_elbow': (0.65, 0.4, 0.0),
+    'right_elbow': (0.35, 0.4, 0.0),
+    'left_wrist': (0.66, 0.52, 0.0),
+    'right_wrist': (0.34, 0.52, 0.0),
+    'left_hip': (0.56, 0.55, 0.0),
+    'right_hip': (0.44, 0.55, 0.0),
+    'left_knee': (0.56, 0.75, 0.0),
+    'right_knee': (0.44, 0.75, 0.0),
+    'left_ankle': (0.56, 0.95, 0.0),
+    'right_ankle': (0.44, 0.95, 0.0),
+}
+
+
+def _make_extractor(cache_dir, calls, landmarks=FRONT_LANDMARKS):
+    """検出器を差し替えたPoseExtractor"""
+    extractor = PoseExtractor(str(cache_dir))
+    extractor.mediapipe_available = True
+
+    def fake_detect(image_rgb):
+        calls.append(image_rgb.shape)
+        return dict(landmarks) if landmarks else None
+
+    extractor._detect_landmarks = fake_detect
+    return extractor
+
+
+@pytest.fixture
+def pose_dir(tmp_path):
+    poses = tmp_path / "poses"
+    poses.mkdir()
+    for i, color in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+        Image.new("RGB", (40, 80), color).save(poses / f"pose_{i}.png")
+    return poses
+
+
+class TestPoseExtractor:
+    """PoseExtractorのテスト"""
+
+    def test_extracts_and_caches(self, tmp_path, pose_dir):
+        """2回目以降は検出せずキャッシュを使う"""
+        calls = []
+        extractor = _make_extractor(tmp_path / "cache", calls)
+        image_path = str(pose_dir / "pose_0.png")
+
+        first = extractor.extract_pose(image_path)
+        second = extractor.extract_pose(image_path)
+
+        assert len(calls) == 1
+        assert first['pose_type'] == "front"
+        assert second == first
+
+    def test_cache_survives_restart(self, tmp_path, pose_dir):
+        """ディスクキャッシュは再起動後（MediaPipeなしでも）使える"""
+        image_path = str(pose_dir / "pose_0.png")
+        _make_extractor(tmp_path / "cache", []).extract_pose(image_path)
+
+        restarted = PoseExtractor(str(tmp_path / "cache"))
+        restarted.mediapipe_available = False
+        pose_info = restarted.extract_pose(image_path)
+
+        assert pose_info['landmarks']['nose'] == FRONT_LANDMARKS['nose']
+
+    def test_failed_detection_cached(self, tmp_path, pose_dir):
+        """検出できなかった画像も再検出しない"""
+        calls = []
+        extractor = _make_extractor(tmp_path / "cache", calls, landmarks=None)
+        image_path = str(pose_dir / "pose_1.png")
+
+        assert extractor.extract_pose(image_path) is None
+        assert extractor.extract_pose(image_path) is None
+        assert len(calls) == 1
+
+    def test_directory_batch(self, tmp_path, pose_dir):
+        """ディレクトリ内の全画像を一括抽出"""
+        calls = []
+        progress = []
+        extractor = _make_extractor(tmp_path / "cache", calls)
+
+        results = extractor.extract_poses_from_directory(
+            str(pose_dir), progress_callback=lambda msg, pct: progress.append(pct)
+        )
+
+        assert len(results) == 3
+        assert all(r['pose_type'] == "front" for r in results.values())
+        assert progress[-1] == 100
+
+        extractor.extract_poses_from_directory(str(pose_dir))
+        assert len(calls) == 3
@@ -0,0 +1,74 @@
+"""Tests for pose library"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.vton.pose_library import PoseLibrary, LANDMARK_NAMES, normalize_landmarks
+
+
+def _pose(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.1, 0.9, (len(LANDMARK_NAMES), 3))
+
+
+def _as_dict(points: np.ndarray) -> dict:
+    return {name: tuple(p) for name, p in zip(LANDMARK_NAMES, points)}
+
+
+@pytest.fixture
+def library():
+    library = PoseLibrary()
+    for i in range(5):
+        library.add(f"preset_{i}", _pose(i), f"description {i}")
+    return library
+
+
+class TestPoseLibrary:
+    """PoseLibraryのテスト"""
+
+    def test_normalize_ignores_position_and_scale(self):
+        """平行移動・拡大縮小しても同じベクトル"""
+        points = _pose(0)
+        moved = points.copy()
+        moved[:, :2] = moved[:, :2] * 0.5 + 0.2
+
+        np.testing.assert_allclose(
+            normalize_landmarks(points), normalize_landmarks(moved), atol=1e-6
+        )
+        assert np.linalg.norm(normalize_landmarks(points)) == pytest.approx(1.0)
+        np.testing.assert_allclose(
+            normalize_landmarks(_as_dict(points)), normalize_landmarks(points)
+        )
+
+    def test_nearest_finds_matching_preset(self, library):
+        """少し動かしたポーズでも元のプリセットが最も近い"""
+        query = _pose(3)
+        query[:, :2] = query[:, :2] * 1.3 + 0.05
+        query[:, :2] += np.random.default_rng(9).normal(0, 0.01, (len(LANDMARK_NAMES), 2))
+
+        pose_id, description, similarity = library.nearest(_as_dict(query))
+
+        assert pose_id == "preset_3"
+        assert description == "description 3"
+        assert similarity > 0.95
+
+    def test_query_sorted_by_similarity(self, library):
+        """検索結果は類似度の高い順"""
+        matches = library.query(_pose(1), top_k=3)
+        scores = [score for _, score in matches]
+
+        assert matches[0][0] == "preset_1"
+        assert scores == sorted(scores, reverse=True)
+        assert len(library.similarities(_pose(1))) == 5
+
+    def test_add_same_id_replaces(self, library):
+        """同じIDで追加すると置き換え"""
+        library.add("preset_0", _pose(42), "replaced")
+
+        assert len(library) == 5
+        assert library.nearest(_pose(42))[:2] == ("preset_0", "replaced")
@@ -0,0 +1,67 @@
+"""Tests for reference person profile cache"""
+
+import base64
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.adapters.fashn_tryon_adapter import FashnTryonAdapter
+from core.vton.reference_profile import ReferenceProfileStore
+
+
+@pytest.fixture
+def person_path(tmp_path):
+    path = tmp_path / "person.png"
+    Image.linear_gradient("L").resize((800, 1100)).convert("RGBA").save(path)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReferenceProfileStore(str(tmp_path / "profiles"))
+
+
+class TestReferenceProfileStore:
+    """ReferenceProfileStoreのテスト"""
+
+    def test_profile_contents(self, store, person_path):
+        """正規化画像とエンコード済みバイトを保持"""
+        profile = store.get(str(person_path))
+
+        assert profile.image.mode == "RGB"
+        assert profile.image.size == (800, 1100)
+
+        # FASHNへのアップロードと同じエンコード結果
+        expected = FashnTryonAdapter("key").encode_image_to_base64(profile.image)
+        assert expected == "data:image/png;base64," + base64.b64encode(profile.upload_bytes).decode()
+
+    def test_reused_in_session(self, store, person_path):
+        """同じ画像は再計算しない"""
+        assert store.get(str(person_path)) is store.get(str(person_path))
+
+    def test_restored_from_disk(self, tmp_path, person_path, monkeypatch):
+        """再起動後はディスクから復元"""
+        first = ReferenceProfileStore(str(tmp_path / "profiles"))
+        original = first.get(str(person_path))
+
+        second = ReferenceProfileStore(str(tmp_path / "profiles"))
+        monkeypatch.setattr(second, "_build", lambda *args: pytest.fail("rebuilt"))
+        restored = second.get(str(person_path))
+
+        assert restored.upload_bytes == original.upload_bytes
+        assert np.array_equal(np.asarray(restored.image), np.asarray(original.image))
+
+    def test_changed_image_rebuilds(self, store, person_path):
+        """画像が変わったら作り直す"""
+        before = store.get(str(person_path))
+        Image.new("RGB", (64, 64), (10, 20, 30)).save(person_path)
+        os.utime(person_path, ns=(1, 1))
+        after = store.get(str(person_path))
+
+        assert after.content_hash != before.content_hash
+        assert after.image.size == (64, 64)
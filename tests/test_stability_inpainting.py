@@ -0,0 +1,87 @@
+"""Tests for Stability inpainting adapter"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.adapters.stability_inpainting_adapter import StabilityInpaintingAdapter
+
+
+@pytest.fixture
+def person():
+    """グラデーションの人物画像（2000x3000）"""
+    x = np.linspace(0, 255, 2000, dtype=np.uint8)
+    img = np.stack([np.tile(x, (3000, 1))] * 3, axis=-1)
+    return Image.fromarray(img)
+
+
+@pytest.fixture
+def mask():
+    """上半身だけのマスク"""
+    arr = np.zeros((3000, 2000), dtype=np.uint8)
+    arr[800:1400, 700:1300] = 255
+    return Image.fromarray(arr)
+
+
+def _fake_post(sent):
+    """送信されたタイルを記録し、赤で塗りつぶした画像を返す"""
+    def post(image, mask, prompt):
+        sent.append((image.size, mask.size))
+        return Image.new("RGB", image.size, (255, 0, 0))
+    return post
+
+
+class TestStabilityInpaintingAdapter:
+    """StabilityInpaintingAdapterのテスト"""
+
+    def test_uploads_only_mask_region(self, person, mask, monkeypatch):
+        """マスク周辺のタイルだけを最適サイズで送信"""
+        adapter = StabilityInpaintingAdapter("test-key")
+        sent = []
+        monkeypatch.setattr(adapter, "_post_inpaint", _fake_post(sent))
+
+        result, metadata = adapter._call_inpainting_api(person, mask, "red shirt")
+
+        (image_size, mask_size), = sent
+        assert image_size == mask_size
+        assert image_size[0] % 64 == 0 and image_size[1] % 64 == 0
+        assert image_size[0] * image_size[1] < person.width * person.height / 4
+
+        left, top, right, bottom = metadata["crop_box"]
+        assert left <= 700 and top <= 800 and right >= 1300 and bottom >= 1400
+        assert result.size == person.size
+
+    def test_pastes_back_with_feather(self, person, mask, monkeypatch):
+        """マスク内は置き換わり、マスク外は元のまま"""
+        adapter = StabilityInpaintingAdapter("test-key")
+        monkeypatch.setattr(adapter, "_post_inpaint", _fake_post([]))
+
+        result, _ = adapter._call_inpainting_api(person, mask, "red shirt")
+        result = np.asarray(result).astype(int)
+        original = np.asarray(person).astype(int)
+
+        assert tuple(result[1100, 1000]) == (255, 0, 0)
+        np.testing.assert_array_equal(result[:700], original[:700])
+        np.testing.assert_array_equal(result[:, 1400:], original[:, 1400:])
+        # 境界は中間値で滑らかにつながる
+        edge = result[1100, 1290:1320, 1]
+        assert (edge > 0).any() and (edge < original[1100, 1290:1320, 1]).any()
+
+    def test_empty_mask_skips_request(self, person, monkeypatch):
+        """マスクが空ならAPIを呼ばない"""
+        adapter = StabilityInpaintingAdapter("test-key")
+        sent = []
+        monkeypatch.setattr(adapter, "_post_inpaint", _fake_post(sent))
+
+        result, metadata = adapter._call_inpainting_api(
+            person, Image.new("L", person.size, 0), "red shirt"
+        )
+
+        assert sent == []
+        assert metadata["skipped"] is True
+        assert result.size == person.size
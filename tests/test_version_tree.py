@@ -0,0 +1,80 @@
+"""Tests for refinement version tree"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from core.pipeline.version_tree import VersionTree
+
+
+@pytest.fixture
+def base():
+    """ノイズ入りの画像（圧縮が効きにくい）"""
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (256, 256, 3), dtype=np.uint8))
+
+
+def _edit(image, box, color):
+    """矩形を塗りつぶした画像"""
+    edited = image.copy()
+    edited.paste(color, box)
+    return edited
+
+
+class TestVersionTree:
+    """VersionTreeのテスト"""
+
+    def test_stores_only_changed_tile(self, base):
+        """変化した範囲だけを保存"""
+        tree = VersionTree(base)
+        node_id = tree.add(_edit(base, (10, 20, 40, 60), (255, 0, 0)), "靴を赤く")
+
+        node = tree.nodes[node_id]
+        assert node.box == (10, 20, 40, 60)
+        assert node.stored_bytes < tree.nodes[0].stored_bytes / 20
+
+    def test_rebuild_after_eviction(self, base):
+        """キャッシュから外れたバージョンも祖先から正確に復元"""
+        tree = VersionTree(base, cache_size=1)
+        expected = base
+        for i in range(6):
+            expected = _edit(expected, (i * 20, i * 10, i * 20 + 30, i * 10 + 30), (i * 40, 0, 255))
+            tree.add(expected, f"edit {i}")
+
+        tree.get_image(0)  # 最新版をキャッシュから追い出す
+
+        np.testing.assert_array_equal(np.asarray(tree.get_image()), np.asarray(expected))
+        assert tree.path() == [0, 1, 2, 3, 4, 5, 6]
+        assert tree.stats()["cached_images"] == 1
+
+    def test_undo_and_branch(self, base):
+        """元に戻してから別の修正をすると分岐する"""
+        tree = VersionTree(base)
+        first = tree.add(_edit(base, (0, 0, 10, 10), (255, 0, 0)))
+        tree.add(_edit(tree.get_image(), (50, 50, 60, 60), (0, 255, 0)))
+
+        undone = tree.undo()
+        branch = tree.add(_edit(undone, (100, 100, 110, 110), (0, 0, 255)))
+
+        assert tree.children(first) == [2, branch]
+        assert tree.path(branch) == [0, first, branch]
+        assert tuple(np.asarray(tree.get_image(branch))[55, 55]) == tuple(np.asarray(base)[55, 55])
+
+    def test_unchanged_and_resized_versions(self, base):
+        """変化なしは空のタイル、サイズ変更は全体を保存"""
+        tree = VersionTree(base)
+        same = tree.add(base.copy())
+        resized = tree.add(base.resize((128, 128)))
+
+        assert tree.nodes[same].box is None
+        assert tree.nodes[resized].box == (0, 0, 128, 128)
+        tree._cache.clear()
+        assert tree.get_image(resized).size == (128, 128)
+        np.testing.assert_array_equal(np.asarray(tree.get_image(same)), np.asarray(base))
+        assert tree.undo() is not None and tree.current_id == same
+        assert tree.checkout(0) is not None and tree.undo() is None